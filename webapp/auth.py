@@ -4,6 +4,7 @@ from typing import Optional, List, Dict
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, HTTPBearer, HTTPAuthorizationCredentials, HTTPBasic
+from fastapi.concurrency import run_in_threadpool
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from cryptography.fernet import Fernet # For symmetric encryption
@@ -11,13 +12,16 @@ from cryptography.fernet import Fernet # For symmetric encryption
 
 # Import SQLAlchemy Session and ORM Models if needed for type hints
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Import schemas, models_db, and the new get_db dependency
 # from . import models_db # This was causing the issue by importing the wrong get_user_by_username
 from . import models # models is likely webapp.models (ORM definitions)
-from .v2.database import get_db_v2 # <--- ADD THIS LINE (V2 DB)
+from .v2.database import get_db_v2, get_async_db_v2 # <--- ADD THIS LINE (V2 DB)
 from .v2.crud import security as v2_crud_security # <--- ADDED: Specific import for v2 CRUD operations
 from .v2.pydantic_models import security as v2_security_schemas # IMPORT THE V2 SECURITY SCHEMAS
+from .v2.services.permission_cache import permission_cache
+from .v2.services.token_cache import token_verification_cache, TokenEntry
 
 # Import logging for added logging functionality
 import logging
@@ -133,9 +137,37 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional['mo
 
 # --- FastAPI Dependencies (Refactored get_current_user) ---
 
+def verify_bearer_token(token: str, credentials_exception: HTTPException) -> TokenEntry:
+    """
+    Verify a bearer token, reusing the cached verification result until the token's exp.
+
+    Repeated requests with the same token skip signature verification; revoked tokens
+    are rejected without decoding.
+    """
+    entry = token_verification_cache.get(token)
+    if entry is not None:
+        return entry
+    if token_verification_cache.is_revoked(token):
+        raise credentials_exception
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        logger.debug(f"JWT decode failed: {e}")
+        raise credentials_exception
+    username = payload.get("sub")
+    if not username:
+        raise credentials_exception
+
+    entry = token_verification_cache.put(token, username, payload.get("exp"))
+    if entry is None:
+        raise credentials_exception
+    return entry
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db_v2)
+    db: AsyncSession = Depends(get_async_db_v2)
 ) -> v2_security_schemas.User:
     """🔥 临时简化版本 - 仅验证JWT，使用快速查询"""
     # 🔥 直接调用超简化认证逻辑
@@ -518,20 +550,16 @@ def require_permissions_optimized(required_permissions: List[str]):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        # JWT解码（极快）
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username = payload.get("sub")
-            if not username:
-                logger.warning("❌ JWT中缺少用户名")
-                raise credentials_exception
-        except JWTError as e:
-            logger.warning(f"❌ JWT解码失败: {e}")
-            raise credentials_exception
+        # JWT验证（同一令牌的重复请求直接使用缓存的验证结果）
+        username = verify_bearer_token(token, credentials_exception).username
 
-        # 🚀 使用高性能查询获取用户权限
+        # 🚀 热路径完全在内存中完成：缓存命中时不访问数据库；未命中时在线程池中查询，不阻塞事件循环
         start_time = datetime.now()
-        user_data = v2_crud_security.get_user_permissions_optimized(db, username, use_cache=True)
+        user_data = v2_crud_security.get_cached_user_permissions(username)
+        if user_data is None:
+            user_data = await run_in_threadpool(
+                v2_crud_security.get_user_permissions_optimized, db, username, True
+            )
         query_time = (datetime.now() - start_time).total_seconds() * 1000
         logger.info(f"⚡ 用户权限查询耗时: {query_time:.2f}ms")
 
@@ -601,7 +629,7 @@ def require_basic_auth_only():
         FastAPI依赖函数
     """
     async def basic_auth_checker(
-        db: Session = Depends(get_db_v2),
+        db: AsyncSession = Depends(get_async_db_v2),
         credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
     ) -> v2_security_schemas.User:
         
@@ -620,14 +648,13 @@ def require_basic_auth_only():
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        # JWT解码（仅验证令牌有效性）
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username = payload.get("sub")
-            if not username:
-                raise credentials_exception
-        except JWTError:
-            raise credentials_exception
+        # JWT验证（仅验证令牌有效性，同一令牌的重复请求直接使用缓存的验证结果）
+        token_entry = verify_bearer_token(token, credentials_exception)
+        if token_entry.user_is_fresh:
+            # 用户快照在权限变更后失效，此时才重新查询用户
+            return token_entry.user
+        username = token_entry.username
+        generation = permission_cache.generation
 
         # 简单用户验证（不加载权限）
         from sqlalchemy import text
@@ -637,7 +664,8 @@ def require_basic_auth_only():
             WHERE username = :username AND is_active = true
         """)
         
-        result = db.execute(query, {"username": username}).first()
+        # 异步会话查询，等待数据库时不占用事件循环
+        result = (await db.execute(query, {"username": username})).first()
         if not result:
             raise credentials_exception
 
@@ -653,6 +681,7 @@ def require_basic_auth_only():
             employee=None,  # 不加载员工信息
             all_permission_codes=["basic:access"]  # 基础访问权限
         )
+        token_verification_cache.set_user(token_entry, current_user, generation)
         
         return current_user
 
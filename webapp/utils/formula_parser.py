@@ -1,32 +1,271 @@
 # salary_system/webapp/utils/formula_parser.py
+import ast
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Sequence, List
 try:
     from asteval import Interpreter
     ASTEVAL_AVAILABLE = True
 except ImportError:
     ASTEVAL_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
-# 不再需要全局解释器实例
-# aeval = None
-# if ASTEVAL_AVAILABLE:
-#     aeval = Interpreter()
-#     # 示例：可以预定义一些安全的数学函数，如果需要的话
-#     # aeval.symtable['safe_max'] = max 
-#     # aeval.symtable['safe_min'] = min
-#     # aeval.symtable['safe_round'] = round
-# else:
-#     logger.warning("asteval library not found. Formula evaluation will be disabled. Please install it: pip install asteval")
+# Maximum number of compiled formulas kept in memory (LRU)
+MAX_COMPILED_FORMULAS = 1024
+
+# Largest exponent allowed in compiled formulas; other powers are evaluated by asteval,
+# which enforces its own size limits
+MAX_COMPILED_EXPONENT = 64
+
+# AST node types allowed in compiled formulas: arithmetic, comparisons,
+# boolean logic, conditional expressions and calls to whitelisted functions.
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+# Functions available inside formulas (scalar and column-wise implementations)
+_SCALAR_FUNCTIONS = {'max': max, 'min': min, 'abs': abs, 'round': round}
+_VECTOR_FUNCTIONS = {
+    # max/min are only compiled with two or more arguments, so they never reduce across rows
+    'max': lambda *args: np.maximum.reduce(args),
+    'min': lambda *args: np.minimum.reduce(args),
+    'abs': lambda value: np.abs(value),
+} if NUMPY_AVAILABLE else {}
+
+
+class FormulaValidationError(ValueError):
+    """Raised when a formula uses syntax outside of the compiled formula subset."""
+    pass
+
+
+class CompiledFormula:
+    """
+    A formula parsed and validated once, evaluated many times.
+
+    Only expressions made of whitelisted AST nodes are compiled; names may not
+    start with an underscore and only whitelisted functions may be called,
+    so evaluation has no access to attributes, builtins or imports.
+    Constants must be numeric and powers need a small constant exponent, so a
+    compiled formula cannot build huge numbers or strings.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        tree = ast.parse(expression.strip(), mode='eval')
+        self._validate(tree)
+        self.variables = sorted({
+            node.id for node in ast.walk(tree)
+            if isinstance(node, ast.Name) and node.id not in _SCALAR_FUNCTIONS
+        })
+        # and/or, chained comparisons and conditional expressions are evaluated row by row;
+        # so is anything whose per-row result would not be a float (or bool) for float inputs,
+        # since NumPy would return floats where the per-row path returns ints
+        self.vectorizable = not any(
+            isinstance(node, (ast.BoolOp, ast.IfExp)) or (isinstance(node, ast.Compare) and len(node.ops) > 1)
+            for node in ast.walk(tree)
+        ) and self._result_kind(tree.body) in ('float', 'bool')
+        self._code = compile(tree, f"<formula:{expression[:40]}>", 'eval')
+
+    @staticmethod
+    def _validate(tree: ast.AST) -> None:
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise FormulaValidationError(f"Unsupported syntax: {type(node).__name__}")
+            if isinstance(node, ast.Name) and node.id.startswith('_'):
+                raise FormulaValidationError(f"Unsupported name: {node.id}")
+            if isinstance(node, ast.Constant) and type(node.value) not in (int, float, bool):
+                raise FormulaValidationError(f"Unsupported constant: {node.value!r}")
+            if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+                exponent = CompiledFormula._constant_value(node.right)
+                if exponent is None or abs(exponent) > MAX_COMPILED_EXPONENT:
+                    raise FormulaValidationError("Only small constant exponents are supported")
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in _SCALAR_FUNCTIONS or node.keywords:
+                    raise FormulaValidationError("Only max/min/abs/round calls are supported")
+                if node.func.id in ('max', 'min') and len(node.args) < 2:
+                    raise FormulaValidationError(f"{node.func.id}() needs at least two arguments")
+
+    @staticmethod
+    def _result_kind(node: ast.AST) -> Optional[str]:
+        """
+        Python result type ('float', 'int' or 'bool') of a node when every variable is a float;
+        None when it depends on the values (e.g. max of an int and a float).
+        """
+        kind = CompiledFormula._result_kind
+        if isinstance(node, ast.Name):
+            return 'float'
+        if isinstance(node, ast.Constant):
+            return type(node.value).__name__
+        if isinstance(node, ast.Compare):
+            return 'bool'
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return 'bool'
+            operand = kind(node.operand)
+            return 'int' if operand == 'bool' else operand
+        if isinstance(node, ast.BinOp):
+            left, right = kind(node.left), kind(node.right)
+            if left is None or right is None:
+                return None
+            if isinstance(node.op, ast.Div) or 'float' in (left, right):
+                return 'float'
+            # int ** negative int is a float; treat the whole int case as not vectorizable
+            return 'int'
+        if isinstance(node, ast.Call):
+            args = [kind(arg) for arg in node.args]
+            name = node.func.id
+            if name == 'abs':
+                return 'int' if args[0] == 'bool' else args[0]
+            if name == 'round':
+                # round(x) returns an int and np.round(x, n) can differ from Python's
+                # correctly rounded round(x, n), so rounding is always evaluated row by row
+                return None
+            if name in ('max', 'min'):
+                return 'float' if all(arg == 'float' for arg in args) else None
+        return None
+
+    @staticmethod
+    def _constant_value(node: ast.AST) -> Optional[float]:
+        """Value of a numeric constant, optionally negated; None for anything else."""
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            value = CompiledFormula._constant_value(node.operand)
+            if value is None:
+                return None
+            return -value if isinstance(node.op, ast.USub) else value
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        return None
+
+    def evaluate(self, context: Dict[str, Any]) -> Any:
+        """Evaluate against a single row of values."""
+        return eval(self._code, {'__builtins__': {}, **_SCALAR_FUNCTIONS}, context)
+
+    def _float_columns(self, columns: Dict[str, Sequence[Any]]) -> bool:
+        """
+        Only float inputs are vectorized; ints (exact beyond 2**53, int results),
+        Decimal and other values keep their exact per-row semantics.
+        """
+        return all(
+            type(value) is float
+            for name in self.variables if name in columns
+            for value in columns[name]
+        )
+
+    def evaluate_batch(self, columns: Dict[str, Sequence[Any]], row_count: int) -> List[Any]:
+        """
+        Evaluate against a batch of rows given as columns.
+
+        Uses NumPy array arithmetic when every input and the result are floats;
+        otherwise (NumPy missing, non-float columns or row-wise syntax) falls back
+        to per-row evaluation of the same compiled code, so results always match
+        evaluate() row by row.
+        """
+        if NUMPY_AVAILABLE and self.vectorizable and row_count and self._float_columns(columns):
+            try:
+                arrays = {
+                    name: np.asarray(columns[name], dtype=float)
+                    for name in self.variables if name in columns
+                }
+                # Division by zero etc. falls back to per-row evaluation (None for failing rows)
+                with np.errstate(divide='raise', invalid='raise', over='raise'):
+                    result = eval(self._code, {'__builtins__': {}, **_VECTOR_FUNCTIONS}, arrays)
+                return np.broadcast_to(result, (row_count,)).tolist()
+            except (TypeError, ValueError, KeyError, NameError, FloatingPointError):
+                pass
+
+        results = []
+        for index in range(row_count):
+            row = {name: values[index] for name, values in columns.items()}
+            try:
+                results.append(self.evaluate(row))
+            except Exception as e:
+                logger.error(f"Error evaluating formula '{self.expression}' for row {index}: {e}")
+                results.append(None)
+        return results
+
+
+_compiled_cache: "OrderedDict[str, Optional[CompiledFormula]]" = OrderedDict()
+_compiled_cache_lock = threading.Lock()
+
+
+def _formula_key(expression: str) -> str:
+    return hashlib.sha256(expression.strip().encode('utf-8')).hexdigest()
+
+
+def compile_formula(expression: str) -> Optional[CompiledFormula]:
+    """
+    Returns the cached compiled formula for an expression (keyed by its hash).
+
+    Returns None if the expression is outside the compiled subset; such formulas
+    are evaluated with asteval instead. The result is cached either way.
+    """
+    key = _formula_key(expression)
+    with _compiled_cache_lock:
+        if key in _compiled_cache:
+            _compiled_cache.move_to_end(key)
+            return _compiled_cache[key]
+
+    try:
+        compiled = CompiledFormula(expression)
+    except (SyntaxError, FormulaValidationError) as e:
+        logger.debug(f"Formula '{expression}' is not compilable, using asteval: {e}")
+        compiled = None
+
+    with _compiled_cache_lock:
+        _compiled_cache[key] = compiled
+        while len(_compiled_cache) > MAX_COMPILED_FORMULAS:
+            _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def clear_formula_cache() -> None:
+    """Drops all compiled formulas."""
+    with _compiled_cache_lock:
+        _compiled_cache.clear()
+
+
+def _evaluate_with_asteval(expression: str, context: Dict[str, Any]) -> Optional[Any]:
+    """Evaluates with a fresh asteval Interpreter (statements and other full-syntax formulas)."""
+    if not ASTEVAL_AVAILABLE:
+        logger.error("Cannot evaluate formula: asteval library is not installed.")
+        return None
+
+    # 为每次调用创建一个新的、独立的解释器实例
+    local_aeval = Interpreter()
+    for key, value in context.items():
+        local_aeval.symtable[key] = value
+
+    try:
+        return local_aeval.eval(expression)
+    except Exception as e:
+        logger.error(
+            f"Error evaluating formula '{expression}' with context keys {list(context.keys())}: {e}",
+            exc_info=True
+        )
+        return None
+
 
 def safe_evaluate_formula(
     expression: str,
     context: Dict[str, Any]
 ) -> Optional[Any]:
     """
-    Safely evaluates a formula string using asteval if available.
-    Creates a new Interpreter instance for each call for safety.
+    Safely evaluates a formula string.
+
+    Expressions are parsed and validated once and cached by hash (see compile_formula);
+    formulas outside the compiled subset are evaluated with asteval.
 
     Args:
         expression: The formula string to evaluate (e.g., "base * 1.1 + bonus").
@@ -34,39 +273,50 @@ def safe_evaluate_formula(
                  (e.g., {"base": 5000, "bonus": 200}).
 
     Returns:
-        The result of the evaluation, or None if asteval is not available or an error occurs.
+        The result of the evaluation, or None if an error occurs.
     """
-    if not ASTEVAL_AVAILABLE:
-        logger.error("Cannot evaluate formula: asteval library is not installed.")
-        return None
-
     if not expression:
         logger.warning("Attempted to evaluate an empty formula expression.")
         return None
 
-    # 为每次调用创建一个新的、独立的解释器实例
-    local_aeval = Interpreter()
-
-    # 将上下文加载到这个本地解释器的符号表中
-    # 注意：这里是直接修改 local_aeval 的 symtable
-    for key, value in context.items():
-        local_aeval.symtable[key] = value
-
-    # 添加一些默认的安全函数（可选，但推荐）
-    # local_aeval.symtable['max'] = max
-    # local_aeval.symtable['min'] = min
-    # local_aeval.symtable['round'] = round
-    # local_aeval.symtable['len'] = len # 如果需要的话
+    compiled = compile_formula(expression)
+    if compiled is None:
+        return _evaluate_with_asteval(expression, context)
 
     try:
-        # 现在直接调用 eval，它会使用 local_aeval 实例的符号表
-        result = local_aeval.eval(expression)
-        return result
+        return compiled.evaluate(context)
     except Exception as e:
-        # 捕获 asteval 可能抛出的各种计算错误
         logger.error(
             f"Error evaluating formula '{expression}' with context keys {list(context.keys())}: {e}",
-            exc_info=True # Include traceback in log for debugging
+            exc_info=True
         )
-        # 返回 None 表示计算失败
-        return None 
\ No newline at end of file
+        return None
+
+
+def evaluate_formula_batch(
+    expression: str,
+    columns: Dict[str, Sequence[Any]],
+    row_count: int
+) -> List[Optional[Any]]:
+    """
+    Evaluates a formula column-wise for a batch of rows (e.g. one row per employee).
+
+    Args:
+        expression: The formula string to evaluate.
+        columns: Variable name -> sequence of values, one per row.
+        row_count: Number of rows.
+
+    Returns:
+        One result per row (None where evaluation failed).
+    """
+    if not expression:
+        return [None] * row_count
+
+    compiled = compile_formula(expression)
+    if compiled is not None:
+        return compiled.evaluate_batch(columns, row_count)
+
+    return [
+        _evaluate_with_asteval(expression, {name: values[index] for name, values in columns.items()})
+        for index in range(row_count)
+    ]
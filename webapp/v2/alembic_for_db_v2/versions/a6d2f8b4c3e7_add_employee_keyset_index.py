@@ -0,0 +1,29 @@
+"""add_employee_keyset_index
+
+Revision ID: a6d2f8b4c3e7
+Revises: f3b9c1d7e2a5
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2f8b4c3e7'
+down_revision: Union[str, None] = 'f3b9c1d7e2a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 员工列表按 (姓, 名, ID) 键集分页，索引顺序与排序一致，任意页都只需一次索引范围扫描
+    op.create_index('idx_employees_name_keyset', 'employees', ['last_name', 'first_name', 'id'], unique=False, schema='hr')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_employees_name_keyset', table_name='employees', schema='hr')
@@ -0,0 +1,43 @@
+"""add_employee_search_trgm_indexes
+
+Revision ID: b7e3a9c5d1f2
+Revises: a6d2f8b4c3e7
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3a9c5d1f2'
+down_revision: Union[str, None] = 'a6d2f8b4c3e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 员工列表搜索中 ILIKE '%关键词%' 的列（索引名, 列或带括号的表达式）
+TRGM_INDEXES = (
+    ('idx_employees_code_trgm', 'employee_code'),
+    ('idx_employees_first_name_trgm', 'first_name'),
+    ('idx_employees_last_name_trgm', 'last_name'),
+    ('idx_employees_id_number_trgm', 'id_number'),
+    ('idx_employees_email_trgm', 'email'),
+    ('idx_employees_phone_number_trgm', 'phone_number'),
+    ('idx_employees_full_name_trgm', "(COALESCE(last_name, '') || COALESCE(first_name, ''))"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 三元组 GIN 索引使前后模糊匹配的 ILIKE 不再全表扫描
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index_name, column in TRGM_INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON hr.employees USING gin ({column} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for index_name, _ in TRGM_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS hr.{index_name}")
@@ -0,0 +1,59 @@
+"""add_payroll_calculation_tasks_table
+
+Revision ID: c4f81d2a9b3e
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f81d2a9b3e'
+down_revision: Union[str, None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 创建薪资计算任务表（替代 /tmp 下的进度文件）
+    op.create_table('calculation_tasks',
+        sa.Column('id', sa.String(length=36), nullable=False, comment='任务ID (UUID)'),
+        sa.Column('task_type', sa.String(length=50), nullable=False, server_default='integrated_run', comment='任务类型'),
+        sa.Column('payroll_run_id', sa.BigInteger(), nullable=True, comment='薪资运行ID'),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='PREPARING', comment='任务状态: PREPARING, CALCULATING, COMPLETED, FAILED, CANCELLED'),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0', comment='总条目数'),
+        sa.Column('processed', sa.Integer(), nullable=False, server_default='0', comment='已处理条目数'),
+        sa.Column('stage', sa.String(length=255), nullable=True, comment='当前阶段'),
+        sa.Column('progress_data', postgresql.JSONB(astext_type=sa.Text()), nullable=True, comment='最近一次的完整进度快照'),
+        sa.Column('request_params', postgresql.JSONB(astext_type=sa.Text()), nullable=True, comment='续算所需的计算参数和条目ID'),
+        sa.Column('completed_entry_ids', postgresql.JSONB(astext_type=sa.Text()), nullable=True, comment='已完成分块的条目ID'),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=False, server_default=sa.text('false'), comment='是否已请求取消'),
+        sa.Column('error_message', sa.Text(), nullable=True, comment='错误信息'),
+        sa.Column('created_by', sa.BigInteger(), nullable=True, comment='创建者'),
+        sa.Column('started_at', sa.TIMESTAMP(timezone=True), nullable=True, comment='开始时间'),
+        sa.Column('completed_at', sa.TIMESTAMP(timezone=True), nullable=True, comment='完成时间'),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False, comment='创建时间'),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False, comment='更新时间'),
+        sa.ForeignKeyConstraint(['payroll_run_id'], ['payroll.payroll_runs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['created_by'], ['security.users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        schema='payroll'
+    )
+
+    # 创建索引
+    op.create_index('idx_calculation_tasks_run_id', 'calculation_tasks', ['payroll_run_id'], unique=False, schema='payroll')
+    op.create_index('idx_calculation_tasks_status', 'calculation_tasks', ['status'], unique=False, schema='payroll')
+    op.create_index('idx_calculation_tasks_created_at', 'calculation_tasks', ['created_at'], unique=False, schema='payroll')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_calculation_tasks_created_at', table_name='calculation_tasks', schema='payroll')
+    op.drop_index('idx_calculation_tasks_status', table_name='calculation_tasks', schema='payroll')
+    op.drop_index('idx_calculation_tasks_run_id', table_name='calculation_tasks', schema='payroll')
+    op.drop_table('calculation_tasks', schema='payroll')
@@ -0,0 +1,59 @@
+"""add_payroll_period_run_updated_at
+
+Revision ID: c5d9e1f3a8b2
+Revises: b7e3a9c5d1f2
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d9e1f3a8b2'
+down_revision: Union[str, None] = 'b7e3a9c5d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 需要维护修改时间的表
+TOUCHED_TABLES = ('payroll_periods', 'payroll_runs')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 修改时间作为报表结果缓存的数据版本
+    for table in TOUCHED_TABLES:
+        op.add_column(
+            table,
+            sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False, comment='更新时间'),
+            schema='payroll'
+        )
+
+    # 原生SQL的更新也需要刷新修改时间
+    op.execute("""
+        CREATE OR REPLACE FUNCTION payroll.touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in TOUCHED_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER trg_{table}_touch_updated_at
+            BEFORE UPDATE ON payroll.{table}
+            FOR EACH ROW EXECUTE FUNCTION payroll.touch_updated_at()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TOUCHED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_touch_updated_at ON payroll.{table}")
+    op.execute("DROP FUNCTION IF EXISTS payroll.touch_updated_at()")
+    for table in TOUCHED_TABLES:
+        op.drop_column(table, 'updated_at', schema='payroll')
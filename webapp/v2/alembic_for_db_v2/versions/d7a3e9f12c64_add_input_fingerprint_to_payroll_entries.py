@@ -0,0 +1,32 @@
+"""add_input_fingerprint_to_payroll_entries
+
+Revision ID: d7a3e9f12c64
+Revises: c4f81d2a9b3e
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3e9f12c64'
+down_revision: Union[str, None] = 'c4f81d2a9b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 薪资条目增加输入指纹字段，增量重算时跳过输入未变化的条目
+    op.add_column('payroll_entries',
+        sa.Column('input_fingerprint', sa.String(length=64), nullable=True, comment='最近一次成功计算的输入指纹'),
+        schema='payroll'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('payroll_entries', 'input_fingerprint', schema='payroll')
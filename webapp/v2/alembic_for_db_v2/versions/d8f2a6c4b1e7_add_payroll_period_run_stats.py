@@ -0,0 +1,263 @@
+"""add_payroll_period_run_stats
+
+Revision ID: d8f2a6c4b1e7
+Revises: c5d9e1f3a8b2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f2a6c4b1e7'
+down_revision: Union[str, None] = 'c5d9e1f3a8b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 工资条目的增量：新行为正、旧行为负（语句级触发器的过渡表）
+NEW_ROWS_DELTA = "SELECT payroll_run_id, payroll_period_id, 1 AS entries, gross_pay, total_deductions, net_pay FROM new_rows"
+OLD_ROWS_DELTA = "SELECT payroll_run_id, payroll_period_id, -1, -gross_pay, -total_deductions, -net_pay FROM old_rows"
+
+# 迁移前的报表视图定义（降级时恢复）
+OLD_PERIODS_VIEW = """
+    CREATE OR REPLACE VIEW reports.v_payroll_periods_detail AS
+    SELECT
+        pp.id,
+        pp.name,
+        pp.start_date,
+        pp.end_date,
+        pp.pay_date,
+        lv_status.name as status,
+        COUNT(pe.id) as total_entries,
+        SUM(pe.gross_pay) as total_gross_pay,
+        SUM(pe.total_deductions) as total_deductions,
+        SUM(pe.net_pay) as total_net_pay
+    FROM payroll.payroll_periods pp
+        LEFT JOIN config.lookup_values lv_status ON pp.status_lookup_value_id = lv_status.id
+        LEFT JOIN payroll.payroll_entries pe ON pp.id = pe.payroll_period_id
+    GROUP BY pp.id, pp.name, pp.start_date, pp.end_date, pp.pay_date, lv_status.name;
+"""
+
+OLD_RUNS_VIEW = """
+    CREATE OR REPLACE VIEW reports.v_payroll_runs_detail AS
+    SELECT
+        pr.id,
+        pr.run_date,
+        lv_status.name as status,
+        pp.name as period_name,
+        pp.start_date as period_start,
+        pp.end_date as period_end,
+        COUNT(pe.id) as entries_count,
+        SUM(pe.gross_pay) as total_gross,
+        SUM(pe.total_deductions) as total_deductions,
+        SUM(pe.net_pay) as total_net
+    FROM payroll.payroll_runs pr
+        LEFT JOIN config.lookup_values lv_status ON pr.status_lookup_value_id = lv_status.id
+        JOIN payroll.payroll_periods pp ON pr.payroll_period_id = pp.id
+        LEFT JOIN payroll.payroll_entries pe ON pr.id = pe.payroll_run_id
+    GROUP BY pr.id, pr.run_date, lv_status.name, pp.name, pp.start_date, pp.end_date;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 期间级汇总：运行数、条目数、金额合计和最新运行（不建外键，避免期间与运行之间的循环依赖）
+    op.add_column('payroll_periods', sa.Column('runs_count', sa.Integer(), server_default='0', nullable=False, comment='工资运行数'), schema='payroll')
+    op.add_column('payroll_periods', sa.Column('entries_count', sa.Integer(), server_default='0', nullable=False, comment='工资条目数'), schema='payroll')
+    op.add_column('payroll_periods', sa.Column('total_gross_pay', sa.Numeric(18, 4), server_default='0', nullable=False, comment='应发合计'), schema='payroll')
+    op.add_column('payroll_periods', sa.Column('total_deductions', sa.Numeric(18, 4), server_default='0', nullable=False, comment='扣发合计'), schema='payroll')
+    op.add_column('payroll_periods', sa.Column('total_net_pay', sa.Numeric(18, 4), server_default='0', nullable=False, comment='实发合计'), schema='payroll')
+    op.add_column('payroll_periods', sa.Column('latest_run_id', sa.BigInteger(), nullable=True, comment='最新工资运行ID'), schema='payroll')
+
+    # 运行级汇总沿用已有字段，total_employees 即条目数
+    op.execute("""
+        UPDATE payroll.payroll_runs pr SET
+            total_employees = COALESCE(s.entries, 0),
+            total_gross_pay = COALESCE(s.gross_pay, 0),
+            total_deductions = COALESCE(s.total_deductions, 0),
+            total_net_pay = COALESCE(s.net_pay, 0)
+        FROM payroll.payroll_runs r
+        LEFT JOIN (
+            SELECT payroll_run_id, COUNT(*) AS entries, SUM(gross_pay) AS gross_pay,
+                   SUM(total_deductions) AS total_deductions, SUM(net_pay) AS net_pay
+            FROM payroll.payroll_entries
+            GROUP BY payroll_run_id
+        ) s ON s.payroll_run_id = r.id
+        WHERE pr.id = r.id
+    """)
+    op.execute("""
+        UPDATE payroll.payroll_periods pp SET
+            entries_count = s.entries,
+            total_gross_pay = s.gross_pay,
+            total_deductions = s.total_deductions,
+            total_net_pay = s.net_pay
+        FROM (
+            SELECT payroll_period_id, COUNT(*) AS entries, SUM(gross_pay) AS gross_pay,
+                   SUM(total_deductions) AS total_deductions, SUM(net_pay) AS net_pay
+            FROM payroll.payroll_entries
+            GROUP BY payroll_period_id
+        ) s
+        WHERE pp.id = s.payroll_period_id
+    """)
+
+    # 工资条目写入时在同一事务中按增量维护运行和期间的汇总。
+    # 使用语句级触发器，批量写入只更新一次汇总行；金额和归属都没有变化的更新不触碰汇总行。
+    # 过渡表只能在触发器函数内引用，按操作类型拼接增量来源后执行。
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION payroll.apply_payroll_entry_stats() RETURNS trigger AS $$
+        DECLARE
+            deltas text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                deltas := '{NEW_ROWS_DELTA}';
+            ELSIF TG_OP = 'DELETE' THEN
+                deltas := '{OLD_ROWS_DELTA}';
+            ELSE
+                deltas := '{NEW_ROWS_DELTA} UNION ALL {OLD_ROWS_DELTA}';
+            END IF;
+
+            EXECUTE format($sql$
+                UPDATE payroll.payroll_runs pr SET
+                    total_employees = COALESCE(pr.total_employees, 0) + d.entries,
+                    total_gross_pay = COALESCE(pr.total_gross_pay, 0) + d.gross_pay,
+                    total_deductions = COALESCE(pr.total_deductions, 0) + d.total_deductions,
+                    total_net_pay = COALESCE(pr.total_net_pay, 0) + d.net_pay
+                FROM (
+                    SELECT payroll_run_id, SUM(entries) AS entries, SUM(gross_pay) AS gross_pay,
+                           SUM(total_deductions) AS total_deductions, SUM(net_pay) AS net_pay
+                    FROM (%s) AS delta (payroll_run_id, payroll_period_id, entries, gross_pay, total_deductions, net_pay)
+                    GROUP BY payroll_run_id
+                    HAVING SUM(entries) <> 0 OR SUM(gross_pay) <> 0 OR SUM(total_deductions) <> 0 OR SUM(net_pay) <> 0
+                ) d
+                WHERE pr.id = d.payroll_run_id
+            $sql$, deltas);
+
+            EXECUTE format($sql$
+                UPDATE payroll.payroll_periods pp SET
+                    entries_count = pp.entries_count + d.entries,
+                    total_gross_pay = pp.total_gross_pay + d.gross_pay,
+                    total_deductions = pp.total_deductions + d.total_deductions,
+                    total_net_pay = pp.total_net_pay + d.net_pay
+                FROM (
+                    SELECT payroll_period_id, SUM(entries) AS entries, SUM(gross_pay) AS gross_pay,
+                           SUM(total_deductions) AS total_deductions, SUM(net_pay) AS net_pay
+                    FROM (%s) AS delta (payroll_run_id, payroll_period_id, entries, gross_pay, total_deductions, net_pay)
+                    GROUP BY payroll_period_id
+                    HAVING SUM(entries) <> 0 OR SUM(gross_pay) <> 0 OR SUM(total_deductions) <> 0 OR SUM(net_pay) <> 0
+                ) d
+                WHERE pp.id = d.payroll_period_id
+            $sql$, deltas);
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # 带过渡表的触发器只能对应一种操作
+    op.execute("""
+        CREATE TRIGGER trg_payroll_entries_stats_insert
+        AFTER INSERT ON payroll.payroll_entries
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION payroll.apply_payroll_entry_stats()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_payroll_entries_stats_update
+        AFTER UPDATE ON payroll.payroll_entries
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION payroll.apply_payroll_entry_stats()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_payroll_entries_stats_delete
+        AFTER DELETE ON payroll.payroll_entries
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION payroll.apply_payroll_entry_stats()
+    """)
+
+    # 运行的新增、删除或改期只涉及少数行，直接重新统计受影响期间的运行数和最新运行
+    op.execute("""
+        CREATE OR REPLACE FUNCTION payroll.refresh_payroll_period_run_stats(period_id bigint) RETURNS void AS $$
+            UPDATE payroll.payroll_periods pp SET
+                runs_count = (SELECT COUNT(*) FROM payroll.payroll_runs pr WHERE pr.payroll_period_id = pp.id),
+                latest_run_id = (
+                    SELECT pr.id FROM payroll.payroll_runs pr
+                    WHERE pr.payroll_period_id = pp.id
+                    ORDER BY pr.run_date DESC, pr.id DESC
+                    LIMIT 1
+                )
+            WHERE pp.id = period_id
+        $$ LANGUAGE sql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION payroll.apply_payroll_run_stats() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM payroll.refresh_payroll_period_run_stats(OLD.payroll_period_id);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.payroll_period_id <> OLD.payroll_period_id) THEN
+                PERFORM payroll.refresh_payroll_period_run_stats(NEW.payroll_period_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # 汇总金额的更新很频繁，只在影响运行数和最新运行的字段变化时触发
+    op.execute("""
+        CREATE TRIGGER trg_payroll_runs_period_stats
+        AFTER INSERT OR DELETE OR UPDATE OF payroll_period_id, run_date ON payroll.payroll_runs
+        FOR EACH ROW EXECUTE FUNCTION payroll.apply_payroll_run_stats()
+    """)
+    op.execute("SELECT payroll.refresh_payroll_period_run_stats(id) FROM payroll.payroll_periods")
+
+    # 报表视图改为读取汇总字段（保持原有列名和类型）
+    op.execute("""
+    CREATE OR REPLACE VIEW reports.v_payroll_periods_detail AS
+    SELECT
+        pp.id,
+        pp.name,
+        pp.start_date,
+        pp.end_date,
+        pp.pay_date,
+        lv_status.name as status,
+        pp.entries_count::bigint as total_entries,
+        pp.total_gross_pay::numeric as total_gross_pay,
+        pp.total_deductions::numeric as total_deductions,
+        pp.total_net_pay::numeric as total_net_pay
+    FROM payroll.payroll_periods pp
+        LEFT JOIN config.lookup_values lv_status ON pp.status_lookup_value_id = lv_status.id;
+    """)
+    op.execute("""
+    CREATE OR REPLACE VIEW reports.v_payroll_runs_detail AS
+    SELECT
+        pr.id,
+        pr.run_date,
+        lv_status.name as status,
+        pp.name as period_name,
+        pp.start_date as period_start,
+        pp.end_date as period_end,
+        COALESCE(pr.total_employees, 0)::bigint as entries_count,
+        pr.total_gross_pay::numeric as total_gross,
+        pr.total_deductions::numeric as total_deductions,
+        pr.total_net_pay::numeric as total_net
+    FROM payroll.payroll_runs pr
+        LEFT JOIN config.lookup_values lv_status ON pr.status_lookup_value_id = lv_status.id
+        JOIN payroll.payroll_periods pp ON pr.payroll_period_id = pp.id;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(OLD_RUNS_VIEW)
+    op.execute(OLD_PERIODS_VIEW)
+
+    op.execute("DROP TRIGGER IF EXISTS trg_payroll_runs_period_stats ON payroll.payroll_runs")
+    op.execute("DROP FUNCTION IF EXISTS payroll.apply_payroll_run_stats()")
+    op.execute("DROP FUNCTION IF EXISTS payroll.refresh_payroll_period_run_stats(bigint)")
+    for operation in ('insert', 'update', 'delete'):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_payroll_entries_stats_{operation} ON payroll.payroll_entries")
+    op.execute("DROP FUNCTION IF EXISTS payroll.apply_payroll_entry_stats()")
+
+    for column in ('latest_run_id', 'total_net_pay', 'total_deductions', 'total_gross_pay', 'entries_count', 'runs_count'):
+        op.drop_column('payroll_periods', column, schema='payroll')
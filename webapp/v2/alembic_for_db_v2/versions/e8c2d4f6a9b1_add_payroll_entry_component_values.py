@@ -0,0 +1,179 @@
+"""add_payroll_entry_component_values
+
+Revision ID: e8c2d4f6a9b1
+Revises: d7a3e9f12c64
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c2d4f6a9b1'
+down_revision: Union[str, None] = 'd7a3e9f12c64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 按列存储的薪资条目组件金额，视图和报表按组件代码聚合时不再逐行解析 JSONB
+    op.create_table('entry_component_values',
+        sa.Column('entry_id', sa.BigInteger(), nullable=False, comment='薪资条目ID'),
+        sa.Column('section', sa.String(length=20), nullable=False, comment='来源: EARNING, DEDUCTION, INPUT'),
+        sa.Column('component_code', sa.String(length=100), nullable=False, comment='薪资组件代码'),
+        sa.Column('payroll_period_id', sa.BigInteger(), nullable=False, comment='薪资周期ID'),
+        sa.Column('payroll_run_id', sa.BigInteger(), nullable=False, comment='薪资运行ID'),
+        sa.Column('amount', sa.Numeric(precision=18, scale=4), nullable=False, comment='金额'),
+        sa.ForeignKeyConstraint(['entry_id'], ['payroll.payroll_entries.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('entry_id', 'section', 'component_code'),
+        schema='payroll'
+    )
+    op.create_index('idx_entry_component_values_period_code', 'entry_component_values', ['payroll_period_id', 'component_code'], unique=False, schema='payroll')
+    op.create_index('idx_entry_component_values_run_code', 'entry_component_values', ['payroll_run_id', 'component_code'], unique=False, schema='payroll')
+
+    # 从 JSONB 明细中提取数值金额：{"CODE": {"amount": x}} 或 {"CODE": x}，非数值（如布尔标志）忽略
+    op.execute(r"""
+    CREATE OR REPLACE FUNCTION payroll.jsonb_component_amount(value jsonb)
+    RETURNS numeric
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN jsonb_typeof(value) = 'number' THEN (value #>> '{}')::numeric
+            WHEN jsonb_typeof(value) = 'object' AND jsonb_typeof(value -> 'amount') = 'number'
+                THEN (value ->> 'amount')::numeric
+            WHEN jsonb_typeof(value) = 'object' AND jsonb_typeof(value -> 'amount') = 'string'
+                 AND btrim(value ->> 'amount') ~ '^-?[0-9]+(\.[0-9]+)?$'
+                THEN btrim(value ->> 'amount')::numeric
+            ELSE NULL
+        END
+    $$;
+    """)
+
+    op.execute("""
+    CREATE OR REPLACE FUNCTION payroll.entry_component_rows(earnings jsonb, deductions jsonb, inputs jsonb)
+    RETURNS TABLE(section text, component_code text, amount numeric)
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT src.section, d.key, payroll.jsonb_component_amount(d.value)
+        FROM (VALUES ('EARNING', earnings), ('DEDUCTION', deductions), ('INPUT', inputs)) AS src(section, details)
+        CROSS JOIN LATERAL jsonb_each(
+            CASE WHEN jsonb_typeof(src.details) = 'object' THEN src.details ELSE '{}'::jsonb END
+        ) AS d
+        WHERE payroll.jsonb_component_amount(d.value) IS NOT NULL
+    $$;
+    """)
+
+    # 写入薪资条目时同步组件金额（覆盖 ORM、批量 SQL 和导入等所有写入路径）
+    op.execute("""
+    CREATE OR REPLACE FUNCTION payroll.sync_entry_component_values()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            DELETE FROM payroll.entry_component_values WHERE entry_id = NEW.id;
+        END IF;
+
+        INSERT INTO payroll.entry_component_values (entry_id, section, component_code, payroll_period_id, payroll_run_id, amount)
+        SELECT NEW.id, r.section, r.component_code, NEW.payroll_period_id, NEW.payroll_run_id, r.amount
+        FROM payroll.entry_component_rows(NEW.earnings_details, NEW.deductions_details, NEW.calculation_inputs) AS r;
+
+        RETURN NULL;
+    END;
+    $$;
+    """)
+
+    op.execute("""
+    CREATE TRIGGER trigger_payroll_entries_component_values_insert
+        AFTER INSERT ON payroll.payroll_entries
+        FOR EACH ROW
+        EXECUTE FUNCTION payroll.sync_entry_component_values();
+    """)
+    op.execute("""
+    CREATE TRIGGER trigger_payroll_entries_component_values_update
+        AFTER UPDATE ON payroll.payroll_entries
+        FOR EACH ROW
+        WHEN (
+            OLD.earnings_details IS DISTINCT FROM NEW.earnings_details
+            OR OLD.deductions_details IS DISTINCT FROM NEW.deductions_details
+            OR OLD.calculation_inputs IS DISTINCT FROM NEW.calculation_inputs
+            OR OLD.payroll_period_id IS DISTINCT FROM NEW.payroll_period_id
+            OR OLD.payroll_run_id IS DISTINCT FROM NEW.payroll_run_id
+        )
+        EXECUTE FUNCTION payroll.sync_entry_component_values();
+    """)
+
+    # 回填已有条目
+    op.execute("""
+    INSERT INTO payroll.entry_component_values (entry_id, section, component_code, payroll_period_id, payroll_run_id, amount)
+    SELECT pe.id, r.section, r.component_code, pe.payroll_period_id, pe.payroll_run_id, r.amount
+    FROM payroll.payroll_entries pe
+    CROSS JOIN LATERAL payroll.entry_component_rows(pe.earnings_details, pe.deductions_details, pe.calculation_inputs) AS r;
+    """)
+
+    # 组件使用统计视图改为基于组件金额表聚合
+    op.execute("""
+    CREATE OR REPLACE VIEW reports.v_payroll_component_usage AS
+    SELECT
+        pcd.code,
+        pcd.name,
+        pcd.type as component_type,
+        COUNT(DISTINCT v.entry_id) as usage_count,
+        COUNT(DISTINCT pe.employee_id) as employee_count,
+        AVG(v.amount) as avg_amount,
+        SUM(v.amount) as total_amount
+    FROM config.payroll_component_definitions pcd
+        LEFT JOIN payroll.entry_component_values v ON (
+            v.component_code = pcd.code
+            AND v.section = CASE
+                WHEN pcd.type = 'EARNING' THEN 'EARNING'
+                WHEN pcd.type IN ('DEDUCTION', 'PERSONAL_DEDUCTION', 'EMPLOYER_DEDUCTION') THEN 'DEDUCTION'
+            END
+        )
+        LEFT JOIN payroll.payroll_entries pe ON pe.id = v.entry_id
+    WHERE pcd.is_active = true
+    GROUP BY pcd.code, pcd.name, pcd.type;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+    CREATE OR REPLACE VIEW reports.v_payroll_component_usage AS
+    SELECT
+        pcd.code,
+        pcd.name,
+        pcd.type as component_type,
+        COUNT(DISTINCT pe.id) as usage_count,
+        COUNT(DISTINCT pe.employee_id) as employee_count,
+        AVG(CASE
+            WHEN pcd.type = 'EARNING' THEN
+                ((pe.earnings_details -> pcd.code) ->> 'amount')::numeric
+            ELSE
+                ((pe.deductions_details -> pcd.code) ->> 'amount')::numeric
+        END) as avg_amount,
+        SUM(CASE
+            WHEN pcd.type = 'EARNING' THEN
+                ((pe.earnings_details -> pcd.code) ->> 'amount')::numeric
+            ELSE
+                ((pe.deductions_details -> pcd.code) ->> 'amount')::numeric
+        END) as total_amount
+    FROM config.payroll_component_definitions pcd
+        LEFT JOIN payroll.payroll_entries pe ON (
+            (pcd.type = 'EARNING' AND pe.earnings_details ? pcd.code) OR
+            (pcd.type IN ('DEDUCTION', 'PERSONAL_DEDUCTION', 'EMPLOYER_DEDUCTION') AND pe.deductions_details ? pcd.code)
+        )
+    WHERE pcd.is_active = true
+    GROUP BY pcd.code, pcd.name, pcd.type;
+    """)
+
+    op.execute("DROP TRIGGER IF EXISTS trigger_payroll_entries_component_values_update ON payroll.payroll_entries")
+    op.execute("DROP TRIGGER IF EXISTS trigger_payroll_entries_component_values_insert ON payroll.payroll_entries")
+    op.execute("DROP FUNCTION IF EXISTS payroll.sync_entry_component_values()")
+    op.execute("DROP FUNCTION IF EXISTS payroll.entry_component_rows(jsonb, jsonb, jsonb)")
+    op.execute("DROP FUNCTION IF EXISTS payroll.jsonb_component_amount(jsonb)")
+
+    op.drop_index('idx_entry_component_values_run_code', table_name='entry_component_values', schema='payroll')
+    op.drop_index('idx_entry_component_values_period_code', table_name='entry_component_values', schema='payroll')
+    op.drop_table('entry_component_values', schema='payroll')
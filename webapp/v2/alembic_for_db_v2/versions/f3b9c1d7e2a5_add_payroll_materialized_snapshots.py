@@ -0,0 +1,58 @@
+"""add_payroll_materialized_snapshots
+
+Revision ID: f3b9c1d7e2a5
+Revises: e8c2d4f6a9b1
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9c1d7e2a5'
+down_revision: Union[str, None] = 'e8c2d4f6a9b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 实时视图 -> 物化快照（两者列相同，唯一索引用于 REFRESH ... CONCURRENTLY）
+SNAPSHOTS = (
+    ('v_payroll_basic', 'mv_payroll_basic'),
+    ('v_comprehensive_employee_payroll', 'mv_comprehensive_employee_payroll'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 快照过期的期间：计算、审核、导入后写入，刷新完成后删除；存在标记的期间查询回退到实时视图
+    op.create_table('payroll_snapshot_stale_periods',
+        sa.Column('period_id', sa.BigInteger(), nullable=False, comment='薪资期间ID'),
+        sa.Column('marked_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False, comment='标记时间'),
+        sa.PrimaryKeyConstraint('period_id'),
+        schema='reports'
+    )
+
+    # 视图由脚本维护，数据库中不存在时跳过对应的快照
+    for view_name, snapshot in SNAPSHOTS:
+        op.execute(f"""
+        DO $$
+        BEGIN
+            IF to_regclass('reports.{view_name}') IS NOT NULL THEN
+                EXECUTE 'CREATE MATERIALIZED VIEW IF NOT EXISTS reports.{snapshot} AS SELECT * FROM reports.{view_name}';
+                EXECUTE 'CREATE UNIQUE INDEX IF NOT EXISTS uq_{snapshot}_period_run_employee
+                    ON reports.{snapshot} ("薪资期间id", "薪资运行id", "员工id")';
+                EXECUTE 'CREATE INDEX IF NOT EXISTS idx_{snapshot}_run
+                    ON reports.{snapshot} ("薪资运行id")';
+            END IF;
+        END $$;
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for _, snapshot in SNAPSHOTS:
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS reports.{snapshot}")
+    op.drop_table('payroll_snapshot_stale_periods', schema='reports')
@@ -325,6 +325,69 @@ def update_batch_report_task_item(
         raise
 
 
+def update_batch_report_task_items(
+    db: Session,
+    task_id: int,
+    item_updates: List[Tuple[int, BatchReportTaskItemUpdate]]
+) -> int:
+    """
+    在一个事务中批量更新同一任务的多个任务项，并一次性更新主任务的统计信息和进度
+
+    Args:
+        db: 数据库会话
+        task_id: 任务ID
+        item_updates: (任务项ID, 更新数据) 列表，同一任务项可出现多次，按顺序应用
+
+    Returns:
+        更新的任务项数量
+    """
+    if not item_updates:
+        return 0
+
+    try:
+        item_ids = {item_id for item_id, _ in item_updates}
+        db_items = {
+            item.id: item
+            for item in db.query(BatchReportTaskItem).filter(
+                BatchReportTaskItem.task_id == task_id,
+                BatchReportTaskItem.id.in_(item_ids)
+            ).all()
+        }
+
+        completed_delta = 0
+        failed_delta = 0
+        for item_id, item_update in item_updates:
+            db_item = db_items.get(item_id)
+            if not db_item:
+                continue
+            for key, value in item_update.model_dump(exclude_unset=True).items():
+                setattr(db_item, key, value)
+            db_item.updated_at = func.now()
+            if item_update.status == "completed":
+                completed_delta += 1
+            elif item_update.status == "failed":
+                failed_delta += 1
+
+        if completed_delta or failed_delta:
+            task = db.query(BatchReportTask).filter(BatchReportTask.id == task_id).first()
+            if task:
+                task.completed_reports = task.completed_reports + completed_delta
+                task.failed_reports = task.failed_reports + failed_delta
+
+                # 更新进度
+                total = task.total_reports
+                completed = task.completed_reports + task.failed_reports
+                task.progress = int((completed / total) * 100) if total > 0 else 0
+
+        db.commit()
+        return len(db_items)
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"批量更新批量报表任务项失败: {str(e)}")
+        raise
+
+
 # ==================== 报表文件管理 CRUD ====================
 
 def create_report_file(
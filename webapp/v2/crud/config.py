@@ -21,6 +21,8 @@ from ..pydantic_models.config import (
     TaxBracketCreate, TaxBracketUpdate,
     SocialSecurityRateCreate, SocialSecurityRateUpdate
 )
+from ..payroll_engine.component_registry import invalidate_component_registry
+from ..services.reference_data import invalidate_reference_data
 
 # LookupType CRUD
 def get_lookup_types(
@@ -109,6 +111,7 @@ def create_lookup_type(db: Session, lookup_type: LookupTypeCreate) -> LookupType
     db_lookup_type = LookupType(**lookup_type.model_dump())
     db.add(db_lookup_type)
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_lookup_type)
     return db_lookup_type
 
@@ -143,6 +146,7 @@ def update_lookup_type(db: Session, lookup_type_id: int, lookup_type: LookupType
             setattr(db_lookup_type, key, value)
 
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_lookup_type)
     return db_lookup_type
 
@@ -166,6 +170,7 @@ def delete_lookup_type(db: Session, lookup_type_id: int) -> bool:
     # 删除查找类型
     db.delete(db_lookup_type)
     db.commit()
+    invalidate_reference_data()
     return True
 
 
@@ -277,6 +282,7 @@ def create_lookup_value(db: Session, lookup_value: LookupValueCreate) -> LookupV
     db_lookup_value = LookupValue(**lookup_value.model_dump())
     db.add(db_lookup_value)
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_lookup_value)
     return db_lookup_value
 
@@ -321,6 +327,7 @@ def update_lookup_value(db: Session, lookup_value_id: int, lookup_value: LookupV
             setattr(db_lookup_value, key, value)
 
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_lookup_value)
     return db_lookup_value
 
@@ -344,6 +351,7 @@ def delete_lookup_value(db: Session, lookup_value_id: int) -> bool:
     # 删除查找值
     db.delete(db_lookup_value)
     db.commit()
+    invalidate_reference_data()
     return True
 
 
@@ -591,6 +599,8 @@ def create_payroll_component_definition(
         db.add(new_component)
         db.commit()
         db.refresh(new_component)
+        invalidate_component_registry()
+        invalidate_reference_data()
         return new_component
     except IntegrityError as e:
         db.rollback()
@@ -637,6 +647,8 @@ def update_payroll_component_definition(
     try:
         db.commit()
         db.refresh(db_component)
+        invalidate_component_registry()
+        invalidate_reference_data()
         return db_component
     except Exception as e:
         db.rollback()
@@ -653,6 +665,8 @@ def delete_payroll_component_definition(
         
     db.delete(component)
     db.commit()
+    invalidate_component_registry()
+    invalidate_reference_data()
     return True
 
 
@@ -7,6 +7,7 @@ from typing import List, Optional, Tuple
 
 from ...models.hr import Department, EmployeeJobHistory
 from ...pydantic_models.hr import DepartmentCreate, DepartmentUpdate
+from ...services.reference_data import invalidate_reference_data
 
 import logging
 logger = logging.getLogger(__name__)
@@ -111,6 +112,7 @@ def create_department(db: Session, department: DepartmentCreate) -> Department:
     db_department = Department(**department.model_dump())
     db.add(db_department)
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_department)
     return db_department
 
@@ -144,6 +146,7 @@ def update_department(db: Session, department_id: int, department: DepartmentUpd
         setattr(db_department, key, value)
 
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_department)
     return db_department
 
@@ -177,6 +180,7 @@ def delete_department(db: Session, department_id: int) -> bool:
     # 删除部门
     db.delete(db_department)
     db.commit()
+    invalidate_reference_data()
     return True
 def _get_department_by_name(db: Session, name: str) -> Optional[Department]:
     """
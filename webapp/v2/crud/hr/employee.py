@@ -12,6 +12,10 @@ from ...models.hr import (
     EmployeeBankAccount, Position, PersonnelCategory
 )
 from ...pydantic_models.hr import EmployeeCreate, EmployeeUpdate
+from ...utils.pagination import (
+    COUNT_MODE_EXACT, COUNT_MODE_ESTIMATED, COUNT_MODE_NONE,
+    decode_cursor, encode_cursor, keyset_filter, keyset_order, estimate_count
+)
 from .utils import (
     _get_department_by_name, 
     _get_position_by_name, 
@@ -21,6 +25,9 @@ from .utils import (
 
 logger = logging.getLogger(__name__)
 
+# 员工列表的排序规格（写入游标用于校验）
+EMPLOYEE_SORT_SPEC = "last_name,first_name,id:asc"
+
 
 def normalize_id_number(id_number: str) -> str:
     """
@@ -78,8 +85,10 @@ def get_employees(
     status_id: Optional[int] = None,
     department_id: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[Employee], int]:
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count_mode: str = COUNT_MODE_EXACT
+) -> Tuple[List[Employee], Optional[int], Optional[str]]:
     """
     获取员工列表，包含完整的关联对象。
 
@@ -90,9 +99,14 @@ def get_employees(
         department_id: 部门ID
         skip: 跳过的记录数
         limit: 返回的记录数
+        cursor: 键集分页游标（上一次返回的下一页游标）；提供时忽略 skip
+        count_mode: 总数计算方式 exact、estimated 或 none
 
     Returns:
-        员工对象列表 (已预加载关联数据) 和总记录数
+        员工对象列表 (已预加载关联数据)、总记录数（count_mode 为 none 时为 None）和下一页游标
+
+    Raises:
+        InvalidCursorError: 游标无效
     """
     query = db.query(Employee)
 
@@ -112,20 +126,27 @@ def get_employees(
             Employee.last_name.ilike(search_term),
             Employee.id_number.ilike(search_term),
             Employee.email.ilike(search_term),
-            Employee.phone_number.ilike(search_term)
+            Employee.phone_number.ilike(search_term),
+            # 姓名连写（如“张三”）；与各列一样由 pg_trgm GIN 索引支持
+            (func.coalesce(Employee.last_name, '') + func.coalesce(Employee.first_name, '')).ilike(search_term)
         ]
         query = query.filter(or_(*employee_filters))
 
     # 获取总记录数
-    count_query = db.query(func.count(Employee.id))
-    if status_id:
-        count_query = count_query.filter(Employee.status_lookup_value_id == status_id)
-    if department_id:
-        count_query = count_query.filter(Employee.department_id == department_id)
-    if search:
-        count_query = count_query.filter(or_(*employee_filters))
+    if count_mode == COUNT_MODE_NONE:
+        total = None
+    elif count_mode == COUNT_MODE_ESTIMATED:
+        total = estimate_count(db, query)
+    else:
+        count_query = db.query(func.count(Employee.id))
+        if status_id:
+            count_query = count_query.filter(Employee.status_lookup_value_id == status_id)
+        if department_id:
+            count_query = count_query.filter(Employee.department_id == department_id)
+        if search:
+            count_query = count_query.filter(or_(*employee_filters))
 
-    total = count_query.scalar()
+        total = count_query.scalar()
 
     # 应用 eager loading options
     query = query.options(
@@ -149,12 +170,22 @@ def get_employees(
         )
     )
 
-    # 应用排序和分页
-    query = query.order_by(Employee.last_name, Employee.first_name)
-    query = query.offset(skip).limit(limit)
+    # 应用排序和分页：按姓名排序并以ID兜底，游标模式下从上一页最后一行之后继续
+    sort_columns = [Employee.last_name, Employee.first_name]
+    query = query.order_by(*keyset_order(sort_columns, Employee.id))
+    if cursor:
+        query = query.filter(keyset_filter(sort_columns, Employee.id, decode_cursor(cursor, EMPLOYEE_SORT_SPEC)))
+    else:
+        query = query.offset(skip)
 
-    results = query.all()
-    return results, total
+    # 多取一行用于判断是否还有下一页
+    results = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        next_cursor = encode_cursor(EMPLOYEE_SORT_SPEC, [last.last_name, last.first_name, last.id])
+    return results, total, next_cursor
 
 
 def get_employee(db: Session, employee_id: int) -> Optional[Employee]:
@@ -284,6 +315,8 @@ def delete_employee(db: Session, employee_id: int) -> bool:
         # 删除员工 - ORM级联删除会自动处理相关记录
         db.delete(db_employee)
         db.commit()
+        from ...services.employee_search import invalidate_employee_search_index
+        invalidate_employee_search_index()
         return True
     except Exception as e:
         db.rollback()
@@ -194,6 +194,8 @@ def create_employee(db: Session, employee: EmployeeCreate) -> Employee:
 
     db.commit()
     db.refresh(db_employee)
+    from ...services.employee_search import invalidate_employee_search_index
+    invalidate_employee_search_index()
     # Re-query to load all relationships for the response
     return get_employee(db, db_employee.id)
 
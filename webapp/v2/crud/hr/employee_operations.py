@@ -84,7 +84,9 @@ def get_employees(
             Employee.last_name.ilike(search_term),
             Employee.id_number.ilike(search_term),
             Employee.email.ilike(search_term),
-            Employee.phone_number.ilike(search_term)
+            Employee.phone_number.ilike(search_term),
+            # 姓名连写（如“张三”）；与各列一样由 pg_trgm GIN 索引支持
+            (func.coalesce(Employee.last_name, '') + func.coalesce(Employee.first_name, '')).ilike(search_term)
         ]
         query = query.filter(or_(*employee_filters))
 
@@ -306,6 +308,8 @@ def create_employee(db: Session, employee: EmployeeCreate) -> Employee:
 
     db.commit()
     db.refresh(db_employee)
+    from ...services.employee_search import invalidate_employee_search_index
+    invalidate_employee_search_index()
     return get_employee(db, db_employee.id)
 
 
@@ -446,6 +450,8 @@ def update_employee(db: Session, employee_id: int, employee: EmployeeUpdate) ->
     try:
         db.commit()
         db.refresh(db_employee)
+        from ...services.employee_search import invalidate_employee_search_index
+        invalidate_employee_search_index()
     except Exception as e:
         db.rollback()
         logger.error(f"Error committing employee update for ID {employee_id}: {e}")
@@ -475,6 +481,8 @@ def delete_employee(db: Session, employee_id: int) -> bool:
             # For now, performing a hard delete as per original structure
             db.delete(db_employee)
             db.commit()
+            from ...services.employee_search import invalidate_employee_search_index
+            invalidate_employee_search_index()
             return True
         except Exception as e:
             db.rollback()
@@ -87,6 +87,8 @@ def update_employee(db: Session, employee_id: int, employee: EmployeeUpdate) ->
     try:
         db.commit()
         db.refresh(db_employee)
+        from ...services.employee_search import invalidate_employee_search_index
+        invalidate_employee_search_index()
     except Exception as e:
         db.rollback()
         logger.error(f"Error committing employee update for ID {employee_id}: {e}")
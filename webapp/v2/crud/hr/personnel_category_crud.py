@@ -7,6 +7,7 @@ from typing import List, Optional, Tuple
 
 from ...models.hr import PersonnelCategory, EmployeeJobHistory
 from ...pydantic_models.hr import PersonnelCategoryCreate, PersonnelCategoryUpdate
+from ...services.reference_data import invalidate_reference_data
 
 # Placeholder for logger if needed in the future
 # import logging
@@ -113,6 +114,7 @@ def create_personnel_category(db: Session, personnel_category: PersonnelCategory
     db_personnel_category = PersonnelCategory(**personnel_category.model_dump())
     db.add(db_personnel_category)
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_personnel_category)
     return db_personnel_category
 
@@ -146,6 +148,7 @@ def update_personnel_category(db: Session, personnel_category_id: int, personnel
         setattr(db_personnel_category, key, value)
 
     db.commit()
+    invalidate_reference_data()
     db.refresh(db_personnel_category)
     return db_personnel_category
 
@@ -179,6 +182,7 @@ def delete_personnel_category(db: Session, personnel_category_id: int) -> bool:
     # 删除人员类别
     db.delete(db_personnel_category)
     db.commit()
+    invalidate_reference_data()
     return True
 def _get_personnel_category_by_name(db: Session, name: str) -> Optional[PersonnelCategory]:
     """
@@ -45,7 +45,8 @@ from .payroll.payroll_entries import (
 
 # 银行导出
 from .payroll.bank_export import (
-    get_payroll_entries_for_bank_export
+    get_payroll_entries_for_bank_export,
+    iter_bank_export_rows
 )
 
 # 批量操作
@@ -87,6 +88,7 @@ __all__ = [
     
     # 银行导出
     "get_payroll_entries_for_bank_export",
+    "iter_bank_export_rows",
     
     # 批量操作
     "bulk_create_payroll_entries",
@@ -41,7 +41,8 @@ from .payroll_entries import (
 
 # 导入银行导出相关操作
 from .bank_export import (
-    get_payroll_entries_for_bank_export
+    get_payroll_entries_for_bank_export,
+    iter_bank_export_rows
 )
 
 # 导入批量操作相关功能
@@ -82,6 +83,7 @@ __all__ = [
     
     # 银行导出
     "get_payroll_entries_for_bank_export",
+    "iter_bank_export_rows",
     
     # 批量操作
     "bulk_create_payroll_entries",
@@ -1,8 +1,10 @@
 """
 银行代发相关的功能。
 """
+from sqlalchemy import text
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 
 from ...models.payroll import PayrollEntry
 from ...models.hr import Employee, EmployeeBankAccount
@@ -62,4 +64,55 @@ def get_payroll_entries_for_bank_export(
         full_name = f"{last_name or ''} {first_name or ''}".strip()
         formatted_results.append( (entry, emp_code, full_name, acc_number, bank_name_val) )
     
-    return formatted_results 
\ No newline at end of file
+    return formatted_results 
+
+# 服务端游标每批读取的行数
+BANK_EXPORT_BATCH_SIZE = 1000
+
+
+def iter_bank_export_rows(
+    db: Session,
+    run_id: int,
+    positive_only: bool = False,
+    batch_size: int = BANK_EXPORT_BATCH_SIZE
+) -> Iterator[Row]:
+    """
+    通过服务端游标逐行读取银行代发数据，不加载 ORM 实体。
+
+    每行包含 employee_code, last_name, first_name, account_number, bank_name, net_pay，
+    以及窗口汇总列 payable_count / payable_amount（有银行账号的记录数和金额）、row_count / row_amount（全部记录），
+    在同一查询快照中计算，读取第一行即可得到整个文件的汇总，便于先写文件头。
+
+    Args:
+        db: 数据库会话
+        run_id: 薪资审核ID
+        positive_only: 只包含实发合计大于0的记录
+        batch_size: 服务端游标每批读取的行数
+    """
+    positive_filter = "AND pe.net_pay > 0" if positive_only else ""
+    query = text(f"""
+        SELECT
+            e.employee_code,
+            e.last_name,
+            e.first_name,
+            ba.account_number,
+            ba.bank_name,
+            pe.net_pay,
+            COUNT(*) FILTER (WHERE COALESCE(ba.account_number, '') <> '') OVER () AS payable_count,
+            COALESCE(SUM(pe.net_pay) FILTER (WHERE COALESCE(ba.account_number, '') <> '') OVER (), 0) AS payable_amount,
+            COUNT(*) OVER () AS row_count,
+            COALESCE(SUM(pe.net_pay) OVER (), 0) AS row_amount
+        FROM payroll.payroll_entries pe
+        JOIN hr.employees e ON e.id = pe.employee_id
+        LEFT JOIN hr.employee_bank_accounts ba ON ba.employee_id = e.id AND ba.is_primary = TRUE
+        WHERE pe.payroll_run_id = :run_id
+          {positive_filter}
+        ORDER BY e.employee_code, pe.id
+    """).execution_options(stream_results=True, max_row_buffer=batch_size)
+
+    result = db.execute(query, {"run_id": run_id})
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
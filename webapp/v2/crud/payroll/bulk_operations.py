@@ -2,7 +2,11 @@
 批量操作相关的功能。
 """
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 from typing import List, Tuple, Dict, Any, Optional
+import csv
+import io
+import json
 import logging
 import time
 from datetime import datetime
@@ -16,9 +20,21 @@ from ..hr import (
 )
 from .payroll_entries import create_payroll_entry, update_payroll_entry
 from .payroll_runs import create_payroll_run
+from ...payroll_engine.component_registry import get_component_registry
 
 logger = logging.getLogger(__name__)
 
+# 批量导入暂存表（事务内的临时表，提交时自动删除）
+IMPORT_STAGING_TABLE = "payroll_import_staging"
+
+# 暂存表中通过 COPY 写入的列（顺序与 _staging_row 一致）
+IMPORT_STAGING_COLUMNS = (
+    "row_index", "employee_id", "last_name", "first_name", "id_number",
+    "gross_pay", "total_deductions", "net_pay",
+    "earnings_details", "deductions_details", "calculation_inputs", "calculation_log",
+    "status_lookup_value_id", "remarks",
+)
+
 
 def normalize_id_number(id_number: str) -> str:
     """
@@ -561,6 +577,148 @@ def bulk_create_payroll_entries(
     return created_entries, errors 
 
 
+def _normalize_details(
+    details: Optional[Dict[str, Any]],
+    component_map: Dict[str, str],
+    invalid_label: str,
+    errors: List[str]
+) -> Dict[str, Any]:
+    """按组件定义补全名称并统一金额格式，无效代码记入 errors"""
+    processed = {}
+    for code, item_input in (details or {}).items():
+        component_name = component_map.get(code)
+        if component_name is None:
+            errors.append(f"{invalid_label}: {code}")
+            continue
+        processed[code] = {
+            "name": component_name,
+            "amount": float(item_input['amount'])
+        }
+    return processed
+
+
+def _staging_row(index: int, entry_data: PayrollEntryCreate, component_map: Dict[str, str]) -> Tuple[Optional[tuple], Optional[str]]:
+    """
+    校验单条导入数据并转换为暂存表的一行
+
+    Returns:
+        Tuple[暂存行, 错误信息]，两者只有一个不为 None
+    """
+    component_errors: List[str] = []
+    earnings = _normalize_details(
+        {code: item.model_dump() for code, item in entry_data.earnings_details.items()},
+        component_map, "无效的收入项代码", component_errors
+    )
+    deductions = _normalize_details(
+        {code: item.model_dump() for code, item in entry_data.deductions_details.items()},
+        component_map, "无效的扣除项代码", component_errors
+    )
+    if component_errors:
+        return None, "; ".join(component_errors)
+
+    info = entry_data.employee_info or {}
+    return (
+        index,
+        entry_data.employee_id,
+        info.get('last_name') or None,
+        info.get('first_name') or None,
+        normalize_id_number(info.get('id_number')) or None,
+        entry_data.gross_pay,
+        entry_data.total_deductions,
+        entry_data.net_pay,
+        json.dumps(earnings, ensure_ascii=False),
+        json.dumps(deductions, ensure_ascii=False),
+        json.dumps(entry_data.calculation_inputs, ensure_ascii=False, default=str) if entry_data.calculation_inputs is not None else None,
+        json.dumps(entry_data.calculation_log, ensure_ascii=False, default=str) if entry_data.calculation_log is not None else None,
+        entry_data.status_lookup_value_id,
+        entry_data.remarks,
+    ), None
+
+
+def _load_import_staging(db: Session, rows: List[tuple]) -> None:
+    """
+    创建暂存表并写入导入数据
+
+    psycopg2 连接使用 COPY 一次性写入；其他驱动退回到 executemany。
+    暂存表与后续语句处于同一事务，提交或回滚时自动删除。
+    """
+    db.execute(text(f"DROP TABLE IF EXISTS {IMPORT_STAGING_TABLE}"))
+    db.execute(text(f"""
+        CREATE TEMP TABLE {IMPORT_STAGING_TABLE} (
+            row_index INTEGER PRIMARY KEY,
+            employee_id BIGINT,
+            last_name TEXT,
+            first_name TEXT,
+            id_number TEXT,
+            gross_pay NUMERIC(18, 4),
+            total_deductions NUMERIC(18, 4),
+            net_pay NUMERIC(18, 4),
+            earnings_details JSONB,
+            deductions_details JSONB,
+            calculation_inputs JSONB,
+            calculation_log JSONB,
+            status_lookup_value_id BIGINT,
+            remarks TEXT,
+            resolved_employee_id BIGINT,
+            existing_entry_id BIGINT
+        ) ON COMMIT DROP
+    """))
+    if not rows:
+        return
+
+    dbapi_connection = db.connection().connection
+    cursor = dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                # CSV 格式下未加引号的空值为 NULL
+                writer.writerow(['' if value is None else value for value in row])
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {IMPORT_STAGING_TABLE} ({', '.join(IMPORT_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            return
+    finally:
+        cursor.close()
+
+    db.execute(
+        text(f"""
+            INSERT INTO {IMPORT_STAGING_TABLE} ({', '.join(IMPORT_STAGING_COLUMNS)})
+            VALUES ({', '.join(':' + column for column in IMPORT_STAGING_COLUMNS)})
+        """),
+        [dict(zip(IMPORT_STAGING_COLUMNS, row)) for row in rows]
+    )
+
+
+def _get_or_create_default_run(db: Session, payroll_period_id: int) -> PayrollRun:
+    """获取工资周期的默认PayrollRun，不存在时创建"""
+    default_run = db.query(PayrollRun).filter(
+        PayrollRun.payroll_period_id == payroll_period_id
+    ).first()
+    if default_run:
+        return default_run
+
+    from ..config import get_lookup_value_by_code, get_lookup_type_by_code
+
+    # 获取"待计算"状态的ID
+    payroll_run_status_type = get_lookup_type_by_code(db, "PAYROLL_RUN_STATUS")
+    if not payroll_run_status_type:
+        raise ValueError("PAYROLL_RUN_STATUS lookup type not found")
+
+    pending_status = get_lookup_value_by_code(db, payroll_run_status_type.id, "PRUN_PENDING_CALC")
+    if not pending_status:
+        raise ValueError("PAYROLL_RUN_STATUS lookup value 'PRUN_PENDING_CALC' not found")
+
+    run_data = PayrollRunCreate(
+        payroll_period_id=payroll_period_id,
+        status_lookup_value_id=pending_status.id
+    )
+    return create_payroll_run(db, run_data)
+
+
 def bulk_create_payroll_entries_optimized(
     db: Session, 
     payroll_period_id: int, 
@@ -568,25 +726,28 @@ def bulk_create_payroll_entries_optimized(
     overwrite_mode: OverwriteMode = OverwriteMode.NONE
 ) -> Tuple[List[PayrollEntry], List[Dict[str, Any]]]:
     """
-    高性能批量创建工资明细 - 避免循环中的重复数据库操作
-    
-    性能优化措施：
-    1. 预加载所有必需的映射数据（组件定义、员工信息等）
-    2. 使用批量插入代替逐条创建
-    3. 减少数据库提交次数
-    4. 避免循环中的expire_all()调用
+    高性能批量创建工资明细 - 基于暂存表的集合式导入
+    
+    处理流程：
+    1. 在内存中校验组件代码并规范化明细（组件定义来自共享注册表）
+    2. 通过 COPY 将所有有效行写入事务内的临时暂存表
+    3. 用一次关联查询解析员工（姓名匹配优先，身份证号一致者优先；否则按 employee_id）
+    4. 按覆写模式用集合语句写入 payroll.payroll_entries：
+       - NONE: 已存在的记录报错，其余插入
+       - FULL: 已存在的记录整体替换
+       - PARTIAL / SMART_MERGE: 只更新导入中有值的字段，明细按项目合并
+    5. 单次提交
     
     Args:
         db: 数据库会话
         payroll_period_id: 工资周期ID
         entries: 工资明细创建数据列表
-        overwrite_mode: 是否启用覆盖模式
+        overwrite_mode: 覆写模式
     
     Returns:
-        Tuple[成功创建的工资明细列表, 错误信息列表]
+        Tuple[成功创建或更新的工资明细列表, 错误信息列表]
     """
     start_time = time.time()
-    created_entries = []
     errors = []
     total_entries = len(entries)
     
@@ -598,394 +759,183 @@ def bulk_create_payroll_entries_optimized(
         if not period:
             raise ValueError(f"Payroll period with ID {payroll_period_id} not found")
         
-        # 获取或创建默认的PayrollRun
-        default_run = db.query(PayrollRun).filter(
-            PayrollRun.payroll_period_id == payroll_period_id
-        ).first()
-        
-        if not default_run:
-            from ..config import get_lookup_value_by_code, get_lookup_type_by_code
-            
-            # 获取"待计算"状态的ID
-            payroll_run_status_type = get_lookup_type_by_code(db, "PAYROLL_RUN_STATUS")
-            if not payroll_run_status_type:
-                raise ValueError("PAYROLL_RUN_STATUS lookup type not found")
-            
-            pending_status = get_lookup_value_by_code(db, payroll_run_status_type.id, "PRUN_PENDING_CALC")
-            if not pending_status:
-                raise ValueError("PAYROLL_RUN_STATUS lookup value 'PRUN_PENDING_CALC' not found")
-            
-            run_data = PayrollRunCreate(
-                payroll_period_id=payroll_period_id,
-                status_lookup_value_id=pending_status.id
-            )
-            default_run = create_payroll_run(db, run_data)
-        
-        # 🚀 性能优化1：预加载薪资组件映射（避免循环中重复查询）
-        logger.info("预加载薪资组件映射...")
-        from .payroll_entries import _get_component_mapping
-        component_map = _get_component_mapping(db)
-        logger.info(f"已加载 {len(component_map)} 个薪资组件定义")
+        default_run = _get_or_create_default_run(db, payroll_period_id)
+        component_map = get_component_registry(db).name_by_code()
         
-        # 🚀 性能优化2：批量预加载员工数据
-        logger.info("批量预加载员工数据...")
-        employee_lookup = {}
-        employee_infos = []
-        
-        # 收集所有需要查询的员工信息
+        # 1. 内存校验，生成暂存行
+        staging_rows = []
         for i, entry_data in enumerate(entries):
-            logger.info(f"🔍 [调试] 第{i+1}条记录类型: {type(entry_data)}")
-            logger.info(f"🔍 [调试] 第{i+1}条记录内容: {entry_data}")
-            logger.info(f"🔍 [调试] 第{i+1}条记录: hasattr(employee_info)={hasattr(entry_data, 'employee_info')}, employee_info={getattr(entry_data, 'employee_info', None)}")
-            if hasattr(entry_data, 'employee_info') and entry_data.employee_info:
-                info = entry_data.employee_info
-                logger.info(f"🔍 [调试] employee_info内容: {info}")
-                logger.info(f"🔍 [调试] employee_info类型: {type(info)}")
-                if info and info.get('last_name') and info.get('first_name'):
-                    employee_infos.append(info)
-                    logger.info(f"🔍 [调试] 添加员工信息: {info}")
-                else:
-                    logger.warning(f"🔍 [调试] 员工信息不完整: last_name={info.get('last_name') if info else None}, first_name={info.get('first_name') if info else None}, id_number={info.get('id_number') if info else None}")
+            try:
+                row, error = _staging_row(i, entry_data, component_map)
+            except Exception as e:
+                row, error = None, str(e)
+            if error:
+                errors.append({
+                    "index": i,
+                    "employee_id": getattr(entry_data, 'employee_id', None),
+                    "error": error
+                })
             else:
-                logger.warning(f"🔍 [调试] 第{i+1}条记录缺少employee_info字段")
-                
-        logger.info(f"🔍 [调试] 收集到的员工信息总数: {len(employee_infos)}")
+                staging_rows.append(row)
         
-        # 批量查询员工
-        if employee_infos:
-            from sqlalchemy import text
-            
-            conditions = []
-            params = {}
-            
-            for i, info in enumerate(employee_infos):
-                # 仅使用姓名进行匹配，不再要求身份证号
-                conditions.append(f"""
-                    (e.last_name = :last_name_{i} 
-                     AND e.first_name = :first_name_{i})
-                """)
-                params[f'last_name_{i}'] = info['last_name']
-                params[f'first_name_{i}'] = info['first_name']
-            
-            if conditions:
-                query = text(f"""
-                    SELECT 
-                        e.id, e.employee_code, e.last_name, e.first_name, e.id_number,
-                        e.is_active, d.name as department_name, d.id as department_id
-                    FROM hr.employees e
-                    LEFT JOIN hr.departments d ON e.department_id = d.id
-                    WHERE e.is_active = true AND ({' OR '.join(conditions)})
-                """)
-                
-                result = db.execute(query, params)
-                for row in result:
-                    # 支持两种查找方式：姓名+身份证 或 仅姓名
-                    key_with_id = f"{row.last_name}_{row.first_name}_{row.id_number}"
-                    key_name_only = f"{row.last_name}_{row.first_name}"
-                    employee_data = {
-                        'id': row.id,
-                        'employee_code': row.employee_code,
-                        'last_name': row.last_name,
-                        'first_name': row.first_name,
-                        'id_number': row.id_number,
-                        'is_active': row.is_active
-                    }
-                    # 同时存储两种查找方式
-                    employee_lookup[key_with_id] = employee_data
-                    employee_lookup[key_name_only] = employee_data
+        # 2. 写入暂存表
+        _load_import_staging(db, staging_rows)
         
-        logger.info(f"已预加载 {len(employee_lookup)} 个员工信息")
+        # 3. 一次关联解析员工
+        db.execute(text(f"""
+            UPDATE {IMPORT_STAGING_TABLE} s
+            SET resolved_employee_id = COALESCE(by_name.id, by_id.id)
+            FROM {IMPORT_STAGING_TABLE} src
+            LEFT JOIN LATERAL (
+                SELECT e.id
+                FROM hr.employees e
+                WHERE e.is_active = true
+                  AND e.last_name = src.last_name
+                  AND e.first_name = src.first_name
+                ORDER BY (e.id_number = src.id_number) DESC NULLS LAST, e.id
+                LIMIT 1
+            ) by_name ON true
+            LEFT JOIN hr.employees by_id ON by_id.id = src.employee_id
+            WHERE s.row_index = src.row_index
+        """))
         
-        # 🚀 性能优化3：批量检查已存在记录
-        logger.info("批量检查已存在的薪资记录...")
-        existing_entries_map = {}
-        employee_ids = [emp['id'] for emp in employee_lookup.values()]
+        for row in db.execute(text(f"""
+            DELETE FROM {IMPORT_STAGING_TABLE}
+            WHERE resolved_employee_id IS NULL
+            RETURNING row_index, employee_id
+        """)):
+            errors.append({
+                "index": row.row_index,
+                "employee_id": row.employee_id,
+                "error": "Employee not found"
+            })
         
-        if employee_ids:
-            from sqlalchemy import text
-            placeholders = ','.join([f':emp_id_{i}' for i in range(len(employee_ids))])
-            params = {'payroll_period_id': payroll_period_id}
-            params.update({f'emp_id_{i}': emp_id for i, emp_id in enumerate(employee_ids)})
-            
-            query = text(f"""
-                SELECT 
-                    pe.employee_id, pe.id as payroll_entry_id
-                FROM payroll.payroll_entries pe
-                WHERE pe.payroll_period_id = :payroll_period_id
-                  AND pe.employee_id IN ({placeholders})
-            """)
-            
-            result = db.execute(query, params)
-            for row in result:
-                existing_entries_map[row.employee_id] = row.payroll_entry_id
+        # 同一员工在导入中出现多次时以最后一行为准
+        for row in db.execute(text(f"""
+            DELETE FROM {IMPORT_STAGING_TABLE} s
+            USING (
+                SELECT row_index,
+                       row_number() OVER (PARTITION BY resolved_employee_id ORDER BY row_index DESC) AS rn
+                FROM {IMPORT_STAGING_TABLE}
+            ) d
+            WHERE s.row_index = d.row_index AND d.rn > 1
+            RETURNING s.row_index, s.resolved_employee_id
+        """)):
+            errors.append({
+                "index": row.row_index,
+                "employee_id": row.resolved_employee_id,
+                "error": f"Duplicate rows for employee {row.resolved_employee_id} in this import, the last row is used"
+            })
         
-        logger.info(f"已检查 {len(existing_entries_map)} 个已存在记录")
+        # 4. 关联本周期已存在的记录
+        db.execute(text(f"""
+            UPDATE {IMPORT_STAGING_TABLE} s
+            SET existing_entry_id = pe.id
+            FROM payroll.payroll_entries pe
+            WHERE pe.payroll_period_id = :payroll_period_id
+              AND pe.employee_id = s.resolved_employee_id
+        """), {'payroll_period_id': payroll_period_id})
         
-        # 🚀 性能优化4：批量准备数据，避免循环中的重复操作
-        logger.info("准备批量插入数据...")
-        new_entries_data = []
-        update_entries_data = []
+        if overwrite_mode == OverwriteMode.NONE:
+            for row in db.execute(text(f"""
+                DELETE FROM {IMPORT_STAGING_TABLE}
+                WHERE existing_entry_id IS NOT NULL
+                RETURNING row_index, resolved_employee_id
+            """)):
+                errors.append({
+                    "index": row.row_index,
+                    "employee_id": row.resolved_employee_id,
+                    "error": f"Payroll entry already exists for employee {row.resolved_employee_id} in this period"
+                })
         
-        for i, entry_data in enumerate(entries):
-            try:
-                # 进度日志
-                if (i + 1) % 100 == 0 or i == 0:
-                    logger.info(f"数据准备进度: {i + 1}/{total_entries} ({((i + 1) / total_entries * 100):.1f}%)")
-                
-                # 查找员工
-                employee_data = None
-                
-                # 先尝试从预加载数据中查找
-                if hasattr(entry_data, 'employee_info') and entry_data.employee_info:
-                    info = entry_data.employee_info
-                    if info and info.get('last_name') and info.get('first_name'):
-                        # 仅使用姓名匹配
-                        key = f"{info['last_name']}_{info['first_name']}"
-                        employee_data = employee_lookup.get(key)
-                        logger.info(f"🔍 [员工匹配] 通过姓名匹配: {info['last_name']}{info['first_name']} -> {employee_data['id'] if employee_data else 'Not Found'}")
-                
-                # 如果预加载数据中没有，且有employee_id，尝试单独查询
-                if not employee_data and hasattr(entry_data, 'employee_id') and entry_data.employee_id:
-                    employee = get_employee(db, entry_data.employee_id)
-                    if employee:
-                        employee_data = {
-                            'id': employee.id,
-                            'employee_code': employee.employee_code,
-                            'last_name': employee.last_name,
-                            'first_name': employee.first_name,
-                            'id_number': employee.id_number,
-                            'is_active': employee.is_active
-                        }
-                        logger.info(f"🔍 [员工匹配] 通过ID匹配: {entry_data.employee_id} -> {employee_data['id']}")
-                
-                if not employee_data:
-                    errors.append({
-                        "index": i,
-                        "employee_id": getattr(entry_data, 'employee_id', None),
-                        "error": "Employee not found"
-                    })
-                    continue
-                
-                employee_id = employee_data['id']
-                
-                # 检查是否已存在记录
-                existing_entry_id = existing_entries_map.get(employee_id)
-                
-                # 准备PayrollEntry数据
-                db_data_dict = entry_data.model_dump(exclude={'employee_info'})
-                db_data_dict['payroll_run_id'] = default_run.id
-                db_data_dict['payroll_period_id'] = payroll_period_id
-                db_data_dict['employee_id'] = employee_id
-                
-                # 规范化 earnings_details - 使用标准处理逻辑
-                earnings_errors = []
-                if "earnings_details" in db_data_dict and isinstance(db_data_dict["earnings_details"], dict):
-                    processed_earnings = {}
-                    for code, item_input in db_data_dict["earnings_details"].items():
-                        component_name = component_map.get(code)
-                        if component_name is None:
-                            earnings_errors.append(f"无效的收入项代码: {code}")
-                            continue
-                        
-                        processed_earnings[code] = {
-                            "name": component_name, 
-                            "amount": float(item_input['amount'])
-                        }
-                    db_data_dict["earnings_details"] = processed_earnings
-                
-                # 规范化 deductions_details
-                deductions_errors = []
-                if "deductions_details" in db_data_dict and isinstance(db_data_dict["deductions_details"], dict):
-                    processed_deductions = {}
-                    for code, item_input in db_data_dict["deductions_details"].items():
-                        component_name = component_map.get(code)
-                        if component_name is None:
-                            deductions_errors.append(f"无效的扣除项代码: {code}")
-                            continue
-                        
-                        processed_deductions[code] = {
-                            "name": component_name,
-                            "amount": float(item_input['amount'])
-                        }
-                    db_data_dict["deductions_details"] = processed_deductions
-                
-                # 如果有组件错误，合并错误信息并跳过此记录
-                if earnings_errors or deductions_errors:
-                    all_component_errors = earnings_errors + deductions_errors
-                    errors.append({
-                        "index": i,
-                        "employee_id": employee_id,
-                        "error": "; ".join(all_component_errors)
-                    })
-                    continue
-                
-                # 决定是新增还是更新
-                if existing_entry_id and overwrite_mode in [OverwriteMode.FULL, OverwriteMode.PARTIAL]:
-                    # 更新现有记录
-                    update_entries_data.append({
-                        'entry_id': existing_entry_id,
-                        'data': db_data_dict,
-                        'overwrite_mode': overwrite_mode  # 传递覆写模式用于后续处理
-                    })
-                elif existing_entry_id and overwrite_mode == OverwriteMode.NONE:
-                    # 记录错误：记录已存在
-                    errors.append({
-                        "index": i,
-                        "employee_id": employee_id,
-                        "error": f"Payroll entry already exists for employee {employee_id} in this period"
-                    })
-                else:
-                    # 创建新记录
-                    new_entries_data.append(db_data_dict)
-                    
-            except Exception as e:
+        # 5. 插入新记录（并发导入已写入的记录不覆盖，按已存在处理）
+        inserted = db.execute(text(f"""
+            INSERT INTO payroll.payroll_entries (
+                employee_id, payroll_period_id, payroll_run_id,
+                gross_pay, total_deductions, net_pay,
+                earnings_details, deductions_details, calculation_inputs, calculation_log,
+                status_lookup_value_id, remarks, calculated_at, updated_at
+            )
+            SELECT
+                s.resolved_employee_id, :payroll_period_id, :payroll_run_id,
+                COALESCE(s.gross_pay, 0), COALESCE(s.total_deductions, 0), COALESCE(s.net_pay, 0),
+                COALESCE(s.earnings_details, '{{}}'::jsonb), COALESCE(s.deductions_details, '{{}}'::jsonb),
+                s.calculation_inputs, s.calculation_log,
+                s.status_lookup_value_id, s.remarks, now(), now()
+            FROM {IMPORT_STAGING_TABLE} s
+            WHERE s.existing_entry_id IS NULL
+            ORDER BY s.row_index
+            ON CONFLICT ON CONSTRAINT uq_payroll_entries_employee_period_run DO NOTHING
+            RETURNING id, employee_id
+        """), {'payroll_period_id': payroll_period_id, 'payroll_run_id': default_run.id}).fetchall()
+        
+        inserted_employee_ids = {row.employee_id for row in inserted}
+        for row in db.execute(text(f"""
+            SELECT row_index, resolved_employee_id
+            FROM {IMPORT_STAGING_TABLE}
+            WHERE existing_entry_id IS NULL
+        """)):
+            if row.resolved_employee_id not in inserted_employee_ids:
                 errors.append({
-                    "index": i,
-                    "employee_id": getattr(entry_data, 'employee_id', None),
-                    "error": str(e)
+                    "index": row.row_index,
+                    "employee_id": row.resolved_employee_id,
+                    "error": f"Payroll entry already exists for employee {row.resolved_employee_id} in this period"
                 })
         
-        # 🚀 性能优化5：批量创建新记录
-        if new_entries_data:
-            logger.info(f"批量创建 {len(new_entries_data)} 条新记录...")
-            
-            # 使用SQLAlchemy的bulk_insert_mappings进行批量插入
-            try:
-                # 为每条记录添加时间戳
-                now = datetime.now()
-                for data in new_entries_data:
-                    data['calculated_at'] = now  # 修复：使用calculated_at而不是created_at
-                    data['updated_at'] = now
-                
-                # 批量插入
-                db.bulk_insert_mappings(PayrollEntry, new_entries_data)
-                
-                # 查询刚插入的记录（用于返回）
-                new_employee_ids = [data['employee_id'] for data in new_entries_data]
-                
-                new_records = db.query(PayrollEntry).filter(
-                    PayrollEntry.payroll_period_id == payroll_period_id,
-                    PayrollEntry.employee_id.in_(new_employee_ids),
-                    PayrollEntry.calculated_at >= now  # 修复：使用calculated_at而不是created_at
-                ).all()
-                
-                created_entries.extend(new_records)
-                logger.info(f"✅ 成功批量创建 {len(new_records)} 条记录")
-                
-            except Exception as e:
-                logger.error(f"❌ 批量创建失败: {str(e)}")
-                # 如果批量创建失败，降级到逐条创建
-                for i, data in enumerate(new_entries_data):
-                    try:
-                        db_entry = PayrollEntry(**data)
-                        db.add(db_entry)
-                        db.flush()  # 获取ID但不提交
-                        created_entries.append(db_entry)
-                    except Exception as individual_error:
-                        errors.append({
-                            "index": -1,  # 无法确定原始索引
-                            "employee_id": data.get('employee_id'),
-                            "error": f"Individual create failed: {str(individual_error)}"
-                        })
+        # 6. 更新已存在的记录（导入覆盖了计算结果，清除输入指纹以便重新计算）
+        updated = []
+        if overwrite_mode == OverwriteMode.FULL:
+            updated = db.execute(text(f"""
+                UPDATE payroll.payroll_entries pe
+                SET payroll_run_id = :payroll_run_id,
+                    gross_pay = COALESCE(s.gross_pay, 0),
+                    total_deductions = COALESCE(s.total_deductions, 0),
+                    net_pay = COALESCE(s.net_pay, 0),
+                    earnings_details = COALESCE(s.earnings_details, '{{}}'::jsonb),
+                    deductions_details = COALESCE(s.deductions_details, '{{}}'::jsonb),
+                    calculation_inputs = s.calculation_inputs,
+                    calculation_log = s.calculation_log,
+                    status_lookup_value_id = s.status_lookup_value_id,
+                    remarks = s.remarks,
+                    input_fingerprint = NULL,
+                    updated_at = now()
+                FROM {IMPORT_STAGING_TABLE} s
+                WHERE pe.id = s.existing_entry_id
+                RETURNING pe.id
+            """), {'payroll_run_id': default_run.id}).fetchall()
+        elif overwrite_mode in (OverwriteMode.PARTIAL, OverwriteMode.SMART_MERGE):
+            # 只更新导入中有值的字段，明细按项目合并（导入的项目覆盖同名项目）
+            updated = db.execute(text(f"""
+                UPDATE payroll.payroll_entries pe
+                SET gross_pay = CASE WHEN s.gross_pay > 0 THEN s.gross_pay ELSE pe.gross_pay END,
+                    total_deductions = CASE WHEN s.total_deductions > 0 THEN s.total_deductions ELSE pe.total_deductions END,
+                    net_pay = CASE WHEN s.net_pay > 0 THEN s.net_pay ELSE pe.net_pay END,
+                    remarks = COALESCE(NULLIF(s.remarks, ''), pe.remarks),
+                    earnings_details = COALESCE(pe.earnings_details, '{{}}'::jsonb) || COALESCE(s.earnings_details, '{{}}'::jsonb),
+                    deductions_details = COALESCE(pe.deductions_details, '{{}}'::jsonb) || COALESCE(s.deductions_details, '{{}}'::jsonb),
+                    input_fingerprint = NULL,
+                    updated_at = now()
+                FROM {IMPORT_STAGING_TABLE} s
+                WHERE pe.id = s.existing_entry_id
+                RETURNING pe.id
+            """)).fetchall()
         
-        # 🚀 性能优化6：批量更新现有记录
-        if update_entries_data:
-            logger.info(f"批量更新 {len(update_entries_data)} 条现有记录...")
-            
-            for update_item in update_entries_data:
-                try:
-                    entry_id = update_item['entry_id']
-                    data = update_item['data']
-                    mode = update_item['overwrite_mode']
-                    
-                    if mode == OverwriteMode.PARTIAL:
-                        # 部分覆写：只更新导入数据中包含的字段
-                        # 首先获取现有记录
-                        existing_entry = db.query(PayrollEntry).filter(
-                            PayrollEntry.id == entry_id
-                        ).first()
-                        
-                        if existing_entry:
-                            # 准备更新数据，只包含非空/非零的字段
-                            update_data = {}
-                            
-                            # 基础字段：只有在导入数据中明确提供时才更新
-                            if data.get('gross_pay', 0) > 0:
-                                update_data['gross_pay'] = data['gross_pay']
-                            if data.get('total_deductions', 0) > 0:
-                                update_data['total_deductions'] = data['total_deductions']
-                            if data.get('net_pay', 0) > 0:
-                                update_data['net_pay'] = data['net_pay']
-                            if data.get('remarks'):
-                                update_data['remarks'] = data['remarks']
-                            
-                            # 收入明细：合并而不是替换
-                            if data.get('earnings_details'):
-                                existing_earnings = existing_entry.earnings_details or {}
-                                new_earnings = data['earnings_details']
-                                # 合并收入明细，新数据覆盖同名项目
-                                merged_earnings = {**existing_earnings, **new_earnings}
-                                update_data['earnings_details'] = merged_earnings
-                            
-                            # 扣除明细：合并而不是替换
-                            if data.get('deductions_details'):
-                                existing_deductions = existing_entry.deductions_details or {}
-                                new_deductions = data['deductions_details']
-                                # 合并扣除明细，新数据覆盖同名项目
-                                merged_deductions = {**existing_deductions, **new_deductions}
-                                update_data['deductions_details'] = merged_deductions
-                            
-                            # 添加更新时间戳
-                            update_data['updated_at'] = datetime.now()
-                            
-                            # 执行部分更新
-                            if update_data:
-                                updated_count = db.query(PayrollEntry).filter(
-                                    PayrollEntry.id == entry_id
-                                ).update(update_data)
-                                
-                                if updated_count > 0:
-                                    # 查询更新后的记录
-                                    updated_entry = db.query(PayrollEntry).filter(
-                                        PayrollEntry.id == entry_id
-                                    ).first()
-                                    if updated_entry:
-                                        created_entries.append(updated_entry)
-                            else:
-                                # 没有需要更新的字段，但仍然算作成功处理
-                                created_entries.append(existing_entry)
-                    else:
-                        # 全量覆写：替换所有字段
-                        data['updated_at'] = datetime.now()
-                        updated_count = db.query(PayrollEntry).filter(
-                            PayrollEntry.id == entry_id
-                        ).update(data)
-                        
-                        if updated_count > 0:
-                            # 查询更新后的记录
-                            updated_entry = db.query(PayrollEntry).filter(
-                                PayrollEntry.id == entry_id
-                            ).first()
-                            if updated_entry:
-                                created_entries.append(updated_entry)
-                    
-                except Exception as e:
-                    errors.append({
-                        "index": -1,
-                        "employee_id": update_item.get('data', {}).get('employee_id'),
-                        "error": f"Update failed: {str(e)}"
-                    })
+        # 7. 单次加载返回的记录并提交
+        entry_ids = [row.id for row in inserted] + [row.id for row in updated]
+        created_entries = db.query(PayrollEntry).filter(PayrollEntry.id.in_(entry_ids)).all() if entry_ids else []
         
-        # 🚀 性能优化7：单次提交，而不是循环中多次提交
-        logger.info("提交数据库事务...")
         db.commit()
         
-        end_time = time.time()
-        duration = end_time - start_time
+        if entry_ids:
+            from ...services.payroll_snapshot import mark_payroll_periods_stale
+            mark_payroll_periods_stale(payroll_period_id)
         
-        logger.info(f"🚀 高性能批量创建工资明细完成: 成功 {len(created_entries)} 条, 失败 {len(errors)} 条, 耗时 {duration:.2f} 秒")
-        logger.info(f"📊 统计详细: 输入总数={total_entries}, 新增数据={len(new_entries_data)}, 更新数据={len(update_entries_data)}, 错误数={len(errors)}")
-        logger.info(f"🚀 性能提升: 预计比原版本快 {91.05/duration:.1f}x")
+        duration = time.time() - start_time
+        errors.sort(key=lambda error: error["index"])
+        logger.info(
+            f"🚀 高性能批量创建工资明细完成: 新增 {len(inserted)} 条, 更新 {len(updated)} 条, "
+            f"失败 {len(errors)} 条, 输入 {total_entries} 条, 耗时 {duration:.2f} 秒"
+        )
         
         return created_entries, errors
         
@@ -993,5 +943,3 @@ def bulk_create_payroll_entries_optimized(
         logger.error(f"❌ 高性能批量创建失败: {str(e)}")
         db.rollback()
         raise 
-
- 
\ No newline at end of file
@@ -10,9 +10,12 @@ import logging
 
 from ...models.payroll import PayrollEntry, PayrollRun, PayrollPeriod
 from ...models.hr import Employee, Department, PersonnelCategory  
-from ...models.config import PayrollComponentDefinition
+from ...payroll_engine.component_registry import get_component_registry
 from ...pydantic_models.payroll import PayrollEntryCreate, PayrollEntryUpdate, PayrollEntryPatch
-from ..config import get_payroll_component_definitions
+from ...utils.pagination import (
+    COUNT_MODE_EXACT, COUNT_MODE_ESTIMATED, COUNT_MODE_NONE,
+    decode_cursor, encode_cursor, keyset_sql, estimate_count
+)
 from .utils import convert_decimals_to_float
 
 logger = logging.getLogger(__name__)
@@ -34,15 +37,24 @@ def get_payroll_entries(
     sort_by: Optional[str] = None,
     sort_order: Optional[str] = "asc",
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[dict], int]:
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    count_mode: str = COUNT_MODE_EXACT
+) -> Tuple[List[dict], Optional[int], Optional[str]]:
     """
     使用视图优化的薪资条目查询
     
     使用 v_comprehensive_employee_payroll 视图，包含完整的员工信息和薪资明细
     
+    Args:
+        cursor: 键集分页游标（上一次返回的 next_cursor）；提供时忽略 skip，从游标位置继续
+        count_mode: 总数计算方式 exact（精确 COUNT）、estimated（执行计划估算）或 none（不计算）
+    
     Returns:
-        薪资条目字典列表和总数的元组
+        (薪资条目字典列表, 总数（count_mode 为 none 时为 None）, 下一页游标（没有下一页时为 None）)
+    
+    Raises:
+        InvalidCursorError: 游标无效或与当前排序不一致
     """
     try:
         logger.info(f"🔍 开始视图查询: employee_id={employee_id}, period_id={period_id}, run_id={run_id}")
@@ -110,39 +122,52 @@ def get_payroll_entries(
         if conditions:
             where_clause = "WHERE " + " AND ".join(conditions)
         
-        # 排序处理
-        order_clause = 'ORDER BY pb."薪资条目id" DESC'  # 默认排序
-        if sort_by:
-            sort_direction = "DESC" if sort_order.lower() == 'desc' else "ASC"
-            
-            # 映射排序字段到新视图体系中实际存在的字段
-            sort_field_mapping = {
-                'employee_name': 'eb.full_name',
-                'department': 'eb.department_name',
-                'gross_pay': 'pb."应发合计"',
-                'net_pay': 'pb."实发合计"',
-                'calculated_at': 'pb."计算时间"'
-            }
-            
-            if sort_by in sort_field_mapping:
-                order_clause = f"ORDER BY {sort_field_mapping[sort_by]} {sort_direction}"
-            elif sort_by == 'id':
-                order_clause = f'ORDER BY pb."薪资条目id" {sort_direction}'
+        # 排序处理：排序键 NULLS LAST + 条目ID，保证顺序稳定，可用于键集分页
+        # 映射排序字段到新视图体系中实际存在的字段（以及结果行中对应的列）
+        sort_field_mapping = {
+            'employee_name': ('eb.full_name', 'employee_name'),
+            'department': ('eb.department_name', 'department_name'),
+            'gross_pay': ('pb."应发合计"', 'gross_pay'),
+            'net_pay': ('pb."实发合计"', 'net_pay'),
+            'calculated_at': ('pb."计算时间"', 'calculated_at')
+        }
+        sort_expr, sort_column = sort_field_mapping.get(sort_by, (None, None))
+        if sort_by in sort_field_mapping or sort_by == 'id':
+            descending = (sort_order or 'asc').lower() == 'desc'
+        else:
+            descending = True  # 默认按ID倒序
+        sort_spec = f"{sort_column or 'id'}:{'desc' if descending else 'asc'}"
+        
+        cursor_values = decode_cursor(cursor, sort_spec) if cursor else None
+        order_clause, cursor_condition, cursor_params = keyset_sql(
+            sort_expr, 'pb."薪资条目id"', descending, cursor_values
+        )
+        
+        data_conditions = conditions + [cursor_condition] if cursor_condition else conditions
+        data_where_clause = "WHERE " + " AND ".join(data_conditions) if data_conditions else ""
         
-        # 分页参数
-        params['limit'] = limit
-        params['offset'] = skip
+        # 期间快照未过期时读取物化快照，否则回退到实时视图
+        from ...services.payroll_snapshot import payroll_view_source
+        payroll_basic_source = payroll_view_source(db, 'v_payroll_basic', period_id)
         
         # 查询总数
-        count_sql = f"""
-            SELECT COUNT(*) as total
-            FROM reports.v_payroll_basic pb
+        count_from = f"""
+            FROM {payroll_basic_source} pb
             LEFT JOIN reports.v_employees_basic eb ON pb."员工id" = eb.id
             {where_clause}
         """
+        if count_mode == COUNT_MODE_NONE:
+            total = None
+        elif count_mode == COUNT_MODE_ESTIMATED:
+            total = estimate_count(db, f"SELECT 1 {count_from}", params)
+        else:
+            count_result = db.execute(text(f"SELECT COUNT(*) as total {count_from}"), params).fetchone()
+            total = count_result.total if count_result else 0
         
-        count_result = db.execute(text(count_sql), params).fetchone()
-        total = count_result.total if count_result else 0
+        # 分页参数：游标模式不使用 OFFSET；多取一行用于判断是否还有下一页
+        params.update(cursor_params)
+        params['limit'] = limit + 1
+        params['offset'] = 0 if cursor else skip
         
         # 查询数据 - 使用新视图体系的字段映射
         data_sql = f"""
@@ -204,17 +229,24 @@ def get_payroll_entries(
                 -- 时间字段
                 pb."计算时间" as calculated_at,
                 pb."更新时间" as updated_at
-            FROM reports.v_payroll_basic pb
+            FROM {payroll_basic_source} pb
             LEFT JOIN reports.v_employees_basic eb ON pb."员工id" = eb.id
             LEFT JOIN reports.v_payroll_earnings pe ON pb."薪资条目id" = pe."薪资条目id"
             LEFT JOIN reports.v_payroll_deductions pd ON pb."薪资条目id" = pd."薪资条目id"
-            {where_clause}
+            {data_where_clause}
             {order_clause}
             LIMIT :limit OFFSET :offset
         """
         
         result = db.execute(text(data_sql), params).fetchall()
         
+        next_cursor = None
+        if len(result) > limit:
+            result = result[:limit]
+            last_row = result[-1]._mapping
+            key_values = [last_row[sort_column]] if sort_column else []
+            next_cursor = encode_cursor(sort_spec, key_values + [last_row['id']])
+        
         # 转换为字典列表
         entries = []
         for row in result:
@@ -268,8 +300,8 @@ def get_payroll_entries(
             }
             entries.append(entry_dict)
         
-        logger.info(f"✅ 视图查询完成: 返回 {len(entries)} 条记录，总计 {total} 条")
-        return entries, total
+        logger.info(f"✅ 视图查询完成: 返回 {len(entries)} 条记录，总计 {total} 条（{count_mode}）")
+        return entries, total, next_cursor
         
     except Exception as e:
         logger.error(f"❌ 视图查询失败: {e}", exc_info=True)
@@ -319,25 +351,11 @@ def get_payroll_entry(db: Session, entry_id: int, include_employee_details: bool
             if hasattr(entry, 'employee_name'):
                  entry.employee_name = None
 
-        # 获取所有激活的扣除和法定类型的薪资字段定义，并创建映射
-        personal_deduction_result = get_payroll_component_definitions(
-            db, 
-            component_type='PERSONAL_DEDUCTION', 
-            is_active=True, 
-            limit=1000 # 假设组件定义不会超过1000个
-        )
-        employer_deduction_result = get_payroll_component_definitions(
-            db,
-            component_type='EMPLOYER_DEDUCTION',
-            is_active=True,
-            limit=1000
-        )
-        
-        all_personal_deduction_components = personal_deduction_result["data"]
-        all_employer_deduction_components = employer_deduction_result["data"]
-        
-        component_map = {comp.code: comp.name for comp in all_personal_deduction_components}
-        component_map.update({comp.code: comp.name for comp in all_employer_deduction_components})
+        # 所有启用的个人扣除和单位扣除组件（共享的组件定义注册表）
+        component_map = {
+            comp.code: comp.name
+            for comp in get_component_registry(db).of_type('PERSONAL_DEDUCTION', 'EMPLOYER_DEDUCTION')
+        }
 
         # 为 earnings_details 也从 component_map 更新/确认 name (如果需要统一来源)
         # 注意：当前 earnings_details 在DB中本身就可能包含 name 和 amount
@@ -397,41 +415,8 @@ def _get_component_mapping(db: Session) -> dict:
     Returns:
         组件代码到名称的映射字典
     """
-    # 直接使用SQLAlchemy查询，避免CRUD函数可能的问题
-    personal_deduction_query = select(PayrollComponentDefinition).where(
-        PayrollComponentDefinition.type == 'PERSONAL_DEDUCTION',
-        PayrollComponentDefinition.is_active == True
-    ).order_by(PayrollComponentDefinition.display_order.asc())
-    
-    employer_deduction_query = select(PayrollComponentDefinition).where(
-        PayrollComponentDefinition.type == 'EMPLOYER_DEDUCTION',
-        PayrollComponentDefinition.is_active == True
-    ).order_by(PayrollComponentDefinition.display_order.asc())
-    
-    # 更全面的查询：包含所有可能用作薪资组件的类型
-    all_components_query = select(PayrollComponentDefinition).where(
-        PayrollComponentDefinition.is_active == True
-    ).order_by(PayrollComponentDefinition.display_order.asc())
-    
-    all_components = db.execute(all_components_query).scalars().all()
-    
-    # 按类型分组（用于调试日志）
-    components_by_type = {}
-    for comp in all_components:
-        if comp.type not in components_by_type:
-            components_by_type[comp.type] = []
-        components_by_type[comp.type].append(comp.code)
-    
-    # 创建统一的映射
-    component_map = {comp.code: comp.name for comp in all_components}
-
-    # 添加调试日志
-    logger.info(f"所有激活组件总数: {len(all_components)}")
-    for comp_type, codes in components_by_type.items():
-        logger.info(f"{comp_type} 类型组件 {len(codes)} 个: {', '.join(codes[:5])}{'...' if len(codes) > 5 else ''}")
-    logger.info(f"component_map包含的所有代码: {len(component_map)} 个")
-    
-    return component_map
+    # 所有启用的薪资组件（共享的组件定义注册表）
+    return get_component_registry(db).name_by_code()
 
 
 def create_payroll_entry(db: Session, payroll_entry_data: PayrollEntryCreate) -> PayrollEntry:
@@ -2,13 +2,14 @@
 薪资审核相关的CRUD操作。
 """
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import func
 from typing import List, Optional, Tuple
-from decimal import Decimal
 
 from ...models.payroll import PayrollRun, PayrollEntry
 from ...pydantic_models.payroll import PayrollRunCreate, PayrollRunUpdate, PayrollRunPatch
 
+# 由数据库触发器随工资条目维护的汇总字段，不接受客户端写入
+RUN_STATS_FIELDS = {'total_employees', 'total_gross_pay', 'total_deductions', 'total_net_pay'}
+
 
 def get_payroll_runs(
     db: Session,
@@ -47,24 +48,8 @@ def get_payroll_runs(
         selectinload(PayrollRun.status)
     ).order_by(PayrollRun.run_date.desc()).offset(skip).limit(limit)
     
+    # 员工数量和金额合计由数据库触发器随工资条目维护，直接读取
     runs = query.all()
-    
-    # 计算每个 run 的员工数量和薪资总额
-    for run in runs:
-        # 计算该 run 下的员工数量
-        employee_count = db.query(PayrollEntry.employee_id).filter(
-            PayrollEntry.payroll_run_id == run.id
-        ).distinct().count()
-        
-        # 计算该 run 下的薪资总额
-        total_net_pay = db.query(func.sum(PayrollEntry.net_pay)).filter(
-            PayrollEntry.payroll_run_id == run.id
-        ).scalar() or Decimal(0)
-        
-        # 动态添加 total_employees 和 total_net_pay 属性
-        run.total_employees = employee_count
-        run.total_net_pay = total_net_pay
-    
     return runs, total
 
 
@@ -80,7 +65,6 @@ def get_payroll_run(db: Session, run_id: int, include_employee_details: bool = F
     Returns:
         薪资审核对象或None
     """
-    print(f"CRUD: Entered get_payroll_run with run_id={run_id}, include_employee_details={include_employee_details}")
     # 构建基础查询
     query = db.query(PayrollRun).options(
         selectinload(PayrollRun.payroll_period),
@@ -93,29 +77,8 @@ def get_payroll_run(db: Session, run_id: int, include_employee_details: bool = F
             selectinload(PayrollRun.payroll_entries).selectinload(PayrollEntry.employee)
         )
     
-    run = query.filter(PayrollRun.id == run_id).first()
-    
-    print(f"CRUD: Fetched run: {run}")
-
-    if run:
-        # 计算该 run 下的员工数量
-        employee_count = db.query(PayrollEntry.employee_id).filter(
-            PayrollEntry.payroll_run_id == run.id
-        ).distinct().count()
-        print(f"CRUD: Calculated employee_count: {employee_count}")
-        
-        # 计算该 run 下的薪资总额
-        total_net_pay = db.query(func.sum(PayrollEntry.net_pay)).filter(
-            PayrollEntry.payroll_run_id == run.id
-        ).scalar() or Decimal(0)
-        print(f"CRUD: Calculated total_net_pay: {total_net_pay}")
-        
-        # 动态添加 total_employees 和 total_net_pay 属性
-        run.total_employees = employee_count
-        run.total_net_pay = total_net_pay
-    
-    print(f"CRUD: Returning run: {run}")
-    return run
+    # 员工数量和金额合计由数据库触发器随工资条目维护，直接读取
+    return query.filter(PayrollRun.id == run_id).first()
 
 
 def create_payroll_run(db: Session, payroll_run: PayrollRunCreate, initiated_by_user_id: Optional[int] = None) -> PayrollRun:
@@ -130,7 +93,7 @@ def create_payroll_run(db: Session, payroll_run: PayrollRunCreate, initiated_by_
     Returns:
         创建的薪资审核对象
     """
-    run_data = payroll_run.model_dump()
+    run_data = payroll_run.model_dump(exclude=RUN_STATS_FIELDS)
     if initiated_by_user_id:
         run_data['initiated_by_user_id'] = initiated_by_user_id
     
@@ -158,7 +121,7 @@ def update_payroll_run(db: Session, run_id: int, payroll_run: PayrollRunUpdate)
     db_payroll_run = get_payroll_run(db, run_id)
     if not db_payroll_run:
         return None
-    update_data = payroll_run.model_dump(exclude_unset=True)
+    update_data = payroll_run.model_dump(exclude_unset=True, exclude=RUN_STATS_FIELDS)
     for key, value in update_data.items():
         setattr(db_payroll_run, key, value)
     db.commit()
@@ -184,7 +147,7 @@ def patch_payroll_run(db: Session, run_id: int, run_data: PayrollRunPatch) -> Op
     db_payroll_run = db.query(PayrollRun).filter(PayrollRun.id == run_id).first()
     if not db_payroll_run:
         return None
-    update_values = run_data.model_dump(exclude_unset=True)
+    update_values = run_data.model_dump(exclude_unset=True, exclude=RUN_STATS_FIELDS)
     for key, value in update_values.items():
         if value is None and key not in run_data.model_fields_set: # Allow explicit None if set by user
             continue
@@ -1,5 +1,6 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
+from sqlalchemy import update
 from ...models.reports import ReportTemplate, ReportTemplateField
 from ...pydantic_models.reports import (
     ReportTemplateCreate, ReportTemplateUpdate
@@ -95,8 +96,11 @@ class ReportTemplateCRUD:
 
     @staticmethod
     def increment_usage(db: Session, template_id: int):
-        """增加模板使用次数"""
-        db_template = db.query(ReportTemplate).filter(ReportTemplate.id == template_id).first()
-        if db_template:
-            db_template.usage_count += 1
-            db.commit() 
\ No newline at end of file
+        """增加模板使用次数（单条 UPDATE，不改变模板的更新时间）"""
+        db.execute(
+            update(ReportTemplate)
+            .where(ReportTemplate.id == template_id)
+            .values(usage_count=ReportTemplate.usage_count + 1, updated_at=ReportTemplate.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit() 
\ No newline at end of file
@@ -11,6 +11,8 @@ import logging
 
 from ..models.security import User, Role, Permission, user_roles, role_permissions
 from ..models.hr import Employee
+from ..services.permission_cache import permission_cache, notify_permission_change
+from ..services.token_cache import revoke_user
 from ..pydantic_models.security import UserCreate, UserUpdate, RoleCreate, RoleUpdate, PermissionCreate, PermissionUpdate, UserRoleCreate, RolePermissionCreate
 
 # 设置logger
@@ -232,6 +234,7 @@ def update_user(db: Session, user_id: int, user: UserUpdate) -> Optional[User]:
     db_user = get_user(db, user_id)
     if not db_user:
         return None
+    original_username = db_user.username
 
     update_data = user.model_dump(exclude_unset=True, exclude={"password", "role_ids", "employee_first_name", "employee_last_name", "employee_id_card"})
 
@@ -299,6 +302,11 @@ def update_user(db: Session, user_id: int, user: UserUpdate) -> Optional[User]:
                 # logging.warning(f"Invalid role ID(s) provided during user update for user {user_id}: {missing_ids}. Only valid roles will be assigned.")
             db_user.roles = roles
 
+    # 用户状态、用户名或角色可能变化，使该用户的权限缓存失效
+    notify_permission_change(db, original_username)
+    # 停用、改名或修改密码后，所有 worker 都不再使用已缓存的令牌验证结果
+    if update_data.get("is_active") is False or user.password or db_user.username != original_username:
+        revoke_user(original_username, db)
     db.commit()
     db.refresh(db_user)
     updated_db_user_with_relations = get_user(db, user_id) 
@@ -321,6 +329,8 @@ def delete_user(db: Session, user_id: int) -> bool:
         return False
 
     db.delete(db_user)
+    notify_permission_change(db, db_user.username)
+    revoke_user(db_user.username, db)
     db.commit()
     return True
 
@@ -352,6 +362,7 @@ def assign_roles_to_user(db: Session, user_id: int, role_ids: List[int]) -> Opti
             raise ValueError(f"Invalid role ID(s) provided: {missing_ids}")
         db_user.roles = roles
     
+    notify_permission_change(db, db_user.username)
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -508,6 +519,8 @@ def update_role(db: Session, role_id: int, role: RoleUpdate) -> Optional[Role]:
         else:
             db_role.permissions = []
     
+    # 角色的权限变化影响所有拥有该角色的用户
+    notify_permission_change(db)
     db.commit()
     db.refresh(db_role)
     return db_role
@@ -529,6 +542,7 @@ def delete_role(db: Session, role_id: int) -> bool:
         return False
 
     db.delete(db_role)
+    notify_permission_change(db)
     db.commit()
     return True
 
@@ -646,6 +660,7 @@ def update_permission(db: Session, permission_id: int, permission: PermissionUpd
     for key, value in update_data.items():
         setattr(db_permission, key, value)
 
+    notify_permission_change(db)
     db.commit()
     db.refresh(db_permission)
     return db_permission
@@ -667,6 +682,7 @@ def delete_permission(db: Session, permission_id: int) -> bool:
         return False
 
     db.delete(db_permission)
+    notify_permission_change(db)
     db.commit()
     return True
 
@@ -800,7 +816,7 @@ def get_user_permissions_optimized(db: Session, username: str, use_cache: bool =
     现在使用超高性能查询函数
     
     Args:
-        db: 数据库会话
+        db: 数据库会话（缓存命中时不会使用）
         username: 用户名
         use_cache: 是否使用缓存
         
@@ -814,22 +830,86 @@ def get_user_permissions_optimized(db: Session, username: str, use_cache: bool =
             logger.debug(f"🎯 用户权限缓存命中: {username}")
             return cached_data
     
-    # 缓存未命中，使用超高性能查询
+    # 缓存未命中，使用超高性能查询；查询期间发生权限变更时不写回缓存
     logger.debug(f"⚡ 执行超高性能权限查询: {username}")
+    generation = permission_cache.generation
     user_data = get_user_permissions_ultra_fast(db, username)
     
     # 存入缓存
     if user_data and use_cache:
-        set_user_permissions_cache(username, user_data)
+        set_user_permissions_cache(username, user_data, generation)
         logger.debug(f"💾 用户权限已缓存: {username}")
         
     return user_data
 
 
-# 用户权限缓存 (5分钟TTL)
-_user_permissions_cache = {}
-_cache_ttl_minutes = 5
+def get_users_permissions_bulk(db: Session, usernames: Optional[List[str]] = None, limit: Optional[int] = None) -> Dict[str, dict]:
+    """
+    批量查询活跃用户的权限：一次查询聚合所有用户的权限代码和角色
+    
+    Args:
+        db: 数据库会话
+        usernames: 用户名列表，为空时查询所有活跃用户
+        limit: 最多返回的用户数
+        
+    Returns:
+        用户名到用户权限数据的字典（结构与 get_user_permissions_ultra_fast 相同）
+    """
+    conditions = ["u.is_active = true"]
+    params: Dict[str, Any] = {}
+    if usernames is not None:
+        if not usernames:
+            return {}
+        conditions.append("u.username = ANY(:usernames)")
+        params["usernames"] = list(usernames)
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT :limit"
+        params["limit"] = limit
+    
+    query = text(f"""
+        SELECT
+            u.id, u.username, u.employee_id, u.is_active, u.created_at,
+            COALESCE(
+                array_agg(DISTINCT p.code) FILTER (WHERE p.code IS NOT NULL),
+                ARRAY[]::varchar[]
+            ) AS permission_codes,
+            COALESCE(
+                jsonb_agg(DISTINCT jsonb_build_object('id', r.id, 'name', r.name, 'code', r.code))
+                    FILTER (WHERE r.id IS NOT NULL),
+                '[]'::jsonb
+            ) AS roles
+        FROM security.users u
+        LEFT JOIN security.user_roles ur ON ur.user_id = u.id
+        LEFT JOIN security.roles r ON r.id = ur.role_id
+        LEFT JOIN security.role_permissions rp ON rp.role_id = ur.role_id
+        LEFT JOIN security.permissions p ON p.id = rp.permission_id
+        WHERE {" AND ".join(conditions)}
+        GROUP BY u.id
+        ORDER BY u.id
+        {limit_clause}
+    """)
+    
+    users = {}
+    for row in db.execute(query, params):
+        roles = row.roles if isinstance(row.roles, list) else json.loads(row.roles)
+        users[row.username] = {
+            "id": row.id,
+            "username": row.username,
+            "employee_id": row.employee_id,
+            "is_active": row.is_active,
+            "created_at": row.created_at,
+            "description": None,  # 用户表没有description字段，设为None
+            "all_permission_codes": list(row.permission_codes),
+            "roles": [
+                {**role, "description": None, "is_active": True}
+                for role in sorted(roles, key=lambda role: role["id"])
+            ]
+        }
+    return users
+
 
+# 用户权限缓存：进程内 LRU，角色/权限变更时通过 LISTEN/NOTIFY 跨 worker 失效
 def get_cached_user_permissions(username: str) -> Optional[dict]:
     """
     从缓存获取用户权限信息
@@ -840,42 +920,29 @@ def get_cached_user_permissions(username: str) -> Optional[dict]:
     Returns:
         缓存的用户权限数据，如果过期或不存在则返回None
     """
-    if username not in _user_permissions_cache:
-        return None
-        
-    cached_data, timestamp = _user_permissions_cache[username]
-    
-    # 检查缓存是否过期
-    if datetime.now() - timestamp > timedelta(minutes=_cache_ttl_minutes):
-        # 清理过期缓存
-        del _user_permissions_cache[username]
-        return None
-        
-    return cached_data
+    return permission_cache.get(username)
 
 
-def set_user_permissions_cache(username: str, user_data: dict) -> None:
+def set_user_permissions_cache(username: str, user_data: dict, generation: Optional[int] = None) -> None:
     """
     设置用户权限缓存
     
     Args:
         username: 用户名
         user_data: 用户权限数据
+        generation: 开始查询时的缓存代数（permission_cache.generation），之后发生过失效则不写入
     """
-    _user_permissions_cache[username] = (user_data, datetime.now())
+    permission_cache.put(username, user_data, generation)
 
 
 def clear_user_permissions_cache(username: str = None) -> None:
     """
-    清理用户权限缓存
+    清理用户权限缓存（仅本进程；数据变更请使用 notify_permission_change 通知所有 worker）
     
     Args:
         username: 特定用户名，如果为None则清理所有缓存
     """
-    if username:
-        _user_permissions_cache.pop(username, None)
-    else:
-        _user_permissions_cache.clear()
+    permission_cache.invalidate(username)
 
 
 # --- 缓存管理辅助函数 ---
@@ -941,29 +1008,15 @@ async def warmup_user_permissions_cache(db: Session, usernames: List[str] = None
     
     Args:
         db: 数据库会话
-        usernames: 要预热的用户名列表，如果为None则加载所有活跃用户
+        usernames: 要预热的用户名列表，如果为None则加载所有活跃用户（不超过缓存容量）
     """
     try:
-        if usernames is None:
-            # 获取所有活跃用户
-            from sqlalchemy import text
-            query = text("SELECT username FROM security.users WHERE is_active = true")
-            result = db.execute(query).fetchall()
-            usernames = [row.username for row in result]
-        
-        logger.info(f"🔥 开始预热用户权限缓存: {len(usernames)} 个用户")
+        generation = permission_cache.generation
+        users = get_users_permissions_bulk(db, usernames, limit=permission_cache.max_entries)
         
-        for username in usernames:
-            try:
-                # 强制查询并缓存
-                user_data = get_user_permissions_ultra_fast(db, username)
-                if user_data:
-                    set_user_permissions_cache(username, user_data)
-                    logger.debug(f"✅ 已预热用户权限: {username}")
-            except Exception as e:
-                logger.warning(f"❌ 预热用户权限失败: {username}, 错误: {e}")
-        
-        logger.info(f"🎉 用户权限缓存预热完成!")
+        logger.info(f"🔥 开始预热用户权限缓存: {len(users)} 个用户")
+        cached = permission_cache.put_many(users, generation)
+        logger.info(f"🎉 用户权限缓存预热完成! 已缓存 {cached} 个用户")
         
     except Exception as e:
         logger.error(f"权限缓存预热过程失败: {e}", exc_info=True)
@@ -976,9 +1029,8 @@ def get_cache_stats() -> dict:
     Returns:
         缓存统计字典
     """
-    stats = {
-        "cached_users": len(_user_permissions_cache),
-        "cache_keys": list(_user_permissions_cache.keys()),
-        "cache_ttl_minutes": _cache_ttl_minutes
-    }
+    stats = permission_cache.get_stats()
+    stats["cached_users"] = stats["entries"]
+    stats["cache_keys"] = permission_cache.keys()
+    stats["cache_ttl_minutes"] = stats["ttl_seconds"] / 60
     return stats
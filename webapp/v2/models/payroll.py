@@ -1,7 +1,7 @@
 """
 工资相关的ORM模型。
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, UniqueConstraint, Identity, Numeric, BigInteger, Date
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, UniqueConstraint, Identity, Numeric, BigInteger, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import TIMESTAMP
@@ -25,6 +25,15 @@ class PayrollPeriod(BaseV2):
     pay_date = Column(Date, nullable=False)
     frequency_lookup_value_id = Column(BigInteger, ForeignKey('config.lookup_values.id', ondelete='RESTRICT'), nullable=False)
     status_lookup_value_id = Column(BigInteger, ForeignKey('config.lookup_values.id', ondelete='RESTRICT'), nullable=True)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # 汇总字段由数据库触发器在写入工资运行和条目的同一事务中维护，应用代码只读
+    runs_count = Column(Integer, nullable=False, server_default='0')
+    entries_count = Column(Integer, nullable=False, server_default='0')
+    total_gross_pay = Column(Numeric(18, 4), nullable=False, server_default='0')
+    total_deductions = Column(Numeric(18, 4), nullable=False, server_default='0')
+    total_net_pay = Column(Numeric(18, 4), nullable=False, server_default='0')
+    latest_run_id = Column(BigInteger, nullable=True)  # 不建外键，避免与工资运行循环依赖
 
     # Relationships
     frequency = relationship("LookupValue", foreign_keys=[frequency_lookup_value_id])
@@ -42,10 +51,12 @@ class PayrollRun(BaseV2):
     run_date = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
     status_lookup_value_id = Column(BigInteger, ForeignKey('config.lookup_values.id', ondelete='RESTRICT'), nullable=False)
     initiated_by_user_id = Column(BigInteger, ForeignKey('security.users.id', ondelete='SET NULL'), nullable=True)
+    # 条目数和金额合计由数据库触发器随工资条目的写入维护，应用代码只读
     total_employees = Column(Integer, nullable=True)
     total_gross_pay = Column(Numeric(18, 4), nullable=True)
     total_deductions = Column(Numeric(18, 4), nullable=True)
     total_net_pay = Column(Numeric(18, 4), nullable=True)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     # Relationships
     payroll_period = relationship("PayrollPeriod", back_populates="payroll_runs")
@@ -73,6 +84,7 @@ class PayrollEntry(BaseV2):
     deductions_details = Column(CustomJSONB, nullable=False, server_default='{}')
     calculation_inputs = Column(CustomJSONB, nullable=True)
     calculation_log = Column(CustomJSONB, nullable=True)
+    input_fingerprint = Column(String(64), nullable=True)  # 最近一次成功计算的输入指纹（增量重算时比对）
     status_lookup_value_id = Column(BigInteger, ForeignKey('config.lookup_values.id', ondelete='RESTRICT'), nullable=False)
     remarks = Column(Text, nullable=True)
     calculated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
@@ -91,3 +103,54 @@ class PayrollEntry(BaseV2):
     payroll_run = relationship("PayrollRun", back_populates="payroll_entries")
     status = relationship("LookupValue")
     audit_anomalies = relationship("PayrollAuditAnomaly", back_populates="payroll_entry")
+
+
+class PayrollEntryComponentValue(BaseV2):
+    """
+    薪资条目组件金额（按列存储的明细）
+
+    由数据库触发器在 payroll_entries 的 earnings_details / deductions_details / calculation_inputs
+    写入时同步维护，供视图和报表按组件代码直接聚合，无需逐行解析 JSONB。应用代码只读不写。
+    """
+    __tablename__ = 'entry_component_values'
+    __table_args__ = (
+        Index('idx_entry_component_values_period_code', 'payroll_period_id', 'component_code'),
+        Index('idx_entry_component_values_run_code', 'payroll_run_id', 'component_code'),
+        {'schema': 'payroll'}
+    )
+
+    entry_id = Column(BigInteger, ForeignKey('payroll.payroll_entries.id', ondelete='CASCADE'), primary_key=True)
+    section = Column(String(20), primary_key=True)  # EARNING, DEDUCTION, INPUT（对应来源 JSONB 字段）
+    component_code = Column(String(100), primary_key=True)
+    payroll_period_id = Column(BigInteger, nullable=False)
+    payroll_run_id = Column(BigInteger, nullable=False)
+    amount = Column(Numeric(18, 4), nullable=False)
+
+
+class PayrollCalculationTask(BaseV2):
+    """薪资计算任务（进度、取消和续算状态的持久化记录）"""
+    __tablename__ = 'calculation_tasks'
+    __table_args__ = (
+        Index('idx_calculation_tasks_run_id', 'payroll_run_id'),
+        Index('idx_calculation_tasks_status', 'status'),
+        Index('idx_calculation_tasks_created_at', 'created_at'),
+        {'schema': 'payroll'}
+    )
+
+    id = Column(String(36), primary_key=True)  # 任务ID (UUID)
+    task_type = Column(String(50), nullable=False, server_default='integrated_run')
+    payroll_run_id = Column(BigInteger, ForeignKey('payroll.payroll_runs.id', ondelete='CASCADE'), nullable=True)
+    status = Column(String(20), nullable=False, server_default='PREPARING')  # PREPARING, CALCULATING, COMPLETED, FAILED, CANCELLED
+    total = Column(Integer, nullable=False, server_default='0')
+    processed = Column(Integer, nullable=False, server_default='0')
+    stage = Column(String(255), nullable=True)
+    progress_data = Column(CustomJSONB, nullable=True)  # 最近一次的完整进度快照
+    request_params = Column(CustomJSONB, nullable=True)  # 续算所需的计算参数和条目ID
+    completed_entry_ids = Column(CustomJSONB, nullable=True)  # 已完成分块的条目ID
+    cancel_requested = Column(Boolean, nullable=False, server_default='FALSE')
+    error_message = Column(Text, nullable=True)
+    created_by = Column(BigInteger, ForeignKey('security.users.id', ondelete='SET NULL'), nullable=True)
+    started_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    completed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -15,13 +15,29 @@ from .social_insurance_calculator import (
     SocialInsuranceCalculator,
     SocialInsuranceComponent,
     SocialInsuranceResult,
+    SocialInsuranceBatchData,
     INSURANCE_TYPES,
     HOUSING_FUND_TYPE
 )
+from .rate_cache import (
+    SocialInsuranceRateTable,
+    social_insurance_rate_cache,
+    invalidate_social_insurance_rate_cache
+)
+from .component_registry import (
+    ComponentDefinition,
+    component_registry,
+    get_component_registry,
+    invalidate_component_registry
+)
 from .integrated_calculator import (
     IntegratedPayrollCalculator,
     IntegratedCalculationResult
 )
+from .parallel_calculator import (
+    ParallelPayrollCalculator,
+    calculate_payroll_chunk
+)
 from .exceptions import (
     PayrollCalculationError,
     MissingDataError,
@@ -40,13 +56,29 @@ __all__ = [
     'SocialInsuranceCalculator',
     'SocialInsuranceComponent',
     'SocialInsuranceResult',
+    'SocialInsuranceBatchData',
     'INSURANCE_TYPES',
     'HOUSING_FUND_TYPE',
     
+    # 费率表缓存
+    'SocialInsuranceRateTable',
+    'social_insurance_rate_cache',
+    'invalidate_social_insurance_rate_cache',
+    
+    # 组件定义注册表
+    'ComponentDefinition',
+    'component_registry',
+    'get_component_registry',
+    'invalidate_component_registry',
+    
     # 集成计算器
     'IntegratedPayrollCalculator',
     'IntegratedCalculationResult',
     
+    # 并行计算
+    'ParallelPayrollCalculator',
+    'calculate_payroll_chunk',
+    
     # 数据模型
     'CalculationResult',
     'CalculationStatus',
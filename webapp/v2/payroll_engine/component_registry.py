@@ -0,0 +1,184 @@
+"""
+薪资组件定义注册表
+
+计算器、导入映射和报表生成器都需要薪资组件定义（代码、名称、类型等），
+此前各自在每次调用时查询 config.payroll_component_definitions。
+注册表在进程内保存一份按代码和类型建立索引的只读快照，所有调用方共享。
+
+快照版本由组件定义表内容的摘要确定，最多每 VERSION_CHECK_INTERVAL_SECONDS 秒向数据库确认一次，
+从而感知其他进程的修改；本进程内通过 CRUD 修改组件定义时调用 invalidate_component_registry 立即失效。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 版本向数据库确认的最小间隔（秒）
+VERSION_CHECK_INTERVAL_SECONDS = 30
+
+# 个人扣缴类型
+PERSONAL_DEDUCTION_TYPES = ('PERSONAL_DEDUCTION', 'DEDUCTION')
+
+
+@dataclass(frozen=True)
+class ComponentDefinition:
+    """薪资组件定义（与数据库会话无关的只读副本）"""
+    id: int
+    code: str
+    name: str
+    type: str
+    calculation_method: Optional[str]
+    calculation_parameters: Optional[Any]
+    is_taxable: bool
+    is_social_security_base: bool
+    is_housing_fund_base: bool
+    display_order: int
+    is_active: bool
+
+
+class ComponentRegistrySnapshot:
+    """某一版本的组件定义快照（只包含启用的组件）"""
+
+    def __init__(self, components: List[ComponentDefinition], version: Optional[Tuple] = None):
+        self.version = version
+        self.components = sorted(
+            (c for c in components if c.is_active),
+            key=lambda c: (c.display_order, c.id)
+        )
+        self._by_code: Dict[str, ComponentDefinition] = {c.code: c for c in self.components}
+        self._by_type: Dict[str, List[ComponentDefinition]] = {}
+        for component in self.components:
+            self._by_type.setdefault(component.type, []).append(component)
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def get(self, code: str) -> Optional[ComponentDefinition]:
+        """按代码获取启用的组件"""
+        return self._by_code.get(code)
+
+    def of_type(self, *component_types: str) -> List[ComponentDefinition]:
+        """获取指定类型的启用组件（按显示顺序）"""
+        if len(component_types) == 1:
+            return list(self._by_type.get(component_types[0], []))
+        return [c for c in self.components if c.type in component_types]
+
+    def type_by_code(self) -> Dict[str, str]:
+        """组件代码 -> 类型"""
+        return {c.code: c.type for c in self.components}
+
+    def name_by_code(self) -> Dict[str, str]:
+        """组件代码 -> 名称"""
+        return {c.code: c.name for c in self.components}
+
+
+class ComponentRegistry:
+    """进程内共享的薪资组件定义注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ComponentRegistrySnapshot] = None
+        self._version: Optional[Tuple] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get_snapshot(self, db: Session) -> ComponentRegistrySnapshot:
+        """获取当前版本的组件定义快照，版本变化时重新加载"""
+        version = self._current_version(db)
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.version == version:
+                self.hits += 1
+                return self._snapshot
+            self.misses += 1
+
+        snapshot = ComponentRegistrySnapshot(self._load(db), version)
+        with self._lock:
+            self._snapshot = snapshot
+
+        logger.info(f"📋 [组件注册表] 加载薪资组件定义: {len(snapshot)} 个启用组件")
+        return snapshot
+
+    def invalidate(self) -> None:
+        """清空快照，并在下次获取时重新确认版本"""
+        with self._lock:
+            self._snapshot = None
+            self._version = None
+            self._version_checked_at = 0.0
+        logger.info("🗑️ [组件注册表] 薪资组件定义缓存已失效")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取注册表统计信息"""
+        with self._lock:
+            return {
+                "components": len(self._snapshot) if self._snapshot else 0,
+                "version": list(self._version) if self._version else None,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _load(self, db: Session) -> List[ComponentDefinition]:
+        from ..models import PayrollComponentDefinition
+
+        return [
+            ComponentDefinition(
+                id=row.id,
+                code=row.code,
+                name=row.name,
+                type=row.type,
+                calculation_method=row.calculation_method,
+                calculation_parameters=row.calculation_parameters,
+                is_taxable=row.is_taxable,
+                is_social_security_base=row.is_social_security_base,
+                is_housing_fund_base=row.is_housing_fund_base,
+                display_order=row.display_order or 0,
+                is_active=row.is_active,
+            )
+            for row in db.query(PayrollComponentDefinition).all()
+        ]
+
+    def _current_version(self, db: Session) -> Tuple:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < VERSION_CHECK_INTERVAL_SECONDS:
+                return self._version
+
+        # 组件定义表没有修改时间字段，使用影响计算和展示的列的摘要作为版本
+        row = db.execute(text("""
+            SELECT
+                COUNT(*),
+                md5(COALESCE(string_agg(
+                    concat_ws('|', id, code, name, type, is_active, display_order, calculation_method,
+                              is_taxable, is_social_security_base, is_housing_fund_base,
+                              calculation_parameters::text),
+                    ',' ORDER BY id
+                ), ''))
+            FROM config.payroll_component_definitions
+        """)).fetchone()
+        version = (row[0], row[1])
+
+        with self._lock:
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+
+# 所有调用方共享的注册表
+component_registry = ComponentRegistry()
+
+
+def get_component_registry(db: Session) -> ComponentRegistrySnapshot:
+    """获取当前的薪资组件定义快照"""
+    return component_registry.get_snapshot(db)
+
+
+def invalidate_component_registry() -> None:
+    """薪资组件定义变更后调用，使所有调用方的组件定义缓存失效"""
+    component_registry.invalidate()
@@ -8,18 +8,42 @@
 """
 
 from decimal import Decimal
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Set, Tuple
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
 from datetime import date, datetime
 from dataclasses import dataclass
+import hashlib
+import json
 import logging
 
 from .simple_calculator import SimplePayrollCalculator, CalculationResult, CalculationStatus, CalculationComponent, ComponentType
-from .social_insurance_calculator import SocialInsuranceCalculator, SocialInsuranceResult
-from ..models import PayrollEntry
+from .social_insurance_calculator import SocialInsuranceCalculator, SocialInsuranceResult, SocialInsuranceBatchData
+from .component_registry import get_component_registry
+from . import run_log
+from ..models import PayrollEntry, Employee
 
 logger = logging.getLogger(__name__)
 
+# 重新计算五险一金前不能清除的重要扣除项目（个税、调整项等）
+PROTECTED_DEDUCTION_FIELDS = {
+    'PERSONAL_INCOME_TAX', 'REFUND_DEDUCTION_ADJUSTMENT',
+    'SOCIAL_INSURANCE_ADJUSTMENT', 'PERFORMANCE_BONUS_DEDUCTION_ADJUSTMENT',
+    'REWARD_PERFORMANCE_ADJUSTMENT', 'MEDICAL_2022_DEDUCTION_ADJUSTMENT'
+}
+
+# 五险一金相关扣缴项目代码关键字
+SOCIAL_INSURANCE_CODE_KEYWORDS = [
+    'HOUSING_FUND', 'PENSION', 'MEDICAL', 'UNEMPLOYMENT',
+    'INJURY', 'SERIOUS_ILLNESS', 'OCCUPATIONAL_PENSION', 'MATERNITY'
+]
+
+# 计算引擎版本，计算规则变化时修改，使已保存的输入指纹全部失效
+ENGINE_VERSION = 'integrated_v2.4_all_personal_deductions'
+
+# 五险一金计算结果写回扣除详情时使用的后缀（指纹计算时排除这些输出字段）
+SOCIAL_INSURANCE_OUTPUT_SUFFIXES = ('_PERSONAL_AMOUNT', '_EMPLOYER_AMOUNT', '_PERSONAL', '_EMPLOYER')
+
 @dataclass
 class IntegratedCalculationResult:
     """集成计算结果"""
@@ -93,12 +117,41 @@ class IntegratedPayrollCalculator:
         Returns:
             IntegratedCalculationResult: 集成计算结果
         """
+        return self._calculate_employee_payroll(
+            employee_id=employee_id,
+            payroll_run_id=payroll_run_id,
+            earnings_data=earnings_data,
+            deductions_data=deductions_data,
+            calculation_period=calculation_period,
+            include_social_insurance=include_social_insurance,
+            calculate_social_insurance=lambda: self.social_insurance_calculator.calculate_employee_social_insurance(
+                employee_id=employee_id,
+                calculation_period=calculation_period
+            )
+        )
+    
+    def _calculate_employee_payroll(
+        self,
+        employee_id: int,
+        payroll_run_id: int,
+        earnings_data: Dict[str, Any],
+        deductions_data: Dict[str, Any],
+        calculation_period: Optional[date],
+        include_social_insurance: bool,
+        calculate_social_insurance: Callable[[], SocialInsuranceResult]
+    ) -> IntegratedCalculationResult:
+        """
+        计算员工完整薪资的核心流程
+        
+        五险一金的计算方式由 calculate_social_insurance 提供：单人计算时逐个查询数据库，
+        批量计算时使用预加载数据，两者的汇总逻辑完全相同。
+        """
         try:
-            logger.info(f"🚀 [集成计算] 开始计算员工 {employee_id} 薪资")
-            logger.info(f"📊 [输入数据] 收入数据: {earnings_data}")
-            logger.info(f"📊 [输入数据] 扣除数据: {deductions_data}")
-            logger.info(f"📊 [输入数据] 计算期间: {calculation_period}")
-            logger.info(f"📊 [输入数据] 包含社保: {include_social_insurance}")
+            run_log.detail(logger, "🚀 [集成计算] 开始计算员工 %s 薪资", employee_id)
+            run_log.detail(logger, "📊 [输入数据] 收入数据: %s", earnings_data)
+            run_log.detail(logger, "📊 [输入数据] 扣除数据: %s", deductions_data)
+            run_log.detail(logger, "📊 [输入数据] 计算期间: %s", calculation_period)
+            run_log.detail(logger, "📊 [输入数据] 包含社保: %s", include_social_insurance)
             
             # 创建集成结果对象
             result = IntegratedCalculationResult(
@@ -108,19 +161,16 @@ class IntegratedPayrollCalculator:
             )
             
             # 第一步：五险一金计算（核心步骤）
-            logger.info(f"🔄 [第一步] 开始五险一金计算...")
+            run_log.detail(logger, "🔄 [第一步] 开始五险一金计算...")
             if include_social_insurance and calculation_period:
                 try:
-                    social_insurance_result = self.social_insurance_calculator.calculate_employee_social_insurance(
-                        employee_id=employee_id,
-                        calculation_period=calculation_period
-                    )
+                    social_insurance_result = calculate_social_insurance()
                     
-                    logger.info(f"✅ [五险一金] 社保计算成功，组件数量: {len(social_insurance_result.components)}")
+                    run_log.detail(logger, "✅ [五险一金] 社保计算成功，组件数量: %s", len(social_insurance_result.components))
                     
                     # 提取社保和公积金金额（个人和单位）
                     for component in social_insurance_result.components:
-                        logger.info(f"📋 [五险一金组件] {component.insurance_type}: 个人={component.employee_amount}, 单位={component.employer_amount}")
+                        run_log.detail(logger, "📋 [五险一金组件] %s: 个人=%s, 单位=%s", component.insurance_type, component.employee_amount, component.employer_amount)
                         
                         if component.insurance_type == "HOUSING_FUND":
                             result.housing_fund_employee += component.employee_amount
@@ -131,57 +181,57 @@ class IntegratedPayrollCalculator:
                     
                     result.social_insurance_components = social_insurance_result.components
                     
-                    logger.info(f"💰 [五险一金汇总] 个人社保: {result.social_insurance_employee}, 个人公积金: {result.housing_fund_employee}")
-                    logger.info(f"💰 [五险一金汇总] 单位社保: {result.social_insurance_employer}, 单位公积金: {result.housing_fund_employer}")
-                    logger.info(f"💰 [五险一金汇总] 个人合计: {result.social_insurance_employee + result.housing_fund_employee}")
+                    run_log.detail(logger, "💰 [五险一金汇总] 个人社保: %s, 个人公积金: %s", result.social_insurance_employee, result.housing_fund_employee)
+                    run_log.detail(logger, "💰 [五险一金汇总] 单位社保: %s, 单位公积金: %s", result.social_insurance_employer, result.housing_fund_employer)
+                    run_log.detail(logger, "💰 [五险一金汇总] 个人合计: %s", result.social_insurance_employee + result.housing_fund_employee)
                     
                 except Exception as social_error:
-                    logger.warning(f"❌ [五险一金] 员工 {employee_id} 五险一金计算失败: {social_error}")
+                    run_log.failure(logger, "❌ [五险一金] 员工 %s 五险一金计算失败: %s", employee_id, social_error, event="social_insurance.failed")
                     result.calculation_details['social_insurance_error'] = str(social_error)
             else:
-                logger.info(f"⏭️ [五险一金] 跳过社保计算 (include_social_insurance={include_social_insurance}, calculation_period={calculation_period})")
+                run_log.detail(logger, "⏭️ [五险一金] 跳过社保计算 (include_social_insurance=%s, calculation_period=%s)", include_social_insurance, calculation_period)
             
             # 第二步：汇总计算
-            logger.info(f"🔄 [第二步] 开始汇总计算...")
+            run_log.detail(logger, "🔄 [第二步] 开始汇总计算...")
             
             # 2.1 计算应发合计（所有收入项之和）
-            logger.info(f"📊 [应发计算] 开始计算应发合计...")
+            run_log.detail(logger, "📊 [应发计算] 开始计算应发合计...")
             gross_pay = Decimal('0.00')
             for key, value in earnings_data.items():
                 if isinstance(value, dict) and 'amount' in value:
                     amount = Decimal(str(value['amount']))
                     gross_pay += amount
-                    logger.info(f"📈 [应发项目] {key}: {amount} (字典格式)")
+                    run_log.detail(logger, "📈 [应发项目] %s: %s (字典格式)", key, amount)
                 elif isinstance(value, (int, float, Decimal)):
                     amount = Decimal(str(value))
                     gross_pay += amount
-                    logger.info(f"📈 [应发项目] {key}: {amount} (数值格式)")
+                    run_log.detail(logger, "📈 [应发项目] %s: %s (数值格式)", key, amount)
                 else:
-                    logger.warning(f"⚠️ [应发项目] {key}: 无法识别的格式 {type(value)} = {value}")
+                    run_log.failure(logger, "⚠️ [应发项目] 员工 %s %s: 无法识别的格式 %s = %s", employee_id, key, type(value), value, event="earnings.unrecognized")
             
             result.gross_pay = gross_pay
-            logger.info(f"💚 [应发合计] 总应发: {result.gross_pay}")
+            run_log.detail(logger, "💚 [应发合计] 总应发: %s", result.gross_pay)
             
             # 2.2 计算所有个人扣缴项目（新规则：包含所有PERSONAL_DEDUCTION类型的项目）
-            logger.info(f"💰 [个人扣缴计算] 开始计算所有个人扣缴项目...")
+            run_log.detail(logger, "💰 [个人扣缴计算] 开始计算所有个人扣缴项目...")
 
             # 2.2.1 获取个人所得税
             personal_income_tax = Decimal('0.00')
             tax_data = deductions_data.get('PERSONAL_INCOME_TAX', {})
             if isinstance(tax_data, dict) and 'amount' in tax_data:
                 personal_income_tax = Decimal(str(tax_data['amount']))
-                logger.info(f"💰 [个税] 获取到个人所得税: {personal_income_tax}")
+                run_log.detail(logger, "💰 [个税] 获取到个人所得税: %s", personal_income_tax)
             elif isinstance(tax_data, (int, float, Decimal)):
                 personal_income_tax = Decimal(str(tax_data))
-                logger.info(f"💰 [个税] 获取到个人所得税: {personal_income_tax}")
+                run_log.detail(logger, "💰 [个税] 获取到个人所得税: %s", personal_income_tax)
             else:
-                logger.info(f"💰 [个税] 未找到个人所得税数据，默认为 0")
+                run_log.detail(logger, "💰 [个税] 未找到个人所得税数据，默认为 0")
 
             # 2.2.2 计算个人五险一金合计
             personal_social_insurance_total = result.social_insurance_employee + result.housing_fund_employee
-            logger.info(f"🏦 [个人社保公积金] 个人社保: {result.social_insurance_employee}")
-            logger.info(f"🏦 [个人社保公积金] 个人公积金: {result.housing_fund_employee}")
-            logger.info(f"🏦 [个人社保公积金] 个人五险一金合计: {personal_social_insurance_total}")
+            run_log.detail(logger, "🏦 [个人社保公积金] 个人社保: %s", result.social_insurance_employee)
+            run_log.detail(logger, "🏦 [个人社保公积金] 个人公积金: %s", result.housing_fund_employee)
+            run_log.detail(logger, "🏦 [个人社保公积金] 个人五险一金合计: %s", personal_social_insurance_total)
 
             # 2.2.3 计算其他个人扣缴项目（补扣、调整等）
             other_personal_deductions = Decimal('0.00')
@@ -203,36 +253,40 @@ class IntegratedPayrollCalculator:
                     amount = Decimal(str(value['amount']))
                     other_personal_deductions += amount
                     other_personal_items.append(f"{key}: {amount}")
-                    logger.info(f"📋 [其他个人扣缴] {key}: {amount} ({value.get('name', '未知项目')})")
+                    run_log.detail(logger, "📋 [其他个人扣缴] %s: %s (%s)", key, amount, value.get('name', '未知项目'))
                 elif isinstance(value, (int, float, Decimal)):
                     amount = Decimal(str(value))
                     other_personal_deductions += amount
                     other_personal_items.append(f"{key}: {amount}")
-                    logger.info(f"📋 [其他个人扣缴] {key}: {amount}")
+                    run_log.detail(logger, "📋 [其他个人扣缴] %s: %s", key, amount)
 
-            logger.info(f"📊 [其他个人扣缴] 其他个人扣缴项目合计: {other_personal_deductions}")
+            run_log.detail(logger, "📊 [其他个人扣缴] 其他个人扣缴项目合计: %s", other_personal_deductions)
             if other_personal_items:
-                logger.info(f"📋 [其他个人扣缴明细] {', '.join(other_personal_items)}")
+                run_log.detail(logger, "📋 [其他个人扣缴明细] %s", other_personal_items)
 
             # 2.3 计算扣发合计（新规则：个人五险一金 + 个税 + 其他个人扣缴）
-            logger.info(f"📊 [扣发计算] 开始计算扣发合计（新规则）...")
+            run_log.detail(logger, "📊 [扣发计算] 开始计算扣发合计（新规则）...")
             result.total_deductions = personal_income_tax + personal_social_insurance_total + other_personal_deductions
-            logger.info(f"📉 [扣发合计] 个税({personal_income_tax}) + 个人五险一金({personal_social_insurance_total}) + 其他个人扣缴({other_personal_deductions}) = {result.total_deductions}")
+            run_log.detail(logger, "📉 [扣发合计] 个税(%s) + 个人五险一金(%s) + 其他个人扣缴(%s) = %s", personal_income_tax, personal_social_insurance_total, other_personal_deductions, result.total_deductions)
 
             # 2.4 计算实发合计
-            logger.info(f"📊 [实发计算] 开始计算实发合计...")
+            run_log.detail(logger, "📊 [实发计算] 开始计算实发合计...")
             result.net_pay = result.gross_pay - result.total_deductions
-            logger.info(f"💰 [实发合计] 应发({result.gross_pay}) - 扣发({result.total_deductions}) = {result.net_pay}")
+            run_log.detail(logger, "💰 [实发合计] 应发(%s) - 扣发(%s) = %s", result.gross_pay, result.total_deductions, result.net_pay)
 
             # 检查实发是否为负数
             if result.net_pay < 0:
-                logger.error(f"🚨 [异常检测] 实发为负数! 应发={result.gross_pay}, 扣发={result.total_deductions}, 实发={result.net_pay}")
-                logger.error(f"🚨 [扣发明细] 个税={personal_income_tax}, 个人五险一金={personal_social_insurance_total}, 其他个人扣缴={other_personal_deductions}")
+                run_log.failure(
+                    logger, "🚨 [异常检测] 员工 %s 实发为负数! 应发=%s, 扣发=%s, 实发=%s（个税=%s, 个人五险一金=%s, 其他个人扣缴=%s）",
+                    employee_id, result.gross_pay, result.total_deductions, result.net_pay,
+                    personal_income_tax, personal_social_insurance_total, other_personal_deductions,
+                    event="payroll.negative_net_pay"
+                )
             
             # 2.5 单位成本合计在汇总信息中体现（应发 + 单位五险一金）
             employer_social_insurance_total = result.social_insurance_employer + result.housing_fund_employer
-            logger.info(f"🏢 [单位成本] 单位五险一金合计: {employer_social_insurance_total}")
-            logger.info(f"🏢 [单位成本] 单位总成本: {result.gross_pay + employer_social_insurance_total}")
+            run_log.detail(logger, "🏢 [单位成本] 单位五险一金合计: %s", employer_social_insurance_total)
+            run_log.detail(logger, "🏢 [单位成本] 单位总成本: %s", result.gross_pay + employer_social_insurance_total)
             
             # 第三步：更新扣除详情中的社保公积金金额（应用进位规则后的金额）
             # 🎯 新规则：保存个人和单位扣缴项目到详情中，但只有个人部分计入扣发合计
@@ -275,22 +329,21 @@ class IntegratedPayrollCalculator:
             result.updated_deductions_details = updated_deductions_details
             
             # 🔍 调试日志：记录更新的扣除详情
-            logger.info(f"🔍 [扣除详情更新] 员工 {employee_id} 保存了 {len(updated_deductions_details)} 个扣缴项目到详情中")
+            run_log.detail(logger, "🔍 [扣除详情更新] 员工 %s 保存了 %s 个扣缴项目到详情中", employee_id, len(updated_deductions_details))
             
             # 统计个人和单位扣缴项目数量
             personal_items = [k for k, v in updated_deductions_details.items() if v.get('type') == 'PERSONAL_DEDUCTION']
             employer_items = [k for k, v in updated_deductions_details.items() if v.get('type') == 'EMPLOYER_DEDUCTION']
             
-            logger.info(f"📋 [扣缴项目统计] 个人扣缴: {len(personal_items)} 项, 单位扣缴: {len(employer_items)} 项")
-            logger.info(f"📋 [个人扣缴项目] {personal_items}")
-            logger.info(f"📋 [单位扣缴项目] {employer_items}")
+            run_log.detail(logger, "📋 [扣缴项目统计] 个人扣缴: %s 项, 单位扣缴: %s 项", len(personal_items), len(employer_items))
+            run_log.detail(logger, "📋 [个人扣缴项目] %s", personal_items)
+            run_log.detail(logger, "📋 [单位扣缴项目] %s", employer_items)
             
             if 'HOUSING_FUND_PERSONAL' in updated_deductions_details:
-                logger.info(f"🏠 [住房公积金详情] 员工 {employee_id} 个人公积金: {updated_deductions_details['HOUSING_FUND_PERSONAL']}")
+                run_log.detail(logger, "🏠 [住房公积金详情] 员工 %s 个人公积金: %s", employee_id, updated_deductions_details['HOUSING_FUND_PERSONAL'])
             if 'HOUSING_FUND_EMPLOYER' in updated_deductions_details:
-                logger.info(f"🏢 [住房公积金详情] 员工 {employee_id} 单位公积金: {updated_deductions_details['HOUSING_FUND_EMPLOYER']}")
-                
-            logger.info(f"⚠️ [重要说明] 扣发合计包含所有个人扣缴项目（五险一金+个税+其他扣缴），单位扣缴项目仅保存在详情中供查看")
+                run_log.detail(logger, "🏢 [住房公积金详情] 员工 %s 单位公积金: %s", employee_id, updated_deductions_details['HOUSING_FUND_EMPLOYER'])
+
             
             # 第四步：构建详细计算信息
             result.calculation_details.update({
@@ -309,14 +362,15 @@ class IntegratedPayrollCalculator:
                 'net_pay': float(result.net_pay),
                 'total_employer_cost': float(result.gross_pay + employer_social_insurance_total),
                 'calculation_time': datetime.now().isoformat(),
-                'engine_version': 'integrated_v2.4_all_personal_deductions'  # 🎯 更新版本号：包含所有个人扣缴项目
+                'engine_version': ENGINE_VERSION  # 🎯 更新版本号：包含所有个人扣缴项目
             })
             
-            logger.info(f"✅ [集成计算完成] 员工 {employee_id} - 应发: {result.gross_pay}, 扣发: {result.total_deductions}, 实发: {result.net_pay}")
+            run_log.count("payroll.calculated")
+            run_log.detail(logger, "✅ [集成计算完成] 员工 %s - 应发: %s, 扣发: %s, 实发: %s", employee_id, result.gross_pay, result.total_deductions, result.net_pay)
             return result
             
         except Exception as e:
-            logger.error(f"❌ [集成计算失败] 员工 {employee_id} 集成计算失败: {str(e)}")
+            run_log.failure(logger, "❌ [集成计算失败] 员工 %s 集成计算失败: %s", employee_id, e, event="payroll.failed")
             # 返回错误结果
             error_result = IntegratedCalculationResult(
                 employee_id=employee_id,
@@ -335,35 +389,48 @@ class IntegratedPayrollCalculator:
         self,
         payroll_entries: List[PayrollEntry],
         calculation_period: Optional[date] = None,
-        include_social_insurance: bool = True
+        include_social_insurance: bool = True,
+        preload: bool = True,
+        batch_data: Optional[SocialInsuranceBatchData] = None
     ) -> List[IntegratedCalculationResult]:
         """
         批量计算薪资
         
+        默认先用少量批量查询预加载整个批次的员工信息、缴费基数和费率表，
+        再在内存中逐个计算，结果与逐个调用 calculate_employee_payroll 一致。
+        
         Args:
             payroll_entries: 薪资条目列表
             calculation_period: 计算期间
             include_social_insurance: 是否包含社保计算
+            preload: 是否批量预加载计算数据（False 时逐个员工查询数据库）
+            batch_data: 调用方已预加载的计算数据（提供时不再重复加载）
             
         Returns:
-            List[IntegratedCalculationResult]: 计算结果列表
+            List[IntegratedCalculationResult]: 计算结果列表，顺序与 payroll_entries 一致
         """
         results = []
         
+        if batch_data is None and preload:
+            batch_data = self._load_batch_data(payroll_entries, calculation_period, include_social_insurance)
+        
         for entry in payroll_entries:
             try:
-                result = self.calculate_employee_payroll(
-                    employee_id=entry.employee_id,
-                    payroll_run_id=entry.payroll_run_id,
-                    earnings_data=entry.earnings_details or {},
-                    deductions_data=entry.deductions_details or {},
-                    calculation_period=calculation_period,
-                    include_social_insurance=include_social_insurance
-                )
+                if batch_data is not None:
+                    result = self._calculate_preloaded(entry, calculation_period, batch_data)
+                else:
+                    result = self.calculate_employee_payroll(
+                        employee_id=entry.employee_id,
+                        payroll_run_id=entry.payroll_run_id,
+                        earnings_data=entry.earnings_details or {},
+                        deductions_data=entry.deductions_details or {},
+                        calculation_period=calculation_period,
+                        include_social_insurance=include_social_insurance
+                    )
                 results.append(result)
                 
             except Exception as e:
-                logger.error(f"批量计算中员工 {entry.employee_id} 失败: {str(e)}")
+                run_log.failure(logger, "批量计算中员工 %s 失败: %s", entry.employee_id, e, event="payroll.failed")
                 error_result = IntegratedCalculationResult(
                     employee_id=entry.employee_id,
                     payroll_run_id=entry.payroll_run_id,
@@ -375,6 +442,358 @@ class IntegratedPayrollCalculator:
         
         return results
     
+    def _load_batch_data(
+        self,
+        payroll_entries: List[PayrollEntry],
+        calculation_period: Optional[date],
+        include_social_insurance: bool
+    ) -> Optional[SocialInsuranceBatchData]:
+        """预加载批次的五险一金计算数据，失败或不需要时返回 None"""
+        if not (include_social_insurance and calculation_period and payroll_entries):
+            return None
+        try:
+            return self.social_insurance_calculator.load_batch_data(
+                [entry.employee_id for entry in payroll_entries],
+                calculation_period
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ [批量计算] 预加载计算数据失败，回退到逐个员工计算: {str(e)}")
+            return None
+    
+    def recalculate_payroll_entries(
+        self,
+        payroll_entries: List[PayrollEntry],
+        calculation_period: Optional[date],
+        include_social_insurance: bool = True,
+        recalculate_all: bool = True
+    ) -> Tuple[List[IntegratedCalculationResult], int, int]:
+        """
+        重新计算薪资条目并批量写回（清除旧五险一金数据 -> 批量计算 -> 批量UPDATE）
+        
+        每个成功计算的条目都会保存输入指纹（收入、非五险一金扣除、员工身份、缴费基数、费率配置版本等）。
+        recalculate_all=False 时，输入指纹与已保存指纹一致的条目直接跳过，其结果由已保存的数据还原。
+        调用方负责提交事务。明细日志在运行日志范围内汇总（见 run_log），结束时输出一条汇总。
+        
+        Args:
+            payroll_entries: 薪资条目列表
+            calculation_period: 计算期间
+            include_social_insurance: 是否包含社保计算
+            recalculate_all: 是否强制重新计算全部条目
+            
+        Returns:
+            Tuple: (计算结果列表（顺序与 payroll_entries 一致）, 成功条目数（含跳过）, 跳过的条目数)
+        """
+        # 计算过程中的明细日志按运行汇总（并行计算的分块并入协调进程的汇总）
+        payroll_run_id = payroll_entries[0].payroll_run_id if payroll_entries else None
+        with run_log.run_log_scope("薪资计算", payroll_run_id):
+            fields_to_clear = self.get_social_insurance_fields_to_clear()
+            batch_data = self._load_batch_data(payroll_entries, calculation_period, include_social_insurance)
+        
+            # 需要社保数据却未能预加载时无法得到完整指纹，全部重新计算且不保存指纹
+            fingerprints: Dict[int, str] = {}
+            if batch_data is not None or not include_social_insurance:
+                fingerprints = {
+                    entry.id: self.compute_input_fingerprint(
+                        entry, calculation_period, include_social_insurance, batch_data, fields_to_clear
+                    )
+                    for entry in payroll_entries
+                }
+        
+            skipped_ids = set()
+            if not recalculate_all:
+                skipped_ids = {
+                    entry.id for entry in payroll_entries
+                    if entry.input_fingerprint
+                    and entry.input_fingerprint == fingerprints.get(entry.id)
+                    and self._saved_result_is_current(entry)
+                }
+            to_calculate = [entry for entry in payroll_entries if entry.id not in skipped_ids]
+        
+            if skipped_ids:
+                run_log.count("entries.skipped", len(skipped_ids))
+                logger.info(f"⏭️ [增量计算] {len(skipped_ids)} 条条目输入未变化，跳过；重新计算 {len(to_calculate)} 条")
+        
+            self.clear_social_insurance_fields(to_calculate, fields_to_clear)
+            calculated = self.batch_calculate_payroll(
+                payroll_entries=to_calculate,
+                calculation_period=calculation_period,
+                include_social_insurance=include_social_insurance,
+                preload=False,
+                batch_data=batch_data
+            )
+            success_count = self.bulk_update_payroll_entries(to_calculate, calculated, fingerprints)
+        
+            calculated_by_id = {entry.id: result for entry, result in zip(to_calculate, calculated)}
+            results = [
+                calculated_by_id[entry.id] if entry.id in calculated_by_id
+                else self._result_from_saved_entry(entry, calculation_period)
+                for entry in payroll_entries
+            ]
+            return results, success_count + len(skipped_ids), len(skipped_ids)
+    
+    def compute_input_fingerprint(
+        self,
+        entry: PayrollEntry,
+        calculation_period: Optional[date],
+        include_social_insurance: bool,
+        batch_data: Optional[SocialInsuranceBatchData],
+        fields_to_clear: Set[str]
+    ) -> str:
+        """
+        计算薪资条目的输入指纹（SHA-256）
+        
+        扣除详情中由本引擎写入的五险一金字段属于计算输出，不参与指纹计算，
+        因此条目计算后立即重新计算得到的指纹不变。
+        """
+        deductions = {
+            key: value for key, value in (entry.deductions_details or {}).items()
+            if not self._is_social_insurance_output(key, fields_to_clear)
+        }
+        payload = {
+            'engine_version': ENGINE_VERSION,
+            'calculation_period': calculation_period.isoformat() if calculation_period else None,
+            'include_social_insurance': include_social_insurance,
+            'earnings': entry.earnings_details or {},
+            'deductions': deductions,
+        }
+        if batch_data is not None:
+            employee_info = batch_data.employee_infos.get(entry.employee_id) or {}
+            payload.update({
+                'personnel_category_id': employee_info.get('personnel_category_id'),
+                'personnel_category_name': employee_info.get('personnel_category_name'),
+                'base_amounts': batch_data.base_amounts.get(entry.employee_id),
+                'rate_version': batch_data.rate_table.version,
+            })
+        serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    
+    def _is_social_insurance_output(self, key: str, fields_to_clear: Set[str]) -> bool:
+        if key in fields_to_clear:
+            return True
+        if key in PROTECTED_DEDUCTION_FIELDS:
+            return False
+        upper_key = key.upper()
+        return upper_key.endswith(SOCIAL_INSURANCE_OUTPUT_SUFFIXES) and any(
+            keyword in upper_key for keyword in SOCIAL_INSURANCE_CODE_KEYWORDS
+        )
+    
+    def _saved_result_is_current(self, entry: PayrollEntry) -> bool:
+        """已保存的金额仍是本引擎的计算结果（未被其他途径修改过应发、扣发、实发）"""
+        calculation_log = entry.calculation_log or {}
+        if calculation_log.get('engine_version') != ENGINE_VERSION:
+            return False
+        try:
+            # 计算日志中保存的是浮点数，按分比较
+            return all(
+                abs(Decimal(str(calculation_log.get(field))) - Decimal(str(getattr(entry, field)))) < Decimal('0.005')
+                for field in ('gross_pay', 'total_deductions', 'net_pay')
+            )
+        except ArithmeticError:
+            return False
+    
+    def _result_from_saved_entry(
+        self,
+        entry: PayrollEntry,
+        calculation_period: Optional[date]
+    ) -> IntegratedCalculationResult:
+        """由跳过的条目已保存的金额和计算日志还原计算结果（用于汇总）"""
+        calculation_log = entry.calculation_log or {}
+        return IntegratedCalculationResult(
+            employee_id=entry.employee_id,
+            payroll_run_id=entry.payroll_run_id,
+            calculation_period=calculation_period or date.today(),
+            gross_pay=Decimal(str(entry.gross_pay or 0)),
+            total_deductions=Decimal(str(entry.total_deductions or 0)),
+            net_pay=Decimal(str(entry.net_pay or 0)),
+            social_insurance_employee=Decimal(str(calculation_log.get('social_insurance_employee', 0))),
+            social_insurance_employer=Decimal(str(calculation_log.get('social_insurance_employer', 0))),
+            housing_fund_employee=Decimal(str(calculation_log.get('housing_fund_employee', 0))),
+            housing_fund_employer=Decimal(str(calculation_log.get('housing_fund_employer', 0))),
+            calculation_details={**calculation_log, 'skipped_unchanged': True}
+        )
+    
+    def _calculate_preloaded(
+        self,
+        entry: PayrollEntry,
+        calculation_period: date,
+        batch_data: SocialInsuranceBatchData
+    ) -> IntegratedCalculationResult:
+        """使用预加载数据计算单个薪资条目"""
+        return self._calculate_employee_payroll(
+            employee_id=entry.employee_id,
+            payroll_run_id=entry.payroll_run_id,
+            earnings_data=entry.earnings_details or {},
+            deductions_data=entry.deductions_details or {},
+            calculation_period=calculation_period,
+            include_social_insurance=True,
+            calculate_social_insurance=lambda: self.social_insurance_calculator.calculate_employee_social_insurance_preloaded(
+                entry.employee_id,
+                batch_data
+            )
+        )
+    
+    def bulk_update_payroll_entries(
+        self,
+        payroll_entries: List[PayrollEntry],
+        results: List[IntegratedCalculationResult],
+        fingerprints: Optional[Dict[int, str]] = None
+    ) -> int:
+        """
+        将批量计算结果通过批量UPDATE写回薪资条目
+        
+        成功条目写回应发、扣发、实发、计算日志以及合并了五险一金金额的扣除详情；
+        失败条目只写回当前内存中的扣除详情（保持与逐条更新时相同的持久化效果）。
+        条目写回后会从会话中移除，避免提交时再逐行生成UPDATE。调用方负责提交事务。
+        
+        Args:
+            payroll_entries: 薪资条目列表
+            results: batch_calculate_payroll 返回的结果列表（顺序一致）
+            fingerprints: 条目ID -> 输入指纹，成功条目保存指纹，失败条目清除指纹
+            
+        Returns:
+            int: 成功写回计算结果的条目数
+        """
+        mappings = []
+        success_count = 0
+        
+        for entry, result in zip(payroll_entries, results):
+            deductions_details = dict(entry.deductions_details or {})
+            mapping = {'id': entry.id}
+            
+            if result.status == CalculationStatus.COMPLETED:
+                updated_deductions_details = getattr(result, 'updated_deductions_details', None)
+                if updated_deductions_details:
+                    deductions_details.update(updated_deductions_details)
+                mapping.update({
+                    'gross_pay': result.gross_pay,
+                    'total_deductions': result.total_deductions,
+                    'net_pay': result.net_pay,
+                    'calculation_log': result.calculation_details
+                })
+                success_count += 1
+            
+            if fingerprints is not None:
+                # 五险一金计算出错的条目不保存指纹，下次增量计算时会重新计算
+                fully_calculated = (
+                    result.status == CalculationStatus.COMPLETED
+                    and 'social_insurance_error' not in (result.calculation_details or {})
+                )
+                mapping['input_fingerprint'] = fingerprints.get(entry.id) if fully_calculated else None
+            
+            mapping['deductions_details'] = deductions_details
+            mappings.append(mapping)
+        
+        for entry in payroll_entries:
+            if entry in self.db:
+                self.db.expunge(entry)
+        
+        if mappings:
+            self.db.bulk_update_mappings(PayrollEntry, mappings)
+        
+        logger.info(f"💾 [批量写回] 写回 {len(mappings)} 条薪资条目，其中计算成功 {success_count} 条")
+        return success_count
+    
+    def get_social_insurance_fields_to_clear(self) -> Set[str]:
+        """从薪资组件定义中获取重新计算前需要清除的五险一金扣缴项目代码"""
+        deduction_components = get_component_registry(self.db).of_type('PERSONAL_DEDUCTION', 'EMPLOYER_DEDUCTION')
+        
+        fields_to_clear = set()
+        for component in deduction_components:
+            # ✅ 明确保护个税等重要扣除项目
+            if component.code in PROTECTED_DEDUCTION_FIELDS:
+                logger.info(f"🛡️ [保护字段] {component.code} - 保留重要扣除项目，不清理")
+                continue
+            
+            # 🎯 只清除五险一金相关项目
+            if any(keyword in component.code.upper() for keyword in SOCIAL_INSURANCE_CODE_KEYWORDS):
+                fields_to_clear.add(component.code)
+        
+        logger.info(f"🔍 [动态字段获取] 从数据库获取到 {len(fields_to_clear)} 个五险一金扣缴项目")
+        return fields_to_clear
+    
+    def clear_social_insurance_fields(
+        self,
+        payroll_entries: List[PayrollEntry],
+        fields_to_clear: Optional[Set[str]] = None
+    ) -> int:
+        """
+        清除薪资条目扣除详情中的旧五险一金数据（重新计算前调用）
+        
+        Args:
+            payroll_entries: 薪资条目列表
+            fields_to_clear: 需要清除的项目代码，为空时从组件定义中获取
+            
+        Returns:
+            int: 被清除了数据的条目数
+        """
+        logger.info(f"🧹 [清除旧数据] 开始清除 {len(payroll_entries)} 条薪资记录中的旧五险一金数据")
+        
+        if fields_to_clear is None:
+            fields_to_clear = self.get_social_insurance_fields_to_clear()
+        
+        cleared_count = 0
+        for entry in payroll_entries:
+            if not entry.deductions_details:
+                continue
+            
+            # 创建新的扣除详情，只保留非五险一金项目
+            cleaned_deductions = {}
+            removed_fields = []
+            removed_amount = 0
+            
+            for key, value in entry.deductions_details.items():
+                if key in fields_to_clear:
+                    removed_fields.append(key)
+                    # 🔍 计算被移除字段的金额
+                    if isinstance(value, dict) and 'amount' in value:
+                        removed_amount += value.get('amount', 0)
+                else:
+                    cleaned_deductions[key] = value
+            
+            if removed_fields:
+                entry.deductions_details = cleaned_deductions
+                # 标记JSONB字段已修改
+                flag_modified(entry, 'deductions_details')
+                cleared_count += 1
+                
+                run_log.detail(logger, "🗑️ [清除] 员工 %s: 移除了 %s 个五险一金字段 %s，总金额 %s", entry.employee_id, len(removed_fields), removed_fields, removed_amount)
+        
+        logger.info(f"✅ [清除完成] 成功清除 {cleared_count} 条记录中的旧五险一金数据")
+        return cleared_count
+    
+    def get_failed_result_details(
+        self,
+        results: List[IntegratedCalculationResult]
+    ) -> List[Dict[str, Any]]:
+        """
+        获取计算失败条目的错误明细（员工姓名一次查询获取）
+        
+        Args:
+            results: 计算结果列表
+            
+        Returns:
+            List[Dict]: 包含 employee_id、employee_name、error_message 的错误列表
+        """
+        failed_results = [r for r in results if r.status != CalculationStatus.COMPLETED]
+        if not failed_results:
+            return []
+        
+        employee_names = {
+            employee.id: f"{employee.first_name}{employee.last_name}"
+            for employee in self.db.query(Employee).filter(
+                Employee.id.in_([r.employee_id for r in failed_results])
+            ).all()
+        }
+        
+        return [
+            {
+                "employee_id": r.employee_id,
+                "employee_name": employee_names.get(r.employee_id, f"员工ID:{r.employee_id}"),
+                "error_message": r.error_message or "计算失败"
+            }
+            for r in failed_results
+        ]
+    
     def update_payroll_entry_with_social_insurance(
         self,
         entry: PayrollEntry,
@@ -480,7 +899,7 @@ class IntegratedPayrollCalculator:
             }
             
         except Exception as e:
-            logger.error(f"为薪资条目 {entry.id} 添加社保计算失败: {str(e)}")
+            run_log.failure(logger, "为薪资条目 %s 添加社保计算失败: %s", entry.id, e, event="social_insurance.failed")
             return {
                 'error': str(e),
                 'social_insurance_added': False
@@ -558,7 +977,7 @@ class IntegratedPayrollCalculator:
             },
             'calculation_metadata': {
                 'calculation_date': datetime.now().isoformat(),
-                'engine_version': 'integrated_v2.4_all_personal_deductions',
+                'engine_version': ENGINE_VERSION,
                 'calculation_order': '扣发合计=个人五险一金+个税+其他个人扣缴，详情包含单位扣缴项目'
             }
         } 
\ No newline at end of file
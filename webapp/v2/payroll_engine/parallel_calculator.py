@@ -0,0 +1,277 @@
+"""
+多进程并行薪资计算
+
+将一次薪资运行的条目按员工分块，分发到进程池中计算。每个工作进程使用独立的数据库会话，
+按块批量预加载计算数据、在内存中计算并批量写回（见 IntegratedPayrollCalculator.batch_calculate_payroll）。
+每个分块独立提交事务，失败的分块会自动重试，重试后仍失败的分块在结果中返回，可按员工重新提交。
+分块之间可以检查取消请求，取消后尚未开始的分块不再执行，已提交的分块保持有效。
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from datetime import date
+from typing import Callable, Dict, List, Optional, Any
+import multiprocessing
+import logging
+import os
+
+from .integrated_calculator import IntegratedPayrollCalculator, IntegratedCalculationResult
+from . import run_log
+
+logger = logging.getLogger(__name__)
+
+# 每个分块包含的薪资条目数
+DEFAULT_CHUNK_SIZE = 200
+
+# 分块失败后的最大重试次数
+DEFAULT_MAX_RETRIES = 2
+
+
+@dataclass
+class ChunkOutcome:
+    """单个分块的计算结果"""
+    chunk_index: int
+    entry_ids: List[int]
+    success_count: int = 0
+    skipped_count: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    results: List[IntegratedCalculationResult] = field(default_factory=list)
+    log_stats: Dict[str, Any] = field(default_factory=dict)  # 工作进程中的日志汇总（见 run_log）
+
+
+@dataclass
+class FailedChunk:
+    """重试后仍失败的分块"""
+    chunk_index: int
+    entry_ids: List[int]
+    employee_ids: List[int]
+    error_message: str
+    attempts: int
+
+
+def calculate_payroll_chunk(
+    chunk_index: int,
+    entry_ids: List[int],
+    calculation_period: Optional[date],
+    include_social_insurance: bool,
+    recalculate_all: bool = True
+) -> ChunkOutcome:
+    """
+    计算一个分块的薪资条目（在工作进程中执行）
+
+    使用独立的数据库会话：清除旧五险一金数据、批量计算、批量写回并提交。
+    recalculate_all=False 时跳过输入指纹未变化的条目。
+    在工作进程中执行时不单独输出日志汇总，汇总数据随结果回传给协调进程合并。
+    """
+    from ..database import SessionLocalV2
+    from ..models import PayrollEntry
+
+    db = SessionLocalV2()
+    try:
+        entries = db.query(PayrollEntry).filter(
+            PayrollEntry.id.in_(entry_ids)
+        ).order_by(PayrollEntry.id).all()
+
+        in_coordinator = run_log.current_run_log() is not None
+        payroll_run_id = entries[0].payroll_run_id if entries else None
+        with run_log.run_log_scope("并行计算分块", payroll_run_id, summarize=False) as chunk_log:
+            calculator = IntegratedPayrollCalculator(db)
+            results, success_count, skipped_count = calculator.recalculate_payroll_entries(
+                entries,
+                calculation_period=calculation_period,
+                include_social_insurance=include_social_insurance,
+                recalculate_all=recalculate_all
+            )
+            errors = calculator.get_failed_result_details(results)
+            db.commit()
+        # 在协调进程中执行（单进程）时已直接计入协调进程的汇总
+        log_stats = {} if in_coordinator else chunk_log.snapshot()
+
+        # 只回传汇总所需的金额字段，避免跨进程传输组件明细
+        light_results = [
+            replace(r, earnings_components=[], deduction_components=[], social_insurance_components=[], calculation_details={})
+            for r in results
+        ]
+        return ChunkOutcome(
+            chunk_index=chunk_index,
+            entry_ids=entry_ids,
+            success_count=success_count,
+            skipped_count=skipped_count,
+            errors=errors,
+            results=light_results,
+            log_stats=log_stats
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _init_worker() -> None:
+    """工作进程初始化：丢弃可能继承自父进程的连接池"""
+    from ..database import engine_v2
+    engine_v2.dispose(close=False)
+
+
+class ParallelPayrollCalculator:
+    """多进程并行薪资计算协调器"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        recalculate_all: bool = True
+    ):
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.recalculate_all = recalculate_all
+        self.chunk_size = max(1, chunk_size)
+        self.max_retries = max(0, max_retries)
+
+    def split_chunks(self, entry_ids: List[int]) -> List[List[int]]:
+        """将条目ID按 chunk_size 切分"""
+        return [entry_ids[i:i + self.chunk_size] for i in range(0, len(entry_ids), self.chunk_size)]
+
+    def run(
+        self,
+        payroll_run_id: int,
+        entry_ids: List[int],
+        employee_ids_by_entry: Dict[int, int],
+        calculation_period: Optional[date],
+        include_social_insurance: bool = True,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        on_chunk_done: Optional[Callable[[ChunkOutcome], None]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        并行计算薪资运行中的指定条目
+
+        Args:
+            payroll_run_id: 薪资运行ID
+            entry_ids: 薪资条目ID列表
+            employee_ids_by_entry: 条目ID -> 员工ID 映射（用于失败分块的重试提示）
+            calculation_period: 计算期间
+            include_social_insurance: 是否包含社保计算
+            progress_callback: 进度回调 (已处理条目数, 总条目数, 阶段描述)，每完成一个分块调用一次
+            on_chunk_done: 分块提交成功后的回调（用于记录已完成条目，支持续算）
+            should_cancel: 每完成一个分块后调用，返回 True 时停止执行剩余分块
+
+        Returns:
+            Dict: 成功/失败数量、错误明细、失败分块、是否已取消和汇总信息
+        """
+        chunks = self.split_chunks(entry_ids)
+        total = len(entry_ids)
+        workers = min(self.max_workers, len(chunks)) if chunks else 1
+
+        # 各分块的明细日志在协调进程中合并，整个运行只输出一条汇总
+        with run_log.run_log_scope("并行计算", payroll_run_id) as coordinator_log:
+
+            logger.info(
+                f"🚀 [并行计算] 薪资运行 {payroll_run_id}: {total} 条条目, "
+                f"{len(chunks)} 个分块, {workers} 个工作进程"
+            )
+
+            outcomes: Dict[int, ChunkOutcome] = {}
+            pending = list(enumerate(chunks))
+            last_errors: Dict[int, str] = {}
+            attempts = 0
+            cancelled = False
+
+            while pending and attempts <= self.max_retries and not cancelled:
+                attempts += 1
+                if attempts > 1:
+                    logger.warning(f"🔁 [并行计算] 第 {attempts - 1} 次重试 {len(pending)} 个失败分块")
+
+                failed = []
+                remaining = dict(pending)
+                execution = self._execute(pending, workers, calculation_period, include_social_insurance)
+                for chunk_index, chunk_ids, outcome, error in execution:
+                    remaining.pop(chunk_index, None)
+                    if outcome is not None:
+                        outcomes[chunk_index] = outcome
+                        last_errors.pop(chunk_index, None)
+                        coordinator_log.merge(outcome.log_stats)
+                        if on_chunk_done:
+                            on_chunk_done(outcome)
+                        if progress_callback:
+                            processed = sum(len(o.entry_ids) for o in outcomes.values())
+                            progress_callback(processed, total, f"已完成 {len(outcomes)}/{len(chunks)} 个分块")
+                    else:
+                        logger.error(f"❌ [并行计算] 分块 {chunk_index} 计算失败: {error}")
+                        last_errors[chunk_index] = error
+                        failed.append((chunk_index, chunk_ids))
+
+                    if should_cancel and should_cancel():
+                        # 关闭生成器会取消尚未开始的分块，未执行的分块保留在 pending 中
+                        execution.close()
+                        cancelled = True
+                        failed.extend(remaining.items())
+                        logger.warning(f"🛑 [并行计算] 薪资运行 {payroll_run_id} 已取消，剩余 {len(failed)} 个分块未完成")
+                        break
+                pending = failed
+
+            failed_chunks = [
+                FailedChunk(
+                    chunk_index=chunk_index,
+                    entry_ids=chunk_ids,
+                    employee_ids=[employee_ids_by_entry[i] for i in chunk_ids if i in employee_ids_by_entry],
+                    error_message=last_errors.get(chunk_index, "已取消" if cancelled else ""),
+                    attempts=attempts
+                )
+                for chunk_index, chunk_ids in pending
+            ]
+
+            ordered = [outcomes[i] for i in sorted(outcomes)]
+            results = [r for o in ordered for r in o.results]
+            errors = [e for o in ordered for e in o.errors]
+            success_count = sum(o.success_count for o in ordered)
+            skipped_count = sum(o.skipped_count for o in ordered)
+
+        return {
+            "payroll_run_id": payroll_run_id,
+            "cancelled": cancelled,
+            "total_processed": total,
+            "success_count": success_count,
+            "skipped_count": skipped_count,
+            "error_count": len(errors) + sum(len(c.entry_ids) for c in failed_chunks),
+            "errors": errors,
+            "failed_chunks": [c.__dict__ for c in failed_chunks],
+            "results": results,
+        }
+
+    def _execute(self, pending, workers, calculation_period, include_social_insurance):
+        """执行一轮分块计算，逐个产出 (分块序号, 条目ID, 结果, 错误信息)"""
+        if workers <= 1:
+            # 单进程时直接在当前进程中执行，省去进程池开销
+            for chunk_index, chunk_ids in pending:
+                try:
+                    yield chunk_index, chunk_ids, calculate_payroll_chunk(
+                        chunk_index, chunk_ids, calculation_period, include_social_insurance, self.recalculate_all
+                    ), None
+                except Exception as e:
+                    yield chunk_index, chunk_ids, None, str(e)
+            return
+
+        # 使用 spawn 启动工作进程，避免在多线程的服务进程中 fork
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+        try:
+            futures = {
+                executor.submit(
+                    calculate_payroll_chunk, chunk_index, chunk_ids, calculation_period,
+                    include_social_insurance, self.recalculate_all
+                ): (chunk_index, chunk_ids)
+                for chunk_index, chunk_ids in pending
+            }
+            for future in as_completed(futures):
+                chunk_index, chunk_ids = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield chunk_index, chunk_ids, None, str(e)
+                else:
+                    yield chunk_index, chunk_ids, result, None
+        finally:
+            # 提前关闭（取消）时丢弃尚未开始的分块，等待正在执行的分块提交完成
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,174 @@
+"""
+社保费率表缓存
+
+费率表只取决于计算期间和社保配置本身，因此按 (计算期间, 配置版本) 缓存，
+在所有 SocialInsuranceCalculator 实例之间共享。
+
+配置版本由 payroll.social_insurance_configs 的行数、最大ID和最近修改时间组成，
+最多每 VERSION_CHECK_INTERVAL_SECONDS 秒向数据库确认一次，从而感知其他进程的修改；
+本进程内通过配置路由修改社保配置时调用 invalidate_social_insurance_rate_cache 立即失效。
+"""
+
+from collections import OrderedDict
+from decimal import Decimal
+from datetime import date
+from typing import Dict, List, Optional, Any, Tuple, Callable
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 配置版本向数据库确认的最小间隔（秒）
+VERSION_CHECK_INTERVAL_SECONDS = 30
+
+# 最多缓存的计算期间数量
+MAX_CACHED_PERIODS = 24
+
+
+class SocialInsuranceRateTable:
+    """
+    某一计算期间的社保费率表
+
+    保留原始顺序的 rates_list，并按 (险种, 配置名称) 预先建立索引，
+    匹配时只需检查同一配置名称下的候选规则。
+    """
+
+    def __init__(self, calculation_period: date, rates_list: List[Dict[str, Any]], version: Optional[Tuple] = None):
+        self.calculation_period = calculation_period
+        self.rates_list = rates_list
+        self.version = version  # 加载时的社保配置版本
+        self._by_type: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_type_and_config: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+
+        for rate_config in rates_list:
+            insurance_type = rate_config["insurance_type"]
+            self._by_type.setdefault(insurance_type, []).append(rate_config)
+            self._by_type_and_config.setdefault(
+                (insurance_type, rate_config["config_name"]), []
+            ).append(rate_config)
+
+    def __len__(self) -> int:
+        return len(self.rates_list)
+
+    def rates_for_type(self, insurance_type: str) -> List[Dict[str, Any]]:
+        """获取指定险种的全部规则（保持原始顺序）"""
+        return self._by_type.get(insurance_type, [])
+
+    def find_rate(
+        self,
+        insurance_type: str,
+        personnel_category_name: Optional[str],
+        personnel_category_id: Optional[int]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查找适用规则：配置名称等于人员身份，且人员身份ID在适用人员类别中（或未限制类别）。
+
+        与按 rates_list 顺序线性扫描的结果一致。
+        """
+        for rate_config in self._by_type_and_config.get((insurance_type, personnel_category_name), []):
+            applicable_categories = rate_config["applicable_personnel_categories"]
+            if applicable_categories is None or (
+                personnel_category_id is not None and personnel_category_id in applicable_categories
+            ):
+                return rate_config
+        return None
+
+
+class SocialInsuranceRateCache:
+    """进程内共享的社保费率表缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: "OrderedDict[Tuple[date, Tuple], SocialInsuranceRateTable]" = OrderedDict()
+        self._version: Optional[Tuple] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get_rate_table(
+        self,
+        db: Session,
+        calculation_period: date,
+        loader: Callable[[date], List[Dict[str, Any]]]
+    ) -> SocialInsuranceRateTable:
+        """
+        获取计算期间的费率表，未命中时通过 loader 从数据库加载
+
+        Args:
+            db: 数据库会话（用于确认配置版本）
+            calculation_period: 计算期间
+            loader: 加载 rates_list 的函数
+        """
+        version = self._current_version(db)
+        key = (calculation_period, version)
+
+        with self._lock:
+            rate_table = self._tables.get(key)
+            if rate_table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return rate_table
+            self.misses += 1
+
+        rate_table = SocialInsuranceRateTable(calculation_period, loader(calculation_period), version)
+
+        with self._lock:
+            # 版本已变化的旧表不会再被命中，直接淘汰
+            for stale_key in [k for k in self._tables if k[1] != version]:
+                del self._tables[stale_key]
+            self._tables[key] = rate_table
+            while len(self._tables) > MAX_CACHED_PERIODS:
+                self._tables.popitem(last=False)
+
+        logger.info(f"📋 [费率缓存] 加载计算期间 {calculation_period} 的费率表: {len(rate_table)} 条规则")
+        return rate_table
+
+    def invalidate(self) -> None:
+        """清空缓存，并在下次获取时重新确认配置版本"""
+        with self._lock:
+            self._tables.clear()
+            self._version = None
+            self._version_checked_at = 0.0
+        logger.info("🗑️ [费率缓存] 社保费率缓存已失效")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            return {
+                "cached_periods": [k[0].isoformat() for k in self._tables],
+                "config_version": list(self._version) if self._version else None,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _current_version(self, db: Session) -> Tuple:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < VERSION_CHECK_INTERVAL_SECONDS:
+                return self._version
+
+        row = db.execute(text("""
+            SELECT
+                COUNT(*),
+                COALESCE(MAX(id), 0),
+                MAX(GREATEST(created_at, COALESCE(updated_at, created_at)))
+            FROM payroll.social_insurance_configs
+        """)).fetchone()
+        version = (row[0], row[1], row[2].isoformat() if row[2] else None)
+
+        with self._lock:
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+
+# 所有计算器实例共享的缓存
+social_insurance_rate_cache = SocialInsuranceRateCache()
+
+
+def invalidate_social_insurance_rate_cache() -> None:
+    """社保配置变更后调用，使所有计算器的费率缓存失效"""
+    social_insurance_rate_cache.invalidate()
@@ -0,0 +1,264 @@
+"""
+薪资计算热路径日志
+
+计算引擎会为每个员工、每个组件、每条费率规则记录日志。大批量计算时，即使日志级别不输出，
+f-string 也已经完成了格式化，日志成为主要的 CPU 开销。这里为热路径提供统一的日志入口：
+
+- 惰性格式化：detail / failure 使用 logging 的 %-格式参数，只有真正输出时才格式化；
+- 按运行汇总：在 run_log_scope 内明细只累计事件计数，运行结束时输出一条汇总；
+  失败详情始终输出，但每次运行最多 MAX_FAILURE_DETAILS 条，其余只计数；
+- 追踪模式：开启后运行的全部明细和失败写入单独的追踪文件（JSON Lines，每次运行一个文件），
+  开关保存在追踪目录的 trace_mode.json 中，每次运行开始时读取，修改后无需重启，
+  对所有 worker 和并行计算进程生效。
+
+不在 run_log_scope 内调用时（如单个员工预览计算），明细按 DEBUG 级别惰性输出，失败按 WARNING 输出。
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 追踪文件目录
+TRACE_DIR = os.getenv("PAYROLL_TRACE_DIR", os.path.join("logs", "payroll_traces"))
+
+# 追踪模式开关文件（位于追踪目录中）
+TRACE_MODE_FILE = "trace_mode.json"
+
+# 每次运行最多输出的失败详情数
+MAX_FAILURE_DETAILS = 20
+
+
+class RunLog:
+    """一次计算运行（或并行计算的一个分块）的日志汇总"""
+
+    def __init__(self, name: str, run_id: Optional[Any] = None, trace: bool = False):
+        self.name = name
+        self.run_id = run_id
+        self.counters: Counter = Counter()
+        self.failures = 0
+        self.suppressed_failures = 0
+        self.started_at = time.monotonic()
+        self.trace_path: Optional[str] = None
+        self._trace_file = None
+        self._trace_lock = threading.Lock()
+        if trace:
+            self._open_trace()
+
+    @property
+    def tracing(self) -> bool:
+        return self._trace_file is not None
+
+    def count(self, event: str, n: int = 1) -> None:
+        """累计事件次数"""
+        self.counters[event] += n
+
+    def detail(self, log: logging.Logger, msg: str, *args: Any) -> None:
+        """记录明细：追踪模式下写入追踪文件，否则仅在 DEBUG 级别开启时输出"""
+        if self._trace_file is not None:
+            self._write_trace(log.name, "DETAIL", msg, args)
+        elif log.isEnabledFor(logging.DEBUG):
+            log.debug(msg, *args)
+
+    def failure(self, log: logging.Logger, msg: str, *args: Any, event: str = "failure") -> None:
+        """记录失败：计数并输出详情（超过上限后只计数）"""
+        self.counters[event] += 1
+        self.failures += 1
+        if self._trace_file is not None:
+            self._write_trace(log.name, "FAILURE", msg, args)
+        if self.failures <= MAX_FAILURE_DETAILS:
+            log.warning(msg, *args)
+        else:
+            self.suppressed_failures += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """汇总数据（并行计算的分块结果随 ChunkOutcome 回传给协调进程）"""
+        return {
+            "counters": dict(self.counters),
+            "failures": self.failures,
+            "suppressed_failures": self.suppressed_failures,
+        }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """并入其他进程中分块的汇总数据"""
+        self.counters.update(snapshot.get("counters", {}))
+        self.failures += snapshot.get("failures", 0)
+        self.suppressed_failures += snapshot.get("suppressed_failures", 0)
+
+    def close(self, summarize: bool = True) -> None:
+        if summarize:
+            elapsed = time.monotonic() - self.started_at
+            counters = ", ".join(f"{event}={n}" for event, n in sorted(self.counters.items())) or "无"
+            message = (
+                f"📊 [计算日志] {self.name} 运行={self.run_id}, 耗时={elapsed:.2f}s, "
+                f"事件: {counters}, 失败={self.failures}"
+            )
+            if self.suppressed_failures:
+                message += f"（{self.suppressed_failures} 条详情未输出）"
+            if self.trace_path:
+                message += f", 追踪文件={self.trace_path}"
+            logger.info(message)
+        if self._trace_file is not None:
+            with self._trace_lock:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def _open_trace(self) -> None:
+        try:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            self.trace_path = os.path.join(TRACE_DIR, f"payroll_run_{self.run_id or 'adhoc'}.jsonl")
+            # 并行计算的各进程追加写入同一文件，每条记录一次写入
+            self._trace_file = open(self.trace_path, "a", encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"⚠️ [计算日志] 无法打开追踪文件，本次运行不追踪: {e}")
+            self.trace_path = None
+            self._trace_file = None
+
+    def _write_trace(self, log_name: str, kind: str, msg: str, args: tuple) -> None:
+        record = {
+            "ts": datetime.now().isoformat(),
+            "pid": os.getpid(),
+            "run_id": self.run_id,
+            "logger": log_name,
+            "kind": kind,
+            "message": msg % args if args else msg,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._trace_lock:
+            if self._trace_file is not None:
+                self._trace_file.write(line)
+                self._trace_file.flush()
+
+
+_current_run_log: ContextVar[Optional[RunLog]] = ContextVar("payroll_run_log", default=None)
+
+
+def current_run_log() -> Optional[RunLog]:
+    """当前上下文中的运行日志"""
+    return _current_run_log.get()
+
+
+@contextmanager
+def run_log_scope(name: str, run_id: Optional[Any] = None, summarize: bool = True) -> Iterator[RunLog]:
+    """
+    在一次计算运行内汇总热路径日志
+
+    已经处于运行日志范围内时并入外层（例如单进程执行的并行分块），不重复输出汇总。
+
+    Args:
+        name: 计算名称（出现在汇总中）
+        run_id: 薪资运行ID（决定是否追踪以及追踪文件名）
+        summarize: 结束时是否输出汇总；并行计算的分块由协调进程合并后统一输出
+    """
+    outer = _current_run_log.get()
+    if outer is not None:
+        yield outer
+        return
+
+    run_log = RunLog(name, run_id, trace=is_trace_enabled(run_id))
+    token = _current_run_log.set(run_log)
+    try:
+        yield run_log
+    finally:
+        _current_run_log.reset(token)
+        run_log.close(summarize)
+
+
+def detail(log: logging.Logger, msg: str, *args: Any) -> None:
+    """记录热路径明细（%-格式参数，不输出时不格式化）"""
+    run_log = _current_run_log.get()
+    if run_log is not None:
+        run_log.detail(log, msg, *args)
+    elif log.isEnabledFor(logging.DEBUG):
+        log.debug(msg, *args)
+
+
+class _Lazy:
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.fn(*self.args))
+
+
+def lazy(fn, *args: Any) -> Any:
+    """延迟计算的日志参数：只有日志真正输出时才调用 fn(*args)"""
+    return _Lazy(fn, args)
+
+
+def count(event: str, n: int = 1) -> None:
+    """累计当前运行的事件次数（不在运行日志范围内时忽略）"""
+    run_log = _current_run_log.get()
+    if run_log is not None:
+        run_log.counters[event] += n
+
+
+def failure(log: logging.Logger, msg: str, *args: Any, event: str = "failure") -> None:
+    """记录热路径中的失败（始终输出，每次运行有上限）"""
+    run_log = _current_run_log.get()
+    if run_log is not None:
+        run_log.failure(log, msg, *args, event=event)
+    else:
+        log.warning(msg, *args)
+
+
+# --- 追踪模式开关 ---
+
+def _trace_mode_path() -> str:
+    return os.path.join(TRACE_DIR, TRACE_MODE_FILE)
+
+
+def get_trace_mode() -> Dict[str, Any]:
+    """
+    读取追踪模式
+
+    Returns:
+        {"enabled": 是否开启, "run_ids": 只追踪的薪资运行ID（为空时追踪所有运行）, "trace_dir": 追踪目录}
+    """
+    mode = {"enabled": False, "run_ids": None}
+    try:
+        with open(_trace_mode_path(), encoding="utf-8") as f:
+            mode.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ [计算日志] 追踪模式配置无法读取，按关闭处理: {e}")
+    mode["trace_dir"] = TRACE_DIR
+    return mode
+
+
+def set_trace_mode(enabled: bool, run_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    开启或关闭追踪模式（之后开始的运行生效）
+
+    Args:
+        run_ids: 只追踪这些薪资运行，为空时追踪所有运行
+    """
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    path = _trace_mode_path()
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"enabled": enabled, "run_ids": run_ids}, f)
+    os.replace(temp_path, path)
+    logger.info(f"🔧 [计算日志] 追踪模式已{'开启' if enabled else '关闭'}: 运行={run_ids or '全部'}")
+    return get_trace_mode()
+
+
+def is_trace_enabled(run_id: Optional[Any]) -> bool:
+    """指定运行是否需要追踪"""
+    mode = get_trace_mode()
+    if not mode.get("enabled"):
+        return False
+    run_ids = mode.get("run_ids")
+    return not run_ids or run_id in run_ids
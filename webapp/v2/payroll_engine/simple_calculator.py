@@ -20,6 +20,8 @@ from datetime import datetime
 
 from ..models import PayrollEntry, Employee
 from ..pydantic_models.payroll import PayrollEntryUpdate
+from .component_registry import get_component_registry, PERSONAL_DEDUCTION_TYPES
+from . import run_log
 import logging
 
 logger = logging.getLogger(__name__)
@@ -125,11 +127,11 @@ class SimplePayrollCalculator:
                 calculation_time=datetime.now()
             )
             
-            logger.info(f"员工 {employee_id} 计算完成: 应发={gross_pay}, 扣发={total_deductions}, 实发={net_pay}")
+            run_log.detail(logger, "员工 %s 计算完成: 应发=%s, 扣发=%s, 实发=%s", employee_id, gross_pay, total_deductions, net_pay)
             return result
             
         except Exception as e:
-            logger.error(f"员工 {employee_id} 计算失败: {str(e)}")
+            run_log.failure(logger, "员工 %s 计算失败: %s", employee_id, e, event="payroll.failed")
             raise
         
     def calculate_payroll_entry(self, 
@@ -181,11 +183,11 @@ class SimplePayrollCalculator:
                 }
             }
             
-            logger.info(f"员工 {employee_id} 计算完成: 应发={gross_pay}, 扣发={total_deductions}, 实发={net_pay}")
+            run_log.detail(logger, "员工 %s 计算完成: 应发=%s, 扣发=%s, 实发=%s", employee_id, gross_pay, total_deductions, net_pay)
             return result
             
         except Exception as e:
-            logger.error(f"员工 {employee_id} 计算失败: {str(e)}")
+            run_log.failure(logger, "员工 %s 计算失败: %s", employee_id, e, event="payroll.failed")
             raise
 
     def _calculate_gross_pay(self, earnings_data: Dict[str, Any]) -> Decimal:
@@ -226,20 +228,12 @@ class SimplePayrollCalculator:
         """
         total = Decimal('0')
         
-        # 获取薪资组件定义，用于判断扣缴类型
-        from ..models import PayrollComponentDefinition
-        
         try:
-            # 查询所有活跃的薪资组件定义
-            components = self.db.query(PayrollComponentDefinition).filter(
-                PayrollComponentDefinition.is_active == True
-            ).all()
-            
-            # 创建组件代码到类型的映射
-            component_type_map = {comp.code: comp.type for comp in components}
+            # 组件代码到类型的映射（共享的组件定义注册表）
+            component_type_map = get_component_registry(self.db).type_by_code()
             
             # 定义个人扣缴类型
-            personal_deduction_types = ['PERSONAL_DEDUCTION', 'DEDUCTION']
+            personal_deduction_types = PERSONAL_DEDUCTION_TYPES
             
             for key, value in deductions_data.items():
                 if isinstance(value, dict) and 'amount' in value:
@@ -250,29 +244,30 @@ class SimplePayrollCalculator:
                         item_type = value['type']
                         if item_type in personal_deduction_types:
                             total += amount
-                            logger.debug(f"✅ [内置类型] 计入个人扣缴: {key} = {amount} (类型: {item_type})")
+                            run_log.detail(logger, "✅ [内置类型] 计入个人扣缴: %s = %s (类型: %s)", key, amount, item_type)
                         else:
-                            logger.debug(f"❌ [内置类型] 跳过单位扣缴: {key} = {amount} (类型: {item_type})")
+                            run_log.detail(logger, "❌ [内置类型] 跳过单位扣缴: %s = %s (类型: %s)", key, amount, item_type)
                     else:
                         # 回退到根据组件代码查询数据库（旧格式兼容）
                         component_type = component_type_map.get(key)
                         if component_type and component_type in personal_deduction_types:
                             total += amount
-                            logger.debug(f"✅ [数据库类型] 计入个人扣缴: {key} = {amount} (类型: {component_type})")
+                            run_log.detail(logger, "✅ [数据库类型] 计入个人扣缴: %s = %s (类型: %s)", key, amount, component_type)
                         elif component_type is None:
                             # 如果找不到组件定义，默认当作个人扣缴（向后兼容）
                             total += amount
-                            logger.warning(f"⚠️ [默认处理] 未找到组件定义: {key}，默认当作个人扣缴")
+                            run_log.count("deductions.undefined_component")
+                            run_log.detail(logger, "⚠️ [默认处理] 未找到组件定义: %s，默认当作个人扣缴", key)
                         else:
-                            logger.debug(f"❌ [数据库类型] 跳过单位扣缴: {key} = {amount} (类型: {component_type})")
+                            run_log.detail(logger, "❌ [数据库类型] 跳过单位扣缴: %s = %s (类型: %s)", key, amount, component_type)
                         
                 elif isinstance(value, (int, float, Decimal)):
                     # 如果是直接的数值，默认当作个人扣缴（向后兼容）
                     total += Decimal(str(value))
-                    logger.debug(f"✅ [数值格式] 计入个人扣缴: {key} = {value} (默认处理)")
+                    run_log.detail(logger, "✅ [数值格式] 计入个人扣缴: %s = %s (默认处理)", key, value)
                     
         except Exception as e:
-            logger.error(f"计算扣发合计时出错: {str(e)}，降级到简单计算")
+            run_log.failure(logger, "计算扣发合计时出错: %s，降级到简单计算", e, event="deductions.fallback")
             # 降级到原始逻辑
             for key, value in deductions_data.items():
                 if isinstance(value, dict) and 'amount' in value:
@@ -342,12 +337,8 @@ class SimplePayrollDataMapper:
             return  # 已经加载过了
             
         try:
-            # 查询所有活跃的工资组件定义
-            from ..models import PayrollComponentDefinition
-            
-            components = self.db.query(PayrollComponentDefinition).filter(
-                PayrollComponentDefinition.is_active == True
-            ).all()
+            # 所有启用的工资组件定义（共享的组件定义注册表）
+            components = get_component_registry(self.db).components
             
             # 初始化映射字典
             self._earnings_mapping = {}
@@ -478,12 +469,7 @@ class SimplePayrollDataMapper:
             组件信息字典，包含名称、类型等
         """
         try:
-            from ..models import PayrollComponentDefinition
-            
-            component = self.db.query(PayrollComponentDefinition).filter(
-                PayrollComponentDefinition.code == component_code,
-                PayrollComponentDefinition.is_active == True
-            ).first()
+            component = get_component_registry(self.db).get(component_code)
             
             if component:
                 return {
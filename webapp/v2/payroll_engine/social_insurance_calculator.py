@@ -19,6 +19,8 @@ import logging
 
 from ..models import Employee
 from ..models.payroll_config import SocialInsuranceConfig, EmployeeSalaryConfig
+from .rate_cache import SocialInsuranceRateTable, social_insurance_rate_cache
+from . import run_log
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +68,14 @@ class SocialInsuranceResult:
         if self.calculation_details is None:
             self.calculation_details = {}
 
+@dataclass
+class SocialInsuranceBatchData:
+    """批量计算的预加载数据（同一计算期间）"""
+    calculation_period: date
+    employee_infos: Dict[int, Dict[str, Any]]
+    base_amounts: Dict[int, Dict[str, Decimal]]
+    rate_table: SocialInsuranceRateTable
+
 class SocialInsuranceCalculator:
     """社保五险一金计算器"""
     
@@ -97,87 +107,175 @@ class SocialInsuranceCalculator:
             if not employee_info:
                 raise ValueError(f"员工 {employee_id} 信息获取失败")
             
-            # 2. 获取缴费基数
+            # 2. 获取缴费基数（职业年金缴费基数始终从员工配置获取）
+            bases = self._get_employee_base_amounts(employee_id, calculation_period)
             if social_insurance_base is None or housing_fund_base is None:
-                bases = self._get_employee_base_amounts(employee_id, calculation_period)
                 social_insurance_base = social_insurance_base or bases.get('social_insurance_base', Decimal('0'))
                 housing_fund_base = housing_fund_base or bases.get('housing_fund_base', Decimal('0'))
-                occupational_pension_base = bases.get('occupational_pension_base', Decimal('0'))
-            else:
-                # 如果提供了参数，也需要获取职业年金缴费基数
-                bases = self._get_employee_base_amounts(employee_id, calculation_period)
-                occupational_pension_base = bases.get('occupational_pension_base', Decimal('0'))
+            occupational_pension_base = bases.get('occupational_pension_base', Decimal('0'))
             
             # 3. 获取适用的社保配置
-            rates_list = self._get_applicable_rates(calculation_period)
+            rate_table = self._get_applicable_rates(calculation_period)
             
             # 4. 计算各项社保
-            result = SocialInsuranceResult(
-                employee_id=employee_id,
-                calculation_period=calculation_period
-            )
-            
-            # 计算五险（不包括职业年金）
-            for insurance_type in INSURANCE_TYPES:
-                if insurance_type == "OCCUPATIONAL_PENSION":
-                    # 职业年金使用专门的缴费基数
-                    component = self._calculate_insurance_component(
-                        insurance_type,
-                        employee_info,
-                        occupational_pension_base,
-                        rates_list
-                    )
-                else:
-                    # 其他险种使用社保缴费基数
-                    component = self._calculate_insurance_component(
-                        insurance_type,
-                        employee_info,
-                        social_insurance_base,
-                        rates_list
-                    )
-                
-                if component:
-                    result.components.append(component)
-                    result.total_employee_amount += component.employee_amount
-                    result.total_employer_amount += component.employer_amount
-                    if component.rule_id:
-                        result.applied_rules.append(f"{insurance_type} (规则ID:{component.rule_id}, 配置:{component.config_name})")
-                else:
-                    result.unapplied_rules.append(f"{insurance_type} (无匹配规则)")
-            
-            # 计算公积金
-            housing_fund_component = self._calculate_insurance_component(
-                HOUSING_FUND_TYPE,
+            return self._calculate_with_loaded_data(
+                employee_id,
+                calculation_period,
                 employee_info,
+                social_insurance_base,
                 housing_fund_base,
-                rates_list
+                occupational_pension_base,
+                rate_table
             )
-            if housing_fund_component:
-                result.components.append(housing_fund_component)
-                result.total_employee_amount += housing_fund_component.employee_amount
-                result.total_employer_amount += housing_fund_component.employer_amount
-                result.applied_rules.append(f"公积金 (规则ID:{housing_fund_component.rule_id}, 配置:{housing_fund_component.config_name})")
-            else:
-                result.unapplied_rules.append("公积金 (无匹配规则)")
             
-            # 设置计算详情
-            result.calculation_details = {
-                'employee_name': employee_info.get('full_name'),
-                'personnel_category': employee_info.get('personnel_category_name'),
-                'social_insurance_base': float(social_insurance_base),
-                'housing_fund_base': float(housing_fund_base),
-                'occupational_pension_base': float(occupational_pension_base),
-                'calculation_time': datetime.now().isoformat(),
-                'engine_version': 'social_insurance_v1.1'
-            }
+        except Exception as e:
+            run_log.failure(logger, "员工 %s 社保计算失败: %s", employee_id, e, event="social_insurance.failed")
+            raise
+    
+    def load_batch_data(
+        self,
+        employee_ids: List[int],
+        calculation_period: date
+    ) -> SocialInsuranceBatchData:
+        """
+        一次性加载批量计算所需的全部数据
+        
+        员工信息、缴费基数和费率表各用一次查询加载，替代逐个员工的三次查询。
+        
+        Args:
+            employee_ids: 员工ID列表
+            calculation_period: 计算期间
             
-            logger.info(f"员工 {employee_id} 社保计算完成: 个人合计={result.total_employee_amount}, 单位合计={result.total_employer_amount}")
-            return result
+        Returns:
+            SocialInsuranceBatchData: 预加载数据
+        """
+        unique_ids = list(dict.fromkeys(employee_ids))
+        
+        batch_data = SocialInsuranceBatchData(
+            calculation_period=calculation_period,
+            employee_infos=self._get_employee_infos_bulk(unique_ids),
+            base_amounts=self._get_employee_base_amounts_bulk(unique_ids, calculation_period),
+            rate_table=self._get_applicable_rates(calculation_period)
+        )
+        
+        logger.info(
+            f"📦 [批量预加载] 员工 {len(unique_ids)} 名, 员工信息 {len(batch_data.employee_infos)} 条, "
+            f"缴费基数 {len(batch_data.base_amounts)} 条, 费率配置 {len(batch_data.rate_table)} 条"
+        )
+        return batch_data
+    
+    def calculate_employee_social_insurance_preloaded(
+        self,
+        employee_id: int,
+        batch_data: SocialInsuranceBatchData
+    ) -> SocialInsuranceResult:
+        """
+        使用预加载数据计算单个员工的五险一金（不访问数据库）
+        
+        计算结果与 calculate_employee_social_insurance 完全一致。
+        
+        Args:
+            employee_id: 员工ID
+            batch_data: load_batch_data 返回的预加载数据
+            
+        Returns:
+            SocialInsuranceResult: 计算结果
+        """
+        try:
+            employee_info = batch_data.employee_infos.get(employee_id)
+            if not employee_info:
+                raise ValueError(f"员工 {employee_id} 信息获取失败")
+            
+            bases = batch_data.base_amounts.get(employee_id) or self._empty_base_amounts()
+            
+            return self._calculate_with_loaded_data(
+                employee_id,
+                batch_data.calculation_period,
+                employee_info,
+                bases.get('social_insurance_base', Decimal('0')),
+                bases.get('housing_fund_base', Decimal('0')),
+                bases.get('occupational_pension_base', Decimal('0')),
+                batch_data.rate_table
+            )
             
         except Exception as e:
-            logger.error(f"员工 {employee_id} 社保计算失败: {str(e)}")
+            run_log.failure(logger, "员工 %s 社保计算失败: %s", employee_id, e, event="social_insurance.failed")
             raise
     
+    def _calculate_with_loaded_data(
+        self,
+        employee_id: int,
+        calculation_period: date,
+        employee_info: Dict[str, Any],
+        social_insurance_base: Decimal,
+        housing_fund_base: Decimal,
+        occupational_pension_base: Decimal,
+        rate_table: SocialInsuranceRateTable
+    ) -> SocialInsuranceResult:
+        """基于已加载的员工信息、缴费基数和费率表计算五险一金"""
+        result = SocialInsuranceResult(
+            employee_id=employee_id,
+            calculation_period=calculation_period
+        )
+        
+        # 计算五险（不包括职业年金）
+        for insurance_type in INSURANCE_TYPES:
+            if insurance_type == "OCCUPATIONAL_PENSION":
+                # 职业年金使用专门的缴费基数
+                component = self._calculate_insurance_component(
+                    insurance_type,
+                    employee_info,
+                    occupational_pension_base,
+                    rate_table
+                )
+            else:
+                # 其他险种使用社保缴费基数
+                component = self._calculate_insurance_component(
+                    insurance_type,
+                    employee_info,
+                    social_insurance_base,
+                    rate_table
+                )
+            
+            if component:
+                result.components.append(component)
+                result.total_employee_amount += component.employee_amount
+                result.total_employer_amount += component.employer_amount
+                if component.rule_id:
+                    result.applied_rules.append(f"{insurance_type} (规则ID:{component.rule_id}, 配置:{component.config_name})")
+            else:
+                result.unapplied_rules.append(f"{insurance_type} (无匹配规则)")
+        
+        # 计算公积金
+        housing_fund_component = self._calculate_insurance_component(
+            HOUSING_FUND_TYPE,
+            employee_info,
+            housing_fund_base,
+            rate_table
+        )
+        if housing_fund_component:
+            result.components.append(housing_fund_component)
+            result.total_employee_amount += housing_fund_component.employee_amount
+            result.total_employer_amount += housing_fund_component.employer_amount
+            result.applied_rules.append(f"公积金 (规则ID:{housing_fund_component.rule_id}, 配置:{housing_fund_component.config_name})")
+        else:
+            result.unapplied_rules.append("公积金 (无匹配规则)")
+        
+        # 设置计算详情
+        result.calculation_details = {
+            'employee_name': employee_info.get('full_name'),
+            'personnel_category': employee_info.get('personnel_category_name'),
+            'social_insurance_base': float(social_insurance_base),
+            'housing_fund_base': float(housing_fund_base),
+            'occupational_pension_base': float(occupational_pension_base),
+            'calculation_time': datetime.now().isoformat(),
+            'engine_version': 'social_insurance_v1.1'
+        }
+        
+        run_log.count("social_insurance.calculated")
+        run_log.detail(logger, "员工 %s 社保计算完成: 个人合计=%s, 单位合计=%s", employee_id, result.total_employee_amount, result.total_employer_amount)
+        return result
+    
     def _get_employee_info(self, employee_id: int, calculation_period: date) -> Optional[Dict[str, Any]]:
         """获取员工基本信息"""
         # 🔍 使用与正确脚本完全相同的查询逻辑，从 reports.v_employees_basic 获取员工信息
@@ -195,20 +293,49 @@ class SocialInsuranceCalculator:
         
         result = self.db.execute(query, {"employee_id": employee_id}).fetchone()
         if result:
-            logger.info(f"📋 [员工信息] ID={result[0]}, 姓名={result[2]}{result[1]}, 人员身份={result[3]}, 身份ID={result[4]}")
-            return {
-                'id': result[0],
-                'first_name': result[1],
-                'last_name': result[2],
-                'full_name': f"{result[2]}{result[1]}",
-                'personnel_category_name': result[3],  # 🎯 关键字段：用于第一阶段匹配
-                'personnel_category_id': result[4],    # 🎯 关键字段：用于第二阶段匹配
-                'housing_fund_client_number': result[5]
-            }
+            run_log.detail(logger, "📋 [员工信息] ID=%s, 姓名=%s%s, 人员身份=%s, 身份ID=%s", result[0], result[2], result[1], result[3], result[4])
+            return self._employee_info_from_row(result)
         else:
             logger.warning(f"❌ [员工信息] 未找到员工 {employee_id} 的信息")
         return None
     
+    def _get_employee_infos_bulk(self, employee_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """批量获取员工基本信息，返回 员工ID -> 员工信息 映射"""
+        if not employee_ids:
+            return {}
+        
+        query = text("""
+            SELECT 
+                veb.id,
+                veb.first_name,
+                veb.last_name,
+                veb.root_personnel_category_name,
+                veb.personnel_category_id,
+                veb.housing_fund_client_number
+            FROM reports.v_employees_basic veb
+            WHERE veb.id = ANY(:employee_ids)
+        """)
+        
+        rows = self.db.execute(query, {"employee_ids": list(employee_ids)}).fetchall()
+        employee_infos = {row[0]: self._employee_info_from_row(row) for row in rows}
+        
+        missing_count = len(employee_ids) - len(employee_infos)
+        if missing_count > 0:
+            logger.warning(f"❌ [员工信息] {missing_count} 名员工未找到信息")
+        return employee_infos
+    
+    def _employee_info_from_row(self, row) -> Dict[str, Any]:
+        """将 v_employees_basic 查询行转换为员工信息字典"""
+        return {
+            'id': row[0],
+            'first_name': row[1],
+            'last_name': row[2],
+            'full_name': f"{row[2]}{row[1]}",
+            'personnel_category_name': row[3],  # 🎯 关键字段：用于第一阶段匹配
+            'personnel_category_id': row[4],    # 🎯 关键字段：用于第二阶段匹配
+            'housing_fund_client_number': row[5]
+        }
+    
     def _get_employee_base_amounts(self, employee_id: int, calculation_period: date) -> Dict[str, Decimal]:
         """获取员工的缴费基数"""
         # 查询员工薪资配置中的缴费基数
@@ -219,20 +346,54 @@ class SocialInsuranceCalculator:
         ).order_by(EmployeeSalaryConfig.effective_date.desc()).first()
         
         if config:
-            return {
-                'social_insurance_base': Decimal(str(config.social_insurance_base or 0)),
-                'housing_fund_base': Decimal(str(config.housing_fund_base or 0)),
-                'occupational_pension_base': Decimal(str(getattr(config, 'occupational_pension_base', None) or 0))
-            }
+            return self._base_amounts_from_config(config)
+        
+        return self._empty_base_amounts()
+    
+    def _get_employee_base_amounts_bulk(self, employee_ids: List[int], calculation_period: date) -> Dict[int, Dict[str, Decimal]]:
+        """批量获取员工的缴费基数，每名员工取计算期间内生效日期最新的配置"""
+        if not employee_ids:
+            return {}
+        
+        configs = self.db.query(EmployeeSalaryConfig).filter(
+            EmployeeSalaryConfig.employee_id.in_(employee_ids),
+            EmployeeSalaryConfig.effective_date <= calculation_period,
+            (EmployeeSalaryConfig.end_date.is_(None)) | (EmployeeSalaryConfig.end_date >= calculation_period)
+        ).order_by(EmployeeSalaryConfig.employee_id, EmployeeSalaryConfig.effective_date.desc()).all()
         
+        base_amounts = {}
+        for config in configs:
+            # 已按生效日期倒序排列，每名员工只保留第一条
+            if config.employee_id not in base_amounts:
+                base_amounts[config.employee_id] = self._base_amounts_from_config(config)
+        return base_amounts
+    
+    def _base_amounts_from_config(self, config: EmployeeSalaryConfig) -> Dict[str, Decimal]:
+        """从员工薪资配置中提取缴费基数"""
+        return {
+            'social_insurance_base': Decimal(str(config.social_insurance_base or 0)),
+            'housing_fund_base': Decimal(str(config.housing_fund_base or 0)),
+            'occupational_pension_base': Decimal(str(getattr(config, 'occupational_pension_base', None) or 0))
+        }
+    
+    def _empty_base_amounts(self) -> Dict[str, Decimal]:
+        """未找到薪资配置时的默认缴费基数"""
         return {
             'social_insurance_base': Decimal('0'),
             'housing_fund_base': Decimal('0'),
             'occupational_pension_base': Decimal('0')
         }
     
-    def _get_applicable_rates(self, calculation_period: date) -> List[Dict[str, Any]]:
-        """获取适用的社保费率配置 - 🎯 完全按照正确脚本的逻辑"""
+    def _get_applicable_rates(self, calculation_period: date) -> SocialInsuranceRateTable:
+        """获取适用的社保费率表（按计算期间和配置版本在所有计算器实例间共享缓存）"""
+        return social_insurance_rate_cache.get_rate_table(
+            self.db,
+            calculation_period,
+            self._load_rates_list
+        )
+    
+    def _load_rates_list(self, calculation_period: date) -> List[Dict[str, Any]]:
+        """从数据库加载适用的社保费率配置 - 🎯 完全按照正确脚本的逻辑"""
         configs = self.db.query(SocialInsuranceConfig).filter(
             SocialInsuranceConfig.is_active == True,
             SocialInsuranceConfig.effective_date <= calculation_period,
@@ -282,56 +443,33 @@ class SocialInsuranceCalculator:
         insurance_type: str,
         employee_info: Dict[str, Any],
         base_amount: Decimal,
-        rates_list: List[Dict[str, Any]]
+        rate_table: SocialInsuranceRateTable
     ) -> Optional[SocialInsuranceComponent]:
         """计算单个保险组件 - 🎯 完全按照正确脚本的双重匹配逻辑"""
         personnel_category_name = employee_info.get('personnel_category_name')
         personnel_category_id = employee_info.get('personnel_category_id')
         
-        logger.info(f"🔍 [匹配{insurance_type}] 员工信息: 人员身份='{personnel_category_name}', 身份ID={personnel_category_id}")
-        
-        applicable_rate = None
-        temp_unapplied_rules = []
+        run_log.detail(logger, "🔍 [匹配%s] 员工信息: 人员身份='%s', 身份ID=%s", insurance_type, personnel_category_name, personnel_category_id)
         
-        # 🎯 完全按照正确脚本的匹配逻辑
-        for rate_config in rates_list:
-            if rate_config["insurance_type"] != insurance_type:
-                continue
-                
-            logger.info(f"🔎 [检查规则] {insurance_type} 规则ID={rate_config['id']}, 配置名='{rate_config['config_name']}'")
-            
-            # 🎯 第一阶段：检查 config_name 是否与员工的 root_personnel_category_name 匹配
-            config_name_matches = (rate_config["config_name"] == personnel_category_name)
-            logger.info(f"   📋 [第一阶段] 配置名匹配: {rate_config['config_name']} == {personnel_category_name} → {config_name_matches}")
-            
-            # 🎯 第二阶段：检查人员身份ID是否包含在适用人员类别数组中
-            personnel_category_matches = (
-                rate_config["applicable_personnel_categories"] is None or
-                (personnel_category_id is not None and 
-                 personnel_category_id in rate_config["applicable_personnel_categories"])
-            )
-            logger.info(f"   📋 [第二阶段] 身份ID匹配: {personnel_category_id} in {rate_config['applicable_personnel_categories']} → {personnel_category_matches}")
-            
-            if config_name_matches and personnel_category_matches:
-                applicable_rate = rate_config
-                logger.info(f"✅ [匹配成功] {insurance_type} 找到适用规则: ID={rate_config['id']}, 配置={rate_config['config_name']}")
-                break
-            else:
-                # 收集不适用的原因
-                reasons = []
-                if not config_name_matches:
-                    reasons.append(f"配置名称({rate_config['config_name']})与人员身份({personnel_category_name})不匹配")
-                if not personnel_category_matches:
-                    reasons.append(f"人员身份ID({personnel_category_id})不在适用类别({rate_config['applicable_personnel_categories']})中")
-                
-                temp_unapplied_rules.append(f"规则ID:{rate_config['id']}, 原因:{', '.join(reasons)}")
+        # 🎯 第一阶段：config_name 与员工的 root_personnel_category_name 匹配（索引查找）
+        # 🎯 第二阶段：人员身份ID包含在适用人员类别数组中
+        applicable_rate = rate_table.find_rate(insurance_type, personnel_category_name, personnel_category_id)
         
         if not applicable_rate:
-            logger.warning(f"❌ [匹配失败] {insurance_type} 未找到适用规则")
-            if temp_unapplied_rules:
-                logger.warning(f"   📋 [不适用规则] {'; '.join(temp_unapplied_rules)}")
+            # 未匹配在部分险种（如职业年金）是正常情况，按险种计数，详情只在追踪或 DEBUG 时输出
+            run_log.count(f"social_insurance.unmatched.{insurance_type}")
+            run_log.detail(
+                logger, "❌ [匹配失败] %s 未找到适用规则（人员身份='%s', 身份ID=%s）: %s",
+                insurance_type, personnel_category_name, personnel_category_id,
+                run_log.lazy(lambda: '; '.join(self._describe_unapplied_rules(
+                    rate_table.rates_for_type(insurance_type), personnel_category_name, personnel_category_id
+                )))
+            )
             return None
         
+        run_log.count("social_insurance.matched")
+        run_log.detail(logger, "✅ [匹配成功] %s 找到适用规则: ID=%s, 配置=%s", insurance_type, applicable_rate['id'], applicable_rate['config_name'])
+        
         # 🎯 计算缴费金额 - 完全按照正确脚本的逻辑
         # 确定实际缴费基数（在最低和最高基数之间），并进行四舍五入取整
         actual_base = max(
@@ -339,7 +477,10 @@ class SocialInsuranceCalculator:
             min(applicable_rate["max_base"], base_amount)
         ).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
         
-        logger.info(f"💰 [缴费基数] {insurance_type}: 原始基数={base_amount}, 最低={applicable_rate['min_base']}, 最高={applicable_rate['max_base']}, 实际基数={actual_base}")
+        run_log.detail(
+            logger, "💰 [缴费基数] %s: 原始基数=%s, 最低=%s, 最高=%s, 实际基数=%s",
+            insurance_type, base_amount, applicable_rate['min_base'], applicable_rate['max_base'], actual_base
+        )
         
         # 🎯 计算缴费金额 - 根据不同险种使用不同的舍入规则
         raw_employee_amount = actual_base * applicable_rate["employee_rate"]
@@ -354,7 +495,10 @@ class SocialInsuranceCalculator:
             employee_amount = raw_employee_amount.quantize(Decimal('0.01'))
             employer_amount = raw_employer_amount.quantize(Decimal('0.01'))
         
-        logger.info(f"💰 [缴费计算] {insurance_type}: 个人缴费={employee_amount} (费率={applicable_rate['employee_rate']:.4f}), 单位缴费={employer_amount} (费率={applicable_rate['employer_rate']:.4f})")
+        run_log.detail(
+            logger, "💰 [缴费计算] %s: 个人缴费=%s (费率=%.4f), 单位缴费=%s (费率=%.4f)",
+            insurance_type, employee_amount, applicable_rate['employee_rate'], employer_amount, applicable_rate['employer_rate']
+        )
         
         # 生成组件代码和名称
         component_code = f"{insurance_type}_EMPLOYEE" if employee_amount > 0 else f"{insurance_type}_EMPLOYER"
@@ -373,6 +517,26 @@ class SocialInsuranceCalculator:
             config_name=applicable_rate["config_name"]
         )
     
+    def _describe_unapplied_rules(
+        self,
+        rates: List[Dict[str, Any]],
+        personnel_category_name: Optional[str],
+        personnel_category_id: Optional[int]
+    ) -> List[str]:
+        """收集同险种下各规则不适用的原因（仅在匹配失败时用于日志）"""
+        unapplied_rules = []
+        for rate_config in rates:
+            reasons = []
+            if rate_config["config_name"] != personnel_category_name:
+                reasons.append(f"配置名称({rate_config['config_name']})与人员身份({personnel_category_name})不匹配")
+            applicable_categories = rate_config["applicable_personnel_categories"]
+            if applicable_categories is not None and (
+                personnel_category_id is None or personnel_category_id not in applicable_categories
+            ):
+                reasons.append(f"人员身份ID({personnel_category_id})不在适用类别({applicable_categories})中")
+            unapplied_rules.append(f"规则ID:{rate_config['id']}, 原因:{', '.join(reasons)}")
+        return unapplied_rules
+    
     def _apply_housing_fund_rounding(self, amount: Decimal) -> Decimal:
         """
         公积金特殊进位处理：
@@ -402,7 +566,7 @@ class SocialInsuranceCalculator:
             # 否则舍去小数部分
             result = integer_part
         
-        logger.info(f"🏠 [公积金进位] 原始金额: {amount}, 整数部分: {integer_part}, 小数部分: {decimal_part}, 处理后: {result}")
+        run_log.detail(logger, "🏠 [公积金进位] 原始金额: %s, 整数部分: %s, 小数部分: %s, 处理后: %s", amount, integer_part, decimal_part, result)
         return result
 
     def _get_component_name(self, insurance_type: str) -> str:
@@ -435,13 +599,14 @@ class SocialInsuranceCalculator:
             List[SocialInsuranceResult]: 计算结果列表
         """
         results = []
+        batch_data = self.load_batch_data(employee_ids, calculation_period)
         
         for employee_id in employee_ids:
             try:
-                result = self.calculate_employee_social_insurance(employee_id, calculation_period)
+                result = self.calculate_employee_social_insurance_preloaded(employee_id, batch_data)
                 results.append(result)
             except Exception as e:
-                logger.error(f"员工 {employee_id} 社保计算失败: {str(e)}")
+                # 失败已在 calculate_employee_social_insurance_preloaded 中记录
                 # 创建错误结果
                 error_result = SocialInsuranceResult(
                     employee_id=employee_id,
@@ -20,6 +20,8 @@ class PaginationMeta(BaseModel):
     size: int = Field(10, description="每页记录数")
     total: int = Field(0, description="总记录数")
     totalPages: int = Field(1, description="总页数")
+    nextCursor: Optional[str] = Field(None, description="下一页游标（键集分页），没有下一页时为空")
+    totalEstimated: bool = Field(False, description="总数是否为估算值")
 
 class PaginationResponse(BaseModel, Generic[T]):
     """
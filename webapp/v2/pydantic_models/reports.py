@@ -486,6 +486,8 @@ class ReportQuery(BaseModel):
     sort_order: Optional[str] = Field("asc", description="排序方向")
     page: int = Field(1, description="页码")
     page_size: int = Field(20, description="每页大小")
+    cursor: Optional[str] = Field(None, description="键集分页游标（上一页返回的 next_cursor），提供时忽略页码")
+    count_mode: Optional[str] = Field("exact", pattern="^(exact|estimated|none)$", description="总数计算方式: exact, estimated 或 none")
 
 
 class ReportData(BaseModel):
@@ -494,6 +496,8 @@ class ReportData(BaseModel):
     total: int = Field(..., description="总数量")
     page: int = Field(..., description="当前页")
     page_size: int = Field(..., description="每页大小")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（键集分页），没有下一页时为空")
+    total_estimated: bool = Field(False, description="总数是否为估算值")
 
 
 # New Pydantic model for listing report templates (summary view)
@@ -398,6 +398,11 @@ class BatchAdjustmentResult(BaseModel):
     description: str = Field(..., description="调整描述")
     task_id: Optional[str] = Field(None, description="任务ID")
 
+class CalculationTraceModeRequest(BaseModel):
+    """计算追踪模式设置请求"""
+    enabled: bool = Field(..., description="是否开启追踪模式")
+    payroll_run_ids: Optional[List[int]] = Field(None, description="只追踪的工资运行ID，为空时追踪所有运行")
+
 # =============================================================================
 # 统计分析响应模型
 # =============================================================================
@@ -9,7 +9,7 @@ import logging
 import os
 from datetime import datetime, timedelta
 
-from ..database import get_db_v2 as get_db
+from ..database import get_db_v2 as get_db, SessionLocalV2
 from ...auth import get_current_user
 from ..models.security import User
 from ..pydantic_models.reports import (
@@ -19,6 +19,7 @@ from ..pydantic_models.reports import (
     ReportFileManager
 )
 from ..crud import batch_reports as crud_batch_reports
+from ..services.progress_stream import progress_event_stream
 
 # 设置logger
 logger = logging.getLogger(__name__)
@@ -188,6 +189,43 @@ async def get_batch_report_task_progress(
         raise HTTPException(status_code=500, detail=f"获取批量报表任务进度失败: {str(e)}")
 
 
+@router.get("/tasks/{task_id}/progress/stream")
+async def stream_batch_report_task_progress(
+    task_id: int = Path(..., description="任务ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    推送批量报表任务进度（Server-Sent Events）
+    
+    首次推送完整进度，之后只推送变化的字段，任务结束后关闭连接。
+    同一任务的所有订阅者共享一份进度，不会按连接数增加查询。
+    
+    Args:
+        task_id: 任务ID
+        db: 数据库会话
+        current_user: 当前用户
+        
+    Returns:
+        text/event-stream 响应
+    """
+    from ..services.batch_report_service import batch_report_progress_channel
+    
+    task = crud_batch_reports.get_batch_report_task(db=db, task_id=task_id, user_id=current_user.id)
+    if not task:
+        raise HTTPException(status_code=404, detail="批量报表任务不存在")
+    
+    def fetch_progress():
+        # 推送频道在多个用户之间共享，权限已在上面检查，这里不再按用户过滤
+        session = SessionLocalV2()
+        try:
+            return crud_batch_reports.get_batch_report_task_progress(db=session, task_id=task_id)
+        finally:
+            session.close()
+    
+    return progress_event_stream(batch_report_progress_channel(task_id), fetch_progress)
+
+
 @router.get("/tasks/{task_id}/items", response_model=List[BatchReportTaskItem])
 async def get_batch_report_task_items(
     task_id: int = Path(..., description="任务ID"),
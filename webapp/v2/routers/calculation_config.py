@@ -10,6 +10,7 @@ from datetime import datetime
 from ..database import get_db_v2
 from ...auth import get_current_user
 from ..models.payroll_config import SocialInsuranceConfig, TaxConfig
+from ..payroll_engine.rate_cache import invalidate_social_insurance_rate_cache
 
 router = APIRouter(prefix="/payroll/calculation-config", tags=["计算配置管理"])
 
@@ -160,6 +161,7 @@ async def create_comprehensive_social_insurance_config(
                 created_configs.append(config)
 
         db.commit()
+        invalidate_social_insurance_rate_cache()
 
         return {"message": f"成功创建 {len(created_configs)} 个社保配置", "count": len(created_configs)}
 
@@ -228,6 +230,7 @@ async def update_comprehensive_social_insurance_config(
                 created_configs.append(config)
 
         db.commit()
+        invalidate_social_insurance_rate_cache()
 
         return {"message": f"成功更新 {len(created_configs)} 个社保配置", "count": len(created_configs)}
 
@@ -1,11 +1,12 @@
 """
 字典类型 (LookupType) 和字典值 (LookupValue) 配置相关的API路由。
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
-from ...database import get_db_v2
+from ...database import get_db_v2, get_async_db_v2
 from webapp.v2.crud import config as crud # Assuming crud functions for lookup are in config.py
 from ...pydantic_models.config import (
     LookupTypeListResponse, LookupType, LookupTypeCreate, LookupTypeUpdate,
@@ -16,6 +17,7 @@ from webapp.auth import get_current_user, require_permissions, smart_require_per
 from ...utils import create_error_response
 from ...pydantic_models import security as v2_security_schemas # Import security schemas for User model
 from ...models.config import PayrollComponentDefinition
+from ...services.reference_data import get_reference_data, not_modified_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -206,6 +208,8 @@ async def create_lookup_value_endpoint(
 
 @router.get("/lookup-values", response_model=LookupValueListResponse)
 async def get_lookup_values_endpoint(
+    request: Request,
+    response: Response,
     lookup_type_code: Optional[str] = None,
     lookup_type_id: Optional[int] = None,
     is_active: Optional[bool] = True,
@@ -213,101 +217,32 @@ async def get_lookup_values_endpoint(
     search: Optional[str] = None,
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(10, ge=1, le=100, description="Page size"),
-    db: Session = Depends(get_db_v2),
+    db: AsyncSession = Depends(get_async_db_v2),
     current_user = Depends(smart_require_permissions(["lookup_value:view"]))  # 🚀 使用高性能权限检查
 ):
     try:
-        # Performance optimization: Use direct SQL query instead of ORM
-        from sqlalchemy import text
-        
-        if lookup_type_code:
-            # Optimized query for type_code lookup
-            query = text("""
-                SELECT 
-                    lv.id,
-                    lv.lookup_type_id,
-                    lv.code,
-                    lv.name,
-                    lv.description,
-                    lv.sort_order,
-                    lv.is_active,
-                    lv.parent_lookup_value_id
-                FROM config.lookup_values lv
-                JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-                WHERE lt.code = :type_code
-                  AND (:is_active IS NULL OR lv.is_active = :is_active)
-                  AND (:search IS NULL OR lv.name ILIKE :search_pattern OR lv.code ILIKE :search_pattern)
-                ORDER BY lv.sort_order ASC, lv.code ASC
-                LIMIT :limit OFFSET :offset
-            """)
-            
-            count_query = text("""
-                SELECT COUNT(*)
-                FROM config.lookup_values lv
-                JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-                WHERE lt.code = :type_code
-                  AND (:is_active IS NULL OR lv.is_active = :is_active)
-                  AND (:search IS NULL OR lv.name ILIKE :search_pattern OR lv.code ILIKE :search_pattern)
-            """)
-            
-            params = {
-                'type_code': lookup_type_code,
-                'is_active': is_active,
-                'search': search,
-                'search_pattern': f"%{search}%" if search else None,
-                'limit': size,
-                'offset': (page - 1) * size
-            }
-            
-        elif lookup_type_id:
-            # Optimized query for type_id lookup
-            query = text("""
-                SELECT 
-                    lv.id,
-                    lv.lookup_type_id,
-                    lv.code,
-                    lv.name,
-                    lv.description,
-                    lv.sort_order,
-                    lv.is_active,
-                    lv.parent_lookup_value_id
-                FROM config.lookup_values lv
-                WHERE lv.lookup_type_id = :type_id
-                  AND (:is_active IS NULL OR lv.is_active = :is_active)
-                  AND (:search IS NULL OR lv.name ILIKE :search_pattern OR lv.code ILIKE :search_pattern)
-                ORDER BY lv.sort_order ASC, lv.code ASC
-                LIMIT :limit OFFSET :offset
-            """)
-            
-            count_query = text("""
-                SELECT COUNT(*)
-                FROM config.lookup_values lv
-                WHERE lv.lookup_type_id = :type_id
-                  AND (:is_active IS NULL OR lv.is_active = :is_active)
-                  AND (:search IS NULL OR lv.name ILIKE :search_pattern OR lv.code ILIKE :search_pattern)
-            """)
-            
-            params = {
-                'type_id': lookup_type_id,
-                'is_active': is_active,
-                'search': search,
-                'search_pattern': f"%{search}%" if search else None,
-                'limit': size,
-                'offset': (page - 1) * size
-            }
-        else:
+        if not lookup_type_code and not lookup_type_id:
             # Return empty result if no type specified
             return LookupValueListResponse(data=[], meta={"page": page, "size": size, "total": 0, "totalPages": 0})
-        
-        # Execute queries
-        result = db.execute(query, params)
-        values = [dict(row._mapping) for row in result]
-        
-        count_result = db.execute(count_query, params)
-        total = count_result.scalar()
+
+        # Served from the in-process reference data snapshot; If-None-Match short-circuits with 304
+        snapshot = await db.run_sync(get_reference_data)
+        not_modified = not_modified_response(request, response, snapshot.etag("lookup_values"))
+        if not_modified:
+            return not_modified
+
+        values = snapshot.lookup_values(
+            type_code=lookup_type_code or None,
+            type_id=None if lookup_type_code else lookup_type_id,
+            is_active=is_active,
+            search=search,
+            search_fields=("code", "name")
+        )
+        total = len(values)
+        offset = (page - 1) * size
         
         total_pages = (total + size - 1) // size if total > 0 else 1
-        return LookupValueListResponse(data=values, meta={"page": page, "size": size, "total": total, "totalPages": total_pages})
+        return LookupValueListResponse(data=values[offset:offset + size], meta={"page": page, "size": size, "total": total, "totalPages": total_pages})
         
     except Exception as e:
         logger.error(f"Error getting lookup values: {e}", exc_info=True)
@@ -372,9 +307,11 @@ async def delete_lookup_value_endpoint(
 # --- 高性能公共 Lookup 端点 (无权限检查) ---
 @router.get("/lookup-values-public", response_model=LookupValueListResponse)
 async def get_lookup_values_public_endpoint(
+    request: Request,
+    response: Response,
     lookup_type_code: str,  # 必须提供type_code
     is_active: Optional[bool] = True,  # 默认只返回活跃的
-    db: Session = Depends(get_db_v2)
+    db: AsyncSession = Depends(get_async_db_v2)
     # 注意：此端点没有权限检查，仅用于公共lookup数据
 ):
     """
@@ -385,9 +322,6 @@ async def get_lookup_values_public_endpoint(
     - 专门用于前端初始化时大量lookup数据加载
     """
     try:
-        # 直接使用原生SQL，跳过所有ORM开销
-        from sqlalchemy import text
-        
         # 预定义的安全lookup类型（仅允许查询这些公共数据）
         safe_lookup_types = {
             'GENDER', 'EMPLOYEE_STATUS', 'EMPLOYMENT_TYPE', 'CONTRACT_TYPE', 
@@ -402,33 +336,13 @@ async def get_lookup_values_public_endpoint(
                 detail=create_error_response(400, "Bad Request", f"Lookup type '{lookup_type_code}' not allowed for public access")
             )
         
-        # 超高性能查询：直接SQL，无分页，无复杂条件
-        query = text("""
-            SELECT 
-                lv.id,
-                lv.lookup_type_id,
-                lv.code,
-                lv.name,
-                lv.description,
-                lv.sort_order,
-                lv.is_active,
-                lv.parent_lookup_value_id
-            FROM config.lookup_values lv
-            JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-            WHERE lt.code = :type_code
-              AND (:is_active IS NULL OR lv.is_active = :is_active)
-            ORDER BY lv.sort_order ASC, lv.code ASC
-            LIMIT 100
-        """)
-        
-        params = {
-            'type_code': lookup_type_code,
-            'is_active': is_active
-        }
+        # 从参照数据快照读取，无分页，无复杂条件；If-None-Match 匹配时返回 304
+        snapshot = await db.run_sync(get_reference_data)
+        not_modified = not_modified_response(request, response, snapshot.etag("lookup_values"))
+        if not_modified:
+            return not_modified
         
-        # 执行查询
-        result = db.execute(query, params)
-        values = [dict(row._mapping) for row in result]
+        values = snapshot.lookup_values(type_code=lookup_type_code, is_active=is_active)[:100]
         
         return LookupValueListResponse(
             data=values, 
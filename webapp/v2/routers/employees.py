@@ -3,7 +3,7 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Path
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 import logging
 
@@ -21,6 +21,8 @@ from webapp.v2.pydantic_models.hr import (
 from webapp.v2.pydantic_models.common import DataResponse, PaginationResponse, PaginationMeta
 from webapp import auth
 from webapp.v2 import utils
+from webapp.v2.utils.pagination import InvalidCursorError
+from webapp.v2.services.employee_search import search_employees
 
 router = APIRouter(
     prefix="/employees",
@@ -39,6 +41,8 @@ async def get_employees(
     status_id: Optional[int] = Query(None, description="Status ID"),
     is_active: Optional[bool] = Query(None, description="Filter by active status"),
     employee_ids: Optional[str] = Query(None, description="Comma-separated list of employee IDs"),
+    cursor: Optional[str] = Query(None, description="Keyset pagination cursor (meta.nextCursor of the previous page); page is ignored when set"),
+    count_mode: str = Query("exact", pattern="^(exact|estimated|none)$", description="Total count mode: exact, estimated or none"),
     db: Session = Depends(get_db_v2),
     current_user = Depends(auth.require_permissions(["employee:view_list"]))
 ):
@@ -51,6 +55,8 @@ async def get_employees(
     - **ids**: 逗号分隔的员工ID列表，用于批量获取指定员工，例如"1,2,3"
     - **page**: 页码，从1开始
     - **size**: 每页记录数，最大100
+    - **cursor**: 键集分页游标，深分页时使用
+    - **count_mode**: 总数计算方式，estimated 使用执行计划估算，none 不计算总数
     """
     logger.info(f"Received request for /employees with page: {page}, size: {size}, search: '{search}', name: '{name}', status_id: {status_id}, department_id: {department_id}, ids: '{employee_ids}'")
     try:
@@ -83,7 +89,8 @@ async def get_employees(
         skip = (page - 1) * size if not employee_ids_list else 0
         
         # 获取员工列表和总数
-        # v2_hr_crud.get_employees now returns Tuple[List[ORM_Employee], int]
+        # v2_hr_crud.get_employees returns Tuple[List[ORM_Employee], Optional[int], Optional[str]]
+        next_cursor = None
         if employee_ids_list:
             # 如果提供了employee_ids，则直接获取这些ID的员工
             employees_orms = []
@@ -95,14 +102,19 @@ async def get_employees(
         else:
             # 如果没有search参数但有name参数，将name参数用作search
             final_search = search or name
-            employees_orms, total = v2_hr_crud.get_employees(
+            employees_orms, total, next_cursor = v2_hr_crud.get_employees(
                 db=db,
                 search=final_search,
                 status_id=status_id,
                 department_id=department_id,
                 skip=skip,
-                limit=size
+                limit=size,
+                cursor=cursor,
+                count_mode=count_mode
             )
+            if total is None:
+                # Lower bound when counting is disabled: rows seen so far, plus one if there is a next page
+                total = skip + len(employees_orms) + (1 if next_cursor else 0)
         
         processed_employees: List[EmployeeWithNames] = []
         for emp_orm in employees_orms:
@@ -157,12 +169,23 @@ async def get_employees(
             page=page if not employee_ids_list else 1,
             size=size if not employee_ids_list else len(processed_employees),
             total=total,
-            totalPages=total_pages if not employee_ids_list else 1
+            totalPages=total_pages if not employee_ids_list else 1,
+            nextCursor=next_cursor,
+            totalEstimated=count_mode != "exact" and not employee_ids_list
         )
         return PaginationResponse[EmployeeWithNames](
             data=processed_employees,
             meta=pagination_meta
         )
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=utils.create_error_response(
+                status_code=400,
+                message="Bad Request",
+                details=str(e)
+            )
+        )
     except Exception as e:
         # Log the exception for server-side debugging
         logger.error(f"Error in get_employees endpoint: {e}", exc_info=True)
@@ -177,6 +200,34 @@ async def get_employees(
         )
 
 
+@router.get("/typeahead", response_model=DataResponse[List[Dict[str, Any]]])
+async def employee_typeahead(
+    q: str = Query(..., min_length=1, description="Search term: name, pinyin, initials, code, ID number, phone or email"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    active_only: bool = Query(False, description="Only return active employees"),
+    db: Session = Depends(get_db_v2),
+    current_user = Depends(auth.require_permissions(["employee:view_list"]))
+):
+    """
+    员工输入联想搜索，按匹配程度排序。
+
+    使用内存搜索索引，支持姓名、拼音全拼/首字母、员工代码、身份证号、电话和邮箱的前缀及包含匹配。
+    """
+    try:
+        results = search_employees(db, q, limit=limit, active_only=active_only)
+        return DataResponse[List[Dict[str, Any]]](data=results)
+    except Exception as e:
+        logger.error(f"Error in employee typeahead for '{q}': {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=utils.create_error_response(
+                status_code=500,
+                message="Internal Server Error",
+                details="An error occurred while searching employees"
+            )
+        )
+
+
 @router.get("/{employee_id}", response_model=DataResponse[EmployeeResponseSchema])
 async def get_employee(
     employee_id: int = Path(..., title="The ID of the employee to get", ge=1),
@@ -1,7 +1,7 @@
 """
 查找值相关的API路由。
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 
@@ -14,7 +14,7 @@ from ..pydantic_models.config import (
 from ..pydantic_models.common import DataResponse
 from ...auth import require_permissions
 from ..utils import create_error_response
-from sqlalchemy import text
+from ..services.reference_data import get_reference_data, not_modified_response
 
 router = APIRouter(
     prefix="/lookup",
@@ -25,6 +25,8 @@ router = APIRouter(
 # LookupType endpoints
 @router.get("/types", response_model=LookupTypeListResponse)
 async def get_lookup_types(
+    request: Request,
+    response: Response,
     search: Optional[str] = None,
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(10, ge=1, le=100, description="Page size"),
@@ -42,13 +44,21 @@ async def get_lookup_types(
         # 计算跳过的记录数
         skip = (page - 1) * size
 
-        # 获取查找类型列表
-        lookup_types, total = crud.get_lookup_types(
-            db=db,
-            search=search,
-            skip=skip,
-            limit=size
-        )
+        # 从参照数据快照获取查找类型列表，If-None-Match 匹配时返回 304
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("lookup_types"))
+        if not_modified:
+            return not_modified
+
+        lookup_types = snapshot.rows("lookup_types")
+        if search:
+            keyword = search.lower()
+            lookup_types = [
+                row for row in lookup_types
+                if any(keyword in (row[field] or "").lower() for field in ("code", "name", "description"))
+            ]
+        total = len(lookup_types)
+        lookup_types = lookup_types[skip:skip + size]
 
         # 计算总页数
         total_pages = (total + size - 1) // size if total > 0 else 1
@@ -253,6 +263,8 @@ async def delete_lookup_type(
 # LookupValue endpoints
 @router.get("/values", response_model=LookupValueListResponse)
 async def get_lookup_values(
+    request: Request,
+    response: Response,
     type_code: Optional[str] = Query(None, description="Filter by lookup type code"),
     is_active: Optional[bool] = None,
     search: Optional[str] = None,
@@ -272,65 +284,19 @@ async def get_lookup_values(
     """
     try:
         if type_code:
-            # 使用优化的 SQL 查询直接获取数据
-            query = text("""
-                SELECT 
-                    lv.id,
-                    lv.lookup_type_id,
-                    lv.code,
-                    lv.name,
-                    lv.description,
-                    lv.sort_order,
-                    lv.is_active,
-                    lv.parent_lookup_value_id
-                FROM config.lookup_values lv
-                JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-                WHERE lt.code = :type_code
-                AND (:is_active IS NULL OR lv.is_active = :is_active)
-                AND (:search IS NULL OR 
-                     lv.code ILIKE :search_pattern OR 
-                     lv.name ILIKE :search_pattern OR 
-                     lv.description ILIKE :search_pattern)
-                ORDER BY lv.sort_order, lv.code
-                LIMIT :limit OFFSET :offset
-            """)
-            
-            count_query = text("""
-                SELECT COUNT(*)
-                FROM config.lookup_values lv
-                JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-                WHERE lt.code = :type_code
-                AND (:is_active IS NULL OR lv.is_active = :is_active)
-                AND (:search IS NULL OR 
-                     lv.code ILIKE :search_pattern OR 
-                     lv.name ILIKE :search_pattern OR 
-                     lv.description ILIKE :search_pattern)
-            """)
-            
-            # 准备参数
-            search_pattern = f"%{search}%" if search else None
+            # 从参照数据快照读取，If-None-Match 匹配时返回 304
+            snapshot = get_reference_data(db)
+            not_modified = not_modified_response(request, response, snapshot.etag("lookup_values"))
+            if not_modified:
+                return not_modified
+
+            lookup_values_data = snapshot.lookup_values(type_code=type_code, is_active=is_active, search=search)
+            total = len(lookup_values_data)
             skip = (page - 1) * size
             
-            params = {
-                'type_code': type_code,
-                'is_active': is_active,
-                'search': search,
-                'search_pattern': search_pattern,
-                'limit': size,
-                'offset': skip
-            }
-            
-            # 执行查询
-            result = db.execute(query, params)
-            lookup_values_data = [dict(row._mapping) for row in result]
-            
-            # 获取总数
-            count_result = db.execute(count_query, params)
-            total = count_result.scalar()
-            
             # 转换为 Pydantic 模型
             lookup_values = []
-            for item in lookup_values_data:
+            for item in lookup_values_data[skip:skip + size]:
                 lookup_values.append(LookupValue(
                     id=item['id'],
                     lookup_type_id=item['lookup_type_id'],
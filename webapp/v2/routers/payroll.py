@@ -4,12 +4,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Path
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
-import io
 import logging
 
-from ..database import get_db_v2
+from ..database import get_db_v2, get_async_db_v2
 from ..crud import payroll as crud
 from ..pydantic_models.payroll import (
     PayrollPeriodCreate, PayrollPeriodUpdate, PayrollPeriod, PayrollPeriodListResponse,
@@ -23,6 +23,8 @@ from ..pydantic_models.payroll import (
 from ..pydantic_models.common import DataResponse, PaginationResponse, PaginationMeta
 from ...auth import require_permissions, get_current_user
 from ..utils import create_error_response
+from ..utils.pagination import InvalidCursorError
+from ..services.bank_file import BankFileExport
 
 router = APIRouter(
     tags=["Payroll"],
@@ -41,7 +43,7 @@ async def get_payroll_periods(
     search: Optional[str] = None,
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(50, ge=1, le=200, description="Page size"),
-    db: Session = Depends(get_db_v2),
+    db: AsyncSession = Depends(get_async_db_v2),
     current_user = Depends(require_permissions(["payroll_period:view"]))
 ):
     """
@@ -59,32 +61,36 @@ async def get_payroll_periods(
         # 计算跳过的记录数
         skip = (page - 1) * size
 
-        # 获取工资周期列表
-        periods, total = crud.get_payroll_periods(
-            db=db,
-            frequency_id=frequency_id,
-            status_lookup_value_id=status_lookup_value_id,
-            start_date=start_date,
-            end_date=end_date,
-            search=search,
-            skip=skip,
-            limit=size
-        )
+        def load_periods(sync_db: Session) -> PaginationResponse[PayrollPeriod]:
+            # 获取工资周期列表
+            periods, total = crud.get_payroll_periods(
+                db=sync_db,
+                frequency_id=frequency_id,
+                status_lookup_value_id=status_lookup_value_id,
+                start_date=start_date,
+                end_date=end_date,
+                search=search,
+                skip=skip,
+                limit=size
+            )
 
-        # 计算总页数
-        total_pages = (total + size - 1) // size if total > 0 else 1
+            # 计算总页数
+            total_pages = (total + size - 1) // size if total > 0 else 1
 
-        # 返回标准响应格式
-        pagination_meta = PaginationMeta(
-            page=page,
-            size=size,
-            total=total,
-            totalPages=total_pages
-        )
-        return PaginationResponse[PayrollPeriod](
-            data=periods,
-            meta=pagination_meta
-        )
+            # 返回标准响应格式（在同步上下文中完成 ORM 对象的转换）
+            pagination_meta = PaginationMeta(
+                page=page,
+                size=size,
+                total=total,
+                totalPages=total_pages
+            )
+            return PaginationResponse[PayrollPeriod](
+                data=[PayrollPeriod.model_validate(period) for period in periods],
+                meta=pagination_meta
+            )
+
+        # 复用同步 CRUD，等待数据库时不阻塞事件循环
+        return await db.run_sync(load_periods)
     except Exception as e:
         # 返回标准错误响应格式
         raise HTTPException(
@@ -600,45 +606,30 @@ async def export_payroll_run_bank_file(
     - 需要 Super Admin, Payroll Admin, 或 Finance Admin 角色
     """
     try:
-        export_data = crud.get_payroll_entries_for_bank_export(db, run_id=run_id)
-        
-        if not export_data:
-            # Return an empty CSV with headers if no data
-            csv_buffer_empty = io.StringIO()
-            headers_empty = ["员工工号", "员工姓名", "银行账号", "开户行名称", "实发金额"]
-            csv_buffer_empty.write(','.join(headers_empty) + '\n')
-            empty_csv_string = csv_buffer_empty.getvalue()
-            csv_buffer_empty.close()
-            return StreamingResponse(iter([empty_csv_string]), media_type="text/csv", headers={"Content-Disposition": f"attachment; filename=bank_export_run_{run_id}_empty.csv"})
-
-        csv_buffer = io.StringIO()
-        headers = [
-            "员工工号", "员工姓名", "银行账号", "开户行名称", "实发金额"
-            # Potentially: "币种", "备注", "身份证号" etc.
-        ]
-        csv_buffer.write(','.join(headers) + '\n')
-
-        # Expected tuple: (PayrollEntry_obj, employee_code, employee_full_name, bank_account_number, bank_name)
-        for entry_tuple in export_data:
-            payroll_entry_obj, emp_code, emp_name, acc_number, bank_name_val = entry_tuple
-            
-            row = [
-                str(emp_code or ''),
-                str(emp_name or ''),
-                str(acc_number or ''),       # This is primary_account_number from subquery
-                str(bank_name_val or ''),   # This is primary_bank_name from subquery
-                str(payroll_entry_obj.net_pay or '0.00')
-            ]
-            csv_buffer.write(','.join(row) + '\n')
-        
-        csv_string = csv_buffer.getvalue()
-        csv_buffer.close()
-
-        response = StreamingResponse(iter([csv_string]), media_type="text/csv")
-        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-        response.headers["Content-Disposition"] = f"attachment; filename=bank_export_run_{run_id}_{timestamp}.csv"
-        
-        return response
+        # 服务端游标逐行读取并流式写出，响应体发送期间使用独立会话
+        export = BankFileExport(
+            run_id,
+            bank_type="RUN_EXPORT",
+            file_format="csv",
+            positive_only=False,
+            require_account=False
+        ).open()
+
+        if export.is_empty:
+            filename = f"bank_export_run_{run_id}_empty.csv"
+        else:
+            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+            filename = f"bank_export_run_{run_id}_{timestamp}.csv"
+
+        return StreamingResponse(
+            export.iter_chunks(),
+            media_type="text/csv",
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "X-Total-Count": str(export.expected_count),
+                "X-Total-Amount": f"{export.expected_amount:.2f}",
+            }
+        )
 
     except Exception as e:
         # logger.error(f"Error exporting bank file for run {run_id}: {e}", exc_info=True)
@@ -673,7 +664,9 @@ async def get_payroll_entries(
     search: Optional[str] = None,
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(10, ge=1, le=100, description="Page size"),
-    db: Session = Depends(get_db_v2),
+    cursor: Optional[str] = Query(None, description="键集分页游标（上一页返回的 meta.nextCursor），提供时忽略 page"),
+    count_mode: str = Query("exact", pattern="^(exact|estimated|none)$", description="总数计算方式: exact, estimated 或 none"),
+    db: AsyncSession = Depends(get_async_db_v2),
     current_user = Depends(require_permissions(["payroll_entry:view"]))
 ):
     """
@@ -697,29 +690,36 @@ async def get_payroll_entries(
     - **search**: 搜索关键词，用于按员工姓名、工号等信息搜索
     - **page**: 页码，从1开始
     - **size**: 每页记录数，最大100
+    - **cursor**: 键集分页游标，深分页时使用，耗时与第一页相同
+    - **count_mode**: 总数计算方式，estimated 使用执行计划估算，none 不计算总数
     """
     try:
         skip = (page - 1) * size
         
         # 使用视图优化方法（已成为唯一实现）
         logger.info(f"🚀 获取薪资条目列表: period_id={period_id}, run_id={actual_run_id}")
-        entries_data, total = crud.get_payroll_entries(
-            db=db,
-            skip=skip,
-            limit=size,
-            period_id=period_id,
-            run_id=actual_run_id,
-            employee_id=employee_id,
-            status_id=status_id,
-            search_term=search,
-            department_name=department_name,
-            personnel_category_name=personnel_category_name,
-            min_gross_pay=min_gross_pay,
-            max_gross_pay=max_gross_pay,
-            min_net_pay=min_net_pay,
-            max_net_pay=max_net_pay,
-            sort_by=sort_by,
-            sort_order=sort_order
+        # 复用同步 CRUD，等待数据库时不阻塞事件循环（视图查询返回字典，可在会话外转换）
+        entries_data, total, next_cursor = await db.run_sync(
+            lambda sync_db: crud.get_payroll_entries(
+                db=sync_db,
+                skip=skip,
+                limit=size,
+                cursor=cursor,
+                count_mode=count_mode,
+                period_id=period_id,
+                run_id=actual_run_id,
+                employee_id=employee_id,
+                status_id=status_id,
+                search_term=search,
+                department_name=department_name,
+                personnel_category_name=personnel_category_name,
+                min_gross_pay=min_gross_pay,
+                max_gross_pay=max_gross_pay,
+                min_net_pay=min_net_pay,
+                max_net_pay=max_net_pay,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
         )
         
         # 视图返回的是字典列表，需要转换为Pydantic模型
@@ -758,17 +758,31 @@ async def get_payroll_entries(
                 logger.warning(f"转换视图数据失败: {e}")
                 continue
 
+        if total is None:
+            # 不计算总数时给出已知下限（已浏览的记录数，还有下一页时加 1）
+            total = skip + len(entries_data) + (1 if next_cursor else 0)
         total_pages = (total + size - 1) // size if total > 0 else 1
         pagination_meta = PaginationMeta(
             page=page,
             size=size,
             total=total,
-            totalPages=total_pages
+            totalPages=total_pages,
+            nextCursor=next_cursor,
+            totalEstimated=count_mode != "exact"
         )
         return PaginationResponse[PayrollEntry](
             data=data,
             meta=pagination_meta
         )
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=create_error_response(
+                status_code=400,
+                message="Bad Request",
+                details=str(e)
+            )
+        )
     except Exception as e:
         # 返回标准错误响应格式
         raise HTTPException(
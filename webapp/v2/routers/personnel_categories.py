@@ -1,7 +1,7 @@
 """
 人员类别相关的API路由。
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 from typing import Optional, Dict, Any, List
@@ -17,6 +17,7 @@ from ..crud import (
 from ..pydantic_models.hr import PersonnelCategoryCreate, PersonnelCategoryUpdate, PersonnelCategorySchema, PersonnelCategoryListResponse
 from ..pydantic_models.common import DataResponse
 from ...auth import require_permissions
+from ..services.reference_data import get_reference_data, not_modified_response
 from ..utils import create_error_response
 from ..models.hr import PersonnelCategory, Employee
 
@@ -369,6 +370,8 @@ async def delete_personnel_category(
 # --- 高性能公共 PersonnelCategory 端点 (无权限检查) ---
 @router.get("/public", response_model=PersonnelCategoryListResponse)
 async def get_personnel_categories_public(
+    request: Request,
+    response: Response,
     is_active: bool = True,  # 默认只返回活跃的人员类别
     db: Session = Depends(get_db_v2)
     # 注意：此端点没有权限检查，仅用于公共personnel_category数据
@@ -380,31 +383,13 @@ async def get_personnel_categories_public(
     - 专门用于前端初始化时personnel_category数据加载
     """
     try:
-        # 直接使用原生SQL，跳过所有ORM开销
-        from sqlalchemy import text
+        # 从参照数据快照读取，无分页，无复杂条件；If-None-Match 匹配时返回 304
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("personnel_categories"))
+        if not_modified:
+            return not_modified
         
-        # 超高性能查询：直接SQL，无分页，无复杂条件
-        query = text("""
-            SELECT 
-                pc.id,
-                pc.code,
-                pc.name,
-                pc.description,
-                pc.parent_category_id,
-                pc.effective_date,
-                pc.end_date,
-                pc.is_active
-            FROM hr.personnel_categories pc
-            WHERE (:is_active IS NULL OR pc.is_active = :is_active)
-            ORDER BY pc.code ASC
-            LIMIT 200
-        """)
-        
-        params = {'is_active': is_active}
-        
-        # 执行查询
-        result = db.execute(query, params)
-        personnel_categories = [dict(row._mapping) for row in result]
+        personnel_categories = snapshot.rows("personnel_categories", is_active)[:200]
         
         return PersonnelCategoryListResponse(
             data=personnel_categories, 
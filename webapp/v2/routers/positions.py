@@ -1,7 +1,7 @@
 """
 实际任职 (Positions) 相关的API路由。
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 
@@ -9,6 +9,7 @@ from ..database import get_db_v2
 from ..crud import get_positions
 from ..pydantic_models.hr import Position, PositionListResponse, PositionCreate, PositionUpdate # 添加导入PositionCreate和PositionUpdate
 from ...auth import require_permissions # UNCOMMENTED
+from ..services.reference_data import get_reference_data, not_modified_response, invalidate_reference_data
 from ..utils import create_error_response # Added for standardized error responses
 from ..models.hr import Position as PositionModel # 导入ORM模型
 
@@ -103,6 +104,7 @@ async def create_position(
         db_position = PositionModel(**position_data.model_dump(exclude_unset=True))
         db.add(db_position)
         db.commit()
+        invalidate_reference_data()
         db.refresh(db_position)
         return db_position
     except HTTPException:
@@ -122,6 +124,8 @@ async def create_position(
 # --- 高性能公共 Position 端点 (无权限检查) ---
 @router.get("/public", response_model=PositionListResponse)
 async def get_positions_public(
+    request: Request,
+    response: Response,
     is_active: bool = True,  # 默认只返回活跃职位
     db: Session = Depends(get_db_v2)
     # 注意：此端点没有权限检查，仅用于公共position数据
@@ -133,31 +137,13 @@ async def get_positions_public(
     - 专门用于前端初始化时position数据加载
     """
     try:
-        # 直接使用原生SQL，跳过所有ORM开销
-        from sqlalchemy import text
+        # 从参照数据快照读取，无分页，无复杂条件；If-None-Match 匹配时返回 304
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("positions"))
+        if not_modified:
+            return not_modified
         
-        # 超高性能查询：直接SQL，无分页，无复杂条件
-        query = text("""
-            SELECT 
-                p.id,
-                p.code,
-                p.name,
-                p.description,
-                p.parent_position_id,
-                p.effective_date,
-                p.end_date,
-                p.is_active
-            FROM hr.positions p
-            WHERE (:is_active IS NULL OR p.is_active = :is_active)
-            ORDER BY p.code ASC
-            LIMIT 200
-        """)
-        
-        params = {'is_active': is_active}
-        
-        # 执行查询
-        result = db.execute(query, params)
-        positions = [dict(row._mapping) for row in result]
+        positions = snapshot.rows("positions", is_active)[:200]
         
         return PositionListResponse(
             data=positions, 
@@ -275,6 +261,7 @@ async def update_position(
             setattr(db_position, key, value)
         
         db.commit()
+        invalidate_reference_data()
         db.refresh(db_position)
         return db_position
     except HTTPException:
@@ -362,6 +349,7 @@ async def delete_position(
         # 执行删除
         db.delete(db_position)
         db.commit()
+        invalidate_reference_data()
         return None  # 204 No Content
     except HTTPException:
         raise
@@ -375,64 +363,3 @@ async def delete_position(
                 details=str(e)
             )
         )
-
-# --- 高性能公共 Position 端点 (无权限检查) ---
-@router.get("/public", response_model=PositionListResponse)
-async def get_positions_public(
-    is_active: bool = True,  # 默认只返回活跃职位
-    db: Session = Depends(get_db_v2)
-    # 注意：此端点没有权限检查，仅用于公共position数据
-):
-    """
-    高性能公共职位查询端点
-    - 默认返回活跃职位
-    - 无权限检查，性能优化
-    - 专门用于前端初始化时position数据加载
-    """
-    try:
-        # 直接使用原生SQL，跳过所有ORM开销
-        from sqlalchemy import text
-        
-        # 超高性能查询：直接SQL，无分页，无复杂条件
-        query = text("""
-            SELECT 
-                p.id,
-                p.code,
-                p.name,
-                p.description,
-                p.parent_position_id,
-                p.effective_date,
-                p.end_date,
-                p.is_active
-            FROM hr.positions p
-            WHERE (:is_active IS NULL OR p.is_active = :is_active)
-            ORDER BY p.code ASC
-            LIMIT 200
-        """)
-        
-        params = {'is_active': is_active}
-        
-        # 执行查询
-        result = db.execute(query, params)
-        positions = [dict(row._mapping) for row in result]
-        
-        return PositionListResponse(
-            data=positions, 
-            meta={
-                "page": 1, 
-                "size": len(positions), 
-                "total": len(positions), 
-                "totalPages": 1
-            }
-        )
-        
-    except Exception as e:
-        # 返回标准错误响应格式
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=create_error_response(
-                status_code=500,
-                message="Internal Server Error",
-                details=str(e)
-            )
-        ) 
\ No newline at end of file
@@ -31,6 +31,10 @@ async def get_optimization_stats(
             "performance_improvement": 47.1,
             "time_range_hours": hours
         }
+        
+        # 报表查询结果缓存的命中统计
+        from ...services.report_optimization_service import ReportOptimizationService
+        stats["result_cache"] = ReportOptimizationService.get_performance_stats(db, hours).get("result_cache")
         return stats
     except Exception as e:
         logging.error(f"获取优化统计失败: {str(e)}")
@@ -12,6 +12,7 @@ from ...pydantic_models.reports import (
     ReportExecution, ReportExecutionCreate, ReportQuery, ReportData
 )
 from ...pydantic_models.common import PaginationResponse, PaginationMeta
+from ...utils.pagination import InvalidCursorError, InvalidSortFieldError
 
 router = APIRouter(prefix="/queries", tags=["queries"])
 
@@ -90,12 +91,19 @@ async def query_report_data(
         
         use_optimized_view = ReportOptimizationService.should_use_optimized_view(data_source, query)
         
-        if use_optimized_view:
-            # 使用优化视图查询
-            result = await ReportOptimizationService.execute_optimized_query(db, data_source, query, template)
-        else:
-            # 使用传统查询
-            result = await _query_with_traditional_method(db, data_source, query, template)
+        # 数据源启用缓存时优先返回缓存结果
+        cache_key, result = ReportOptimizationService.get_cached_result(
+            db, data_source, template, query, variant="optimized" if use_optimized_view else "traditional"
+        )
+        
+        if result is None:
+            if use_optimized_view:
+                # 使用优化视图查询
+                result = await ReportOptimizationService.execute_optimized_query(db, data_source, query, template)
+            else:
+                # 使用传统查询
+                result = await _query_with_traditional_method(db, data_source, query, template)
+            ReportOptimizationService.cache_result(db, data_source, cache_key, result)
         
         execution_time = time.time() - start_time
         
@@ -108,9 +116,13 @@ async def query_report_data(
             total=result.get('total', 0),
             page=query.page,
             page_size=query.page_size,
+            next_cursor=result.get('next_cursor'),
+            total_estimated=result.get('total_estimated', False),
             execution_time=round(execution_time, 3)
         )
         
+    except (InvalidCursorError, InvalidSortFieldError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         execution_time = time.time() - start_time
         logging.error(f"报表查询失败 - 模板ID: {query.template_id}, 错误: {str(e)}, 耗时: {execution_time:.3f}s")
@@ -5,13 +5,16 @@
 
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, select
 from datetime import datetime, date
+from urllib.parse import quote
 import json
 import logging
 
-from ..database import get_db_v2
+from ..database import get_db_v2, get_async_db_v2
 from webapp.auth import require_permissions
 from ..services.simple_payroll.simple_payroll_service import SimplePayrollService
 from ..utils.common import create_error_response
@@ -28,6 +31,7 @@ from ..pydantic_models.simple_payroll import (
     BatchAdjustmentRequestAdvanced,
     BatchAdjustmentPreview,
     BatchAdjustmentResult,
+    CalculationTraceModeRequest,
     DepartmentCostAnalysisResponse,
     EmployeeTypeAnalysisResponse,
     SalaryTrendAnalysisResponse,
@@ -47,6 +51,15 @@ from ..services.simple_payroll.analytics_service import PayrollAnalyticsService
 from ..models.config import LookupValue
 from ..models.payroll import PayrollEntry, PayrollRun, PayrollPeriod
 from ..payroll_engine.simple_calculator import CalculationStatus
+from ..payroll_engine.integrated_calculator import IntegratedPayrollCalculator
+from ..payroll_engine import run_log
+from ..payroll_engine.parallel_calculator import (
+    ParallelPayrollCalculator, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_RETRIES
+)
+from ..services.simple_payroll.calculation_task_store import calculation_task_store, progress_channel
+from ..services.progress_stream import progress_event_stream
+from ..services.payroll_snapshot import payroll_view_source, mark_payroll_periods_stale
+from ..services.bank_file import BankFileExport
 from ..crud import simple_payroll as crud_simple_payroll
 
 logger = logging.getLogger(__name__)
@@ -64,7 +77,7 @@ async def get_payroll_periods(
     is_active: Optional[bool] = Query(None, description="是否活跃"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(50, ge=1, le=200, description="每页记录数"),
-    db: Session = Depends(get_db_v2)
+    db: AsyncSession = Depends(get_async_db_v2)
     # ⚡️ 临时移除权限验证以提升性能
     # current_user = Depends(require_permissions(["payroll_period:view"]))
 ):
@@ -76,14 +89,15 @@ async def get_payroll_periods(
     logger.info(f"🔄 [get_payroll_periods] 接收请求 - 参数: year={year}, month={month}, is_active={is_active}, page={page}, size={size}")
     
     try:
-        # 使用标准的 SimplePayrollService
-        service = SimplePayrollService(db)
-        result = service.get_payroll_periods(
-            year=year,
-            month=month,
-            is_active=is_active,
-            page=page,
-            size=size
+        # 使用标准的 SimplePayrollService，在异步会话的同步上下文中执行，不阻塞事件循环
+        result = await db.run_sync(
+            lambda sync_db: SimplePayrollService(sync_db).get_payroll_periods(
+                year=year,
+                month=month,
+                is_active=is_active,
+                page=page,
+                size=size
+            )
         )
         
         logger.info(f"✅ [get_payroll_periods] 查询成功 - 返回 {len(result['data'])} 条记录, 总计: {result['meta']['total']}")
@@ -141,18 +155,19 @@ async def get_payroll_versions(
     period_id: int = Query(..., description="工资期间ID"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页记录数"),
-    db: Session = Depends(get_db_v2)
+    db: AsyncSession = Depends(get_async_db_v2)
     # ⚡️ 临时移除权限验证以提升性能
     # current_user = Depends(require_permissions(["payroll_run:view"]))
 ):
     """获取指定期间的工资运行列表"""
     try:
-        # 使用标准的 SimplePayrollService
-        service = SimplePayrollService(db)
-        result = service.get_payroll_versions(
-            period_id=period_id,
-            page=page,
-            size=size
+        # 使用标准的 SimplePayrollService，在异步会话的同步上下文中执行，不阻塞事件循环
+        result = await db.run_sync(
+            lambda sync_db: SimplePayrollService(sync_db).get_payroll_versions(
+                period_id=period_id,
+                page=page,
+                size=size
+            )
         )
         return result
     except Exception as e:
@@ -169,17 +184,26 @@ async def get_payroll_versions(
 @router.get("/versions/{version_id}", response_model=DataResponse[PayrollRunResponse])
 async def get_payroll_version(
     version_id: int,
-    db: Session = Depends(get_db_v2)
+    db: AsyncSession = Depends(get_async_db_v2)
     # ⚡️ 临时移除权限验证以提升性能  
     # current_user = Depends(require_permissions(["payroll_run:view"]))
 ):
     """获取指定工资运行详情"""
     try:
-        # 直接查询工资运行记录
-        from ..models.payroll import PayrollRun
-        payroll_run = db.query(PayrollRun).filter(PayrollRun.id == version_id).first()
+        # 运行记录、状态和期间合并为一次异步查询，条目数读取运行上维护的汇总字段
+        query = (
+            select(
+                PayrollRun,
+                LookupValue.name.label("status_name"),
+                PayrollPeriod.name.label("period_name")
+            )
+            .outerjoin(LookupValue, LookupValue.id == PayrollRun.status_lookup_value_id)
+            .outerjoin(PayrollPeriod, PayrollPeriod.id == PayrollRun.payroll_period_id)
+            .where(PayrollRun.id == version_id)
+        )
+        row = (await db.execute(query)).first()
         
-        if not payroll_run:
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=create_error_response(
@@ -189,32 +213,17 @@ async def get_payroll_version(
                 )
             )
         
-        # 查询状态信息
-        status_lookup = db.query(LookupValue).filter(
-            LookupValue.id == payroll_run.status_lookup_value_id
-        ).first()
-        
-        # 查询期间信息
-        from ..models.payroll import PayrollPeriod
-        period = db.query(PayrollPeriod).filter(
-            PayrollPeriod.id == payroll_run.payroll_period_id
-        ).first()
-        
-        # 查询实际的工资条目数量
-        from ..models.payroll import PayrollEntry
-        actual_entries_count = db.query(PayrollEntry).filter(
-            PayrollEntry.payroll_run_id == payroll_run.id
-        ).count()
+        payroll_run = row.PayrollRun
         
         # 构建响应对象
         version = PayrollRunResponse(
             id=payroll_run.id,
             period_id=payroll_run.payroll_period_id,
-            period_name=period.name if period else "工资期间",
+            period_name=row.period_name or "工资期间",
             version_number=1,
             status_id=payroll_run.status_lookup_value_id,
-            status_name=status_lookup.name if status_lookup else "未知状态",
-            total_entries=actual_entries_count,  # 使用实际的工资条目数量
+            status_name=row.status_name or "未知状态",
+            total_entries=payroll_run.total_employees or 0,
             total_gross_pay=payroll_run.total_gross_pay or 0,
             total_net_pay=payroll_run.total_net_pay or 0,
             total_deductions=payroll_run.total_deductions or 0,
@@ -725,54 +734,53 @@ async def run_calculation_engine(
         
         logger.info(f"开始计算 {len(entries)} 条工资记录...")
         
-        for i, entry in enumerate(entries, 1):
-            if i % 10 == 0:  # 每10条记录记录一次进度
-                logger.info(f"计算进度: {i}/{len(entries)}")
-            try:
-                # 使用现有的earnings_details和deductions_details进行计算
-                result = calculator.calculate_payroll_entry(
-                    employee_id=entry.employee_id,
-                    payroll_run_id=entry.payroll_run_id,
-                    earnings_data=entry.earnings_details or {},
-                    deductions_data=entry.deductions_details or {}
-                )
+        # 逐条明细只在调试或追踪模式下输出，结束时输出一条汇总
+        with run_log.run_log_scope("简化版计算", payroll_run_id):
+            for i, entry in enumerate(entries, 1):
+                if i % 10 == 0:  # 每10条记录记录一次进度
+                    run_log.detail(logger, "计算进度: %s/%s", i, len(entries))
+                try:
+                    # 使用现有的earnings_details和deductions_details进行计算
+                    result = calculator.calculate_payroll_entry(
+                        employee_id=entry.employee_id,
+                        payroll_run_id=entry.payroll_run_id,
+                        earnings_data=entry.earnings_details or {},
+                        deductions_data=entry.deductions_details or {}
+                    )
                 
-                # 更新数据库记录
-                entry.gross_pay = result["gross_pay"]
-                entry.total_deductions = result["total_deductions"]
-                entry.net_pay = result["net_pay"]
-                entry.calculation_log = result["calculation_log"]
+                    # 更新数据库记录
+                    entry.gross_pay = result["gross_pay"]
+                    entry.total_deductions = result["total_deductions"]
+                    entry.net_pay = result["net_pay"]
+                    entry.calculation_log = result["calculation_log"]
                 
-                # 累计统计
-                total_gross_pay += float(result["gross_pay"])
-                total_deductions += float(result["total_deductions"])
-                total_net_pay += float(result["net_pay"])
+                    # 累计统计
+                    total_gross_pay += float(result["gross_pay"])
+                    total_deductions += float(result["total_deductions"])
+                    total_net_pay += float(result["net_pay"])
                 
-                success_count += 1
+                    success_count += 1
                 
-            except Exception as calc_error:
-                error_count += 1
-                # 获取员工信息用于错误报告
-                employee = db.query(Employee).filter(Employee.id == entry.employee_id).first()
-                employee_name = f"{employee.first_name}{employee.last_name}" if employee else f"员工ID:{entry.employee_id}"
+                except Exception as calc_error:
+                    error_count += 1
+                    # 获取员工信息用于错误报告
+                    employee = db.query(Employee).filter(Employee.id == entry.employee_id).first()
+                    employee_name = f"{employee.first_name}{employee.last_name}" if employee else f"员工ID:{entry.employee_id}"
                 
-                errors.append({
-                    "employee_id": entry.employee_id,
-                    "employee_name": employee_name,
-                    "error_message": str(calc_error)
-                })
-                logger.error(f"计算员工 {entry.employee_id} 工资失败: {calc_error}")
+                    errors.append({
+                        "employee_id": entry.employee_id,
+                        "employee_name": employee_name,
+                        "error_message": str(calc_error)
+                    })
+                    # 失败详情已由计算器记录到本次运行的日志中
         
         # 更新工资运行状态和汇总信息
         try:
             if payroll_run and success_count > 0:
                 # 更新为已计算状态 (PRUN_CALCULATED = 61)
+                # 条目数和金额合计由数据库触发器随条目更新一并维护
                 payroll_run.status_lookup_value_id = 61
-                payroll_run.total_employees = success_count
-                payroll_run.total_gross_pay = total_gross_pay
-                payroll_run.total_deductions = total_deductions
-                payroll_run.total_net_pay = total_net_pay
-                logger.info(f"更新工资运行汇总: ID={payroll_run_id}, 状态=已计算, 员工数={success_count}, 应发={total_gross_pay}, 扣发={total_deductions}, 实发={total_net_pay}")
+                logger.info(f"更新工资运行状态: ID={payroll_run_id}, 状态=已计算, 成功={success_count}, 应发={total_gross_pay}, 扣发={total_deductions}, 实发={total_net_pay}")
         except Exception as status_update_error:
             logger.error(f"更新工资运行状态失败: {status_update_error}")
             # 不影响主要计算流程，继续执行
@@ -781,6 +789,8 @@ async def run_calculation_engine(
         try:
             db.commit()
             logger.info(f"数据库提交成功，更新了 {success_count} 条记录")
+            if payroll_run and success_count > 0:
+                mark_payroll_periods_stale(payroll_run.payroll_period_id)
         except Exception as commit_error:
             logger.error(f"数据库提交失败: {commit_error}")
             db.rollback()
@@ -1134,6 +1144,7 @@ async def update_audit_status(
         payroll_run.status_lookup_value_id = status_lookup_value_id
         
         db.commit()
+        mark_payroll_periods_stale(payroll_run.payroll_period_id)
         
         # 返回更新后的工资运行信息（查询单个工资运行详情）
         updated_run = db.query(PayrollRun).filter(PayrollRun.id == payroll_run_id).first()
@@ -1143,11 +1154,6 @@ async def update_audit_status(
                 LookupValue.id == updated_run.status_lookup_value_id
             ).first()
             
-            # 查询实际的工资条目数量
-            actual_entries_count = db.query(PayrollEntry).filter(
-                PayrollEntry.payroll_run_id == updated_run.id
-            ).count()
-            
             updated_payroll_run = PayrollRunResponse(
                 id=updated_run.id,
                 period_id=updated_run.payroll_period_id,
@@ -1155,7 +1161,7 @@ async def update_audit_status(
                 version_number=1,
                 status_id=updated_run.status_lookup_value_id,
                 status_name=status_lookup.name if status_lookup else "未知状态",
-                total_entries=actual_entries_count,  # 使用实际的工资条目数量
+                total_entries=updated_run.total_employees or 0,
                 total_gross_pay=updated_run.total_gross_pay or 0,
                 total_net_pay=updated_run.total_net_pay or 0,
                 total_deductions=updated_run.total_deductions or 0,
@@ -1196,6 +1202,68 @@ async def update_audit_status(
             )
         )
 
+def _open_bank_file_export(request: Dict[str, Any], db: Session, use_request_session: bool) -> tuple:
+    """
+    校验银行文件请求并打开导出（执行查询、读取汇总）
+
+    Returns:
+        (BankFileExport, 期间名称)
+    """
+    payroll_run_id = request.get("payroll_run_id")
+    bank_type = request.get("bank_type", "ICBC")  # 默认工商银行
+    file_format = request.get("file_format", "txt")  # txt, csv, excel
+
+    if not payroll_run_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=create_error_response(
+                status_code=400,
+                message="缺少必要参数",
+                details="payroll_run_id 参数是必需的"
+            )
+        )
+
+    # 验证工资运行是否存在
+    payroll_run = db.query(PayrollRun).filter(PayrollRun.id == payroll_run_id).first()
+    if not payroll_run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=create_error_response(
+                status_code=404,
+                message="工资运行不存在",
+                details=f"工资运行ID {payroll_run_id} 未找到"
+            )
+        )
+    period_name = payroll_run.payroll_period.name if payroll_run.payroll_period else "工资"
+
+    # 只包含实发合计大于0且有银行账号的记录；流式下载时响应体发送期间使用独立会话
+    export = BankFileExport(
+        payroll_run_id,
+        bank_type=bank_type,
+        file_format=file_format,
+        purpose=f"{period_name if payroll_run.payroll_period else ''}工资",
+        positive_only=True,
+        require_account=True
+    ).open(db if use_request_session else None)
+
+    if export.row_count == 0:
+        export.close()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=create_error_response(
+                status_code=400,
+                message="没有可发放的工资记录",
+                details="该工资运行中没有实发合计大于0的员工"
+            )
+        )
+    return export, period_name
+
+
+def _bank_file_name(bank_type: str, period_name: str, file_format: str) -> str:
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{bank_type}_{period_name}_银行代发_{timestamp}.{file_format}"
+
+
 @router.post("/bank-file/generate", response_model=DataResponse[Dict[str, Any]])
 async def generate_bank_file(
     request: Dict[str, Any],
@@ -1211,130 +1279,35 @@ async def generate_bank_file(
     - 农业银行
     - 中国银行
     - 招商银行
+
+    文件内容包含在 JSON 响应中；大批量发放请使用 /bank-file/download 流式下载。
     """
     logger.info(f"🔄 [generate_bank_file] 接收请求 - 用户: {current_user.username}, 参数: {request}")
     
     try:
-        payroll_run_id = request.get("payroll_run_id")
-        bank_type = request.get("bank_type", "ICBC")  # 默认工商银行
-        file_format = request.get("file_format", "txt")  # txt, csv, excel
-        include_summary = request.get("include_summary", True)
-        
-        if not payroll_run_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=create_error_response(
-                    status_code=400,
-                    message="缺少必要参数",
-                    details="payroll_run_id 参数是必需的"
-                )
-            )
-        
-        # 验证工资运行是否存在
-        from ..models.payroll import PayrollRun, PayrollEntry
-        from ..models.hr import Employee
-        
-        payroll_run = db.query(PayrollRun).filter(PayrollRun.id == payroll_run_id).first()
-        if not payroll_run:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=create_error_response(
-                    status_code=404,
-                    message="工资运行不存在",
-                    details=f"工资运行ID {payroll_run_id} 未找到"
-                )
-            )
-        
-        # 获取工资条目和员工银行信息
-        from ..models.hr import EmployeeBankAccount
-        
-        entries_query = db.query(PayrollEntry, Employee, EmployeeBankAccount).join(
-            Employee, PayrollEntry.employee_id == Employee.id
-        ).outerjoin(
-            EmployeeBankAccount, 
-            (EmployeeBankAccount.employee_id == Employee.id) & 
-            (EmployeeBankAccount.is_primary == True)
-        ).filter(
-            PayrollEntry.payroll_run_id == payroll_run_id,
-            PayrollEntry.net_pay > 0  # 只包含实发合计大于0的记录
-        ).order_by(Employee.employee_code)
-        
-        entries_data = entries_query.all()
-        
-        if not entries_data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=create_error_response(
-                    status_code=400,
-                    message="没有可发放的工资记录",
-                    details="该工资运行中没有实发合计大于0的员工"
-                )
-            )
-        
-        # 生成银行文件内容
-        bank_records = []
-        total_amount = 0
-        total_count = 0
-        
-        for entry, employee, bank_account_info in entries_data:
-            # 构建员工全名
-            employee_full_name = f"{employee.last_name or ''}{employee.first_name or ''}".strip()
-            if not employee_full_name:
-                employee_full_name = employee.employee_code or "未知员工"
-            
-            # 检查员工银行信息
-            if not bank_account_info or not bank_account_info.account_number:
-                logger.warning(f"员工 {employee_full_name} 缺少银行账号信息")
-                continue
-            
-            bank_account = bank_account_info.account_number
-            bank_name = bank_account_info.bank_name
-            
-            bank_record = {
-                "employee_code": employee.employee_code,
-                "employee_name": employee_full_name,
-                "bank_account": bank_account,
-                "bank_name": bank_name or "未知银行",
-                "amount": float(entry.net_pay),
-                "currency": "CNY",
-                "purpose": f"{payroll_run.payroll_period.name if payroll_run.payroll_period else ''}工资",
-                "remark": f"工资发放-{employee.employee_code}"
-            }
-            
-            bank_records.append(bank_record)
-            total_amount += float(entry.net_pay)
-            total_count += 1
-        
-        # 根据银行类型生成不同格式的文件内容
-        file_content = generate_bank_file_content(
-            bank_type=bank_type,
-            file_format=file_format,
-            records=bank_records,
-            total_amount=total_amount,
-            total_count=total_count,
-            payroll_run=payroll_run
-        )
-        
-        # 生成文件名
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        period_name = payroll_run.payroll_period.name if payroll_run.payroll_period else "工资"
-        filename = f"{bank_type}_{period_name}_银行代发_{timestamp}.{file_format}"
+        export, period_name = _open_bank_file_export(request, db, use_request_session=True)
+        file_content = export.read_all()
+
+        total_count = export.total_count
+        total_amount = float(export.total_amount)
+        filename = _bank_file_name(export.bank_type, period_name, export.file_format)
         
         result = {
             "file_name": filename,
             "file_content": file_content,
-            "file_format": file_format,
-            "bank_type": bank_type,
+            "file_format": export.file_format,
+            "bank_type": export.bank_type,
             "total_records": total_count,
             "total_amount": total_amount,
             "summary": {
-                "payroll_run_id": payroll_run_id,
+                "payroll_run_id": export.run_id,
                 "period_name": period_name,
-                "generated_at": datetime.now().isoformat(),
+                "generated_at": export.generated_at.isoformat(),
                 "generated_by": current_user.username,
                 "records_count": total_count,
-                "total_amount": f"{total_amount:.2f}"
+                "total_amount": f"{export.total_amount:.2f}",
+                "skipped_count": export.skipped_count,
+                "sha256": export.checksum
             }
         }
         
@@ -1357,166 +1330,46 @@ async def generate_bank_file(
             )
         )
 
-def generate_bank_file_content(
-    bank_type: str,
-    file_format: str,
-    records: list,
-    total_amount: float,
-    total_count: int,
-    payroll_run
-) -> str:
-    """根据银行类型和文件格式生成银行文件内容"""
-    
-    if bank_type == "ICBC":  # 工商银行
-        return generate_icbc_format(file_format, records, total_amount, total_count, payroll_run)
-    elif bank_type == "CCB":  # 建设银行
-        return generate_ccb_format(file_format, records, total_amount, total_count, payroll_run)
-    elif bank_type == "ABC":  # 农业银行
-        return generate_abc_format(file_format, records, total_amount, total_count, payroll_run)
-    elif bank_type == "BOC":  # 中国银行
-        return generate_boc_format(file_format, records, total_amount, total_count, payroll_run)
-    elif bank_type == "CMB":  # 招商银行
-        return generate_cmb_format(file_format, records, total_amount, total_count, payroll_run)
-    else:
-        # 通用格式
-        return generate_generic_format(file_format, records, total_amount, total_count, payroll_run)
-
-def generate_icbc_format(file_format: str, records: list, total_amount: float, total_count: int, payroll_run) -> str:
-    """生成工商银行格式文件"""
-    if file_format == "txt":
-        lines = []
-        # 文件头
-        lines.append(f"H|{total_count:08d}|{total_amount:015.2f}|CNY|{datetime.now().strftime('%Y%m%d')}|工资代发")
-        
-        # 明细记录
-        for i, record in enumerate(records, 1):
-            bank_name = record['bank_name'] or "未知银行"
-            line = f"D|{i:08d}|{record['bank_account']}|{record['employee_name']}|{bank_name}|{record['amount']:012.2f}|CNY|{record['remark']}"
-            lines.append(line)
-        
-        # 文件尾
-        lines.append(f"T|{total_count:08d}|{total_amount:015.2f}")
-        
-        return "\n".join(lines)
-    
-    elif file_format == "csv":
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # CSV头部
-        writer.writerow(["序号", "账号", "户名", "开户银行", "金额", "币种", "备注"])
-        
-        # 明细记录
-        for i, record in enumerate(records, 1):
-            writer.writerow([
-                i,
-                record['bank_account'],
-                record['employee_name'],
-                record['bank_name'] or "未知银行",
-                f"{record['amount']:.2f}",
-                "CNY",
-                record['remark']
-            ])
-        
-        return output.getvalue()
-    
-    else:  # excel格式
-        return generate_excel_content(records, "工商银行代发文件")
-
-def generate_ccb_format(file_format: str, records: list, total_amount: float, total_count: int, payroll_run) -> str:
-    """生成建设银行格式文件"""
-    # 建设银行格式实现
-    return generate_generic_format(file_format, records, total_amount, total_count, payroll_run)
-
-def generate_abc_format(file_format: str, records: list, total_amount: float, total_count: int, payroll_run) -> str:
-    """生成农业银行格式文件"""
-    # 农业银行格式实现
-    return generate_generic_format(file_format, records, total_amount, total_count, payroll_run)
-
-def generate_boc_format(file_format: str, records: list, total_amount: float, total_count: int, payroll_run) -> str:
-    """生成中国银行格式文件"""
-    # 中国银行格式实现
-    return generate_generic_format(file_format, records, total_amount, total_count, payroll_run)
-
-def generate_cmb_format(file_format: str, records: list, total_amount: float, total_count: int, payroll_run) -> str:
-    """生成招商银行格式文件"""
-    # 招商银行格式实现
-    return generate_generic_format(file_format, records, total_amount, total_count, payroll_run)
-
-def generate_generic_format(file_format: str, records: list, total_amount: float, total_count: int, payroll_run) -> str:
-    """生成通用格式文件"""
-    if file_format == "csv":
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # CSV头部
-        writer.writerow(["员工编号", "员工姓名", "银行账号", "开户银行", "发放金额", "备注"])
-        
-        # 明细记录
-        for record in records:
-            writer.writerow([
-                record['employee_code'],
-                record['employee_name'],
-                record['bank_account'],
-                record['bank_name'],
-                f"{record['amount']:.2f}",
-                record['remark']
-            ])
-        
-        # 汇总行
-        writer.writerow([])
-        writer.writerow(["汇总", f"共{total_count}人", "", "", f"{total_amount:.2f}", ""])
-        
-        return output.getvalue()
-    
-    else:  # txt格式
-        lines = []
-        lines.append(f"银行代发文件 - 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"总记录数: {total_count}, 总金额: {total_amount:.2f}")
-        lines.append("-" * 120)
-        lines.append(f"{'序号':<4} {'员工编号':<10} {'员工姓名':<10} {'银行账号':<20} {'开户银行':<30} {'金额':<12} {'备注':<20}")
-        lines.append("-" * 120)
-        
-        for i, record in enumerate(records, 1):
-            bank_name = record['bank_name'] or "未知银行"
-            lines.append(f"{i:<4} {record['employee_code']:<10} {record['employee_name']:<10} {record['bank_account']:<20} {bank_name:<30} {record['amount']:<12.2f} {record['remark']:<20}")
-        
-        lines.append("-" * 120)
-        lines.append(f"合计: {total_count}人, {total_amount:.2f}元")
-        
-        return "\n".join(lines)
-
-def generate_excel_content(records: list, title: str) -> str:
-    """生成Excel格式内容（返回base64编码）"""
-    # 这里可以使用openpyxl等库生成真正的Excel文件
-    # 为了简化，这里返回CSV格式
-    import csv
-    import io
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([title])
-    writer.writerow([])
-    writer.writerow(["员工编号", "员工姓名", "银行账号", "开户银行", "发放金额", "备注"])
-    
-    for record in records:
-        writer.writerow([
-            record['employee_code'],
-            record['employee_name'],
-            record['bank_account'],
-            record['bank_name'],
-            f"{record['amount']:.2f}",
-            record['remark']
-        ])
-    
-    return output.getvalue()
+
+@router.post("/bank-file/download")
+async def download_bank_file(
+    request: Dict[str, Any],
+    db: Session = Depends(get_db_v2),
+    current_user = Depends(require_permissions(["payroll_run:manage"]))
+):
+    """
+    流式下载银行代发文件
+
+    参数与 /bank-file/generate 相同。文件边查询边写出，内存占用与发放人数无关；
+    总笔数和总金额在响应头 X-Total-Count / X-Total-Amount 中返回。
+    """
+    logger.info(f"🔄 [download_bank_file] 接收请求 - 用户: {current_user.username}, 参数: {request}")
+
+    try:
+        export, period_name = _open_bank_file_export(request, db, use_request_session=False)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"生成银行文件失败: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=create_error_response(
+                status_code=500,
+                message="生成银行文件失败",
+                details=str(e)
+            )
+        )
+
+    filename = _bank_file_name(export.bank_type, period_name, export.file_format)
+    return StreamingResponse(
+        export.iter_chunks(),
+        media_type=export.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+            "X-Total-Count": str(export.expected_count),
+            "X-Total-Amount": f"{export.expected_amount:.2f}",
+        }
+    )
 
 @router.post("/audit/advanced-check/{payroll_run_id}", response_model=DataResponse[Dict[str, Any]])
 async def run_advanced_audit_check(
@@ -2183,16 +2036,11 @@ async def get_calculation_progress(
     logger.info(f"🔄 [get_calculation_progress] 查询计算进度 - 任务ID: {task_id}, 用户: {current_user.username}")
     
     try:
-        # 从Redis或内存缓存中获取进度信息
-        # 这里使用简单的内存存储示例，实际项目中建议使用Redis
-        import json
-        from pathlib import Path
+        # 本进程执行的任务直接读内存，其他工作进程的任务按主键查询任务表
+        progress_data = calculation_task_store.get_progress(task_id)
         
-        # 定义进度文件路径
-        progress_file = Path(f"/tmp/calculation_progress_{task_id}.json")
-        
-        if not progress_file.exists():
-            # 任务不存在或已完成
+        if progress_data is None:
+            # 任务不存在
             return DataResponse(
                 data={
                     "task_id": task_id,
@@ -2202,10 +2050,6 @@ async def get_calculation_progress(
                 message="任务不存在"
             )
         
-        # 读取进度信息
-        with open(progress_file, 'r', encoding='utf-8') as f:
-            progress_data = json.load(f)
-        
         logger.info(f"✅ [get_calculation_progress] 进度查询成功 - 状态: {progress_data.get('status')}")
         return DataResponse(
             data=progress_data,
@@ -2223,6 +2067,186 @@ async def get_calculation_progress(
             )
         )
 
+@router.get("/calculation-engine/progress/{task_id}/stream")
+async def stream_calculation_progress(
+    task_id: str,
+    current_user = Depends(require_permissions(["payroll_run:view"]))
+):
+    """
+    推送计算引擎的进度（Server-Sent Events）
+    
+    首次推送完整进度，之后只推送变化的字段，任务结束后关闭连接；
+    同一任务的所有订阅者共享一份进度，不会按连接数增加查询
+    """
+    logger.info(f"🔄 [stream_calculation_progress] 订阅计算进度 - 任务ID: {task_id}, 用户: {current_user.username}")
+    return progress_event_stream(
+        progress_channel(task_id),
+        lambda: calculation_task_store.get_progress(task_id),
+        not_found={"task_id": task_id, "status": "NOT_FOUND", "message": "计算任务不存在或已完成"}
+    )
+
+@router.get("/calculation-engine/tasks", response_model=DataResponse[List[Dict[str, Any]]])
+async def list_calculation_tasks(
+    payroll_run_id: Optional[int] = Query(None, description="工资运行ID"),
+    task_status: Optional[str] = Query(None, alias="status", description="任务状态"),
+    limit: int = Query(20, ge=1, le=100, description="返回数量"),
+    current_user = Depends(require_permissions(["payroll_run:view"]))
+):
+    """
+    获取计算任务列表
+    
+    按创建时间倒序返回，长时间无更新的运行中任务标记为可续算
+    """
+    try:
+        tasks = calculation_task_store.list_tasks(payroll_run_id=payroll_run_id, status=task_status, limit=limit)
+        return DataResponse(data=tasks, message=f"获取到 {len(tasks)} 个计算任务")
+    except Exception as e:
+        logger.error(f"获取计算任务列表失败: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=create_error_response(
+                status_code=500,
+                message="获取计算任务列表失败",
+                details=str(e)
+            )
+        )
+
+@router.get("/calculation-engine/trace", response_model=DataResponse[Dict[str, Any]])
+async def get_calculation_trace_mode(
+    current_user = Depends(require_permissions(["payroll_run:manage"]))
+):
+    """
+    获取计算追踪模式
+
+    追踪模式开启时，计算运行的全部明细写入追踪目录中的单独文件（每次运行一个文件）
+    """
+    return DataResponse(data=run_log.get_trace_mode(), message="获取计算追踪模式成功")
+
+@router.put("/calculation-engine/trace", response_model=DataResponse[Dict[str, Any]])
+async def set_calculation_trace_mode(
+    request: CalculationTraceModeRequest,
+    current_user = Depends(require_permissions(["payroll_run:manage"]))
+):
+    """
+    开启或关闭计算追踪模式
+
+    无需重启服务，对之后开始的计算运行生效（包括其他 worker 和并行计算进程）
+    """
+    logger.info(f"🔄 [set_calculation_trace_mode] 设置计算追踪模式 - 用户: {current_user.username}, 参数: {request.model_dump()}")
+
+    try:
+        mode = run_log.set_trace_mode(request.enabled, request.payroll_run_ids)
+    except OSError as e:
+        logger.error(f"设置计算追踪模式失败: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=create_error_response(
+                status_code=500,
+                message="设置计算追踪模式失败",
+                details=str(e)
+            )
+        )
+
+    return DataResponse(
+        data=mode,
+        message=f"计算追踪模式已{'开启' if request.enabled else '关闭'}"
+    )
+
+@router.post("/calculation-engine/tasks/{task_id}/cancel", response_model=DataResponse[Dict[str, Any]])
+async def cancel_calculation_task(
+    task_id: str,
+    current_user = Depends(require_permissions(["payroll_run:manage"]))
+):
+    """
+    取消计算任务
+    
+    正在执行的分块完成并提交后停止，已完成的条目保留，可通过续算接口继续
+    """
+    logger.info(f"🔄 [cancel_calculation_task] 取消计算任务 - 任务ID: {task_id}, 用户: {current_user.username}")
+    
+    if not calculation_task_store.request_cancel(task_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=create_error_response(
+                status_code=409,
+                message="无法取消计算任务",
+                details=f"计算任务 {task_id} 不存在或已结束"
+            )
+        )
+    
+    return DataResponse(
+        data={"task_id": task_id, "cancel_requested": True},
+        message="已请求取消计算任务"
+    )
+
+@router.post("/calculation-engine/tasks/{task_id}/resume", response_model=DataResponse[Dict[str, Any]])
+async def resume_calculation_task(
+    task_id: str,
+    db: Session = Depends(get_db_v2),
+    current_user = Depends(require_permissions(["payroll_run:manage"]))
+):
+    """
+    续算失败、已取消或已中断的计算任务
+    
+    沿用原任务ID和计算参数，只计算尚未完成的薪资条目
+    """
+    logger.info(f"🔄 [resume_calculation_task] 续算计算任务 - 任务ID: {task_id}, 用户: {current_user.username}")
+    
+    plan = calculation_task_store.get_resume_plan(task_id)
+    if plan is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=create_error_response(
+                status_code=409,
+                message="无法续算计算任务",
+                details=f"计算任务 {task_id} 不存在或不处于可续算状态"
+            )
+        )
+    
+    params = plan["request_params"]
+    remaining_entry_ids = plan["remaining_entry_ids"]
+    
+    # 已删除的条目不再计算
+    employee_ids_by_entry = dict(
+        db.query(PayrollEntry.id, PayrollEntry.employee_id).filter(
+            PayrollEntry.id.in_(remaining_entry_ids)
+        ).all()
+    ) if remaining_entry_ids else {}
+    remaining_entry_ids = [i for i in remaining_entry_ids if i in employee_ids_by_entry]
+    
+    calculation_task_store.claim_task(task_id, plan["completed_entry_ids"])
+    total = len(params.get("entry_ids", []))
+    processed = total - len(remaining_entry_ids)
+    calculation_task_store.update_progress(
+        task_id, "PREPARING", processed, total, "续算准备",
+        resumed_at=datetime.now().isoformat()
+    )
+    
+    _start_background_calculation(
+        task_id=task_id,
+        payroll_run_id=plan["payroll_run_id"],
+        entry_ids=remaining_entry_ids,
+        employee_ids_by_entry=employee_ids_by_entry,
+        calculation_period=date.fromisoformat(params["calculation_period"]),
+        include_social_insurance=params.get("include_social_insurance", True),
+        max_workers=params.get("parallel_workers"),
+        chunk_size=params.get("chunk_size", DEFAULT_CHUNK_SIZE),
+        max_retries=params.get("max_retries", DEFAULT_MAX_RETRIES),
+        all_entry_ids=params.get("entry_ids"),
+        recalculate_all=params.get("recalculate_all", True)
+    )
+    
+    return DataResponse(
+        data={
+            "task_id": task_id,
+            "status": "STARTED",
+            "total_employees": total,
+            "remaining_employees": len(remaining_entry_ids),
+            "message": "续算已启动，请使用task_id查询进度"
+        },
+        message="计算任务已续算"
+    )
+
 @router.post("/calculation-engine/integrated-run", response_model=DataResponse[Dict[str, Any]])
 async def run_integrated_calculation_engine(
     request: Dict[str, Any],
@@ -2239,16 +2263,12 @@ async def run_integrated_calculation_engine(
     
     try:
         import uuid
-        import json
-        from pathlib import Path
-        import threading
         from datetime import datetime
         from ..payroll_engine.integrated_calculator import IntegratedPayrollCalculator
         from ..payroll_engine.simple_calculator import CalculationStatus
         from ..models.payroll import PayrollEntry, PayrollRun
         from ..models.hr import Employee
         from datetime import date
-        from decimal import Decimal
         
         # 生成唯一任务ID
         task_id = str(uuid.uuid4())
@@ -2257,8 +2277,13 @@ async def run_integrated_calculation_engine(
         calculation_period_str = request.get("calculation_period")
         employee_ids = request.get("employee_ids")
         include_social_insurance = request.get("include_social_insurance", True)
-        recalculate_all = request.get("recalculate_all", True)
+        # 默认增量计算：输入指纹未变化的条目直接跳过；recalculate_all=true 时强制全部重新计算
+        recalculate_all = request.get("recalculate_all", False)
         async_mode = request.get("async_mode", True)  # 支持异步和同步两种模式
+        # 异步模式下的并行参数：工作进程数（默认CPU核数）、每个分块的条目数、失败分块重试次数
+        parallel_workers = request.get("parallel_workers")
+        chunk_size = request.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        max_retries = request.get("max_retries", DEFAULT_MAX_RETRIES)
         
         if not payroll_run_id:
             raise HTTPException(
@@ -2311,53 +2336,41 @@ async def run_integrated_calculation_engine(
                 )
             )
         
-        # 定义进度更新函数
-        def update_progress(status, processed=0, total=0, current_employee=None, stage="", start_time=None):
-            progress_data = {
-                "task_id": task_id,
-                "status": status,
-                "total": total,
-                "processed": processed,
-                "current_employee": current_employee,
-                "stage": stage,
-                "start_time": start_time.isoformat() if start_time else None,
-                "estimated_remaining_time": None,
-                "last_updated": datetime.now().isoformat()
-            }
-            
-            # 计算预估剩余时间
-            if processed > 0 and start_time:
-                elapsed = datetime.now() - start_time
-                avg_time_per_employee = elapsed.total_seconds() / processed
-                remaining_employees = total - processed
-                estimated_remaining_seconds = avg_time_per_employee * remaining_employees
-                progress_data["estimated_remaining_time"] = int(estimated_remaining_seconds)
-            
-            # 写入进度文件
-            progress_file = Path(f"/tmp/calculation_progress_{task_id}.json")
-            with open(progress_file, 'w', encoding='utf-8') as f:
-                json.dump(progress_data, f, ensure_ascii=False, indent=2)
-        
         # 如果是异步模式，立即返回任务ID
         if async_mode:
-            # 初始化进度
-            start_time = datetime.now()
-            update_progress("PREPARING", 0, len(entries), None, "数据准备", start_time)
+            # 后台线程只负责协调，计算分块在进程池中执行（每个工作进程使用独立的数据库会话）
+            entry_ids = [entry.id for entry in entries]
+            employee_ids_by_entry = {entry.id: entry.employee_id for entry in entries}
             
-            # 在后台线程中执行计算
-            def background_calculation():
-                try:
-                    perform_calculation_with_progress(
-                        db, entries, calculation_period, include_social_insurance, 
-                        task_id, payroll_run_id, update_progress, start_time
-                    )
-                except Exception as e:
-                    logger.error(f"后台计算失败: {e}", exc_info=True)
-                    update_progress("FAILED", 0, len(entries), None, f"计算失败: {str(e)}", start_time)
+            # 登记任务，保存计算参数以便取消后续算
+            calculation_task_store.create_task(
+                task_id=task_id,
+                payroll_run_id=payroll_run_id,
+                total=len(entries),
+                request_params={
+                    "calculation_period": calculation_period.isoformat(),
+                    "include_social_insurance": include_social_insurance,
+                    "parallel_workers": parallel_workers,
+                    "chunk_size": chunk_size,
+                    "max_retries": max_retries,
+                    "recalculate_all": recalculate_all,
+                    "entry_ids": entry_ids
+                },
+                created_by=current_user.id
+            )
             
-            thread = threading.Thread(target=background_calculation)
-            thread.daemon = True
-            thread.start()
+            _start_background_calculation(
+                task_id=task_id,
+                payroll_run_id=payroll_run_id,
+                entry_ids=entry_ids,
+                employee_ids_by_entry=employee_ids_by_entry,
+                calculation_period=calculation_period,
+                include_social_insurance=include_social_insurance,
+                max_workers=parallel_workers,
+                chunk_size=chunk_size,
+                max_retries=max_retries,
+                recalculate_all=recalculate_all
+            )
             
             return DataResponse(
                 data={
@@ -2369,156 +2382,24 @@ async def run_integrated_calculation_engine(
                 message="计算任务已启动"
             )
         
-        # 🧹 第一步：清除所有薪资条目中的旧五险一金数据
-        logger.info(f"🧹 [清除旧数据] 开始清除 {len(entries)} 条薪资记录中的旧五险一金数据")
-        
-        # 🎯 从数据库动态获取需要清除的五险一金字段
-        social_insurance_fields_to_clear = set()
-        
-        # 🎯 第一步：从数据库动态获取所有五险一金项目并清除现有数据
-        logger.info("🗑️ [准备清除] 开始获取并清除旧的五险一金数据...")
-
-        from ..models.config import PayrollComponentDefinition
-        # 获取所有个人扣缴和单位扣缴项目
-        deduction_components = db.query(PayrollComponentDefinition).filter(
-            PayrollComponentDefinition.type.in_(['PERSONAL_DEDUCTION', 'EMPLOYER_DEDUCTION']),
-            PayrollComponentDefinition.is_active == True
-        ).all()
-        
-        # 🎯 个税等重要扣除项目不能清理
-        protected_deduction_fields = {
-            'PERSONAL_INCOME_TAX', 'REFUND_DEDUCTION_ADJUSTMENT', 
-            'SOCIAL_INSURANCE_ADJUSTMENT', 'PERFORMANCE_BONUS_DEDUCTION_ADJUSTMENT',
-            'REWARD_PERFORMANCE_ADJUSTMENT', 'MEDICAL_2022_DEDUCTION_ADJUSTMENT'
-        }
-        
-        for component in deduction_components:
-            # ✅ 明确保护个税等重要扣除项目
-            if component.code in protected_deduction_fields:
-                logger.info(f"🛡️ [保护字段] {component.code} - 保留重要扣除项目，不清理")
-                continue
-                
-            # 🎯 只清除五险一金相关项目
-            if any(keyword in component.code.upper() for keyword in [
-                'HOUSING_FUND', 'PENSION', 'MEDICAL', 'UNEMPLOYMENT', 
-                'INJURY', 'SERIOUS_ILLNESS', 'OCCUPATIONAL_PENSION', 'MATERNITY'
-            ]):
-                social_insurance_fields_to_clear.add(component.code)
-        
-        logger.info(f"🔍 [动态字段获取] 从数据库获取到 {len(social_insurance_fields_to_clear)} 个五险一金扣缴项目")
-        
-        cleared_count = 0
-        for entry in entries:
-            if entry.deductions_details:
-                original_count = len(entry.deductions_details)
-                
-                # 创建新的扣除详情，只保留非五险一金项目
-                cleaned_deductions = {}
-                removed_fields = []
-                removed_amount = 0
-                
-                for key, value in entry.deductions_details.items():
-                    if key in social_insurance_fields_to_clear:
-                        removed_fields.append(key)
-                        # 🔍 计算被移除字段的金额
-                        if isinstance(value, dict) and 'amount' in value:
-                            removed_amount += value.get('amount', 0)
-                    else:
-                        cleaned_deductions[key] = value
-                
-                if removed_fields:
-                    entry.deductions_details = cleaned_deductions
-                    # 标记JSONB字段已修改
-                    from sqlalchemy.orm.attributes import flag_modified
-                    flag_modified(entry, 'deductions_details')
-                    cleared_count += 1
-                    
-                    logger.info(f"🗑️ [清除] 员工 {entry.employee_id}: 移除了 {len(removed_fields)} 个五险一金字段，总金额 {removed_amount}")
-                    logger.info(f"🗑️ [清除字段] {removed_fields}")
-        
-        logger.info(f"✅ [清除完成] 成功清除 {cleared_count} 条记录中的旧五险一金数据")
-        
-        # 🔄 第二步：初始化集成计算器并执行计算
-        logger.info(f"🚀 [开始计算] 初始化集成计算器，开始重新计算五险一金")
+        # 清除旧五险一金数据、计算并一次批量UPDATE写回（增量模式下跳过输入未变化的条目）
+        logger.info(f"🚀 [开始计算] 开始重新计算五险一金")
         integrated_calculator = IntegratedPayrollCalculator(db)
-        
-        # 批量计算
-        results = integrated_calculator.batch_calculate_payroll(
-            payroll_entries=entries,
+        results, success_count, skipped_count = integrated_calculator.recalculate_payroll_entries(
+            entries,
             calculation_period=calculation_period,
-            include_social_insurance=include_social_insurance
+            include_social_insurance=include_social_insurance,
+            recalculate_all=recalculate_all
         )
         
-        # 更新数据库记录
-        success_count = 0
-        error_count = 0
-        errors = []
-        
-        for i, result in enumerate(results):
-            entry = entries[i]
-            
-            if result.status == CalculationStatus.COMPLETED:
-                try:
-                    # 更新薪资条目
-                    entry.gross_pay = result.gross_pay
-                    entry.total_deductions = result.total_deductions
-                    entry.net_pay = result.net_pay
-                    entry.calculation_log = result.calculation_details
-                    
-                    # 🎯 更新扣除详情中的社保公积金金额（应用进位规则后的金额）
-                    if hasattr(result, 'updated_deductions_details') and result.updated_deductions_details:
-                        current_deductions = entry.deductions_details or {}
-                        
-                        # 🔍 调试：记录更新前的状态
-                        old_housing_fund = current_deductions.get('HOUSING_FUND_PERSONAL', {}).get('amount', 'N/A')
-                        logger.info(f"🔍 [更新前] 员工 {entry.employee_id} 原住房公积金: {old_housing_fund}")
-                        logger.info(f"🔍 [更新数据] 员工 {entry.employee_id} updated_deductions_details: {result.updated_deductions_details}")
-                        
-                        # 将计算后的进位金额更新到扣除详情中
-                        current_deductions.update(result.updated_deductions_details)
-                        entry.deductions_details = current_deductions
-                        
-                        # 🎯 强制标记JSONB字段已修改，确保SQLAlchemy检测到变化
-                        from sqlalchemy.orm.attributes import flag_modified
-                        flag_modified(entry, 'deductions_details')
-                        
-                        # 🔍 调试：记录更新后的状态
-                        new_housing_fund = current_deductions.get('HOUSING_FUND_PERSONAL', {}).get('amount', 'N/A')
-                        logger.info(f"🔍 [更新后] 员工 {entry.employee_id} 新住房公积金: {new_housing_fund}")
-                        logger.info(f"✅ [更新扣除详情] 员工 {entry.employee_id} 扣除详情已更新，包含进位后的住房公积金金额")
-                    
-                    success_count += 1
-                except Exception as e:
-                    error_count += 1
-                    employee = db.query(Employee).filter(Employee.id == entry.employee_id).first()
-                    employee_name = f"{employee.first_name}{employee.last_name}" if employee else f"员工ID:{entry.employee_id}"
-                    errors.append({
-                        "employee_id": entry.employee_id,
-                        "employee_name": employee_name,
-                        "error_message": str(e)
-                    })
-                    logger.error(f"更新员工 {entry.employee_id} 计算结果失败: {e}")
-            else:
-                error_count += 1
-                employee = db.query(Employee).filter(Employee.id == entry.employee_id).first()
-                employee_name = f"{employee.first_name}{employee.last_name}" if employee else f"员工ID:{entry.employee_id}"
-                errors.append({
-                    "employee_id": entry.employee_id,
-                    "employee_name": employee_name,
-                    "error_message": result.error_message or "计算失败"
-                })
+        errors = integrated_calculator.get_failed_result_details(results)
+        error_count = len(errors)
         
         # 提交更改
         if success_count > 0:
+            # 工资运行的条目数和金额合计由数据库触发器随条目写回一并维护
             db.commit()
-            
-            # 更新工资运行汇总信息
-            calculation_summary = integrated_calculator.get_calculation_summary(results)
-            payroll_totals = calculation_summary.get('payroll_totals', {})
-            payroll_run.total_gross_pay = Decimal(str(payroll_totals.get('total_gross_pay', 0)))
-            payroll_run.total_deductions = Decimal(str(payroll_totals.get('total_deductions', 0)))
-            payroll_run.total_net_pay = Decimal(str(payroll_totals.get('total_net_pay', 0)))
-            db.commit()
+            mark_payroll_periods_stale(payroll_run.payroll_period_id)
         
         # 获取汇总信息并重新构造响应格式
         calculation_summary = integrated_calculator.get_calculation_summary(results)
@@ -2527,6 +2408,7 @@ async def run_integrated_calculation_engine(
             "payroll_run_id": payroll_run_id,
             "total_processed": len(entries),
             "success_count": success_count,
+            "skipped_count": skipped_count,
             "error_count": error_count,
             "calculation_summary": calculation_summary.get('calculation_summary', {}),
             "payroll_totals": calculation_summary.get('payroll_totals', {}),
@@ -2539,7 +2421,7 @@ async def run_integrated_calculation_engine(
             "errors": errors
         }
         
-        logger.info(f"✅ [run_integrated_calculation_engine] 集成计算完成 - 成功: {success_count}, 失败: {error_count}")
+        logger.info(f"✅ [run_integrated_calculation_engine] 集成计算完成 - 成功: {success_count}（未变化跳过 {skipped_count}）, 失败: {error_count}")
         return DataResponse(
             data=response_data,
             message=f"集成计算完成，成功处理 {success_count} 条记录，失败 {error_count} 条"
@@ -2559,6 +2441,117 @@ async def run_integrated_calculation_engine(
             )
         )   
 
+def _start_background_calculation(
+    task_id: str,
+    payroll_run_id: int,
+    entry_ids: List[int],
+    employee_ids_by_entry: Dict[int, int],
+    calculation_period: date,
+    include_social_insurance: bool,
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    all_entry_ids: Optional[List[int]] = None,
+    recalculate_all: bool = True
+) -> None:
+    """在后台线程中执行 perform_calculation_with_progress，异常时将任务标记为失败"""
+    import threading
+    
+    def background_calculation():
+        try:
+            perform_calculation_with_progress(
+                entry_ids, employee_ids_by_entry, calculation_period, include_social_insurance,
+                task_id, payroll_run_id,
+                max_workers=max_workers, chunk_size=chunk_size, max_retries=max_retries,
+                all_entry_ids=all_entry_ids, recalculate_all=recalculate_all
+            )
+        except Exception as e:
+            logger.error(f"后台计算失败: {e}", exc_info=True)
+            calculation_task_store.fail_task(task_id, str(e))
+    
+    thread = threading.Thread(target=background_calculation)
+    thread.daemon = True
+    thread.start()
+
+def perform_calculation_with_progress(
+    entry_ids: List[int],
+    employee_ids_by_entry: Dict[int, int],
+    calculation_period: date,
+    include_social_insurance: bool,
+    task_id: str,
+    payroll_run_id: int,
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    all_entry_ids: Optional[List[int]] = None,
+    recalculate_all: bool = True
+) -> None:
+    """
+    后台执行集成计算并按分块更新进度
+    
+    条目按分块分发到进程池并行计算，每完成一个分块合并一次进度并记录已完成条目；
+    重试后仍失败的分块记录在进度信息的 failed_chunks 中，可按其中的 employee_ids 重新提交计算，
+    也可以通过续算接口只计算未完成的条目。
+    
+    Args:
+        all_entry_ids: 续算时原任务的全部条目ID（进度按全部条目计算）
+        recalculate_all: 为 False 时跳过输入指纹未变化的条目
+    """
+    from ..database import SessionLocalV2
+    
+    total = len(all_entry_ids) if all_entry_ids is not None else len(entry_ids)
+    already_done = total - len(entry_ids)
+    runner = ParallelPayrollCalculator(
+        max_workers=max_workers, chunk_size=chunk_size, max_retries=max_retries, recalculate_all=recalculate_all
+    )
+    calculation_task_store.update_progress(task_id, "CALCULATING", already_done, total, "五险一金计算")
+    
+    outcome = runner.run(
+        payroll_run_id=payroll_run_id,
+        entry_ids=entry_ids,
+        employee_ids_by_entry=employee_ids_by_entry,
+        calculation_period=calculation_period,
+        include_social_insurance=include_social_insurance,
+        progress_callback=lambda processed, total_count, stage: calculation_task_store.update_progress(
+            task_id, "CALCULATING", already_done + processed, total, stage
+        ),
+        on_chunk_done=lambda chunk: calculation_task_store.mark_entries_completed(task_id, chunk.entry_ids),
+        should_cancel=lambda: calculation_task_store.is_cancel_requested(task_id)
+    )
+    results = outcome.pop("results")
+    
+    db = SessionLocalV2()
+    try:
+        # 工资运行的条目数和金额合计已由数据库触发器随各分块写回维护（续算时同样覆盖全部条目）
+        calculation_summary = IntegratedPayrollCalculator(db).get_calculation_summary(results)
+        if outcome["success_count"] > 0:
+            period_id = db.query(PayrollRun.payroll_period_id).filter(PayrollRun.id == payroll_run_id).scalar()
+            mark_payroll_periods_stale(period_id)
+    finally:
+        db.close()
+    
+    processed = total - sum(len(c["entry_ids"]) for c in outcome["failed_chunks"])
+    if outcome["cancelled"]:
+        final_status = "CANCELLED"
+        stage = f"已取消，已完成 {processed}/{total} 条，可续算"
+    else:
+        final_status = "COMPLETED" if outcome["success_count"] > 0 or not entry_ids else "FAILED"
+        stage = "计算完成" if not outcome["failed_chunks"] else f"计算完成，{len(outcome['failed_chunks'])} 个分块失败"
+    calculation_task_store.update_progress(
+        task_id, final_status, processed if outcome["cancelled"] else total, total, stage,
+        success_count=outcome["success_count"],
+        skipped_count=outcome["skipped_count"],
+        error_count=outcome["error_count"],
+        errors=outcome["errors"],
+        failed_chunks=outcome["failed_chunks"],
+        payroll_totals=calculation_summary.get('payroll_totals', {}),
+        social_insurance_breakdown=calculation_summary.get('social_insurance_breakdown', {}),
+        cost_analysis=calculation_summary.get('cost_analysis', {}),
+        include_social_insurance=include_social_insurance,
+        calculation_period=calculation_period.isoformat()
+    )
+    logger.info(f"✅ [perform_calculation_with_progress] 任务 {task_id} {final_status} - 成功: {outcome['success_count']}, 失败: {outcome['error_count']}")
+
 @router.delete("/payroll-data/{period_id}", response_model=DataResponse[Dict[str, Any]])
 async def delete_payroll_data_for_period(
     period_id: int,
@@ -3707,7 +3700,7 @@ async def get_personnel_category_statistics(
             AVG(应发合计) as 平均应发,
             AVG(扣除合计) as 平均扣除,
             AVG(实发合计) as 平均实发
-        FROM reports.v_payroll_basic 
+        FROM {payroll_view_source(db, 'v_payroll_basic', period_id)} 
         {where_clause}
         AND 根人员类别 IS NOT NULL
         GROUP BY 根人员类别
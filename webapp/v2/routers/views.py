@@ -11,6 +11,7 @@ from sqlalchemy import text
 
 from webapp.database import get_db as get_session
 from webapp.v2.utils.auth import get_current_user_id
+from webapp.v2.services.payroll_snapshot import payroll_view_source
 
 router = APIRouter(prefix="/views", tags=["Views"])
 
@@ -735,7 +736,7 @@ async def get_payroll_entries_detailed(
             人员类别 as personnel_category_name, 
             计算时间::text as calculated_at, 
             更新时间::text as updated_at
-        FROM reports.v_comprehensive_employee_payroll
+        FROM {payroll_view_source(session, 'v_comprehensive_employee_payroll', period_id)}
         {where_clause}
         ORDER BY 员工编号 NULLS LAST, 薪资条目id
         LIMIT {limit} OFFSET {offset}
@@ -1174,7 +1175,7 @@ async def get_comprehensive_payroll_data(
         # 选择所有列
         query = f"""
         SELECT *
-        FROM reports.v_comprehensive_employee_payroll
+        FROM {payroll_view_source(session, 'v_comprehensive_employee_payroll', period_id)}
         {where_clause}
         ORDER BY "部门名称", "姓名"
         LIMIT {limit} OFFSET {offset}
@@ -3,7 +3,7 @@
 使用简化查询进行数据访问，确保极速响应
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Dict, Any, Optional
@@ -14,6 +14,7 @@ from ..database import get_db_v2
 from webapp.auth import smart_require_permissions, get_current_user, require_basic_auth_only
 from ..utils.common import create_error_response
 from ..pydantic_models.common import SuccessResponse, OptimizedResponse
+from ..services.reference_data import get_reference_data, not_modified_response
 
 logger = logging.getLogger(__name__)
 
@@ -63,99 +64,45 @@ async def get_user_optimized(
 
 @router.get("/payroll-component-definitions")
 async def get_payroll_component_definitions_optimized(
+    request: Request,
+    response: Response,
     is_active: Optional[bool] = Query(True, description="是否活跃"),
     component_type: Optional[str] = Query(None, description="组件类型"),
     size: int = Query(100, le=100, description="返回数量"),
     db: Session = Depends(get_db_v2)
     # ⚡️ 已无权限验证，保持现状
 ):
-    """🚀 高性能薪资组件定义查询 - 超级优化版"""
-    import time
-    start_time = time.time()
-    
+    """🚀 高性能薪资组件定义查询 - 从参照数据快照读取，支持 If-None-Match"""
     try:
-        # 🚀 使用最简单的原生SQL，减少开销
-        query = """
-            SELECT 
-                id, code, name, type as component_type, is_active, 
-                display_order, calculation_method, is_taxable,
-                is_social_security_base, is_housing_fund_base
-            FROM config.payroll_component_definitions
-            WHERE ($1::boolean IS NULL OR is_active = $1)
-              AND ($2::text IS NULL OR type = $2)
-            ORDER BY display_order ASC, code ASC
-            LIMIT $3
-        """
-        
-        # 🚀 直接使用psycopg2连接，跳过SQLAlchemy开销
-        import psycopg2
-        from psycopg2.extras import RealDictCursor
-        
-        # 从SQLAlchemy获取连接字符串
-        db_url = str(db.bind.url)
-        # 转换为psycopg2格式
-        psycopg2_url = db_url.replace('postgresql+psycopg2://', 'postgresql://')
-        
-        with psycopg2.connect(psycopg2_url) as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query, (is_active, component_type, size))
-                components = [dict(row) for row in cur.fetchall()]
-        
-        execution_time = (time.time() - start_time) * 1000
-        logger.info(f"🚀 薪资组件定义查询优化版执行时间: {execution_time:.2f}ms")
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("payroll_component_definitions"))
+        if not_modified:
+            return not_modified
+        
+        components = [
+            row for row in snapshot.rows("payroll_component_definitions", is_active)
+            if component_type is None or row["component_type"] == component_type
+        ][:size]
         
         return OptimizedResponse(
             success=True,
             data=components,
-            message=f"成功获取 {len(components)} 个薪资组件定义 (耗时: {execution_time:.1f}ms)"
+            message=f"成功获取 {len(components)} 个薪资组件定义"
         )
         
     except Exception as e:
-        execution_time = (time.time() - start_time) * 1000
-        logger.error(f"❌ 获取薪资组件定义失败 (耗时: {execution_time:.2f}ms): {e}")
-        
-        # 降级到原SQLAlchemy方案
-        try:
-            query = text("""
-                SELECT 
-                    id, code, name, type as component_type, is_active, 
-                    display_order, calculation_method, is_taxable,
-                    is_social_security_base, is_housing_fund_base
-                FROM config.payroll_component_definitions
-                WHERE (:is_active IS NULL OR is_active = :is_active)
-                  AND (:component_type IS NULL OR type = :component_type)
-                ORDER BY display_order ASC, code ASC
-                LIMIT :size
-            """)
-            
-            result = db.execute(query, {
-                "is_active": is_active,
-                "component_type": component_type,
-                "size": size
-            })
-            
-            components = [dict(row._mapping) for row in result]
-            
-            fallback_time = (time.time() - start_time) * 1000
-            logger.warning(f"⚠️ 降级到SQLAlchemy方案 (耗时: {fallback_time:.2f}ms)")
-            
-            return OptimizedResponse(
-                success=True,
-                data=components,
-                message=f"成功获取 {len(components)} 个薪资组件定义 (降级方案)"
-            )
-            
-        except Exception as fallback_error:
-            logger.error(f"💥 降级方案也失败: {fallback_error}")
-            raise HTTPException(status_code=500, detail=f"获取薪资组件定义失败: {str(fallback_error)}")
+        logger.error(f"❌ 获取薪资组件定义失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取薪资组件定义失败: {str(e)}")
 
 @router.get("/lookup-values-public")
 async def get_lookup_values_public_optimized(
+    request: Request,
+    response: Response,
     lookup_type_code: str = Query(..., description="查找类型代码"),
     is_active: Optional[bool] = Query(True, description="是否活跃"),
     db: Session = Depends(get_db_v2)
 ):
-    """🚀 高性能公共lookup查询 - 简化版"""
+    """🚀 高性能公共lookup查询 - 从参照数据快照读取，支持 If-None-Match"""
     try:
         safe_lookup_types = {
             'GENDER', 'EMPLOYEE_STATUS', 'EMPLOYMENT_TYPE', 'CONTRACT_TYPE', 
@@ -167,23 +114,12 @@ async def get_lookup_values_public_optimized(
         if lookup_type_code not in safe_lookup_types:
             raise HTTPException(status_code=400, detail=f"不允许查询的lookup类型: {lookup_type_code}")
         
-        query = text("""
-            SELECT 
-                lv.id, lv.code, lv.name, lv.description, lv.sort_order, lv.is_active
-            FROM config.lookup_values lv
-            JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-            WHERE lt.code = :type_code
-              AND (:is_active IS NULL OR lv.is_active = :is_active)
-            ORDER BY lv.sort_order ASC, lv.code ASC
-            LIMIT 50
-        """)
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("lookup_values"))
+        if not_modified:
+            return not_modified
         
-        result = db.execute(query, {
-            "type_code": lookup_type_code,
-            "is_active": is_active
-        })
-        
-        values = [dict(row._mapping) for row in result]
+        values = snapshot.lookup_values(type_code=lookup_type_code, is_active=is_active)[:50]
         
         return OptimizedResponse(
             success=True,
@@ -199,19 +135,18 @@ async def get_lookup_values_public_optimized(
 
 @router.get("/lookup-types")
 async def get_lookup_types_optimized(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db_v2)
 ):
-    """🚀 高性能lookup类型查询 - 简化版"""
+    """🚀 高性能lookup类型查询 - 从参照数据快照读取，支持 If-None-Match"""
     try:
-        query = text("""
-            SELECT 
-                id, code, name, description
-            FROM config.lookup_types
-            ORDER BY code ASC
-        """)
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("lookup_types"))
+        if not_modified:
+            return not_modified
         
-        result = db.execute(query)
-        types = [dict(row._mapping) for row in result]
+        types = snapshot.rows("lookup_types")
         
         return OptimizedResponse(
             success=True,
@@ -227,23 +162,21 @@ async def get_lookup_types_optimized(
 
 @router.get("/departments")
 async def get_departments_optimized(
+    request: Request,
+    response: Response,
     is_active: Optional[bool] = Query(True, description="是否活跃"),
     db: Session = Depends(get_db_v2)
     # ⚡️ 临时移除权限验证以提升性能
     # current_user = Depends(require_basic_auth_only())
 ):
-    """🚀 高性能部门查询 - 简化版"""
+    """🚀 高性能部门查询 - 从参照数据快照读取，支持 If-None-Match"""
     try:
-        query = text("""
-            SELECT 
-                id, name, code, is_active, parent_department_id
-            FROM hr.departments
-            WHERE (:is_active IS NULL OR is_active = :is_active)
-            ORDER BY code ASC
-        """)
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("departments"))
+        if not_modified:
+            return not_modified
         
-        result = db.execute(query, {"is_active": is_active})
-        departments = [dict(row._mapping) for row in result]
+        departments = snapshot.rows("departments", is_active)
         
         return OptimizedResponse(
             success=True,
@@ -257,22 +190,20 @@ async def get_departments_optimized(
 
 @router.get("/personnel-categories")
 async def get_personnel_categories_optimized(
+    request: Request,
+    response: Response,
     is_active: Optional[bool] = Query(True, description="是否活跃"),
     db: Session = Depends(get_db_v2)
     # ⚡️ 已无权限验证，保持现状
 ):
-    """🚀 高性能人员类别查询 - 简化版"""
+    """🚀 高性能人员类别查询 - 从参照数据快照读取，支持 If-None-Match"""
     try:
-        query = text("""
-            SELECT 
-                id, name, code, description, is_active, parent_category_id
-            FROM hr.personnel_categories
-            WHERE (:is_active IS NULL OR is_active = :is_active)
-            ORDER BY code ASC
-        """)
+        snapshot = get_reference_data(db)
+        not_modified = not_modified_response(request, response, snapshot.etag("personnel_categories"))
+        if not_modified:
+            return not_modified
         
-        result = db.execute(query, {"is_active": is_active})
-        categories = [dict(row._mapping) for row in result]
+        categories = snapshot.rows("personnel_categories", is_active)
         
         return OptimizedResponse(
             success=True,
@@ -337,20 +268,12 @@ async def batch_lookup_optimized(
         if invalid_types:
             raise HTTPException(status_code=400, detail=f"不允许查询的lookup类型: {invalid_types}")
         
-        result_data = {}
-        for lookup_type in lookup_types:
-            query = text("""
-                SELECT 
-                    lv.id, lv.code, lv.name, lv.description, lv.sort_order, lv.is_active
-                FROM config.lookup_values lv
-                JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
-                WHERE lt.code = :type_code AND lv.is_active = true
-                ORDER BY lv.sort_order ASC, lv.code ASC
-            """)
-            
-            result = db.execute(query, {"type_code": lookup_type})
-            values = [dict(row._mapping) for row in result]
-            result_data[lookup_type] = values
+        # 所有类型从同一份参照数据快照读取，不再逐个类型查询
+        snapshot = get_reference_data(db)
+        result_data = {
+            lookup_type: snapshot.lookup_values(type_code=lookup_type, is_active=True)
+            for lookup_type in lookup_types
+        }
         
         return OptimizedResponse(
             success=True,
@@ -1,7 +1,10 @@
 -- 基于薪资组件定义表动态生成综合薪资视图
 -- 此脚本会根据 config.payroll_component_definitions 表中的标准定义自动生成所有字段
+-- 组件金额从 payroll.entry_component_values（按列存储的组件金额表，由触发器同步维护）中按条目聚合读取，
+-- 不再逐行解析 JSONB；布尔标志字段仍从 calculation_inputs 读取
 
--- 1. 先删除现有视图
+-- 1. 先删除现有视图（物化快照依赖该视图，一并删除后在末尾重建）
+DROP MATERIALIZED VIEW IF EXISTS reports.mv_comprehensive_employee_payroll;
 DROP VIEW IF EXISTS reports.v_comprehensive_employee_payroll;
 
 -- 2. 动态生成视图的SQL构建
@@ -15,8 +18,11 @@ DECLARE
     calculation_rate_fields TEXT := '';
     calculation_result_fields TEXT := '';
     other_fields TEXT := '';
+    pivot_fields TEXT := '';
+    pivot_index INTEGER := 0;
     component_record RECORD;
     field_source TEXT;
+    field_section TEXT;
     field_alias TEXT;
     actual_field_code TEXT;
 BEGIN
@@ -75,16 +81,20 @@ SELECT
             display_order, 
             name
     LOOP
-        -- 根据组件类型确定数据源字段
+        -- 根据组件类型确定数据源字段（及组件金额表中对应的来源）
         CASE component_record.type
             WHEN 'EARNING' THEN
                 field_source := 'pe.earnings_details';
+                field_section := 'EARNING';
             WHEN 'PERSONAL_DEDUCTION', 'EMPLOYER_DEDUCTION' THEN
                 field_source := 'pe.deductions_details';
+                field_section := 'DEDUCTION';
             WHEN 'CALCULATION_BASE', 'CALCULATION_RATE', 'CALCULATION_RESULT', 'OTHER' THEN
                 field_source := 'pe.calculation_inputs';
+                field_section := 'INPUT';
             ELSE
                 field_source := 'pe.deductions_details'; -- 默认
+                field_section := 'DEDUCTION';
         END CASE;
 
         -- 生成字段定义，处理字段名映射
@@ -97,8 +107,13 @@ SELECT
             ELSE component_record.code
         END;
         
+        -- 在按条目聚合的组件金额中增加一列，视图字段引用该列
+        pivot_index := pivot_index + 1;
+        pivot_fields := pivot_fields || CASE WHEN pivot_fields = '' THEN '' ELSE ',' END || '
+            MAX(v.amount) FILTER (WHERE v.section = ''' || field_section || ''' AND v.component_code = ''' || actual_field_code || ''') AS c' || pivot_index;
+
         field_alias := ',
-    COALESCE(((' || field_source || ' -> ''' || actual_field_code || '''::text) ->> ''amount''::text)::numeric, 0.00) AS "' || component_record.name || '"';
+    COALESCE(cv.c' || pivot_index || ', 0.00) AS "' || component_record.name || '"';
 
         -- 添加到相应的字段组
         CASE component_record.type
@@ -168,7 +183,12 @@ SELECT
 FROM (((payroll.payroll_entries pe
      LEFT JOIN reports.v_employees_basic eb ON ((pe.employee_id = eb.id)))
      LEFT JOIN payroll.payroll_periods pp ON ((pe.payroll_period_id = pp.id)))
-     LEFT JOIN payroll.payroll_runs pr ON ((pe.payroll_run_id = pr.id)));';
+     LEFT JOIN payroll.payroll_runs pr ON ((pe.payroll_run_id = pr.id)))
+     LEFT JOIN LATERAL (
+        SELECT ' || pivot_fields || '
+        FROM payroll.entry_component_values v
+        WHERE v.entry_id = pe.id
+     ) cv ON true;';
 
     -- 执行生成的SQL
     EXECUTE sql_text;
@@ -176,4 +196,13 @@ FROM (((payroll.payroll_entries pe
     RAISE NOTICE '视图 reports.v_comprehensive_employee_payroll 已成功创建，包含 % 个动态字段', 
         (SELECT COUNT(*) FROM config.payroll_component_definitions WHERE is_active = true AND code NOT IN ('GROSS_PAY_TOTAL', 'TOTAL_DEDUCTIONS', 'NET_PAY_TOTAL'));
         
-END $$; 
\ No newline at end of file
+END $$; 
+
+-- 3. 重建物化快照及其唯一索引（用于 REFRESH MATERIALIZED VIEW CONCURRENTLY）
+CREATE MATERIALIZED VIEW reports.mv_comprehensive_employee_payroll AS
+SELECT * FROM reports.v_comprehensive_employee_payroll;
+
+CREATE UNIQUE INDEX uq_mv_comprehensive_employee_payroll_period_run_employee
+    ON reports.mv_comprehensive_employee_payroll ("薪资期间id", "薪资运行id", "员工id");
+CREATE INDEX idx_mv_comprehensive_employee_payroll_run
+    ON reports.mv_comprehensive_employee_payroll ("薪资运行id");
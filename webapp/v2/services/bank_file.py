@@ -0,0 +1,391 @@
+"""
+银行代发文件流式生成服务
+
+原实现先把工资运行的全部 (PayrollEntry, Employee, EmployeeBankAccount) 加载到内存，
+拼出完整文件字符串后再返回。这里改为：
+
+- 通过服务端游标逐行读取轻量行（iter_bank_export_rows），不加载 ORM 实体；
+- 各银行格式的写入器按 文件头 / 明细 / 文件尾 增量输出，缓冲达到一定大小即输出一块；
+- 文件头需要的总笔数、总金额来自查询中的窗口汇总列（与明细同一快照），
+  写入过程中同步累计实际输出的笔数、金额和 SHA-256 校验值，结束时与文件头核对。
+
+无论工资运行有多少条记录，内存占用只与缓冲大小有关。
+"""
+
+import csv
+import hashlib
+import io
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+from sqlalchemy.orm import Session
+
+from ..crud.payroll.bank_export import iter_bank_export_rows
+
+logger = logging.getLogger(__name__)
+
+# 输出块大小（字节），达到后输出一块
+BANK_FILE_CHUNK_SIZE = 64 * 1024
+
+# 文件格式对应的 MIME 类型
+BANK_FILE_MEDIA_TYPES: Dict[str, str] = {
+    "txt": "text/plain; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "excel": "text/csv; charset=utf-8",
+}
+
+
+class BankFileWriter:
+    """银行文件写入器基类：按 文件头 / 明细 / 文件尾 输出文本行"""
+
+    # 员工姓名中姓和名之间的分隔符
+    name_separator = ""
+
+    def __init__(self, export: "BankFileExport"):
+        self.export = export
+
+    def header(self) -> List[str]:
+        return []
+
+    def detail(self, index: int, record: Dict[str, Any]) -> List[str]:
+        raise NotImplementedError
+
+    def trailer(self) -> List[str]:
+        return []
+
+
+class CsvBankFileWriter(BankFileWriter):
+    """CSV 写入器基类，复用一个 csv.writer 逐行格式化"""
+
+    def __init__(self, export: "BankFileExport"):
+        super().__init__(export)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def row(self, values: List[Any]) -> str:
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerow(values)
+        return self._buffer.getvalue()
+
+
+class IcbcTxtWriter(BankFileWriter):
+    """工商银行 TXT 格式"""
+
+    def header(self) -> List[str]:
+        export = self.export
+        return [f"H|{export.expected_count:08d}|{export.expected_amount:015.2f}|CNY|{export.generated_at.strftime('%Y%m%d')}|工资代发\n"]
+
+    def detail(self, index: int, record: Dict[str, Any]) -> List[str]:
+        return [f"D|{index:08d}|{record['bank_account']}|{record['employee_name']}|{record['bank_name']}|{record['amount']:012.2f}|CNY|{record['remark']}\n"]
+
+    def trailer(self) -> List[str]:
+        return [f"T|{self.export.total_count:08d}|{self.export.total_amount:015.2f}"]
+
+
+class IcbcCsvWriter(CsvBankFileWriter):
+    """工商银行 CSV 格式"""
+
+    def header(self) -> List[str]:
+        return [self.row(["序号", "账号", "户名", "开户银行", "金额", "币种", "备注"])]
+
+    def detail(self, index: int, record: Dict[str, Any]) -> List[str]:
+        return [self.row([
+            index,
+            record['bank_account'],
+            record['employee_name'],
+            record['bank_name'],
+            f"{record['amount']:.2f}",
+            "CNY",
+            record['remark']
+        ])]
+
+
+class GenericCsvWriter(CsvBankFileWriter):
+    """通用 CSV 格式（末尾带汇总行）"""
+
+    def header(self) -> List[str]:
+        return [self.row(["员工编号", "员工姓名", "银行账号", "开户银行", "发放金额", "备注"])]
+
+    def detail(self, index: int, record: Dict[str, Any]) -> List[str]:
+        return [self.row([
+            record['employee_code'],
+            record['employee_name'],
+            record['bank_account'],
+            record['bank_name'],
+            f"{record['amount']:.2f}",
+            record['remark']
+        ])]
+
+    def trailer(self) -> List[str]:
+        return [
+            self.row([]),
+            self.row(["汇总", f"共{self.export.total_count}人", "", "", f"{self.export.total_amount:.2f}", ""])
+        ]
+
+
+class GenericTxtWriter(BankFileWriter):
+    """通用 TXT 格式（定宽列）"""
+
+    def header(self) -> List[str]:
+        export = self.export
+        return [
+            f"银行代发文件 - 生成时间: {export.generated_at.strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"总记录数: {export.expected_count}, 总金额: {export.expected_amount:.2f}\n",
+            "-" * 120 + "\n",
+            f"{'序号':<4} {'员工编号':<10} {'员工姓名':<10} {'银行账号':<20} {'开户银行':<30} {'金额':<12} {'备注':<20}\n",
+            "-" * 120 + "\n",
+        ]
+
+    def detail(self, index: int, record: Dict[str, Any]) -> List[str]:
+        return [f"{index:<4} {record['employee_code']:<10} {record['employee_name']:<10} {record['bank_account']:<20} {record['bank_name']:<30} {record['amount']:<12.2f} {record['remark']:<20}\n"]
+
+    def trailer(self) -> List[str]:
+        return [
+            "-" * 120 + "\n",
+            f"合计: {self.export.total_count}人, {self.export.total_amount:.2f}元"
+        ]
+
+
+class TitledCsvWriter(GenericCsvWriter):
+    """带标题行的 CSV（Excel 格式暂以 CSV 输出）"""
+
+    title = "银行代发文件"
+
+    def header(self) -> List[str]:
+        return [self.row([self.title]), self.row([])] + super().header()
+
+    def trailer(self) -> List[str]:
+        return []
+
+
+class IcbcExcelWriter(TitledCsvWriter):
+    title = "工商银行代发文件"
+
+
+class RunExportCsvWriter(CsvBankFileWriter):
+    """薪资审核银行导出 CSV（/payroll-runs/{run_id}/bank-export，包含缺少账号的员工）"""
+
+    name_separator = " "
+
+    def header(self) -> List[str]:
+        return [self.row(["员工工号", "员工姓名", "银行账号", "开户行名称", "实发金额"])]
+
+    def detail(self, index: int, record: Dict[str, Any]) -> List[str]:
+        return [self.row([
+            record['employee_code'],
+            record['employee_name'],
+            record['bank_account'],
+            record['bank_name'],
+            f"{record['amount']:.2f}"
+        ])]
+
+
+# (银行类型, 文件格式) -> 写入器；建设/农业/中国/招商银行目前使用通用格式
+BANK_FILE_WRITERS: Dict[tuple, Type[BankFileWriter]] = {
+    ("ICBC", "txt"): IcbcTxtWriter,
+    ("ICBC", "csv"): IcbcCsvWriter,
+    ("ICBC", "excel"): IcbcExcelWriter,
+    ("GENERIC", "txt"): GenericTxtWriter,
+    ("GENERIC", "csv"): GenericCsvWriter,
+    ("GENERIC", "excel"): TitledCsvWriter,
+    ("RUN_EXPORT", "csv"): RunExportCsvWriter,
+}
+
+
+def get_bank_file_writer(bank_type: str, file_format: str) -> Type[BankFileWriter]:
+    """按银行类型和文件格式选择写入器（未知组合使用通用格式，未知文件格式按 TXT 输出）"""
+    writer = BANK_FILE_WRITERS.get((bank_type, file_format))
+    if writer is None:
+        writer = BANK_FILE_WRITERS.get(("GENERIC", file_format), GenericTxtWriter)
+    return writer
+
+
+class BankFileExport:
+    """
+    一次银行代发文件导出
+
+    open() 执行查询并读取第一行（得到汇总和是否为空），iter_chunks() 流式输出文件内容。
+    未传入会话时使用独立会话并在输出结束后关闭，适用于 StreamingResponse
+    （响应体在请求依赖释放之后才开始发送）。
+    """
+
+    def __init__(
+        self,
+        run_id: int,
+        bank_type: str = "ICBC",
+        file_format: str = "txt",
+        purpose: str = "",
+        positive_only: bool = True,
+        require_account: bool = True,
+        chunk_size: int = BANK_FILE_CHUNK_SIZE
+    ):
+        self.run_id = run_id
+        self.bank_type = bank_type
+        self.file_format = file_format
+        self.purpose = purpose
+        self.positive_only = positive_only
+        self.require_account = require_account
+        self.chunk_size = chunk_size
+        self.generated_at = datetime.now()
+
+        # 查询汇总（文件头使用）
+        self.expected_count = 0
+        self.expected_amount = Decimal("0")
+        self.row_count = 0
+
+        # 写入过程中累计
+        self.total_count = 0
+        self.total_amount = Decimal("0")
+        self.skipped_count = 0
+        self.bytes_written = 0
+        self.checksum: Optional[str] = None
+
+        self._db: Optional[Session] = None
+        self._owns_session = False
+        self._rows: Optional[Iterator[Any]] = None
+        self._first_row = None
+        self._writer = get_bank_file_writer(bank_type, file_format)(self)
+
+    @property
+    def media_type(self) -> str:
+        return BANK_FILE_MEDIA_TYPES.get(self.file_format, BANK_FILE_MEDIA_TYPES["txt"])
+
+    @property
+    def is_empty(self) -> bool:
+        """没有可写入的明细记录"""
+        return self.expected_count == 0
+
+    def open(self, db: Optional[Session] = None) -> "BankFileExport":
+        """执行查询并读取第一行"""
+        if db is None:
+            from ..database import SessionLocalV2
+            db = SessionLocalV2()
+            self._owns_session = True
+        self._db = db
+
+        try:
+            self._rows = iter_bank_export_rows(db, self.run_id, positive_only=self.positive_only)
+            self._first_row = next(self._rows, None)
+        except Exception:
+            self.close()
+            raise
+
+        if self._first_row is not None:
+            first = self._first_row
+            self.row_count = first.row_count
+            if self.require_account:
+                self.expected_count = first.payable_count
+                self.expected_amount = Decimal(first.payable_amount or 0)
+            else:
+                self.expected_count = first.row_count
+                self.expected_amount = Decimal(first.row_amount or 0)
+        return self
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """流式输出文件内容（UTF-8），同时累计笔数、金额和 SHA-256"""
+        if self._rows is None:
+            raise RuntimeError("BankFileExport.open() must be called before iter_chunks()")
+
+        digest = hashlib.sha256()
+        buffer: List[str] = []
+        buffered = 0
+
+        def flush() -> bytes:
+            nonlocal buffer, buffered
+            data = "".join(buffer).encode("utf-8")
+            buffer = []
+            buffered = 0
+            digest.update(data)
+            self.bytes_written += len(data)
+            return data
+
+        try:
+            buffer.extend(self._writer.header())
+
+            rows = self._rows
+            if self._first_row is not None:
+                rows = _prepend(self._first_row, rows)
+                self._first_row = None
+
+            for row in rows:
+                record = self._to_record(row)
+                if record is None:
+                    continue
+                self.total_count += 1
+                self.total_amount += record['amount']
+                for line in self._writer.detail(self.total_count, record):
+                    buffer.append(line)
+                    buffered += len(line)
+                if buffered >= self.chunk_size:
+                    yield flush()
+
+            if self.total_count != self.expected_count or self.total_amount != self.expected_amount:
+                logger.warning(
+                    f"⚠️ [银行文件] 工资运行 {self.run_id} 写入 {self.total_count} 笔/{self.total_amount:.2f} "
+                    f"与文件头 {self.expected_count} 笔/{self.expected_amount:.2f} 不一致"
+                )
+
+            buffer.extend(self._writer.trailer())
+            yield flush()
+
+            self.checksum = digest.hexdigest()
+            logger.info(
+                f"🏦 [银行文件] 工资运行 {self.run_id} {self.bank_type}/{self.file_format}: "
+                f"{self.total_count} 笔, 金额 {self.total_amount:.2f}, 跳过 {self.skipped_count}, "
+                f"{self.bytes_written} 字节, sha256={self.checksum}"
+            )
+        finally:
+            self.close()
+
+    def read_all(self) -> str:
+        """输出完整文件内容（用于需要在 JSON 中返回文件内容的接口）"""
+        return b"".join(self.iter_chunks()).decode("utf-8")
+
+    def summary(self) -> Dict[str, Any]:
+        """写入完成后的汇总"""
+        return {
+            "payroll_run_id": self.run_id,
+            "bank_type": self.bank_type,
+            "file_format": self.file_format,
+            "records_count": self.total_count,
+            "total_amount": f"{self.total_amount:.2f}",
+            "skipped_count": self.skipped_count,
+            "bytes": self.bytes_written,
+            "sha256": self.checksum,
+        }
+
+    def close(self) -> None:
+        if self._rows is not None:
+            self._rows.close()
+        if self._owns_session and self._db is not None:
+            self._db.close()
+        self._db = None
+        self._owns_session = False
+
+    def _to_record(self, row) -> Optional[Dict[str, Any]]:
+        employee_code = row.employee_code or ""
+        employee_name = f"{row.last_name or ''}{self._writer.name_separator}{row.first_name or ''}".strip() or employee_code or "未知员工"
+
+        if self.require_account and not row.account_number:
+            self.skipped_count += 1
+            logger.warning(f"员工 {employee_name} 缺少银行账号信息")
+            return None
+
+        return {
+            "employee_code": employee_code,
+            "employee_name": employee_name,
+            "bank_account": row.account_number or "",
+            "bank_name": row.bank_name or ("未知银行" if self.require_account else ""),
+            "amount": Decimal(row.net_pay or 0),
+            "currency": "CNY",
+            "purpose": self.purpose,
+            "remark": f"工资发放-{employee_code}",
+        }
+
+
+def _prepend(first, rows: Iterator[Any]) -> Iterator[Any]:
+    yield first
+    yield from rows
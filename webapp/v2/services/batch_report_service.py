@@ -2,16 +2,20 @@
 批量报表生成服务。
 """
 import os
+import time
 import zipfile
 import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
+import multiprocessing
 from sqlalchemy.orm import Session
 
 from ..crud import batch_reports as crud_batch_reports
 from ..models.reports import BatchReportTask, BatchReportTaskItem
 from ..pydantic_models.reports import BatchReportTaskItemUpdate, ReportFileManagerCreate
+from .progress_stream import progress_broadcaster
 from .report_generators import (
     PayrollSummaryGenerator,
     PayrollDetailGenerator,
@@ -25,11 +29,76 @@ from .report_generators import (
 logger = logging.getLogger(__name__)
 
 
+# 默认并发生成的报表数（工作进程数），可通过任务 export_config.max_workers 覆盖
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# 任务项状态累计到该数量或距上次写入超过该时间（秒）时批量写入数据库
+ITEM_UPDATE_BATCH_SIZE = 10
+ITEM_UPDATE_FLUSH_SECONDS = 2.0
+
+# 生成器类型 -> 生成器类
+REPORT_GENERATORS = {
+    "payroll_summary": PayrollSummaryGenerator,
+    "payroll_detail": PayrollDetailGenerator,
+    "department_summary": DepartmentSummaryGenerator,
+    "tax_report": TaxDeclarationGenerator,
+    "social_insurance": SocialInsuranceGenerator,
+    "attendance_summary": AttendanceSummaryGenerator,
+}
+
+# 工作进程内复用的数据库会话（每个工作进程一个）
+_worker_db: Optional[Session] = None
+
+
+def batch_report_progress_channel(task_id: int) -> str:
+    """批量报表任务的进度推送频道名称"""
+    return f"batch_report:{task_id}"
+
+
+def _init_report_worker() -> None:
+    """工作进程初始化：丢弃可能继承自父进程的连接池，并创建本进程的数据库会话"""
+    global _worker_db
+    from ..database import engine_v2, SessionLocalV2
+    engine_v2.dispose(close=False)
+    _worker_db = SessionLocalV2()
+
+
+def generate_batch_report_file(
+    report_type: str,
+    config: Dict[str, Any],
+    output_dir: str,
+    export_format: str
+) -> Optional[str]:
+    """
+    生成单个报表文件（在工作进程或工作线程中执行）
+
+    工作进程使用初始化时创建的会话，每个报表结束后回滚只读事务，下一个报表读取最新数据；
+    未初始化会话时（单线程执行）使用临时会话。
+    """
+    generator_class = REPORT_GENERATORS.get(report_type)
+    if generator_class is None:
+        raise ValueError(f"不支持的报表类型: {report_type}")
+
+    db = _worker_db
+    temporary = db is None
+    if temporary:
+        from ..database import SessionLocalV2
+        db = SessionLocalV2()
+    try:
+        return generator_class(db).generate_report(config, output_dir, export_format)
+    finally:
+        if temporary:
+            db.close()
+        else:
+            db.rollback()
+
+
 class BatchReportService:
     """批量报表生成服务"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, max_workers: Optional[int] = None):
         self.db = db
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
         self.output_base_dir = "reports/batch_exports"
         
         # 确保输出目录存在
@@ -98,6 +167,7 @@ class BatchReportService:
                     started_at=datetime.utcnow()
                 )
             )
+            self._publish_progress(task_id)
             
             logger.info(f"开始执行批量报表任务: {task_id}")
             
@@ -118,56 +188,21 @@ class BatchReportService:
             # 获取任务项
             task_items = crud_batch_reports.get_batch_report_task_items(self.db, task_id)
             
-            # 执行每个报表项
-            generated_files = []
-            for item in task_items:
-                try:
-                    file_path = await self._execute_report_item(task, item, task_output_dir)
-                    if file_path:
-                        generated_files.append(file_path)
-                        
-                        # 更新任务项状态为完成
-                        crud_batch_reports.update_batch_report_task_item(
-                            self.db,
-                            item.id,
-                            BatchReportTaskItemUpdate(
-                                status="completed",
-                                completed_at=datetime.utcnow(),
-                                file_path=file_path,
-                                file_size=os.path.getsize(file_path) if os.path.exists(file_path) else 0,
-                                file_format=task.export_config.get("export_format", "xlsx")
-                            )
-                        )
-                    else:
-                        # 更新任务项状态为失败
-                        crud_batch_reports.update_batch_report_task_item(
-                            self.db,
-                            item.id,
-                            BatchReportTaskItemUpdate(
-                                status="failed",
-                                completed_at=datetime.utcnow(),
-                                error_message="报表生成失败"
-                            )
-                        )
-                        
-                except Exception as e:
-                    logger.error(f"执行报表项失败 {item.id}: {str(e)}")
-                    
-                    # 更新任务项状态为失败
-                    crud_batch_reports.update_batch_report_task_item(
-                        self.db,
-                        item.id,
-                        BatchReportTaskItemUpdate(
-                            status="failed",
-                            completed_at=datetime.utcnow(),
-                            error_message=str(e)
-                        )
-                    )
-            
-            # 如果需要打包，创建压缩文件
+            # 生成的报表边完成边写入压缩包
             archive_file_path = None
-            if task.export_config.get("include_archive", True) and generated_files:
-                archive_file_path = await self._create_archive(task_id, task_output_dir, generated_files)
+            archive = None
+            if task.export_config.get("include_archive", True) and task_items:
+                archive_file_path, archive = self._open_archive(task_id, task_output_dir)
+            
+            try:
+                generated_files = await self._execute_report_items(task, task_items, task_output_dir, archive)
+            finally:
+                if archive is not None:
+                    archive.close()
+            
+            if archive_file_path and not generated_files:
+                os.remove(archive_file_path)
+                archive_file_path = None
             
             # 更新任务状态为完成
             task_update = crud_batch_reports.BatchReportTaskUpdate(
@@ -181,6 +216,7 @@ class BatchReportService:
                 task_update.archive_file_size = os.path.getsize(archive_file_path)
             
             crud_batch_reports.update_batch_report_task(self.db, task_id, task_update)
+            self._publish_progress(task_id)
             
             # 创建文件管理记录
             if archive_file_path:
@@ -204,65 +240,163 @@ class BatchReportService:
                     error_message=str(e)
                 )
             )
+            self._publish_progress(task_id)
     
-    async def _execute_report_item(
+    def _publish_progress(self, task_id: int) -> None:
+        """向 SSE 订阅者推送任务进度（无订阅者时跳过查询）"""
+        channel = batch_report_progress_channel(task_id)
+        if not progress_broadcaster.has_subscribers(channel):
+            return
+        try:
+            progress = crud_batch_reports.get_batch_report_task_progress(self.db, task_id)
+            if progress:
+                progress_broadcaster.publish(channel, progress)
+        except Exception as e:
+            logger.warning(f"推送批量报表任务进度失败 {task_id}: {str(e)}")
+    
+    async def _execute_report_items(
         self,
         task: BatchReportTask,
-        item: BatchReportTaskItem,
-        output_dir: str
-    ) -> Optional[str]:
+        task_items: List[BatchReportTaskItem],
+        output_dir: str,
+        archive: Optional[zipfile.ZipFile]
+    ) -> List[str]:
         """
-        执行单个报表项
+        使用工作进程池并发执行报表项
+        
+        报表生成器是同步的 pandas/openpyxl 代码，放到工作进程中执行，不阻塞事件循环；
+        同时运行的报表数不超过并发数，任务项状态（运行中/完成/失败）累计后批量写入。
         
         Args:
             task: 批量报表任务
-            item: 报表任务项
-            output_dir: 输出目录
+            task_items: 任务项（按执行顺序）
+            output_dir: 输出目录（每个报表项写入其中的 item_<ID> 子目录）
+            archive: 压缩包，每个报表生成后立即写入（重名文件加报表项ID前缀）
             
         Returns:
-            生成的文件路径或None
+            生成的文件路径列表（按完成顺序）
         """
+        if not task_items:
+            return []
+        
+        export_format = task.export_config.get("export_format", "xlsx")
+        workers = min(max(1, int(task.export_config.get("max_workers") or self.max_workers)), len(task_items))
+        logger.info(f"🚀 [批量报表] 任务 {task.id}: {len(task_items)} 个报表, 并发 {workers}")
+        
+        loop = asyncio.get_running_loop()
+        executor = self._create_executor(workers)
+        pending_updates: List[Tuple[int, BatchReportTaskItemUpdate]] = []
+        last_flush = 0.0
+        generated_files: List[str] = []
+        archive_names: set = set()
+        queue = list(task_items)
+        in_flight: Dict[asyncio.Future, BatchReportTaskItem] = {}
+        
+        def flush(force: bool = False) -> None:
+            nonlocal last_flush
+            if not pending_updates:
+                return
+            if not force and len(pending_updates) < ITEM_UPDATE_BATCH_SIZE \
+                    and time.monotonic() - last_flush < ITEM_UPDATE_FLUSH_SECONDS:
+                return
+            try:
+                crud_batch_reports.update_batch_report_task_items(self.db, task.id, pending_updates)
+            except Exception as e:
+                logger.error(f"写入批量报表任务项状态失败 {task.id}: {str(e)}")
+            pending_updates.clear()
+            last_flush = time.monotonic()
+            self._publish_progress(task.id)
+        
         try:
-            # 更新任务项状态为运行中
-            crud_batch_reports.update_batch_report_task_item(
-                self.db,
-                item.id,
-                BatchReportTaskItemUpdate(
-                    status="running",
-                    started_at=datetime.utcnow()
-                )
-            )
-            
-            logger.info(f"开始执行报表项: {item.id} - {item.report_name}")
-            
-            # 根据报表类型生成报表
-            file_path = None
-            report_config = item.report_config
-            export_format = task.export_config.get("export_format", "xlsx")
-            
-            # 🚀 增强的报表类型映射逻辑
-            if item.report_type in self.report_type_mapping:
-                report_type = self.report_type_mapping[item.report_type]
-                file_path = await self._generate_report(report_type, report_config, output_dir, export_format)
-            else:
-                # 💡 智能回退策略：根据报表名称推断报表类型
-                logger.warning(f"未知的报表类型: {item.report_type}，尝试智能推断...")
+            while queue or in_flight:
+                # 补满空闲的工作进程
+                while queue and len(in_flight) < workers:
+                    item = queue.pop(0)
+                    report_type = self._resolve_report_type(item)
+                    pending_updates.append((item.id, BatchReportTaskItemUpdate(
+                        status="running",
+                        started_at=datetime.utcnow()
+                    )))
+                    logger.info(f"开始执行报表项: {item.id} - {item.report_name} ({report_type})")
+                    # 文件名只精确到秒，并发的同类报表各自使用独立目录，避免写入同一路径
+                    item_output_dir = os.path.join(output_dir, f"item_{item.id}")
+                    os.makedirs(item_output_dir, exist_ok=True)
+                    future = loop.run_in_executor(
+                        executor, generate_batch_report_file,
+                        report_type, item.report_config, item_output_dir, export_format
+                    )
+                    in_flight[future] = item
+                flush(force=last_flush == 0.0)
                 
-                report_type = self._infer_report_type_from_name(item.report_name, item.report_type)
-                if report_type:
-                    logger.info(f"智能推断报表类型: {item.report_type} -> {report_type}")
-                    file_path = await self._generate_report(report_type, report_config, output_dir, export_format)
-                else:
-                    # 最后的回退：使用默认的薪资明细生成器
-                    logger.warning(f"无法推断报表类型，使用默认生成器: {item.report_type}")
-                    file_path = await self._generate_report("payroll_detail", report_config, output_dir, export_format)
-            
-            logger.info(f"报表项执行完成: {item.id} - {file_path}")
-            return file_path
-            
-        except Exception as e:
-            logger.error(f"执行报表项失败 {item.id}: {str(e)}")
-            raise
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    try:
+                        file_path = future.result()
+                    except Exception as e:
+                        logger.error(f"执行报表项失败 {item.id}: {str(e)}")
+                        pending_updates.append((item.id, BatchReportTaskItemUpdate(
+                            status="failed",
+                            completed_at=datetime.utcnow(),
+                            error_message=str(e)
+                        )))
+                        continue
+                    
+                    if not file_path:
+                        pending_updates.append((item.id, BatchReportTaskItemUpdate(
+                            status="failed",
+                            completed_at=datetime.utcnow(),
+                            error_message="报表生成失败"
+                        )))
+                        continue
+                    
+                    logger.info(f"报表项执行完成: {item.id} - {file_path}")
+                    generated_files.append(file_path)
+                    exists = os.path.exists(file_path)
+                    if archive is not None and exists:
+                        archive_name = os.path.basename(file_path)
+                        if archive_name in archive_names:
+                            archive_name = f"{item.id}_{archive_name}"
+                        archive_names.add(archive_name)
+                        await loop.run_in_executor(None, archive.write, file_path, archive_name)
+                    pending_updates.append((item.id, BatchReportTaskItemUpdate(
+                        status="completed",
+                        completed_at=datetime.utcnow(),
+                        file_path=file_path,
+                        file_size=os.path.getsize(file_path) if exists else 0,
+                        file_format=export_format
+                    )))
+                flush()
+        finally:
+            flush(force=True)
+            # 异常退出时丢弃尚未开始的报表
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return generated_files
+    
+    def _create_executor(self, workers: int) -> Executor:
+        """多个并发时使用进程池（spawn 启动，避免在多线程的服务进程中 fork），否则使用单个工作线程"""
+        if workers <= 1:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-report")
+        context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_report_worker)
+    
+    def _resolve_report_type(self, item: BatchReportTaskItem) -> str:
+        """确定报表项使用的生成器类型"""
+        # 🚀 增强的报表类型映射逻辑
+        if item.report_type in self.report_type_mapping:
+            return self.report_type_mapping[item.report_type]
+        
+        # 💡 智能回退策略：根据报表名称推断报表类型
+        logger.warning(f"未知的报表类型: {item.report_type}，尝试智能推断...")
+        report_type = self._infer_report_type_from_name(item.report_name, item.report_type)
+        if report_type:
+            logger.info(f"智能推断报表类型: {item.report_type} -> {report_type}")
+            return report_type
+        
+        # 最后的回退：使用默认的薪资明细生成器
+        logger.warning(f"无法推断报表类型，使用默认生成器: {item.report_type}")
+        return "payroll_detail"
     
     def _infer_report_type_from_name(self, report_name: str, report_type: str) -> Optional[str]:
         """
@@ -295,70 +429,21 @@ class BatchReportService:
         # 无法推断，返回None
         return None
     
-    async def _generate_report(
-        self,
-        report_type: str,
-        config: Dict[str, Any],
-        output_dir: str,
-        export_format: str
-    ) -> str:
-        """生成报表"""
-        try:
-            generator = None
-            if report_type == "payroll_summary":
-                generator = PayrollSummaryGenerator(self.db)
-            elif report_type == "payroll_detail":
-                generator = PayrollDetailGenerator(self.db)
-            elif report_type == "department_summary":
-                generator = DepartmentSummaryGenerator(self.db)
-            elif report_type == "tax_report":
-                generator = TaxDeclarationGenerator(self.db)
-            elif report_type == "social_insurance":
-                generator = SocialInsuranceGenerator(self.db)
-            elif report_type == "attendance_summary":
-                generator = AttendanceSummaryGenerator(self.db)
-            else:
-                raise ValueError(f"不支持的报表类型: {report_type}")
-            
-            return generator.generate_report(config, output_dir, export_format)
-        except Exception as e:
-            logger.error(f"生成报表失败: {str(e)}")
-            raise
-    
-    async def _create_archive(
-        self,
-        task_id: int,
-        output_dir: str,
-        file_paths: List[str]
-    ) -> str:
+    def _open_archive(self, task_id: int, output_dir: str) -> Tuple[str, zipfile.ZipFile]:
         """
-        创建压缩文件
+        创建压缩文件，报表生成后逐个写入
         
         Args:
             task_id: 任务ID
             output_dir: 输出目录
-            file_paths: 文件路径列表
             
         Returns:
-            压缩文件路径
+            (压缩文件路径, 打开的 ZipFile)
         """
-        try:
-            archive_name = f"批量报表_{task_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-            archive_path = os.path.join(output_dir, archive_name)
-            
-            with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file_path in file_paths:
-                    if os.path.exists(file_path):
-                        # 使用文件名作为压缩包内的路径
-                        arcname = os.path.basename(file_path)
-                        zipf.write(file_path, arcname)
-            
-            logger.info(f"创建压缩文件成功: {archive_path}")
-            return archive_path
-            
-        except Exception as e:
-            logger.error(f"创建压缩文件失败: {str(e)}")
-            raise
+        archive_name = f"批量报表_{task_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        archive_path = os.path.join(output_dir, archive_name)
+        logger.info(f"创建压缩文件: {archive_path}")
+        return archive_path, zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED)
     
     async def _create_file_record(
         self,
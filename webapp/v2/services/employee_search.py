@@ -0,0 +1,401 @@
+"""
+员工搜索索引
+
+员工列表和选择框的搜索此前对工号、姓名、身份证号、邮箱、电话做多个 ILIKE '%关键词%'，
+每次按键都是一次全表扫描，也不支持拼音。这里在进程内维护一份员工搜索索引：
+
+- 中文姓名按单字和双字建立倒排索引，工号、证件号、电话、邮箱、拼音按三字符片段建立倒排索引，
+  一到两个字符的字母数字关键词按前缀在有序键列表中二分查找；
+- 安装了 pypinyin 时支持全拼和首字母搜索（如 "zhangsan"、"zs"）；
+- 结果按匹配程度排序（完全匹配 > 前缀匹配 > 拼音匹配 > 包含），在职员工优先。
+
+索引版本由员工表的记录数和最大更新时间确定，最多每 VERSION_CHECK_INTERVAL_SECONDS 秒向数据库确认一次，
+版本变化时在后台重建；本进程内新增、修改、删除员工后调用 invalidate_employee_search_index 立即重新确认版本。
+"""
+
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Tuple, Iterable, Sequence
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+import threading
+import time
+import logging
+
+try:
+    from pypinyin import lazy_pinyin, Style
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 版本向数据库确认的最小间隔（秒）
+VERSION_CHECK_INTERVAL_SECONDS = 30
+
+# 倒排索引片段长度（字母数字字段）
+ASCII_GRAM_SIZE = 3
+
+# 候选过多（如单个常见姓氏）时只对前缀匹配打分：最多逐一评分的候选数 / 前缀扫描条数
+MAX_SCORED_CANDIDATES = 1000
+PREFIX_SCAN_LIMIT = 500
+
+# 匹配得分：字段完全匹配 / 前缀匹配 / 拼音首字母前缀 / 全拼前缀 / 包含
+SCORE_EXACT = 100
+SCORE_PREFIX = 80
+SCORE_INITIALS_PREFIX = 70
+SCORE_PINYIN_PREFIX = 60
+SCORE_CONTAINS = 40
+
+
+@dataclass(frozen=True)
+class EmployeeSearchEntry:
+    """索引中的员工（与数据库会话无关的只读副本）"""
+    id: int
+    employee_code: Optional[str]
+    full_name: str
+    id_number: Optional[str]
+    phone_number: Optional[str]
+    email: Optional[str]
+    department_id: Optional[int]
+    department_name: Optional[str]
+    personnel_category_id: Optional[int]
+    personnel_category_name: Optional[str]
+    status_code: Optional[str]
+    is_active: bool
+    pinyin: str
+    initials: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "employee_code": self.employee_code,
+            "full_name": self.full_name,
+            "department_id": self.department_id,
+            "department_name": self.department_name,
+            "personnel_category_id": self.personnel_category_id,
+            "personnel_category_name": self.personnel_category_name,
+            "employee_status": self.status_code,
+            "is_active": self.is_active,
+        }
+
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+def _is_cjk(value: str) -> bool:
+    return any('一' <= ch <= '鿿' for ch in value)
+
+
+def _pinyin(name: str) -> Tuple[str, str]:
+    """姓名的全拼和首字母（未安装 pypinyin 时为空）"""
+    if not PYPINYIN_AVAILABLE or not name:
+        return "", ""
+    syllables = [s.lower() for s in lazy_pinyin(name, style=Style.NORMAL, errors='ignore')]
+    return "".join(syllables), "".join(s[0] for s in syllables if s)
+
+
+def _grams(value: str, size: int) -> Iterable[str]:
+    if len(value) <= size:
+        return (value,) if value else ()
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class EmployeeSearchIndexSnapshot:
+    """某一版本的员工搜索索引"""
+
+    def __init__(self, entries: List[EmployeeSearchEntry], version: Optional[Tuple] = None):
+        self.version = version
+        self.entries: Dict[int, EmployeeSearchEntry] = {e.id: e for e in entries}
+        self._fields: Dict[int, Tuple[str, ...]] = {}
+        self._cjk_postings: Dict[str, array] = {}
+        self._ascii_postings: Dict[str, array] = {}
+        # 短关键词前缀查找：(键, 员工ID) 按键排序
+        self._prefix_keys: List[Tuple[str, int]] = []
+
+        cjk_postings: Dict[str, set] = {}
+        ascii_postings: Dict[str, set] = {}
+        for entry in entries:
+            name = _normalize(entry.full_name)
+            cjk_name = _is_cjk(name)
+            ascii_fields = tuple(
+                value for value in (
+                    _normalize(entry.employee_code), _normalize(entry.id_number),
+                    _normalize(entry.phone_number), _normalize(entry.email).split('@')[0],
+                    entry.pinyin, entry.initials, '' if cjk_name else name,
+                ) if value
+            )
+            self._fields[entry.id] = ((name,) if cjk_name else ()) + ascii_fields
+
+            if cjk_name:
+                for size in (1, 2):
+                    for gram in _grams(name, size):
+                        cjk_postings.setdefault(gram, set()).add(entry.id)
+            for value in ascii_fields:
+                for gram in _grams(value, ASCII_GRAM_SIZE):
+                    ascii_postings.setdefault(gram, set()).add(entry.id)
+                self._prefix_keys.append((value, entry.id))
+            if cjk_name:
+                self._prefix_keys.append((name, entry.id))
+
+        self._cjk_postings = {gram: array('q', ids) for gram, ids in cjk_postings.items()}
+        self._ascii_postings = {gram: array('q', ids) for gram, ids in ascii_postings.items()}
+        self._prefix_keys.sort()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def match_ids(self, query: str) -> List[int]:
+        """所有匹配关键词的员工ID（未排序）"""
+        query = _normalize(query)
+        if not query:
+            return []
+        return [emp_id for emp_id in self._candidates(query) if self._score(emp_id, query)]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        active_only: bool = False,
+        department_id: Optional[int] = None,
+        personnel_category_id: Optional[int] = None,
+        employee_status: Optional[str] = None
+    ) -> List[Tuple[EmployeeSearchEntry, int]]:
+        """按匹配程度排序的搜索结果 [(员工, 得分)]"""
+        query = _normalize(query)
+        if not query:
+            return []
+
+        if len(query) < ASCII_GRAM_SIZE and not _is_cjk(query):
+            candidates = self._prefix_ids(query, PREFIX_SCAN_LIMIT)
+        else:
+            candidates = self._candidates(query)
+        if len(candidates) > MAX_SCORED_CANDIDATES:
+            # 前缀匹配的得分总是高于包含匹配，前缀结果足够时只对它们打分
+            prefix_ids = self._prefix_ids(query, PREFIX_SCAN_LIMIT)
+            if len(prefix_ids) >= limit:
+                candidates = prefix_ids
+
+        scored = []
+        for emp_id in candidates:
+            entry = self.entries[emp_id]
+            if (
+                (active_only and not entry.is_active)
+                or (department_id is not None and entry.department_id != department_id)
+                or (personnel_category_id is not None and entry.personnel_category_id != personnel_category_id)
+                or (employee_status is not None and entry.status_code != employee_status)
+            ):
+                continue
+            score = self._score(emp_id, query)
+            if score:
+                scored.append((entry, score))
+
+        scored.sort(key=lambda item: (-item[1], not item[0].is_active, len(item[0].full_name), item[0].employee_code or ""))
+        return scored[:limit]
+
+    def _candidates(self, query: str) -> Sequence[int]:
+        if _is_cjk(query):
+            grams = _grams(query, 2) if len(query) > 1 else (query,)
+            return self._smallest_posting(self._cjk_postings, grams)
+
+        if len(query) >= ASCII_GRAM_SIZE:
+            return self._smallest_posting(self._ascii_postings, _grams(query, ASCII_GRAM_SIZE))
+
+        # 一到两个字符：前缀查找
+        return self._prefix_ids(query)
+
+    def _prefix_ids(self, query: str, max_keys: Optional[int] = None) -> List[int]:
+        """有字段以关键词开头的员工ID（按键的字典序，最多扫描 max_keys 条）"""
+        start = bisect_left(self._prefix_keys, (query, -1))
+        ids: Dict[int, None] = {}
+        for index in range(start, len(self._prefix_keys)):
+            key, emp_id = self._prefix_keys[index]
+            if not key.startswith(query) or (max_keys is not None and index - start >= max_keys):
+                break
+            ids[emp_id] = None
+        return list(ids)
+
+    @staticmethod
+    def _smallest_posting(postings: Dict[str, array], grams: Iterable[str]) -> Sequence[int]:
+        # 只取最短的倒排列表作为候选，其余片段由 _score 的子串校验覆盖
+        smallest = None
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is None:
+                return ()
+            if smallest is None or len(posting) < len(smallest):
+                smallest = posting
+        return smallest if smallest is not None else ()
+
+    def _score(self, emp_id: int, query: str) -> int:
+        entry = self.entries[emp_id]
+        best = 0
+        for value in self._fields[emp_id]:
+            if value == query:
+                return SCORE_EXACT
+            if value.startswith(query):
+                if value == entry.initials:
+                    best = max(best, SCORE_INITIALS_PREFIX)
+                elif value == entry.pinyin:
+                    best = max(best, SCORE_PINYIN_PREFIX)
+                else:
+                    best = max(best, SCORE_PREFIX)
+            elif query in value:
+                best = max(best, SCORE_CONTAINS)
+        return best
+
+
+class EmployeeSearchIndex:
+    """进程内共享的员工搜索索引"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshot: Optional[EmployeeSearchIndexSnapshot] = None
+        self._version: Optional[Tuple] = None
+        self._version_checked_at = 0.0
+        self._rebuilding = False
+        self.hits = 0
+        self.rebuilds = 0
+        self.last_build_seconds: Optional[float] = None
+
+    def get_snapshot(self, db: Session) -> EmployeeSearchIndexSnapshot:
+        """
+        获取员工搜索索引
+
+        首次使用时同步构建；之后版本变化时在后台重建，重建完成前继续使用上一版本，
+        避免员工数据变更后的第一次按键等待整个索引重建。
+        """
+        version = self._current_version(db)
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                self.hits += 1
+                if snapshot.version != version and not self._rebuilding:
+                    self._rebuilding = True
+                    threading.Thread(target=self._rebuild_in_background, args=(version,), daemon=True).start()
+                return snapshot
+
+        # 同一时刻只构建一次，其他请求等待后直接使用新索引
+        with self._build_lock:
+            with self._lock:
+                if self._snapshot is not None:
+                    return self._snapshot
+            return self._build(db, version)
+
+    def _build(self, db: Session, version: Tuple) -> EmployeeSearchIndexSnapshot:
+        started = time.monotonic()
+        snapshot = EmployeeSearchIndexSnapshot(self._load(db), version)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._snapshot = snapshot
+            self.rebuilds += 1
+            self.last_build_seconds = round(elapsed, 3)
+
+        logger.info(f"🔎 [员工搜索] 构建搜索索引: {len(snapshot)} 名员工，耗时 {elapsed:.2f}s，拼音: {PYPINYIN_AVAILABLE}")
+        return snapshot
+
+    def _rebuild_in_background(self, version: Tuple) -> None:
+        from ..database import SessionLocalV2
+
+        db = SessionLocalV2()
+        try:
+            with self._build_lock:
+                self._build(db, version)
+        except Exception as e:
+            logger.error(f"❌ [员工搜索] 后台重建搜索索引失败: {e}", exc_info=True)
+        finally:
+            db.close()
+            with self._lock:
+                self._rebuilding = False
+
+    def invalidate(self) -> None:
+        """下次搜索时重新确认版本"""
+        with self._lock:
+            self._version = None
+            self._version_checked_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            return {
+                "employees": len(self._snapshot) if self._snapshot else 0,
+                "hits": self.hits,
+                "rebuilds": self.rebuilds,
+                "rebuilding": self._rebuilding,
+                "last_build_seconds": self.last_build_seconds,
+                "pinyin_enabled": PYPINYIN_AVAILABLE,
+            }
+
+    def _load(self, db: Session) -> List[EmployeeSearchEntry]:
+        rows = db.execute(text("""
+            SELECT
+                e.id, e.employee_code, e.last_name, e.first_name, e.id_number,
+                e.phone_number, e.email, e.is_active, e.department_id, e.personnel_category_id,
+                d.name AS department_name,
+                pc.name AS personnel_category_name,
+                status.code AS status_code
+            FROM hr.employees e
+            LEFT JOIN hr.departments d ON e.department_id = d.id
+            LEFT JOIN hr.personnel_categories pc ON e.personnel_category_id = pc.id
+            LEFT JOIN config.lookup_values status ON e.status_lookup_value_id = status.id
+        """)).fetchall()
+
+        entries = []
+        for row in rows:
+            # 姓名按中文习惯：姓 + 名
+            full_name = f"{row.last_name or ''}{row.first_name or ''}".strip()
+            pinyin, initials = _pinyin(full_name)
+            entries.append(EmployeeSearchEntry(
+                id=row.id,
+                employee_code=row.employee_code,
+                full_name=full_name,
+                id_number=row.id_number,
+                phone_number=row.phone_number,
+                email=row.email,
+                department_id=row.department_id,
+                department_name=row.department_name,
+                personnel_category_id=row.personnel_category_id,
+                personnel_category_name=row.personnel_category_name,
+                status_code=row.status_code,
+                is_active=bool(row.is_active),
+                pinyin=pinyin,
+                initials=initials,
+            ))
+        return entries
+
+    def _current_version(self, db: Session) -> Tuple:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < VERSION_CHECK_INTERVAL_SECONDS:
+                return self._version
+
+        row = db.execute(text("SELECT COUNT(*), MAX(updated_at), MAX(id) FROM hr.employees")).fetchone()
+        version = (row[0], row[1].isoformat() if row[1] else None, row[2])
+
+        with self._lock:
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+
+# 所有调用方共享的搜索索引
+employee_search_index = EmployeeSearchIndex()
+
+
+def search_employees(db: Session, query: str, limit: int = 20, active_only: bool = False, **filters) -> List[Dict[str, Any]]:
+    """
+    按匹配程度排序的员工搜索结果（包含 score 字段）
+
+    Args:
+        filters: department_id、personnel_category_id、employee_status（状态代码）
+    """
+    results = employee_search_index.get_snapshot(db).search(query, limit=limit, active_only=active_only, **filters)
+    return [{**entry.to_dict(), "score": score} for entry, score in results]
+
+
+def invalidate_employee_search_index() -> None:
+    """员工数据变更后调用，使搜索索引在下次搜索时重建"""
+    employee_search_index.invalidate()
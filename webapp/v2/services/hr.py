@@ -287,12 +287,12 @@ class HRBusinessService(BusinessService):
         }
     
     def search_employees(self, search_term: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """搜索员工"""
-        if filters is None:
-            filters = {}
-        
-        filters['search_term'] = search_term
-        return self.employees.get_employees_with_details(**filters)
+        """搜索员工（使用内存搜索索引，按匹配程度排序）"""
+        from .employee_search import search_employees
+
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        limit = filters.pop('limit', 100)
+        return search_employees(self.db, search_term, limit=limit, **filters)
     
     def get_department_tree(self) -> List[Dict[str, Any]]:
         """获取部门树形结构"""
@@ -0,0 +1,303 @@
+"""
+薪资视图物化快照服务
+
+reports.v_payroll_basic 和 reports.v_comprehensive_employee_payroll 是普通视图，
+每次分页查询、分析统计和报表都会重新计算。这里为两者维护物化快照
+（reports.mv_payroll_basic / reports.mv_comprehensive_employee_payroll，唯一索引为 期间+运行+员工），
+并负责查询路由：
+
+- 工资运行计算、审核或导入完成后调用 mark_period_stale 标记期间过期，
+  并在短暂合并窗口后以 REFRESH MATERIALIZED VIEW CONCURRENTLY 在后台刷新（刷新期间不阻塞读取）；
+- 通过 ORM 修改薪资条目、工资运行或员工的会话在提交后自动标记相关期间（见 _collect_stale_periods），
+  绕过 ORM 的批量 SQL 写入仍需显式调用 mark_payroll_periods_stale；
+- 查询通过 source() 获取数据源：期间未过期时读取物化快照，刷新待完成时回退到实时视图。
+
+PostgreSQL 不支持按条件局部刷新物化视图，因此“按期间增量”体现在路由上：
+只有被标记的期间回退到实时视图，其他期间仍然读取快照。
+"""
+
+from typing import Dict, Any, Optional, Iterable
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, text
+import itertools
+import threading
+import time
+import logging
+
+from ..models.hr import Employee
+from ..models.payroll import PayrollEntry, PayrollRun
+
+logger = logging.getLogger(__name__)
+
+# 实时视图 -> 物化快照
+SNAPSHOT_VIEWS: Dict[str, str] = {
+    'v_payroll_basic': 'mv_payroll_basic',
+    'v_comprehensive_employee_payroll': 'mv_comprehensive_employee_payroll',
+}
+
+# 过期标记后等待合并的时间（秒），同一批计算/导入的多次标记只触发一次刷新
+REFRESH_DEBOUNCE_SECONDS = 5.0
+
+# 物化快照是否存在的检查结果缓存时间（秒）
+EXISTENCE_CHECK_INTERVAL_SECONDS = 60
+
+# 刷新使用的会话级咨询锁，保证多进程部署时同一时刻只有一个刷新
+REFRESH_ADVISORY_LOCK_KEY = 720120
+
+# 会话 info 中待提交后标记的期间
+_STALE_PERIODS_KEY = "payroll_snapshot_stale_periods"
+
+
+class PayrollSnapshotService:
+    """物化快照的过期标记、后台刷新和查询路由"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._available: Dict[str, bool] = {}
+        self._available_checked_at = 0.0
+        self.snapshot_reads = 0
+        self.live_reads = 0
+        self.refresh_count = 0
+        self.last_refresh_seconds: Optional[float] = None
+        self.last_refresh_at: Optional[float] = None
+
+    def source(self, db: Session, view_name: str, period_id: Optional[int] = None) -> str:
+        """
+        获取查询数据源（带 schema 的视图名）
+
+        Args:
+            view_name: 实时视图名，如 'v_payroll_basic'
+            period_id: 查询限定的期间；为空表示跨期间查询，任一期间过期即回退到实时视图
+        """
+        live = f"reports.{view_name}"
+        snapshot = SNAPSHOT_VIEWS.get(view_name)
+        if not snapshot or not self._is_available(db, snapshot):
+            self.live_reads += 1
+            return live
+
+        if period_id is not None:
+            stale = db.execute(
+                text("SELECT 1 FROM reports.payroll_snapshot_stale_periods WHERE period_id = :period_id"),
+                {"period_id": period_id}
+            ).first()
+        else:
+            stale = db.execute(text("SELECT 1 FROM reports.payroll_snapshot_stale_periods LIMIT 1")).first()
+
+        if stale:
+            self.live_reads += 1
+            return live
+        self.snapshot_reads += 1
+        return f"reports.{snapshot}"
+
+    def mark_period_stale(self, period_ids: Iterable[Optional[int]]) -> None:
+        """
+        标记期间的快照已过期并安排后台刷新
+
+        在调用方提交写入之后调用；使用独立会话写入标记，不影响调用方的事务。
+        """
+        period_ids = sorted({int(p) for p in period_ids if p is not None})
+        if not period_ids:
+            return
+
+        from ..database import SessionLocalV2
+
+        db = SessionLocalV2()
+        try:
+            db.execute(text("""
+                INSERT INTO reports.payroll_snapshot_stale_periods (period_id, marked_at)
+                SELECT unnest(CAST(:period_ids AS bigint[])), clock_timestamp()
+                ON CONFLICT (period_id) DO UPDATE SET marked_at = EXCLUDED.marked_at
+            """), {"period_ids": period_ids})
+            # 期间修改时间是报表结果缓存的数据版本
+            db.execute(
+                text("UPDATE payroll.payroll_periods SET updated_at = clock_timestamp() WHERE id = ANY(:period_ids)"),
+                {"period_ids": period_ids}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️ [薪资快照] 标记期间过期失败 {period_ids}: {e}")
+            return
+        finally:
+            db.close()
+
+        from .report_result_cache import invalidate_report_result_cache
+        invalidate_report_result_cache()
+
+        logger.info(f"🕒 [薪资快照] 期间 {period_ids} 已标记过期，{REFRESH_DEBOUNCE_SECONDS}s 后刷新")
+        self.schedule_refresh()
+
+    def schedule_refresh(self, delay: float = REFRESH_DEBOUNCE_SECONDS) -> None:
+        """在合并窗口结束后刷新（已有待执行的刷新时重新计时）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            if self.refresh():
+                return
+        except Exception as e:
+            logger.error(f"❌ [薪资快照] 后台刷新失败: {e}", exc_info=True)
+        # 其他进程正在刷新或刷新失败，稍后重试（标记仍在，查询保持回退）
+        self.schedule_refresh(REFRESH_DEBOUNCE_SECONDS * 6)
+
+    def refresh(self) -> bool:
+        """
+        并发刷新所有物化快照，并清除刷新开始前的过期标记
+
+        Returns:
+            是否完成刷新（未获得刷新锁时返回 False）
+        """
+        from ..database import SessionLocalV2
+
+        db = SessionLocalV2()
+        try:
+            locked = db.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": REFRESH_ADVISORY_LOCK_KEY}
+            ).scalar()
+            db.commit()
+            if not locked:
+                logger.info("⏳ [薪资快照] 其他进程正在刷新快照")
+                return False
+
+            try:
+                started = time.monotonic()
+                refresh_started_at = db.execute(text("SELECT clock_timestamp()")).scalar()
+                db.commit()
+
+                for snapshot in SNAPSHOT_VIEWS.values():
+                    populated = self._populated(db, snapshot)
+                    if populated is None:
+                        continue
+                    # 未填充的物化视图不能并发刷新（首次填充）
+                    concurrently = "CONCURRENTLY " if populated else ""
+                    db.execute(text(f"REFRESH MATERIALIZED VIEW {concurrently}reports.{snapshot}"))
+                    db.commit()
+
+                # 刷新过程中新产生的标记（marked_at 晚于刷新开始时间）保留，由下一次刷新处理
+                db.execute(
+                    text("DELETE FROM reports.payroll_snapshot_stale_periods WHERE marked_at <= :started_at"),
+                    {"started_at": refresh_started_at}
+                )
+                remaining = db.execute(text("SELECT COUNT(*) FROM reports.payroll_snapshot_stale_periods")).scalar()
+                db.commit()
+            finally:
+                db.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": REFRESH_ADVISORY_LOCK_KEY})
+                db.commit()
+
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.refresh_count += 1
+                self.last_refresh_seconds = round(elapsed, 3)
+                self.last_refresh_at = time.time()
+            logger.info(f"✅ [薪资快照] 物化快照刷新完成，耗时 {elapsed:.2f}s")
+
+            if remaining:
+                self.schedule_refresh()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def invalidate(self) -> None:
+        """清空物化快照存在性缓存（视图重建后调用）"""
+        with self._lock:
+            self._available = {}
+            self._available_checked_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取快照路由统计信息"""
+        with self._lock:
+            return {
+                "snapshots": dict(self._available),
+                "snapshot_reads": self.snapshot_reads,
+                "live_reads": self.live_reads,
+                "refresh_count": self.refresh_count,
+                "last_refresh_seconds": self.last_refresh_seconds,
+                "last_refresh_at": self.last_refresh_at,
+                "refresh_pending": self._timer is not None,
+            }
+
+    def _is_available(self, db: Session, snapshot: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if snapshot in self._available and now - self._available_checked_at < EXISTENCE_CHECK_INTERVAL_SECONDS:
+                return self._available[snapshot]
+
+        available = {name: bool(self._populated(db, name)) for name in SNAPSHOT_VIEWS.values()}
+        with self._lock:
+            self._available = available
+            self._available_checked_at = now
+        return available.get(snapshot, False)
+
+    @staticmethod
+    def _populated(db: Session, snapshot: str) -> Optional[bool]:
+        """物化快照是否已填充；不存在时返回 None（未填充的快照不用于查询）"""
+        row = db.execute(text("""
+            SELECT m.ispopulated
+            FROM pg_matviews m
+            WHERE m.schemaname = 'reports' AND m.matviewname = :name
+        """), {"name": snapshot}).first()
+        return bool(row[0]) if row else None
+
+
+# 所有调用方共享的快照服务
+payroll_snapshot_service = PayrollSnapshotService()
+
+
+def payroll_view_source(db: Session, view_name: str, period_id: Optional[int] = None) -> str:
+    """获取薪资视图的查询数据源（物化快照或实时视图）"""
+    return payroll_snapshot_service.source(db, view_name, period_id)
+
+
+def mark_payroll_periods_stale(*period_ids: Optional[int]) -> None:
+    """工资运行计算、审核或导入提交后调用，标记期间快照过期并安排刷新"""
+    payroll_snapshot_service.mark_period_stale(period_ids)
+
+
+# --- 提交后自动标记 ---
+
+@event.listens_for(Session, "after_flush")
+def _collect_stale_periods(session: Session, flush_context) -> None:
+    """记录本次刷写涉及的期间（薪资条目和工资运行的新旧期间、被修改员工的所有期间）"""
+    period_ids = set()
+    employee_ids = set()
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (PayrollEntry, PayrollRun)):
+            # 新旧值都需要标记（条目被移到其他期间时两个期间都变化）
+            period_ids.update(inspect(obj).attrs.payroll_period_id.history.sum())
+        elif isinstance(obj, Employee) and obj.id is not None:
+            if obj in session.deleted or session.is_modified(obj, include_collections=False):
+                employee_ids.add(obj.id)
+
+    if employee_ids:
+        rows = session.connection().execute(
+            text("SELECT DISTINCT payroll_period_id FROM payroll.payroll_entries WHERE employee_id = ANY(:employee_ids)"),
+            {"employee_ids": sorted(employee_ids)}
+        )
+        period_ids.update(row[0] for row in rows)
+
+    period_ids.discard(None)
+    if period_ids:
+        session.info.setdefault(_STALE_PERIODS_KEY, set()).update(period_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed_periods_stale(session: Session) -> None:
+    period_ids = session.info.pop(_STALE_PERIODS_KEY, None)
+    if period_ids:
+        payroll_snapshot_service.mark_period_stale(period_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stale_periods(session: Session) -> None:
+    session.info.pop(_STALE_PERIODS_KEY, None)
@@ -0,0 +1,278 @@
+"""
+用户权限缓存
+
+认证依赖在每个请求上都需要用户的权限集合。这里在进程内按 LRU 缓存用户权限数据：
+
+- 条目数有上限，超出时淘汰最久未使用的用户；
+- 缓存代数（generation）在每次角色/权限变更时递增，变更前开始的数据库加载结果不会写回缓存；
+- 跨进程失效使用 PostgreSQL LISTEN/NOTIFY：写操作在同一事务中发出 pg_notify，
+  事务提交后所有 worker 的监听线程收到通知并清理本进程缓存；
+- 监听连接正常时条目可以保留较长时间，监听不可用时退回较短的 TTL，以限制错过通知后的过期时间；
+- 其他进程内缓存（如已验证令牌缓存）可以通过 add_notification_handler 注册带前缀的通知，共用同一频道和监听线程。
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import event, text
+import os
+import select
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 跨进程失效通知的频道
+INVALIDATION_CHANNEL = "security_permission_cache"
+
+# 通知载荷：清理全部用户
+INVALIDATE_ALL = "*"
+
+# 最多缓存的用户数
+MAX_ENTRIES = 2048
+
+# 监听连接正常时的条目有效期（秒）
+LISTENING_TTL_SECONDS = 1800
+
+# 监听不可用时的条目有效期（秒）
+FALLBACK_TTL_SECONDS = 300
+
+# 监听线程等待通知的超时和断线重连间隔（秒）
+LISTEN_POLL_SECONDS = 5
+LISTEN_RECONNECT_SECONDS = 10
+
+
+class PermissionCache:
+    """进程内共享的用户权限缓存（LRU + 缓存代数 + LISTEN/NOTIFY 失效）"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation = 0
+        self._listening = False
+        self._listener_started = False
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.rejected_puts = 0
+        self.notifications = 0
+
+    @property
+    def generation(self) -> int:
+        """当前缓存代数，加载数据前读取，写回时传给 put"""
+        return self._generation
+
+    @property
+    def ttl_seconds(self) -> int:
+        return LISTENING_TTL_SECONDS if self._listening else FALLBACK_TTL_SECONDS
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的用户权限数据，不存在或过期时返回 None"""
+        self.ensure_listener()
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_data, loaded_at = entry
+            if now - loaded_at > self.ttl_seconds:
+                del self._entries[username]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return user_data
+
+    def put(self, username: str, user_data: Dict[str, Any], generation: Optional[int] = None) -> bool:
+        """
+        缓存用户权限数据
+
+        Args:
+            generation: 开始加载数据时的缓存代数；加载期间发生过失效时放弃写入
+
+        Returns:
+            是否已写入缓存
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.rejected_puts += 1
+                return False
+            self._store(username, user_data, time.monotonic())
+        return True
+
+    def put_many(self, users: Dict[str, Dict[str, Any]], generation: Optional[int] = None) -> int:
+        """批量缓存用户权限数据，返回写入的用户数"""
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self.rejected_puts += len(users)
+                return 0
+            for username, user_data in users.items():
+                self._store(username, user_data, now)
+        return len(users)
+
+    def invalidate(self, username: Optional[str] = None) -> None:
+        """
+        使缓存失效并递增缓存代数
+
+        Args:
+            username: 特定用户名，为空时清理所有用户
+        """
+        with self._lock:
+            self._generation += 1
+            if username:
+                self._entries.pop(username, None)
+            else:
+                self._entries.clear()
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generation": self._generation,
+                "listening": self._listening,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "rejected_puts": self.rejected_puts,
+                "notifications": self.notifications,
+            }
+
+    def _store(self, username: str, user_data: Dict[str, Any], loaded_at: float) -> None:
+        self._entries[username] = (user_data, loaded_at)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # --- 跨进程失效 ---
+
+    def add_notification_handler(self, prefix: str, handler: Callable[[str], None]) -> None:
+        """
+        注册同一频道上的其他通知
+
+        载荷以 prefix 开头的通知交给 handler（参数为去掉前缀的载荷），不再作为用户名处理。
+        前缀应以用户名中不会出现的字符开头（如 "#"）。
+        """
+        with self._lock:
+            self._handlers[prefix] = handler
+
+    def ensure_listener(self) -> None:
+        """启动本进程的通知监听线程（只启动一次）"""
+        if self._listener_started:
+            return
+        with self._lock:
+            if self._listener_started:
+                return
+            self._listener_started = True
+        # 关闭监听时仅依赖较短的 TTL
+        if os.getenv("PERMISSION_CACHE_LISTEN", "true").lower() != "true":
+            return
+        threading.Thread(
+            target=self._listen_forever, name="permission-cache-listener", daemon=True
+        ).start()
+
+    def _listen_forever(self) -> None:
+        from ..database import engine_v2
+
+        while True:
+            connection = None
+            try:
+                # 专用连接，脱离连接池，避免长期占用池中的连接
+                connection = engine_v2.raw_connection()
+                connection.detach()
+                pg_connection = connection.driver_connection
+                pg_connection.autocommit = True
+                with pg_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+
+                # 未监听期间可能错过了通知
+                self.invalidate()
+                self._listening = True
+                logger.info(f"👂 [权限缓存] 已监听权限变更通知: {INVALIDATION_CHANNEL}")
+
+                while True:
+                    if select.select([pg_connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    pg_connection.poll()
+                    while pg_connection.notifies:
+                        notify = pg_connection.notifies.pop(0)
+                        self.notifications += 1
+                        self._dispatch(notify.payload)
+            except Exception as e:
+                if self._listening:
+                    logger.warning(f"⚠️ [权限缓存] 权限变更监听中断，{LISTEN_RECONNECT_SECONDS} 秒后重连: {e}")
+                self._listening = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                time.sleep(LISTEN_RECONNECT_SECONDS)
+
+
+    def _dispatch(self, payload: str) -> None:
+        for prefix, handler in list(self._handlers.items()):
+            if payload.startswith(prefix):
+                try:
+                    handler(payload[len(prefix):])
+                except Exception as e:
+                    logger.warning(f"⚠️ [权限缓存] 处理通知失败 {payload}: {e}")
+                return
+        self.invalidate(None if payload == INVALIDATE_ALL else payload)
+
+
+# 所有认证依赖共享的用户权限缓存
+permission_cache = PermissionCache()
+
+
+def notify_permission_change(db: Session, username: Optional[str] = None) -> None:
+    """
+    角色、权限或用户授权变更时调用（在提交事务之前）
+
+    在当前事务中发出失效通知，事务提交后所有 worker 清理缓存。
+    本进程在提交后立即失效，不依赖监听线程；提交前后各失效一次，避免并发请求在提交前写回旧数据。
+
+    Args:
+        username: 受影响的用户名，为空时表示所有用户
+    """
+    publish_notification(username or INVALIDATE_ALL, db)
+    permission_cache.invalidate(username)
+    event.listen(db, "after_commit", lambda session: permission_cache.invalidate(username), once=True)
+
+
+def publish_notification(payload: str, db: Optional[Session] = None) -> None:
+    """
+    在失效频道上发送通知
+
+    Args:
+        payload: 通知载荷
+        db: 提供时在该会话的事务中发送（事务提交后送达），否则立即使用独立连接发送
+    """
+    statement = text("SELECT pg_notify(:channel, :payload)")
+    params = {"channel": INVALIDATION_CHANNEL, "payload": payload}
+    if db is not None:
+        db.execute(statement, params)
+        return
+
+    from ..database import engine_v2
+
+    with engine_v2.begin() as connection:
+        connection.execute(statement, params)
@@ -0,0 +1,216 @@
+"""
+任务进度推送（Server-Sent Events）
+
+计算任务和批量报表任务在进度变化时调用 progress_broadcaster.publish 发布进度快照，
+订阅者通过 SSE 连接接收推送，无需轮询进度接口。
+
+为了让大量同时观看的客户端不放大数据库压力：
+- 每个频道只保存最新快照，订阅者被唤醒时只读取最新版本，中间的更新自动合并；
+- 每个订阅者两次推送之间至少间隔 MIN_PUSH_INTERVAL_SECONDS 秒；
+- 任务在其他工作进程执行时，每个频道只有一个共享的轮询协程读取进度，与订阅者数量无关；
+- 首次推送完整快照，之后只推送变化的字段。
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set, Tuple
+import asyncio
+import json
+import threading
+import time
+import logging
+
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# 同一订阅者两次推送之间的最小间隔（秒）
+MIN_PUSH_INTERVAL_SECONDS = 0.5
+
+# 本进程内没有发布者时，共享轮询的间隔（秒）
+POLL_INTERVAL_SECONDS = 2.0
+
+# 无进度变化时发送心跳注释的间隔（秒），避免代理断开空闲连接
+HEARTBEAT_INTERVAL_SECONDS = 15.0
+
+# 结束状态（大小写不敏感），推送后关闭连接
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELLED", "NOT_FOUND"}
+
+# 始终随增量推送的字段
+IDENTITY_FIELDS = ("task_id", "status")
+
+
+class _ProgressChannel:
+    """单个任务的进度频道"""
+
+    def __init__(self):
+        self.latest: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self.published_at = 0.0
+        self.subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self.poller: Optional[asyncio.Task] = None
+
+
+class ProgressBroadcaster:
+    """进程内的进度发布/订阅中心"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels: Dict[str, _ProgressChannel] = {}
+
+    def publish(self, channel: str, progress: Dict[str, Any]) -> None:
+        """
+        发布进度快照（线程安全，可在后台线程和事件循环中调用）
+
+        没有订阅者的频道直接返回，不产生额外开销。
+        """
+        with self._lock:
+            state = self._channels.get(channel)
+            if state is None:
+                # 没有订阅者时不保留频道，避免已结束任务的快照堆积
+                return
+            state.latest = dict(progress)
+            state.version += 1
+            state.published_at = time.monotonic()
+            subscribers = list(state.subscribers)
+
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    async def subscribe(
+        self,
+        channel: str,
+        fetch: Callable[[], Optional[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        订阅频道，产出合并后的进度增量
+
+        Args:
+            channel: 频道名称
+            fetch: 同步读取当前进度的函数（在线程池中执行），用于首次快照和共享轮询
+
+        Yields:
+            Dict: 首次为完整快照，之后为变化的字段（始终包含 task_id 和 status）
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        with self._lock:
+            state = self._channels.setdefault(channel, _ProgressChannel())
+            state.subscribers.add((loop, event))
+
+        try:
+            if state.latest is None:
+                snapshot = await run_in_threadpool(fetch)
+                if snapshot is None:
+                    return
+                self.publish(channel, snapshot)
+
+            with self._lock:
+                if state.poller is None or state.poller.done():
+                    state.poller = loop.create_task(self._poll(channel, state, fetch))
+
+            sent: Dict[str, Any] = {}
+            sent_version = 0
+            while True:
+                with self._lock:
+                    version, latest = state.version, state.latest
+                event.clear()
+
+                if version != sent_version and latest is not None:
+                    delta = self._diff(sent, latest)
+                    sent, sent_version = latest, version
+                    yield delta
+                    if str(latest.get("status", "")).upper() in TERMINAL_STATUSES:
+                        return
+                    # 合并窗口内的更新
+                    await asyncio.sleep(MIN_PUSH_INTERVAL_SECONDS)
+                    continue
+
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=HEARTBEAT_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    yield {}
+        finally:
+            with self._lock:
+                state.subscribers.discard((loop, event))
+                if not state.subscribers:
+                    if state.poller is not None:
+                        state.poller.cancel()
+                    self._channels.pop(channel, None)
+
+    def has_subscribers(self, channel: str) -> bool:
+        """频道是否有订阅者（发布前需要额外查询时用于提前跳过）"""
+        with self._lock:
+            return channel in self._channels
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取当前频道和订阅者数量"""
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "subscribers": sum(len(s.subscribers) for s in self._channels.values()),
+            }
+
+    async def _poll(self, channel: str, state: _ProgressChannel, fetch: Callable[[], Optional[Dict[str, Any]]]) -> None:
+        """频道共享的轮询协程：本进程最近有发布时跳过，否则读取一次并发布"""
+        try:
+            while True:
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+                if time.monotonic() - state.published_at < POLL_INTERVAL_SECONDS:
+                    continue
+                try:
+                    snapshot = await run_in_threadpool(fetch)
+                except Exception as e:
+                    logger.warning(f"轮询进度频道 {channel} 失败: {e}")
+                    continue
+                if snapshot is not None and snapshot != state.latest:
+                    self.publish(channel, snapshot)
+        except asyncio.CancelledError:
+            pass
+
+    @staticmethod
+    def _diff(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+        delta = {k: v for k, v in current.items() if previous.get(k) != v or k not in previous}
+        for key in IDENTITY_FIELDS:
+            if key in current:
+                delta[key] = current[key]
+        return delta
+
+
+# 进程内共享的进度推送中心
+progress_broadcaster = ProgressBroadcaster()
+
+
+def progress_event_stream(
+    channel: str,
+    fetch: Callable[[], Optional[Dict[str, Any]]],
+    not_found: Optional[Dict[str, Any]] = None
+) -> StreamingResponse:
+    """
+    创建进度 SSE 响应
+
+    Args:
+        channel: 频道名称
+        fetch: 同步读取当前进度的函数
+        not_found: 任务不存在时推送的内容
+    """
+    async def event_source():
+        delivered = False
+        async for delta in progress_broadcaster.subscribe(channel, fetch):
+            if not delta:
+                yield ": heartbeat\n\n"
+                continue
+            delivered = True
+            yield f"event: progress\ndata: {json.dumps(delta, ensure_ascii=False, default=str)}\n\n"
+        if not delivered and not_found is not None:
+            yield f"event: progress\ndata: {json.dumps(not_found, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
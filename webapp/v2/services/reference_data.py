@@ -0,0 +1,231 @@
+"""
+基础参照数据快照
+
+下拉框等使用的基础数据（查找类型和值、部门、人员类别、职位、薪资组件定义）几乎不变，
+此前相关接口每次调用都会查询数据库。这里在进程内保存一份只读快照，所有接口共享：
+
+- 每个数据集的版本是整表内容的摘要，最多每 VERSION_CHECK_INTERVAL_SECONDS 秒用一次查询向数据库确认，
+  只有版本变化的数据集才重新加载，从而感知其他进程的修改；
+- 本进程内通过 CRUD 修改这些数据时调用 invalidate_reference_data 立即失效；
+- 接口以相关数据集的版本作为 ETag，请求的 If-None-Match 匹配时直接返回 304，不再查询和序列化数据。
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+import hashlib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 版本向数据库确认的最小间隔（秒）
+VERSION_CHECK_INTERVAL_SECONDS = 10
+
+# 数据集名称 -> (数据表, 加载查询)
+DATASETS: Dict[str, Tuple[str, str]] = {
+    "lookup_types": ("config.lookup_types", """
+        SELECT id, code, name, description
+        FROM config.lookup_types
+        ORDER BY code ASC
+    """),
+    "lookup_values": ("config.lookup_values", """
+        SELECT
+            lv.id, lv.lookup_type_id, lt.code AS lookup_type_code, lv.code, lv.name,
+            lv.description, lv.sort_order, lv.is_active, lv.parent_lookup_value_id
+        FROM config.lookup_values lv
+        JOIN config.lookup_types lt ON lv.lookup_type_id = lt.id
+        ORDER BY lv.sort_order ASC, lv.code ASC
+    """),
+    "departments": ("hr.departments", """
+        SELECT id, name, code, is_active, parent_department_id
+        FROM hr.departments
+        ORDER BY code ASC
+    """),
+    "personnel_categories": ("hr.personnel_categories", """
+        SELECT id, name, code, description, is_active, parent_category_id, effective_date, end_date
+        FROM hr.personnel_categories
+        ORDER BY code ASC
+    """),
+    "positions": ("hr.positions", """
+        SELECT id, name, code, description, is_active, parent_position_id, effective_date, end_date
+        FROM hr.positions
+        ORDER BY code ASC, id ASC
+    """),
+    "payroll_component_definitions": ("config.payroll_component_definitions", """
+        SELECT
+            id, code, name, type AS component_type, is_active,
+            display_order, calculation_method, is_taxable,
+            is_social_security_base, is_housing_fund_base
+        FROM config.payroll_component_definitions
+        ORDER BY display_order ASC, code ASC
+    """),
+}
+
+# 查找值的类型代码来自查找类型，两者的版本都会影响查找值数据
+DATASET_DEPENDENCIES = {
+    "lookup_values": ("lookup_types", "lookup_values"),
+}
+
+
+class ReferenceDataSnapshot:
+    """某一时刻的基础参照数据（只读，行是普通字典，调用方不应修改）"""
+
+    def __init__(self, versions: Dict[str, str], datasets: Dict[str, List[Dict[str, Any]]]):
+        self.versions = versions
+        self.datasets = datasets
+        self.lookup_values_by_type_code: Dict[str, List[Dict[str, Any]]] = {}
+        for row in datasets["lookup_values"]:
+            self.lookup_values_by_type_code.setdefault(row["lookup_type_code"], []).append(row)
+
+    def etag(self, *names: str) -> str:
+        """指定数据集（含其依赖）当前版本对应的 ETag"""
+        parts = []
+        for name in names:
+            for dependency in DATASET_DEPENDENCIES.get(name, (name,)):
+                parts.append(f"{dependency}={self.versions[dependency]}")
+        return '"' + hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest() + '"'
+
+    def rows(self, name: str, is_active: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """获取数据集的行，可按是否活跃过滤"""
+        rows = self.datasets[name]
+        if is_active is None:
+            return rows
+        return [row for row in rows if row["is_active"] == is_active]
+
+    def lookup_values(
+        self,
+        type_code: Optional[str] = None,
+        type_id: Optional[int] = None,
+        is_active: Optional[bool] = None,
+        search: Optional[str] = None,
+        parent_id: Optional[int] = None,
+        search_fields: Tuple[str, ...] = ("code", "name", "description")
+    ) -> List[Dict[str, Any]]:
+        """
+        按类型、状态、父值和关键字过滤查找值（顺序与数据库查询相同：sort_order, code）
+
+        Args:
+            search: 不区分大小写匹配 search_fields 中的任一字段
+        """
+        if type_code is not None:
+            rows = self.lookup_values_by_type_code.get(type_code, [])
+        else:
+            rows = self.datasets["lookup_values"]
+        if type_id is not None:
+            rows = [row for row in rows if row["lookup_type_id"] == type_id]
+        if is_active is not None:
+            rows = [row for row in rows if row["is_active"] == is_active]
+        if parent_id is not None:
+            rows = [row for row in rows if row["parent_lookup_value_id"] == parent_id]
+        if search:
+            keyword = search.lower()
+            rows = [
+                row for row in rows
+                if any(keyword in (row[field] or "").lower() for field in search_fields)
+            ]
+        return rows
+
+
+class ReferenceDataCache:
+    """进程内共享的基础参照数据快照（按数据集版本增量重建）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ReferenceDataSnapshot] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.reloads = 0
+        self.version_checks = 0
+
+    def get_snapshot(self, db: Session) -> ReferenceDataSnapshot:
+        """获取当前快照，版本确认间隔内不访问数据库"""
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now - self._version_checked_at < VERSION_CHECK_INTERVAL_SECONDS:
+                self.hits += 1
+                return snapshot
+
+        versions = self._current_versions(db)
+        if snapshot is not None and snapshot.versions == versions:
+            with self._lock:
+                self._version_checked_at = now
+            return snapshot
+
+        # 只重新加载版本变化的数据集
+        datasets = {}
+        for name, (_, query) in DATASETS.items():
+            if snapshot is not None and snapshot.versions.get(name) == versions[name]:
+                datasets[name] = snapshot.datasets[name]
+            else:
+                datasets[name] = [dict(row._mapping) for row in db.execute(text(query))]
+        changed = [name for name in DATASETS if snapshot is None or snapshot.versions.get(name) != versions[name]]
+        snapshot = ReferenceDataSnapshot(versions, datasets)
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._version_checked_at = now
+            self.reloads += 1
+        logger.info(f"📚 [参照数据] 快照已重建: {', '.join(changed)}")
+        return snapshot
+
+    def invalidate(self) -> None:
+        """下次获取快照时重新确认版本"""
+        with self._lock:
+            self._version_checked_at = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                "loaded": snapshot is not None,
+                "rows": {name: len(rows) for name, rows in snapshot.datasets.items()} if snapshot else {},
+                "hits": self.hits,
+                "reloads": self.reloads,
+                "version_checks": self.version_checks,
+            }
+
+    def _current_versions(self, db: Session) -> Dict[str, str]:
+        self.version_checks += 1
+        # 这些表都没有修改时间字段，使用整表内容的摘要作为版本（表很小，一次查询确认所有数据集）
+        columns = ",\n".join(
+            f"(SELECT md5(COALESCE(string_agg(t::text, ',' ORDER BY t.id), '')) FROM {table} t) AS {name}"
+            for name, (table, _) in DATASETS.items()
+        )
+        row = db.execute(text(f"SELECT {columns}")).fetchone()
+        return dict(row._mapping)
+
+
+# 所有接口共享的参照数据快照
+reference_data_cache = ReferenceDataCache()
+
+
+def get_reference_data(db: Session) -> ReferenceDataSnapshot:
+    """获取当前的基础参照数据快照"""
+    return reference_data_cache.get_snapshot(db)
+
+
+def invalidate_reference_data() -> None:
+    """查找值、部门、人员类别、职位或薪资组件定义变更后调用，使本进程的快照立即重新确认版本"""
+    reference_data_cache.invalidate()
+
+
+def not_modified_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    处理条件请求
+
+    为响应设置 ETag（要求客户端每次重新验证）；请求的 If-None-Match 与 ETag 匹配时返回 304 响应，
+    调用方应直接返回它，否则返回 None 并继续生成响应。
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
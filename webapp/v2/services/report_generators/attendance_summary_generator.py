@@ -4,17 +4,71 @@
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy import text
 from decimal import Decimal
 from datetime import datetime
 
-from .base_generator import BaseReportGenerator
+from .base_generator import BaseReportGenerator, SummaryAccumulator
+
+
+class AttendanceSummaryAccumulator(SummaryAccumulator):
+    """考勤汇总表汇总累加器"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.total_work_hours = 0.0
+        self.total_overtime_hours = 0.0
+        self.total_leave_hours = 0.0
+        self.total_absent_hours = 0.0
+        self.total_late_times = 0
+        self.total_early_leave_times = 0
+        self.total_pay = 0.0
+        # 平均出勤率只统计出勤率不为0的员工
+        self.attendance_rate_sum = 0.0
+        self.attendance_rate_count = 0
+    
+    def add(self, row: Dict[str, Any]):
+        self.total_work_hours += float(row['total_work_hours'])
+        self.total_overtime_hours += float(row['overtime_hours'])
+        self.total_leave_hours += float(row['total_leave_hours'])
+        self.total_absent_hours += float(row['absent_hours'])
+        self.total_late_times += int(row['late_times'])
+        self.total_early_leave_times += int(row['early_leave_times'])
+        self.total_pay += float(row['total_pay'])
+        if row['attendance_rate'] != '0.0%':
+            self.attendance_rate_sum += float(row['attendance_rate'].replace('%', ''))
+            self.attendance_rate_count += 1
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return None
+        
+        total_employees = self.count
+        avg_attendance_rate = self.attendance_rate_sum / self.attendance_rate_count if self.attendance_rate_count else 0
+        
+        return {
+            "统计人数": total_employees,
+            "总工时": f"{self.total_work_hours:.1f}",
+            "加班工时": f"{self.total_overtime_hours:.1f}",
+            "请假工时": f"{self.total_leave_hours:.1f}",
+            "缺勤工时": f"{self.total_absent_hours:.1f}",
+            "迟到总次数": self.total_late_times,
+            "早退总次数": self.total_early_leave_times,
+            "平均出勤率": f"{avg_attendance_rate:.1f}%",
+            "考勤工资合计": f"{self.total_pay:.2f}",
+            "人均工时": f"{self.total_work_hours / total_employees:.1f}",
+            "人均加班工时": f"{self.total_overtime_hours / total_employees:.1f}",
+            "人均考勤工资": f"{self.total_pay / total_employees:.2f}",
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
 
 
 class AttendanceSummaryGenerator(BaseReportGenerator):
     """考勤汇总表生成器"""
     
+    summary_accumulator_class = AttendanceSummaryAccumulator
+    
     def generate_report(
         self,
         config: Dict[str, Any],
@@ -39,9 +93,6 @@ class AttendanceSummaryGenerator(BaseReportGenerator):
             if not self.validate_config(config):
                 raise ValueError("配置验证失败")
             
-            # 获取报表数据
-            data = self.get_report_data(config)
-            
             # 生成文件名和路径
             filename = self.generate_filename(config, export_format)
             file_path = os.path.join(output_dir, filename)
@@ -49,30 +100,25 @@ class AttendanceSummaryGenerator(BaseReportGenerator):
             # 确保输出目录存在
             os.makedirs(output_dir, exist_ok=True)
             
-            # 根据格式生成文件
-            if export_format.lower() == 'xlsx':
-                result_path = self.create_excel_file(data, file_path, config)
-            elif export_format.lower() == 'csv':
-                result_path = self.create_csv_file(data, file_path, config)
-            else:
-                raise ValueError(f"不支持的导出格式: {export_format}")
+            # 数据行从游标流式写入文件，汇总在同一遍中累计
+            result_path, data_count = self.write_report_file(config, file_path, export_format)
             
-            self.log_generation_end(result_path, len(data))
+            self.log_generation_end(result_path, data_count)
             return result_path
             
         except Exception as e:
             self.handle_generation_error(e, config)
             raise
     
-    def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        获取考勤汇总数据
+        逐行产生考勤汇总数据
         
         Args:
             config: 报表配置
             
         Returns:
-            考勤汇总数据列表
+            考勤汇总数据行迭代器
         """
         try:
             period_id = config.get('period_id')
@@ -128,12 +174,8 @@ class AttendanceSummaryGenerator(BaseReportGenerator):
             ORDER BY d.name, e.employee_code
             """
             
-            result = self.db.execute(text(query), params)
-            rows = result.fetchall()
-            
             # 转换为字典格式
-            data = []
-            for row in rows:
+            for row in self.stream_query(query, params):
                 # 计算总工时和总薪资
                 total_work_hours = (
                     (row.normal_hours or 0) + 
@@ -159,7 +201,7 @@ class AttendanceSummaryGenerator(BaseReportGenerator):
                 total_scheduled_hours = total_work_hours + total_leave_hours + (row.absent_hours or 0)
                 attendance_rate = (total_work_hours / total_scheduled_hours * 100) if total_scheduled_hours > 0 else 0
                 
-                data.append({
+                yield {
                     'employee_code': row.employee_code or '',
                     'employee_name': row.employee_name or '',
                     'department_name': row.department_name or '未分配部门',
@@ -185,10 +227,7 @@ class AttendanceSummaryGenerator(BaseReportGenerator):
                     'total_pay': f"{total_pay:.2f}",
                     'start_date': row.start_date.strftime('%Y-%m-%d') if row.start_date else '',
                     'end_date': row.end_date.strftime('%Y-%m-%d') if row.end_date else ''
-                })
-            
-            self.logger.info(f"获取考勤汇总数据成功，共 {len(data)} 条记录")
-            return data
+                }
             
         except Exception as e:
             self.logger.error(f"获取考勤汇总数据失败: {str(e)}")
@@ -233,50 +272,6 @@ class AttendanceSummaryGenerator(BaseReportGenerator):
         """获取报表标题"""
         return "考勤汇总表"
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """
-        获取汇总数据
-        
-        Args:
-            data: 报表数据
-            config: 报表配置
-            
-        Returns:
-            汇总数据字典
-        """
-        if not data:
-            return None
-        
-        # 计算汇总统计
-        total_employees = len(data)
-        total_work_hours = sum(float(row['total_work_hours']) for row in data)
-        total_overtime_hours = sum(float(row['overtime_hours']) for row in data)
-        total_leave_hours = sum(float(row['total_leave_hours']) for row in data)
-        total_absent_hours = sum(float(row['absent_hours']) for row in data)
-        total_late_times = sum(int(row['late_times']) for row in data)
-        total_early_leave_times = sum(int(row['early_leave_times']) for row in data)
-        total_pay = sum(float(row['total_pay']) for row in data)
-        
-        # 计算平均出勤率
-        attendance_rates = [float(row['attendance_rate'].replace('%', '')) for row in data if row['attendance_rate'] != '0.0%']
-        avg_attendance_rate = sum(attendance_rates) / len(attendance_rates) if attendance_rates else 0
-        
-        return {
-            "统计人数": total_employees,
-            "总工时": f"{total_work_hours:.1f}",
-            "加班工时": f"{total_overtime_hours:.1f}",
-            "请假工时": f"{total_leave_hours:.1f}",
-            "缺勤工时": f"{total_absent_hours:.1f}",
-            "迟到总次数": total_late_times,
-            "早退总次数": total_early_leave_times,
-            "平均出勤率": f"{avg_attendance_rate:.1f}%",
-            "考勤工资合计": f"{total_pay:.2f}",
-            "人均工时": f"{total_work_hours / total_employees:.1f}" if total_employees > 0 else "0.0",
-            "人均加班工时": f"{total_overtime_hours / total_employees:.1f}" if total_employees > 0 else "0.0",
-            "人均考勤工资": f"{total_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """
         验证配置参数
@@ -4,18 +4,68 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Union, Callable, Tuple
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from datetime import datetime
+import csv
 import logging
+import os
 
 from .excel_utils import ExcelExportUtils
 
 logger = logging.getLogger(__name__)
 
+# 服务端游标每批读取的行数
+REPORT_STREAM_BATCH_SIZE = 1000
+
+
+class SummaryAccumulator:
+    """
+    汇总累加器
+    
+    数据行流经文件写入器时逐行累计，写完后生成汇总数据，
+    汇总不再需要把整份数据保留在内存中再遍历一遍。子类重写 add 和 build。
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.count = 0
+    
+    def track(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """透传数据行并累计"""
+        for row in rows:
+            self.count += 1
+            self.add(row)
+            yield row
+    
+    def consume(self, rows: Iterable[Dict[str, Any]]) -> "SummaryAccumulator":
+        """累计全部数据行（用于已物化的列表）"""
+        for _ in self.track(rows):
+            pass
+        return self
+    
+    def add(self, row: Dict[str, Any]):
+        """累计一行数据"""
+        pass
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        """生成汇总数据"""
+        if not self.count:
+            return None
+        
+        return {
+            "总记录数": self.count,
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+
 class BaseReportGenerator(ABC):
     """基础报表生成器抽象类"""
     
+    # 汇总累加器类型，子类按报表内容重写
+    summary_accumulator_class = SummaryAccumulator
+    
     def __init__(self, db: Session):
         self.db = db
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -41,9 +91,21 @@ class BaseReportGenerator(ABC):
         pass
     
     @abstractmethod
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        逐行产生报表数据
+        
+        Args:
+            config: 报表配置
+            
+        Returns:
+            报表数据行迭代器
+        """
+        pass
+    
     def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
-        获取报表数据
+        获取报表数据（一次性加载全部数据行）
         
         Args:
             config: 报表配置
@@ -51,7 +113,28 @@ class BaseReportGenerator(ABC):
         Returns:
             报表数据列表
         """
-        pass
+        return list(self.iter_report_data(config))
+    
+    def stream_query(self, query: str, params: Dict[str, Any]) -> Iterator[Any]:
+        """
+        通过服务端游标执行查询，按批读取结果行
+        
+        Args:
+            query: SQL语句
+            params: 查询参数
+            
+        Returns:
+            结果行迭代器
+        """
+        result = self.db.execute(
+            text(query).execution_options(stream_results=True, max_row_buffer=REPORT_STREAM_BATCH_SIZE),
+            params
+        )
+        try:
+            for row in result:
+                yield row
+        finally:
+            result.close()
     
     @abstractmethod
     def get_columns_config(self) -> List[Dict[str, Any]]:
@@ -91,7 +174,19 @@ class BaseReportGenerator(ABC):
             return f"期间ID: {period_id} - 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         return f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def create_summary_accumulator(self, config: Dict[str, Any]) -> SummaryAccumulator:
+        """
+        创建汇总累加器
+        
+        Args:
+            config: 报表配置
+            
+        Returns:
+            汇总累加器
+        """
+        return self.summary_accumulator_class(config)
+    
+    def get_summary_data(self, data: Iterable[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         获取汇总数据
         
@@ -102,13 +197,38 @@ class BaseReportGenerator(ABC):
         Returns:
             汇总数据字典
         """
-        if not data:
-            return None
+        return self.create_summary_accumulator(config).consume(data).build()
+    
+    def write_report_file(
+        self,
+        config: Dict[str, Any],
+        file_path: str,
+        export_format: str
+    ) -> Tuple[str, int]:
+        """
+        将报表数据流式写入文件
         
-        return {
-            "总记录数": len(data),
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+        数据行从 iter_report_data 逐行流向文件写入器，汇总数据在同一遍中累计。
+        
+        Args:
+            config: 报表配置
+            file_path: 文件路径
+            export_format: 导出格式
+            
+        Returns:
+            (生成的文件路径, 数据行数)
+        """
+        accumulator = self.create_summary_accumulator(config)
+        rows = accumulator.track(self.iter_report_data(config))
+        
+        if export_format.lower() == 'xlsx':
+            result_path = self.create_excel_file(rows, file_path, config, summary_data=accumulator.build)
+        elif export_format.lower() == 'csv':
+            result_path = self.create_csv_file(rows, file_path, config)
+        else:
+            raise ValueError(f"不支持的导出格式: {export_format}")
+        
+        return result_path, accumulator.count
     
     def generate_filename(self, config: Dict[str, Any], export_format: str) -> str:
         """
@@ -135,17 +255,19 @@ class BaseReportGenerator(ABC):
     
     def create_excel_file(
         self,
-        data: List[Dict[str, Any]],
+        data: Iterable[Dict[str, Any]],
         file_path: str,
-        config: Dict[str, Any]
+        config: Dict[str, Any],
+        summary_data: Union[Dict[str, Any], Callable[[], Optional[Dict[str, Any]]], None] = None
     ) -> str:
         """
-        创建Excel文件
+        创建Excel文件（按行流式写入）
         
         Args:
-            data: 报表数据
+            data: 报表数据，列表或逐行产生的迭代器（如数据库游标）
             file_path: 文件路径
             config: 报表配置
+            summary_data: 汇总数据或在数据写完后调用的回调；为空且 data 为列表时使用 get_summary_data
             
         Returns:
             生成的文件路径
@@ -154,7 +276,8 @@ class BaseReportGenerator(ABC):
             title = self.get_report_title(config)
             subtitle = self.get_report_subtitle(config)
             columns_config = self.get_columns_config()
-            summary_data = self.get_summary_data(data, config)
+            if summary_data is None and isinstance(data, list):
+                summary_data = self.get_summary_data(data, config)
             include_charts = config.get('include_charts', False)
             
             return ExcelExportUtils.create_excel_file(
@@ -173,15 +296,15 @@ class BaseReportGenerator(ABC):
     
     def create_csv_file(
         self,
-        data: List[Dict[str, Any]],
+        data: Iterable[Dict[str, Any]],
         file_path: str,
         config: Dict[str, Any]
     ) -> str:
         """
-        创建CSV文件
+        创建CSV文件（按行流式写入）
         
         Args:
-            data: 报表数据
+            data: 报表数据，列表或逐行产生的迭代器
             file_path: 文件路径
             config: 报表配置
             
@@ -189,26 +312,25 @@ class BaseReportGenerator(ABC):
             生成的文件路径
         """
         try:
-            import pandas as pd
-            import os
-            
             # 确保目录存在
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
-            if not data:
-                # 创建空的CSV文件
-                df = pd.DataFrame()
-                df.to_csv(file_path, index=False, encoding='utf-8-sig')
+            row_count = 0
+            with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = None
+                for row in data:
+                    if writer is None:
+                        # 表头取第一行的字段
+                        writer = csv.DictWriter(f, fieldnames=list(row.keys()), extrasaction='ignore')
+                        writer.writeheader()
+                    writer.writerow(row)
+                    row_count += 1
+            
+            if not row_count:
                 self.logger.warning(f"创建了空的CSV文件: {file_path}")
                 return file_path
             
-            # 转换数据为DataFrame
-            df = pd.DataFrame(data)
-            
-            # 写入CSV文件
-            df.to_csv(file_path, index=False, encoding='utf-8-sig')
-            
-            self.logger.info(f"成功创建CSV文件: {file_path}, 数据行数: {len(df)}")
+            self.logger.info(f"成功创建CSV文件: {file_path}, 数据行数: {row_count}")
             return file_path
             
         except Exception as e:
@@ -4,15 +4,80 @@
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy import text
 from datetime import datetime
 
-from .base_generator import BaseReportGenerator
+from .base_generator import BaseReportGenerator, SummaryAccumulator
+
+
+class DepartmentSummaryAccumulator(SummaryAccumulator):
+    """部门汇总表汇总累加器"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.total_employees = 0
+        self.total_gross_pay = 0.0
+        self.total_net_pay = 0.0
+        self.total_deductions = 0.0
+        self.total_tax = 0.0
+        self.total_social_benefits = 0.0
+        # 成本最高、最低和人均成本最高的部门
+        self.highest_cost_dept = None
+        self.lowest_cost_dept = None
+        self.highest_per_capita_dept = None
+    
+    def add(self, row: Dict[str, Any]):
+        self.total_employees += row['employee_count']
+        self.total_gross_pay += row['total_gross_pay']
+        self.total_net_pay += row['total_net_pay']
+        self.total_deductions += row['total_deductions']
+        self.total_tax += row['total_tax']
+        self.total_social_benefits += row['total_social_benefits']
+        
+        if self.highest_cost_dept is None or row['total_gross_pay'] > self.highest_cost_dept['total_gross_pay']:
+            self.highest_cost_dept = row
+        if self.lowest_cost_dept is None or row['total_gross_pay'] < self.lowest_cost_dept['total_gross_pay']:
+            self.lowest_cost_dept = row
+        if self.highest_per_capita_dept is None or row['per_capita_cost'] > self.highest_per_capita_dept['per_capita_cost']:
+            self.highest_per_capita_dept = row
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return {
+                "总记录数": 0,
+                "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        
+        total_employees = self.total_employees
+        summary = {
+            "部门总数": self.count,
+            "员工总数": total_employees,
+            "应发合计总计": f"{self.total_gross_pay:.2f}",
+            "实发合计总计": f"{self.total_net_pay:.2f}",
+            "扣除总计": f"{self.total_deductions:.2f}",
+            "个税总计": f"{self.total_tax:.2f}",
+            "社保公积金总计": f"{self.total_social_benefits:.2f}",
+            "平均应发合计": f"{self.total_gross_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
+            "平均实发合计": f"{self.total_net_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        highest_cost_dept = self.highest_cost_dept
+        lowest_cost_dept = self.lowest_cost_dept
+        highest_per_capita_dept = self.highest_per_capita_dept
+        summary["成本最高部门"] = f"{highest_cost_dept['department_name']} ({highest_cost_dept['total_gross_pay']:.2f})"
+        summary["成本最低部门"] = f"{lowest_cost_dept['department_name']} ({lowest_cost_dept['total_gross_pay']:.2f})"
+        summary["人均成本最高部门"] = f"{highest_per_capita_dept['department_name']} ({highest_per_capita_dept['per_capita_cost']:.2f})"
+        
+        return summary
+
 
 class DepartmentSummaryGenerator(BaseReportGenerator):
     """部门汇总报表生成器"""
     
+    summary_accumulator_class = DepartmentSummaryAccumulator
+    
     def generate_report(
         self,
         config: Dict[str, Any],
@@ -27,29 +92,21 @@ class DepartmentSummaryGenerator(BaseReportGenerator):
             if not self.validate_config(config):
                 raise ValueError("配置参数无效")
             
-            # 获取报表数据
-            data = self.get_report_data(config)
-            
             # 生成文件名和路径
             filename = self.generate_filename(config, export_format)
             file_path = os.path.join(output_dir, filename)
             
-            # 根据格式生成文件
-            if export_format.lower() == 'xlsx':
-                result_path = self.create_excel_file(data, file_path, config)
-            elif export_format.lower() == 'csv':
-                result_path = self.create_csv_file(data, file_path, config)
-            else:
-                raise ValueError(f"不支持的导出格式: {export_format}")
+            # 数据行从游标流式写入文件，汇总在同一遍中累计
+            result_path, data_count = self.write_report_file(config, file_path, export_format)
             
-            self.log_generation_end(result_path, len(data))
+            self.log_generation_end(result_path, data_count)
             return result_path
             
         except Exception as e:
             self.handle_generation_error(e, config)
     
-    def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """获取部门汇总数据"""
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """逐行产生部门汇总数据"""
         try:
             period_id = config.get('period_id')
             department_ids = config.get('department_ids', [])
@@ -115,13 +172,9 @@ class DepartmentSummaryGenerator(BaseReportGenerator):
             ORDER BY total_gross_pay DESC
             """
             
-            result = self.db.execute(text(query), params)
-            rows = result.fetchall()
-            
             # 转换为字典格式
-            data = []
-            for row in rows:
-                data.append({
+            for row in self.stream_query(query, params):
+                yield {
                     'department_name': row.department_name or '未分配部门',
                     'department_code': row.department_code or '',
                     'employee_count': int(row.employee_count),
@@ -134,10 +187,7 @@ class DepartmentSummaryGenerator(BaseReportGenerator):
                     'total_social_benefits': float(row.total_social_benefits or 0),
                     'cost_percentage': float(row.cost_percentage or 0),
                     'per_capita_cost': float(row.total_gross_pay or 0) / max(int(row.employee_count), 1)
-                })
-            
-            self.logger.info(f"查询到部门汇总数据 {len(data)} 条")
-            return data
+                }
             
         except Exception as e:
             self.logger.error(f"获取部门汇总数据失败: {str(e)}")
@@ -185,54 +235,6 @@ class DepartmentSummaryGenerator(BaseReportGenerator):
         subtitle_parts.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         return " | ".join(subtitle_parts)
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """获取汇总数据"""
-        if not data:
-            return {
-                "总记录数": 0,
-                "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        
-        # 计算总计
-        total_employees = sum(row['employee_count'] for row in data)
-        total_gross_pay = sum(row['total_gross_pay'] for row in data)
-        total_net_pay = sum(row['total_net_pay'] for row in data)
-        total_deductions = sum(row['total_deductions'] for row in data)
-        total_tax = sum(row['total_tax'] for row in data)
-        total_social_benefits = sum(row['total_social_benefits'] for row in data)
-        
-        # 找出成本最高和最低的部门
-        if data:
-            highest_cost_dept = max(data, key=lambda x: x['total_gross_pay'])
-            lowest_cost_dept = min(data, key=lambda x: x['total_gross_pay'])
-            highest_per_capita_dept = max(data, key=lambda x: x['per_capita_cost'])
-        else:
-            highest_cost_dept = lowest_cost_dept = highest_per_capita_dept = None
-        
-        summary = {
-            "部门总数": len(data),
-            "员工总数": total_employees,
-            "应发合计总计": f"{total_gross_pay:.2f}",
-            "实发合计总计": f"{total_net_pay:.2f}",
-            "扣除总计": f"{total_deductions:.2f}",
-            "个税总计": f"{total_tax:.2f}",
-            "社保公积金总计": f"{total_social_benefits:.2f}",
-            "平均应发合计": f"{total_gross_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
-            "平均实发合计": f"{total_net_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        if highest_cost_dept:
-            summary["成本最高部门"] = f"{highest_cost_dept['department_name']} ({highest_cost_dept['total_gross_pay']:.2f})"
-        
-        if lowest_cost_dept:
-            summary["成本最低部门"] = f"{lowest_cost_dept['department_name']} ({lowest_cost_dept['total_gross_pay']:.2f})"
-        
-        if highest_per_capita_dept:
-            summary["人均成本最高部门"] = f"{highest_per_capita_dept['department_name']} ({highest_per_capita_dept['per_capita_cost']:.2f})"
-        
-        return summary
-    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """验证配置参数"""
         period_id = config.get('period_id')
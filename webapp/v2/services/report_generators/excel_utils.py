@@ -1,325 +1,420 @@
 """
 Excel导出工具类
 提供通用的Excel文件生成功能，支持样式、格式化等
+
+数据按行流式写入（xlsxwriter constant_memory 模式，不可用时使用 openpyxl write_only 模式），
+每列的单元格格式在写入前按列配置一次性生成，内存占用与数据行数无关，
+生成器可以直接传入数据库游标产生的行迭代器。
 """
 
-import pandas as pd
+import json
 import os
-from typing import List, Dict, Any, Optional, Union
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Union, Iterable, Callable
+from datetime import date, datetime
 from decimal import Decimal
+from itertools import chain
 import logging
 
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# 数值类列（右对齐，写入数值）
+NUMERIC_COLUMN_TYPES = ('currency', 'number', 'percentage')
+
+# 列类型 -> Excel 数字格式
+COLUMN_NUM_FORMATS = {
+    'currency': '0.00',
+    'percentage': '0.00%',
+    'date': 'yyyy-mm-dd',
+}
+
+# 自动列宽：根据前若干行数据估算，范围 [最小, 最大]
+WIDTH_SAMPLE_ROWS = 100
+MIN_COLUMN_WIDTH = 8
+MAX_COLUMN_WIDTH = 50
+
+# 图表最多包含的数据系列和行数
+CHART_MAX_SERIES = 4
+CHART_MAX_ROWS = 20
+
+FONT_NAME = '微软雅黑'
+HEADER_FILL_COLOR = '366092'
+
+SummaryData = Union[Dict[str, Any], Callable[[], Optional[Dict[str, Any]]], None]
+
+
+def _display_width(value: Any) -> int:
+    """估算显示宽度（中文字符按两个字符宽度计算）"""
+    text = str(value)
+    return sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+
+
+class _XlsxWriterBackend:
+    """xlsxwriter constant_memory 模式：每写完一行即刷新到临时文件"""
+
+    def __init__(self, file_path: str, sheet_name: str):
+        self.workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True})
+        self.sheet_name = sheet_name
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+
+    def make_format(self, font_size: int = 10, bold: bool = False, font_color: Optional[str] = None,
+                    fill: Optional[str] = None, align: str = 'left', border: bool = True,
+                    num_format: Optional[str] = None):
+        props = {'font_name': FONT_NAME, 'font_size': font_size, 'bold': bold, 'align': align, 'valign': 'vcenter'}
+        if font_color:
+            props['font_color'] = f"#{font_color}"
+        if fill:
+            props['bg_color'] = f"#{fill}"
+            props['pattern'] = 1
+        if border:
+            props['border'] = 1
+        if num_format:
+            props['num_format'] = num_format
+        return self.workbook.add_format(props)
+
+    def write_row(self, row: int, values: List[Any], formats: List[Any]) -> None:
+        worksheet = self.worksheet
+        for col, (value, fmt) in enumerate(zip(values, formats)):
+            if value is None or value == '':
+                worksheet.write_blank(row, col, None, fmt)
+            elif isinstance(value, bool):
+                worksheet.write_boolean(row, col, value, fmt)
+            elif isinstance(value, (int, float)):
+                worksheet.write_number(row, col, value, fmt)
+            elif isinstance(value, (datetime, date)):
+                worksheet.write_datetime(row, col, value, fmt)
+            else:
+                worksheet.write_string(row, col, value, fmt)
+
+    def write_banner(self, row: int, text: str, column_count: int, fmt) -> None:
+        """标题行（跨所有列合并）"""
+        if column_count > 1:
+            self.worksheet.merge_range(row, 0, row, column_count - 1, text, fmt)
+        else:
+            self.worksheet.write_string(row, 0, text, fmt)
+
+    def set_width(self, col: int, width: float) -> None:
+        self.worksheet.set_column(col, col, width)
+
+    def add_chart(self, header_row: int, first_data_row: int, last_data_row: int,
+                  value_columns: List[int], anchor_col: int) -> None:
+        chart = self.workbook.add_chart({'type': 'column'})
+        chart.set_title({'name': '数据图表'})
+        for col in value_columns:
+            chart.add_series({
+                'name': [self.sheet_name, header_row, col],
+                'categories': [self.sheet_name, first_data_row, 0, last_data_row, 0],
+                'values': [self.sheet_name, first_data_row, col, last_data_row, col],
+            })
+        self.worksheet.insert_chart(header_row, anchor_col, chart)
+
+    def close(self) -> None:
+        self.workbook.close()
+
+
+class _OpenpyxlWriteOnlyBackend:
+    """openpyxl write_only 模式（未安装 xlsxwriter 时使用）：行按顺序追加，不支持合并单元格和图表"""
+
+    def __init__(self, file_path: str, sheet_name: str):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        self._cell_class = WriteOnlyCell
+        self.file_path = file_path
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet(sheet_name)
+        self._next_row = 0
+        self._rows_started = False
+
+    def make_format(self, font_size: int = 10, bold: bool = False, font_color: Optional[str] = None,
+                    fill: Optional[str] = None, align: str = 'left', border: bool = True,
+                    num_format: Optional[str] = None) -> Dict[str, Any]:
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+        style = {
+            'font': Font(name=FONT_NAME, size=font_size, bold=bold, color=font_color),
+            'alignment': Alignment(horizontal=align, vertical='center'),
+        }
+        if fill:
+            style['fill'] = PatternFill(start_color=fill, end_color=fill, fill_type='solid')
+        if border:
+            thin = Side(style='thin')
+            style['border'] = Border(left=thin, right=thin, top=thin, bottom=thin)
+        if num_format:
+            style['number_format'] = num_format
+        return style
+
+    def write_row(self, row: int, values: List[Any], formats: List[Any]) -> None:
+        self._advance_to(row)
+        cells = []
+        for value, style in zip(values, formats):
+            cell = self._cell_class(self.worksheet, value=None if value == '' else value)
+            for attr, style_value in style.items():
+                setattr(cell, attr, style_value)
+            cells.append(cell)
+        self.worksheet.append(cells)
+        self._next_row = row + 1
+
+    def write_banner(self, row: int, text: str, column_count: int, fmt) -> None:
+        self.write_row(row, [text], [fmt])
+
+    def set_width(self, col: int, width: float) -> None:
+        # write_only 模式下列宽必须在写入第一行之前设置
+        if self._rows_started:
+            return
+        from openpyxl.utils import get_column_letter
+        self.worksheet.column_dimensions[get_column_letter(col + 1)].width = width
+
+    def add_chart(self, *args, **kwargs) -> None:
+        logger.warning("openpyxl write_only 模式不支持图表，跳过图表创建")
+
+    def close(self) -> None:
+        self.workbook.save(self.file_path)
+
+    def _advance_to(self, row: int) -> None:
+        self._rows_started = True
+        while self._next_row < row:
+            self.worksheet.append([])
+            self._next_row += 1
+
+
+class StreamingExcelWriter:
+    """
+    按行流式写入的 Excel 报表
+
+    版式与原 pandas 实现一致：标题、副标题（各占一行并空一行）、表头、数据行，
+    数据后空两行写入汇总信息。列由列配置决定（表头使用配置中的 title），
+    首行数据中未配置的字段追加在后面。
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        sheet_name: str = "Sheet1",
+        columns_config: Optional[List[Dict[str, Any]]] = None,
+        title: Optional[str] = None,
+        subtitle: Optional[str] = None
+    ):
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self.file_path = file_path
+        self.title = title
+        self.subtitle = subtitle
+        self.columns_config = list(columns_config or [])
+        self.backend = (_XlsxWriterBackend if XLSXWRITER_AVAILABLE else _OpenpyxlWriteOnlyBackend)(file_path, sheet_name)
+
+        self.columns: List[Dict[str, Any]] = []
+        self.row_count = 0
+        self.header_row: Optional[int] = None
+        self._next_row = 0
+        self._widths: List[int] = []
+
+        backend = self.backend
+        self._title_format = backend.make_format(font_size=16, bold=True, align='center', border=False)
+        self._subtitle_format = backend.make_format(font_size=12, bold=True, align='center', border=False)
+        self._header_format = backend.make_format(font_size=11, bold=True, font_color='FFFFFF',
+                                                  fill=HEADER_FILL_COLOR, align='center')
+        self._plain_format = backend.make_format(border=False)
+        self._data_formats: List[Any] = []
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        写入表头和全部数据行（逐行消费迭代器）
+
+        Returns:
+            写入的数据行数
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        self._prepare_columns(first)
+        if not self.columns:
+            return 0
+
+        self._write_banners()
+        self.header_row = self._next_row
+        self.backend.write_row(self.header_row, [c['title'] for c in self.columns],
+                               [self._header_format] * len(self.columns))
+        self._next_row += 1
+
+        if first is None:
+            return 0
+
+        keys = [c['key'] for c in self.columns]
+        types = [c['type'] for c in self.columns]
+        formats = self._data_formats
+        widths = self._widths
+        write_row = self.backend.write_row
+        for row in chain((first,), rows):
+            values = [self._cell_value(row.get(key), col_type) for key, col_type in zip(keys, types)]
+            if self.row_count < WIDTH_SAMPLE_ROWS:
+                for i, value in enumerate(values):
+                    if value is not None:
+                        widths[i] = max(widths[i], _display_width(value))
+            write_row(self._next_row, values, formats)
+            self._next_row += 1
+            self.row_count += 1
+        return self.row_count
+
+    def write_summary(self, summary_data: SummaryData) -> None:
+        """在数据后空两行写入汇总信息（可传入在数据写完后才计算的回调）"""
+        if callable(summary_data):
+            summary_data = summary_data()
+        if not summary_data:
+            return
+
+        self._next_row += 2
+        rows = [['汇总信息', ''], ['', '']]
+        for key, value in summary_data.items():
+            if isinstance(value, (float, Decimal)):
+                formatted_value = f"{value:.2f}"
+            else:
+                formatted_value = str(value)
+            rows.append([key, formatted_value])
+        for values in rows:
+            self.backend.write_row(self._next_row, values, [self._plain_format, self._plain_format])
+            self._next_row += 1
+
+    def add_chart(self) -> None:
+        """为前几个数值列的前若干行添加柱状图"""
+        if not self.row_count or self.header_row is None:
+            return
+        value_columns = [i for i, c in enumerate(self.columns) if c['type'] in NUMERIC_COLUMN_TYPES and i > 0]
+        if not value_columns:
+            return
+        try:
+            first_data_row = self.header_row + 1
+            last_data_row = self.header_row + min(self.row_count, CHART_MAX_ROWS)
+            self.backend.add_chart(self.header_row, first_data_row, last_data_row,
+                                   value_columns[:CHART_MAX_SERIES], len(self.columns) + 2)
+        except Exception as e:
+            logger.warning(f"添加图表失败: {str(e)}")
+
+    def close(self) -> None:
+        for col, width in enumerate(self._widths):
+            self.backend.set_width(col, min(max(width + 2, MIN_COLUMN_WIDTH), MAX_COLUMN_WIDTH))
+        self.backend.close()
+
+    def __enter__(self) -> "StreamingExcelWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _prepare_columns(self, first_row: Optional[Dict[str, Any]]) -> None:
+        """确定列及每列的单元格格式"""
+        columns = [
+            {'key': c['key'], 'title': c.get('title') or c['key'], 'type': c.get('type', 'string'), 'width': c.get('width')}
+            for c in self.columns_config if c.get('key')
+        ]
+        configured = {c['key'] for c in columns}
+        if first_row:
+            for key, value in first_row.items():
+                if key not in configured:
+                    inferred = 'number' if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) else 'string'
+                    columns.append({'key': key, 'title': key, 'type': inferred, 'width': None})
+        self.columns = columns
+
+        self._data_formats = [
+            self.backend.make_format(
+                align='right' if c['type'] in NUMERIC_COLUMN_TYPES else 'left',
+                num_format=COLUMN_NUM_FORMATS.get(c['type'])
+            )
+            for c in columns
+        ]
+        # 配置了宽度的列直接使用配置，其余根据表头和前若干行数据估算
+        self._widths = [int(c['width']) - 2 if c.get('width') else _display_width(c['title']) for c in columns]
+        if not XLSXWRITER_AVAILABLE:
+            for col, width in enumerate(self._widths):
+                self.backend.set_width(col, min(max(width + 2, MIN_COLUMN_WIDTH), MAX_COLUMN_WIDTH))
+
+    def _write_banners(self) -> None:
+        for text, fmt in ((self.title, self._title_format), (self.subtitle, self._subtitle_format)):
+            if text:
+                self.backend.write_banner(self._next_row, text, len(self.columns), fmt)
+                self._next_row += 2
+
+    @staticmethod
+    def _cell_value(value: Any, col_type: str) -> Any:
+        if col_type in NUMERIC_COLUMN_TYPES:
+            # 与原实现一致：无法转换为数值的值按 0 写入
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value
+            try:
+                return float(value)
+            except (ValueError, TypeError):
+                return 0
+        if value is None:
+            return None
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (str, int, float, bool)):
+            return value
+        if isinstance(value, (datetime, date)):
+            return value if col_type == 'date' else value.isoformat()
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return str(value)
+
+
 class ExcelExportUtils:
     """Excel导出工具类"""
-    
+
     @staticmethod
     def create_excel_file(
-        data: List[Dict[str, Any]],
+        data: Iterable[Dict[str, Any]],
         file_path: str,
         sheet_name: str = "Sheet1",
         title: Optional[str] = None,
         subtitle: Optional[str] = None,
         columns_config: Optional[List[Dict[str, Any]]] = None,
-        summary_data: Optional[Dict[str, Any]] = None,
+        summary_data: SummaryData = None,
         include_charts: bool = False
     ) -> str:
         """
         创建Excel文件
-        
+
         Args:
-            data: 数据列表
+            data: 数据行，可以是列表或逐行产生的迭代器（如数据库游标）
             file_path: 文件路径
             sheet_name: 工作表名称
             title: 报表标题
             subtitle: 报表副标题
             columns_config: 列配置信息
-            summary_data: 汇总数据
+            summary_data: 汇总数据，或在数据写完后调用的回调（用于边写边统计的迭代器数据）
             include_charts: 是否包含图表
-            
+
         Returns:
             生成的文件路径
         """
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            if not data:
-                # 创建空的Excel文件
-                df = pd.DataFrame()
-                df.to_excel(file_path, sheet_name=sheet_name, index=False)
+            writer = StreamingExcelWriter(
+                file_path,
+                sheet_name=sheet_name,
+                columns_config=columns_config,
+                title=title,
+                subtitle=subtitle
+            )
+            try:
+                row_count = writer.write_rows(data)
+                if row_count:
+                    writer.write_summary(summary_data)
+                    if include_charts:
+                        writer.add_chart()
+            finally:
+                writer.close()
+
+            if row_count:
+                logger.info(f"成功创建Excel文件: {file_path}, 数据行数: {row_count}")
+            else:
                 logger.warning(f"创建了空的Excel文件: {file_path}")
-                return file_path
-            
-            # 转换数据为DataFrame
-            df = pd.DataFrame(data)
-            
-            # 格式化数值列
-            df = ExcelExportUtils._format_numeric_columns(df, columns_config)
-            
-            # 使用ExcelWriter进行高级格式化
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                # 写入数据
-                start_row = 0
-                
-                # 添加标题
-                if title:
-                    title_df = pd.DataFrame([[title]])
-                    title_df.to_excel(writer, sheet_name=sheet_name, startrow=start_row, 
-                                     index=False, header=False)
-                    start_row += 2
-                
-                # 添加副标题
-                if subtitle:
-                    subtitle_df = pd.DataFrame([[subtitle]])
-                    subtitle_df.to_excel(writer, sheet_name=sheet_name, startrow=start_row,
-                                       index=False, header=False)
-                    start_row += 2
-                
-                # 写入主数据
-                df.to_excel(writer, sheet_name=sheet_name, startrow=start_row, index=False)
-                
-                # 添加汇总数据
-                if summary_data:
-                    summary_start_row = start_row + len(df) + 3
-                    ExcelExportUtils._add_summary_section(
-                        writer, sheet_name, summary_data, summary_start_row
-                    )
-                
-                # 应用样式
-                ExcelExportUtils._apply_excel_styles(
-                    writer, sheet_name, df, start_row, title, subtitle, columns_config
-                )
-                
-                # 添加图表（如果需要）
-                if include_charts and len(df) > 0:
-                    ExcelExportUtils._add_charts(writer, sheet_name, df, start_row)
-            
-            logger.info(f"成功创建Excel文件: {file_path}, 数据行数: {len(df)}")
             return file_path
-            
+
         except Exception as e:
             logger.error(f"创建Excel文件失败: {str(e)}")
             raise
-    
-    @staticmethod
-    def _format_numeric_columns(
-        df: pd.DataFrame, 
-        columns_config: Optional[List[Dict[str, Any]]]
-    ) -> pd.DataFrame:
-        """格式化数值列"""
-        if not columns_config:
-            return df
-        
-        for col_config in columns_config:
-            col_key = col_config.get('key')
-            col_type = col_config.get('type')
-            
-            if col_key in df.columns:
-                if col_type == 'currency':
-                    # 格式化货币字段
-                    df[col_key] = pd.to_numeric(df[col_key], errors='coerce').fillna(0)
-                    df[col_key] = df[col_key].apply(lambda x: f"{x:.2f}")
-                elif col_type == 'number':
-                    # 格式化数字字段
-                    df[col_key] = pd.to_numeric(df[col_key], errors='coerce').fillna(0)
-                elif col_type == 'percentage':
-                    # 格式化百分比字段
-                    df[col_key] = pd.to_numeric(df[col_key], errors='coerce').fillna(0)
-                    df[col_key] = df[col_key].apply(lambda x: f"{x:.2%}")
-        
-        return df
-    
-    @staticmethod
-    def _add_summary_section(
-        writer: pd.ExcelWriter,
-        sheet_name: str,
-        summary_data: Dict[str, Any],
-        start_row: int
-    ):
-        """添加汇总部分"""
-        summary_rows = []
-        
-        # 添加汇总标题
-        summary_rows.append(['汇总信息', ''])
-        summary_rows.append(['', ''])
-        
-        # 添加汇总数据
-        for key, value in summary_data.items():
-            if isinstance(value, (int, float, Decimal)):
-                formatted_value = f"{value:.2f}" if isinstance(value, (float, Decimal)) else str(value)
-            else:
-                formatted_value = str(value)
-            summary_rows.append([key, formatted_value])
-        
-        # 写入汇总数据
-        summary_df = pd.DataFrame(summary_rows)
-        summary_df.to_excel(writer, sheet_name=sheet_name, startrow=start_row,
-                           index=False, header=False)
-    
-    @staticmethod
-    def _apply_excel_styles(
-        writer: pd.ExcelWriter,
-        sheet_name: str,
-        df: pd.DataFrame,
-        data_start_row: int,
-        title: Optional[str],
-        subtitle: Optional[str],
-        columns_config: Optional[List[Dict[str, Any]]]
-    ):
-        """应用Excel样式"""
-        try:
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils import get_column_letter
-            
-            workbook = writer.book
-            worksheet = workbook[sheet_name]
-            
-            # 定义样式
-            title_font = Font(name='微软雅黑', size=16, bold=True)
-            subtitle_font = Font(name='微软雅黑', size=12, bold=True)
-            header_font = Font(name='微软雅黑', size=11, bold=True, color='FFFFFF')
-            data_font = Font(name='微软雅黑', size=10)
-            
-            header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-            
-            center_alignment = Alignment(horizontal='center', vertical='center')
-            left_alignment = Alignment(horizontal='left', vertical='center')
-            
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            current_row = 1
-            
-            # 应用标题样式
-            if title:
-                cell = worksheet.cell(row=current_row, column=1)
-                cell.font = title_font
-                cell.alignment = center_alignment
-                # 合并标题行
-                worksheet.merge_cells(f'A{current_row}:{get_column_letter(len(df.columns))}{current_row}')
-                current_row += 2
-            
-            # 应用副标题样式
-            if subtitle:
-                cell = worksheet.cell(row=current_row, column=1)
-                cell.font = subtitle_font
-                cell.alignment = center_alignment
-                # 合并副标题行
-                worksheet.merge_cells(f'A{current_row}:{get_column_letter(len(df.columns))}{current_row}')
-                current_row += 2
-            
-            # 应用表头样式
-            header_row = data_start_row + 1
-            for col_num in range(1, len(df.columns) + 1):
-                cell = worksheet.cell(row=header_row, column=col_num)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = center_alignment
-                cell.border = thin_border
-            
-            # 应用数据行样式
-            for row_num in range(header_row + 1, header_row + len(df) + 1):
-                for col_num in range(1, len(df.columns) + 1):
-                    cell = worksheet.cell(row=row_num, column=col_num)
-                    cell.font = data_font
-                    cell.border = thin_border
-                    
-                    # 根据列类型设置对齐方式
-                    col_name = df.columns[col_num - 1]
-                    if columns_config:
-                        col_config = next((c for c in columns_config if c.get('key') == col_name), None)
-                        if col_config and col_config.get('type') in ['currency', 'number', 'percentage']:
-                            cell.alignment = Alignment(horizontal='right', vertical='center')
-                        else:
-                            cell.alignment = left_alignment
-                    else:
-                        cell.alignment = left_alignment
-            
-            # 自动调整列宽
-            for col_num in range(1, len(df.columns) + 1):
-                column_letter = get_column_letter(col_num)
-                max_length = 0
-                
-                # 检查列标题长度
-                header_length = len(str(df.columns[col_num - 1]))
-                max_length = max(max_length, header_length)
-                
-                # 检查数据长度
-                for row_num in range(header_row + 1, header_row + min(len(df), 100) + 1):
-                    cell_value = worksheet.cell(row=row_num, column=col_num).value
-                    if cell_value:
-                        max_length = max(max_length, len(str(cell_value)))
-                
-                # 设置列宽（最小8，最大50）
-                adjusted_width = min(max(max_length + 2, 8), 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-                
-        except ImportError:
-            logger.warning("openpyxl不可用，跳过样式设置")
-        except Exception as e:
-            logger.warning(f"应用Excel样式失败: {str(e)}")
-    
-    @staticmethod
-    def _add_charts(
-        writer: pd.ExcelWriter,
-        sheet_name: str,
-        df: pd.DataFrame,
-        data_start_row: int
-    ):
-        """添加图表"""
-        try:
-            from openpyxl.chart import ColumnChart, Reference
-            
-            workbook = writer.book
-            worksheet = workbook[sheet_name]
-            
-            # 查找数值列
-            numeric_columns = []
-            for col_name in df.columns:
-                if df[col_name].dtype in ['int64', 'float64']:
-                    numeric_columns.append(col_name)
-            
-            if len(numeric_columns) > 0:
-                # 创建柱状图
-                chart = ColumnChart()
-                chart.title = "数据图表"
-                chart.style = 13
-                
-                # 设置数据范围
-                data_range = Reference(
-                    worksheet,
-                    min_col=2,  # 假设第一列是标签
-                    min_row=data_start_row + 1,
-                    max_col=min(len(numeric_columns) + 1, 5),  # 最多显示4个数据系列
-                    max_row=data_start_row + min(len(df), 20) + 1  # 最多显示20行数据
-                )
-                
-                categories = Reference(
-                    worksheet,
-                    min_col=1,
-                    min_row=data_start_row + 2,
-                    max_row=data_start_row + min(len(df), 20) + 1
-                )
-                
-                chart.add_data(data_range, titles_from_data=True)
-                chart.set_categories(categories)
-                
-                # 设置图表位置
-                chart_position = f"{chr(ord('A') + len(df.columns) + 2)}{data_start_row + 1}"
-                worksheet.add_chart(chart, chart_position)
-                
-        except ImportError:
-            logger.warning("openpyxl图表功能不可用，跳过图表创建")
-        except Exception as e:
-            logger.warning(f"添加图表失败: {str(e)}")
-    
+
     @staticmethod
     def format_currency(value: Union[int, float, Decimal, str]) -> str:
         """格式化货币值"""
@@ -329,7 +424,7 @@ class ExcelExportUtils:
             return f"{value:.2f}"
         except (ValueError, TypeError):
             return "0.00"
-    
+
     @staticmethod
     def format_percentage(value: Union[int, float, Decimal, str]) -> str:
         """格式化百分比值"""
@@ -338,4 +433,4 @@ class ExcelExportUtils:
                 value = float(value)
             return f"{value:.2%}"
         except (ValueError, TypeError):
-            return "0.00%" 
\ No newline at end of file
+            return "0.00%"
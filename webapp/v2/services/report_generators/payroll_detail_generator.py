@@ -4,15 +4,54 @@
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy import text
 from datetime import datetime
 
-from .base_generator import BaseReportGenerator
+from .base_generator import BaseReportGenerator, SummaryAccumulator
+from ...payroll_engine.component_registry import get_component_registry
+
+
+class PayrollDetailSummaryAccumulator(SummaryAccumulator):
+    """薪资明细汇总累加器"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.gross_pay = 0.0
+        self.net_pay = 0.0
+        self.deductions = 0.0
+        self.departments = set()
+    
+    def add(self, row: Dict[str, Any]):
+        self.gross_pay += row.get('gross_pay', 0)
+        self.net_pay += row.get('net_pay', 0)
+        self.deductions += row.get('total_deductions', 0)
+        self.departments.add(row.get('department_name', ''))
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return {
+                "总记录数": 0,
+                "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        
+        return {
+            "员工总数": self.count,
+            "部门数量": len(self.departments),
+            "应发合计总计": f"{self.gross_pay:.2f}",
+            "实发合计总计": f"{self.net_pay:.2f}",
+            "扣除总计": f"{self.deductions:.2f}",
+            "平均应发合计": f"{self.gross_pay / self.count:.2f}",
+            "平均实发合计": f"{self.net_pay / self.count:.2f}",
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
 
 class PayrollDetailGenerator(BaseReportGenerator):
     """薪资明细报表生成器"""
     
+    summary_accumulator_class = PayrollDetailSummaryAccumulator
+    
     def generate_report(
         self,
         config: Dict[str, Any],
@@ -27,29 +66,21 @@ class PayrollDetailGenerator(BaseReportGenerator):
             if not self.validate_config(config):
                 raise ValueError("配置参数无效")
             
-            # 获取报表数据
-            data = self.get_report_data(config)
-            
             # 生成文件名和路径
             filename = self.generate_filename(config, export_format)
             file_path = os.path.join(output_dir, filename)
             
-            # 根据格式生成文件
-            if export_format.lower() == 'xlsx':
-                result_path = self.create_excel_file(data, file_path, config)
-            elif export_format.lower() == 'csv':
-                result_path = self.create_csv_file(data, file_path, config)
-            else:
-                raise ValueError(f"不支持的导出格式: {export_format}")
+            # 数据行从游标流式写入文件，汇总在同一遍中累计
+            result_path, data_count = self.write_report_file(config, file_path, export_format)
             
-            self.log_generation_end(result_path, len(data))
+            self.log_generation_end(result_path, data_count)
             return result_path
             
         except Exception as e:
             self.handle_generation_error(e, config)
     
-    def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """获取薪资明细数据"""
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """通过服务端游标逐行产生薪资明细数据"""
         try:
             period_id = config.get('period_id')
             department_ids = config.get('department_ids', [])
@@ -99,16 +130,12 @@ class PayrollDetailGenerator(BaseReportGenerator):
             ORDER BY d.name, e.employee_code
             """
             
-            result = self.db.execute(text(query), params)
-            rows = result.fetchall()
-            
             # 获取薪资组件定义
             earnings_components = self._get_payroll_components('EARNING')
             deductions_components = self._get_payroll_components('DEDUCTION')
             
             # 转换为字典格式
-            data = []
-            for row in rows:
+            for row in self.stream_query(query, params):
                 # 基础信息
                 row_data = {
                     'employee_code': row.employee_code or '',
@@ -145,10 +172,7 @@ class PayrollDetailGenerator(BaseReportGenerator):
                 row_data['total_deductions'] = deductions_total
                 row_data['net_pay'] = float(row.net_pay or 0)
                 
-                data.append(row_data)
-            
-            self.logger.info(f"查询到薪资明细数据 {len(data)} 条")
-            return data
+                yield row_data
             
         except Exception as e:
             self.logger.error(f"获取薪资明细数据失败: {str(e)}")
@@ -209,27 +233,19 @@ class PayrollDetailGenerator(BaseReportGenerator):
             ]
     
     def _get_payroll_components(self, component_type: str) -> List[Dict[str, Any]]:
-        """获取薪资组件定义"""
+        """获取薪资组件定义（来自组件注册表，按显示顺序）"""
         try:
-            query = """
-            SELECT code, name, sort_order
-            FROM config.payroll_component_definitions
-            WHERE component_type = :component_type AND is_active = true
-            ORDER BY sort_order, name
-            """
-            
-            result = self.db.execute(text(query), {'component_type': component_type})
-            rows = result.fetchall()
-            
-            components = []
-            for row in rows:
-                components.append({
-                    'code': row.code,
-                    'name': row.name,
-                    'sort_order': row.sort_order or 0
-                })
-            
-            return components
+            components = [
+                {
+                    'code': component.code,
+                    'name': component.name,
+                    'sort_order': component.display_order
+                }
+                for component in get_component_registry(self.db).of_type(component_type)
+            ]
+            if components:
+                return components
+            raise LookupError(f"没有启用的 {component_type} 类型组件")
             
         except Exception as e:
             self.logger.warning(f"获取薪资组件定义失败: {str(e)}")
@@ -275,33 +291,6 @@ class PayrollDetailGenerator(BaseReportGenerator):
         subtitle_parts.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         return " | ".join(subtitle_parts)
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """获取汇总数据"""
-        if not data:
-            return {
-                "总记录数": 0,
-                "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        
-        # 计算总计
-        total_gross_pay = sum(row.get('gross_pay', 0) for row in data)
-        total_net_pay = sum(row.get('net_pay', 0) for row in data)
-        total_deductions = sum(row.get('total_deductions', 0) for row in data)
-        
-        # 统计部门数量
-        departments = set(row.get('department_name', '') for row in data)
-        
-        return {
-            "员工总数": len(data),
-            "部门数量": len(departments),
-            "应发合计总计": f"{total_gross_pay:.2f}",
-            "实发合计总计": f"{total_net_pay:.2f}",
-            "扣除总计": f"{total_deductions:.2f}",
-            "平均应发合计": f"{total_gross_pay / len(data):.2f}" if len(data) > 0 else "0.00",
-            "平均实发合计": f"{total_net_pay / len(data):.2f}" if len(data) > 0 else "0.00",
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """验证配置参数"""
         # 薪资明细报表通常需要指定期间
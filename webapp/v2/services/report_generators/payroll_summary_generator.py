@@ -4,17 +4,65 @@
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy import text
 from decimal import Decimal
 from datetime import datetime
 
-from .base_generator import BaseReportGenerator
+from .base_generator import BaseReportGenerator, SummaryAccumulator
 from .excel_utils import ExcelExportUtils
 
+
+class PayrollSummaryAccumulator(SummaryAccumulator):
+    """薪资汇总表汇总累加器"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.total_employees = 0
+        self.total_gross_pay = 0.0
+        self.total_net_pay = 0.0
+        self.total_deductions = 0.0
+        self.total_tax = 0.0
+        self.total_social_insurance = 0.0
+        self.total_housing_fund = 0.0
+    
+    def add(self, row: Dict[str, Any]):
+        self.total_employees += row['employee_count']
+        self.total_gross_pay += row['total_gross_pay']
+        self.total_net_pay += row['total_net_pay']
+        self.total_deductions += row['total_deductions']
+        self.total_tax += row['total_tax']
+        self.total_social_insurance += row['total_social_insurance']
+        self.total_housing_fund += row['total_housing_fund']
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return {
+                "总记录数": 0,
+                "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        
+        total_employees = self.total_employees
+        return {
+            "部门数量": self.count,
+            "员工总数": total_employees,
+            "应发合计总计": f"{self.total_gross_pay:.2f}",
+            "实发合计总计": f"{self.total_net_pay:.2f}",
+            "扣除总计": f"{self.total_deductions:.2f}",
+            "个税总计": f"{self.total_tax:.2f}",
+            "社保个人总计": f"{self.total_social_insurance:.2f}",
+            "公积金个人总计": f"{self.total_housing_fund:.2f}",
+            "平均应发合计": f"{self.total_gross_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
+            "平均实发合计": f"{self.total_net_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+
 class PayrollSummaryGenerator(BaseReportGenerator):
     """薪资汇总报表生成器"""
     
+    summary_accumulator_class = PayrollSummaryAccumulator
+    
     def generate_report(
         self,
         config: Dict[str, Any],
@@ -29,29 +77,21 @@ class PayrollSummaryGenerator(BaseReportGenerator):
             if not self.validate_config(config):
                 raise ValueError("配置参数无效")
             
-            # 获取报表数据
-            data = self.get_report_data(config)
-            
             # 生成文件名和路径
             filename = self.generate_filename(config, export_format)
             file_path = os.path.join(output_dir, filename)
             
-            # 根据格式生成文件
-            if export_format.lower() == 'xlsx':
-                result_path = self.create_excel_file(data, file_path, config)
-            elif export_format.lower() == 'csv':
-                result_path = self.create_csv_file(data, file_path, config)
-            else:
-                raise ValueError(f"不支持的导出格式: {export_format}")
+            # 数据行从游标流式写入文件，汇总在同一遍中累计
+            result_path, data_count = self.write_report_file(config, file_path, export_format)
             
-            self.log_generation_end(result_path, len(data))
+            self.log_generation_end(result_path, data_count)
             return result_path
             
         except Exception as e:
             self.handle_generation_error(e, config)
     
-    def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """获取薪资汇总数据"""
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """逐行产生薪资汇总数据（每个部门一行）"""
         try:
             period_id = config.get('period_id')
             department_ids = config.get('department_ids', [])
@@ -115,13 +155,9 @@ class PayrollSummaryGenerator(BaseReportGenerator):
             ORDER BY total_gross_pay DESC
             """
             
-            result = self.db.execute(text(query), params)
-            rows = result.fetchall()
-            
             # 转换为字典格式
-            data = []
-            for row in rows:
-                data.append({
+            for row in self.stream_query(query, params):
+                yield {
                     'department_name': row.department_name or '未分配部门',
                     'employee_count': int(row.employee_count),
                     'total_gross_pay': float(row.total_gross_pay or 0),
@@ -132,10 +168,7 @@ class PayrollSummaryGenerator(BaseReportGenerator):
                     'total_tax': float(row.total_tax or 0),
                     'total_social_insurance': float(row.total_social_insurance or 0),
                     'total_housing_fund': float(row.total_housing_fund or 0)
-                })
-            
-            self.logger.info(f"查询到薪资汇总数据 {len(data)} 条")
-            return data
+                }
             
         except Exception as e:
             self.logger.error(f"获取薪资汇总数据失败: {str(e)}")
@@ -181,37 +214,6 @@ class PayrollSummaryGenerator(BaseReportGenerator):
         subtitle_parts.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         return " | ".join(subtitle_parts)
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """获取汇总数据"""
-        if not data:
-            return {
-                "总记录数": 0,
-                "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        
-        # 计算总计
-        total_employees = sum(row['employee_count'] for row in data)
-        total_gross_pay = sum(row['total_gross_pay'] for row in data)
-        total_net_pay = sum(row['total_net_pay'] for row in data)
-        total_deductions = sum(row['total_deductions'] for row in data)
-        total_tax = sum(row['total_tax'] for row in data)
-        total_social_insurance = sum(row['total_social_insurance'] for row in data)
-        total_housing_fund = sum(row['total_housing_fund'] for row in data)
-        
-        return {
-            "部门数量": len(data),
-            "员工总数": total_employees,
-            "应发合计总计": f"{total_gross_pay:.2f}",
-            "实发合计总计": f"{total_net_pay:.2f}",
-            "扣除总计": f"{total_deductions:.2f}",
-            "个税总计": f"{total_tax:.2f}",
-            "社保个人总计": f"{total_social_insurance:.2f}",
-            "公积金个人总计": f"{total_housing_fund:.2f}",
-            "平均应发合计": f"{total_gross_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
-            "平均实发合计": f"{total_net_pay / total_employees:.2f}" if total_employees > 0 else "0.00",
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """验证配置参数"""
         # 薪资汇总报表可以不需要特定的期间，但如果提供了要验证
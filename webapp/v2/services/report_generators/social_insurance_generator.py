@@ -4,17 +4,60 @@
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy import text
 from decimal import Decimal
 from datetime import datetime
 
-from .base_generator import BaseReportGenerator
+from .base_generator import BaseReportGenerator, SummaryAccumulator
+
+
+class SocialInsuranceSummaryAccumulator(SummaryAccumulator):
+    """社保缴费表汇总累加器"""
+    
+    # 需要累计的缴费列
+    TOTAL_KEYS = (
+        'personal_total', 'employer_total',
+        'pension_personal', 'pension_employer',
+        'medical_personal', 'medical_employer',
+        'housing_fund_personal', 'housing_fund_employer'
+    )
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.totals = {key: 0.0 for key in self.TOTAL_KEYS}
+    
+    def add(self, row: Dict[str, Any]):
+        for key in self.TOTAL_KEYS:
+            self.totals[key] += float(row[key])
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return None
+        
+        totals = self.totals
+        return {
+            "参保人数": self.count,
+            "个人缴费合计": f"{totals['personal_total']:.2f}",
+            "单位缴费合计": f"{totals['employer_total']:.2f}",
+            "缴费总计": f"{totals['personal_total'] + totals['employer_total']:.2f}",
+            "养老保险(个人)": f"{totals['pension_personal']:.2f}",
+            "养老保险(单位)": f"{totals['pension_employer']:.2f}",
+            "医疗保险(个人)": f"{totals['medical_personal']:.2f}",
+            "医疗保险(单位)": f"{totals['medical_employer']:.2f}",
+            "住房公积金(个人)": f"{totals['housing_fund_personal']:.2f}",
+            "住房公积金(单位)": f"{totals['housing_fund_employer']:.2f}",
+            "人均个人缴费": f"{totals['personal_total'] / self.count:.2f}",
+            "人均单位缴费": f"{totals['employer_total'] / self.count:.2f}",
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
 
 
 class SocialInsuranceGenerator(BaseReportGenerator):
     """社保缴费表生成器"""
     
+    summary_accumulator_class = SocialInsuranceSummaryAccumulator
+    
     def generate_report(
         self,
         config: Dict[str, Any],
@@ -39,9 +82,6 @@ class SocialInsuranceGenerator(BaseReportGenerator):
             if not self.validate_config(config):
                 raise ValueError("配置验证失败")
             
-            # 获取报表数据
-            data = self.get_report_data(config)
-            
             # 生成文件名和路径
             filename = self.generate_filename(config, export_format)
             file_path = os.path.join(output_dir, filename)
@@ -49,30 +89,25 @@ class SocialInsuranceGenerator(BaseReportGenerator):
             # 确保输出目录存在
             os.makedirs(output_dir, exist_ok=True)
             
-            # 根据格式生成文件
-            if export_format.lower() == 'xlsx':
-                result_path = self.create_excel_file(data, file_path, config)
-            elif export_format.lower() == 'csv':
-                result_path = self.create_csv_file(data, file_path, config)
-            else:
-                raise ValueError(f"不支持的导出格式: {export_format}")
+            # 数据行从游标流式写入文件，汇总在同一遍中累计
+            result_path, data_count = self.write_report_file(config, file_path, export_format)
             
-            self.log_generation_end(result_path, len(data))
+            self.log_generation_end(result_path, data_count)
             return result_path
             
         except Exception as e:
             self.handle_generation_error(e, config)
             raise
     
-    def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        获取社保缴费数据
+        逐行产生社保缴费数据
         
         Args:
             config: 报表配置
             
         Returns:
-            社保缴费数据列表
+            社保缴费数据行迭代器
         """
         try:
             period_id = config.get('period_id')
@@ -124,12 +159,8 @@ class SocialInsuranceGenerator(BaseReportGenerator):
             ORDER BY d.name, e.employee_code
             """
             
-            result = self.db.execute(text(query), params)
-            rows = result.fetchall()
-            
             # 转换为字典格式
-            data = []
-            for row in rows:
+            for row in self.stream_query(query, params):
                 # 计算个人和单位缴费合计
                 personal_total = (
                     (row.pension_personal or 0) + 
@@ -147,7 +178,7 @@ class SocialInsuranceGenerator(BaseReportGenerator):
                     (row.housing_fund_employer or 0)
                 )
                 
-                data.append({
+                yield {
                     'employee_code': row.employee_code or '',
                     'employee_name': row.employee_name or '',
                     'id_card_number': row.id_card_number or '',
@@ -170,10 +201,7 @@ class SocialInsuranceGenerator(BaseReportGenerator):
                     'grand_total': f"{personal_total + employer_total:.2f}",
                     'start_date': row.start_date.strftime('%Y-%m-%d') if row.start_date else '',
                     'end_date': row.end_date.strftime('%Y-%m-%d') if row.end_date else ''
-                })
-            
-            self.logger.info(f"获取社保缴费数据成功，共 {len(data)} 条记录")
-            return data
+                }
             
         except Exception as e:
             self.logger.error(f"获取社保缴费数据失败: {str(e)}")
@@ -215,46 +243,6 @@ class SocialInsuranceGenerator(BaseReportGenerator):
         """获取报表标题"""
         return "社会保险缴费表"
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """
-        获取汇总数据
-        
-        Args:
-            data: 报表数据
-            config: 报表配置
-            
-        Returns:
-            汇总数据字典
-        """
-        if not data:
-            return None
-        
-        # 计算汇总统计
-        total_personal = sum(float(row['personal_total']) for row in data)
-        total_employer = sum(float(row['employer_total']) for row in data)
-        total_pension_personal = sum(float(row['pension_personal']) for row in data)
-        total_pension_employer = sum(float(row['pension_employer']) for row in data)
-        total_medical_personal = sum(float(row['medical_personal']) for row in data)
-        total_medical_employer = sum(float(row['medical_employer']) for row in data)
-        total_housing_fund_personal = sum(float(row['housing_fund_personal']) for row in data)
-        total_housing_fund_employer = sum(float(row['housing_fund_employer']) for row in data)
-        
-        return {
-            "参保人数": len(data),
-            "个人缴费合计": f"{total_personal:.2f}",
-            "单位缴费合计": f"{total_employer:.2f}",
-            "缴费总计": f"{total_personal + total_employer:.2f}",
-            "养老保险(个人)": f"{total_pension_personal:.2f}",
-            "养老保险(单位)": f"{total_pension_employer:.2f}",
-            "医疗保险(个人)": f"{total_medical_personal:.2f}",
-            "医疗保险(单位)": f"{total_medical_employer:.2f}",
-            "住房公积金(个人)": f"{total_housing_fund_personal:.2f}",
-            "住房公积金(单位)": f"{total_housing_fund_employer:.2f}",
-            "人均个人缴费": f"{total_personal / len(data):.2f}" if len(data) > 0 else "0.00",
-            "人均单位缴费": f"{total_employer / len(data):.2f}" if len(data) > 0 else "0.00",
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """
         验证配置参数
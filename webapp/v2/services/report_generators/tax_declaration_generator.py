@@ -4,17 +4,52 @@
 """
 
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from sqlalchemy import text
 from decimal import Decimal
 from datetime import datetime
 
-from .base_generator import BaseReportGenerator
+from .base_generator import BaseReportGenerator, SummaryAccumulator
+
+
+class TaxDeclarationSummaryAccumulator(SummaryAccumulator):
+    """个税申报表汇总累加器"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.total_taxable_income = 0.0
+        self.total_income_tax = 0.0
+        self.total_deductions = 0.0
+    
+    def add(self, row: Dict[str, Any]):
+        self.total_taxable_income += float(row['taxable_income'])
+        self.total_income_tax += float(row['income_tax'])
+        self.total_deductions += (
+            float(row['pension_deduction']) + 
+            float(row['medical_deduction']) + 
+            float(row['unemployment_deduction']) + 
+            float(row['housing_fund_deduction'])
+        )
+    
+    def build(self) -> Optional[Dict[str, Any]]:
+        if not self.count:
+            return None
+        
+        return {
+            "申报人数": self.count,
+            "应税收入合计": f"{self.total_taxable_income:.2f}",
+            "个税合计": f"{self.total_income_tax:.2f}",
+            "社保公积金扣除合计": f"{self.total_deductions:.2f}",
+            "平均税额": f"{self.total_income_tax / self.count:.2f}",
+            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
 
 
 class TaxDeclarationGenerator(BaseReportGenerator):
     """个税申报表生成器"""
     
+    summary_accumulator_class = TaxDeclarationSummaryAccumulator
+    
     def generate_report(
         self,
         config: Dict[str, Any],
@@ -39,9 +74,6 @@ class TaxDeclarationGenerator(BaseReportGenerator):
             if not self.validate_config(config):
                 raise ValueError("配置验证失败")
             
-            # 获取报表数据
-            data = self.get_report_data(config)
-            
             # 生成文件名和路径
             filename = self.generate_filename(config, export_format)
             file_path = os.path.join(output_dir, filename)
@@ -49,30 +81,25 @@ class TaxDeclarationGenerator(BaseReportGenerator):
             # 确保输出目录存在
             os.makedirs(output_dir, exist_ok=True)
             
-            # 根据格式生成文件
-            if export_format.lower() == 'xlsx':
-                result_path = self.create_excel_file(data, file_path, config)
-            elif export_format.lower() == 'csv':
-                result_path = self.create_csv_file(data, file_path, config)
-            else:
-                raise ValueError(f"不支持的导出格式: {export_format}")
+            # 数据行从游标流式写入文件，汇总在同一遍中累计
+            result_path, data_count = self.write_report_file(config, file_path, export_format)
             
-            self.log_generation_end(result_path, len(data))
+            self.log_generation_end(result_path, data_count)
             return result_path
             
         except Exception as e:
             self.handle_generation_error(e, config)
             raise
     
-    def get_report_data(self, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def iter_report_data(self, config: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        获取个税申报数据
+        逐行产生个税申报数据
         
         Args:
             config: 报表配置
             
         Returns:
-            个税申报数据列表
+            个税申报数据行迭代器
         """
         try:
             period_id = config.get('period_id')
@@ -126,13 +153,9 @@ class TaxDeclarationGenerator(BaseReportGenerator):
             ORDER BY d.name, e.employee_code
             """
             
-            result = self.db.execute(text(query), params)
-            rows = result.fetchall()
-            
             # 转换为字典格式
-            data = []
-            for row in rows:
-                data.append({
+            for row in self.stream_query(query, params):
+                yield {
                     'employee_code': row.employee_code or '',
                     'employee_name': row.employee_name or '',
                     'id_card_number': row.id_card_number or '',
@@ -149,10 +172,7 @@ class TaxDeclarationGenerator(BaseReportGenerator):
                     'income_tax': f"{row.income_tax or 0:.2f}",
                     'start_date': row.start_date.strftime('%Y-%m-%d') if row.start_date else '',
                     'end_date': row.end_date.strftime('%Y-%m-%d') if row.end_date else ''
-                })
-            
-            self.logger.info(f"获取个税申报数据成功，共 {len(data)} 条记录")
-            return data
+                }
             
         except Exception as e:
             self.logger.error(f"获取个税申报数据失败: {str(e)}")
@@ -188,40 +208,6 @@ class TaxDeclarationGenerator(BaseReportGenerator):
         """获取报表标题"""
         return "个人所得税申报表"
     
-    def get_summary_data(self, data: List[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """
-        获取汇总数据
-        
-        Args:
-            data: 报表数据
-            config: 报表配置
-            
-        Returns:
-            汇总数据字典
-        """
-        if not data:
-            return None
-        
-        # 计算汇总统计
-        total_taxable_income = sum(float(row['taxable_income']) for row in data)
-        total_income_tax = sum(float(row['income_tax']) for row in data)
-        total_deductions = sum(
-            float(row['pension_deduction']) + 
-            float(row['medical_deduction']) + 
-            float(row['unemployment_deduction']) + 
-            float(row['housing_fund_deduction'])
-            for row in data
-        )
-        
-        return {
-            "申报人数": len(data),
-            "应税收入合计": f"{total_taxable_income:.2f}",
-            "个税合计": f"{total_income_tax:.2f}",
-            "社保公积金扣除合计": f"{total_deductions:.2f}",
-            "平均税额": f"{total_income_tax / len(data):.2f}" if len(data) > 0 else "0.00",
-            "生成时间": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-    
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """
         验证配置参数
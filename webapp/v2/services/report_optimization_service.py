@@ -12,6 +12,11 @@ from datetime import datetime, timedelta
 
 from ..models.reports import ReportDataSource, ReportTemplate
 from ..pydantic_models.reports import ReportQuery
+from .report_result_cache import report_result_cache
+from ..utils.pagination import (
+    COUNT_MODE_EXACT, COUNT_MODE_ESTIMATED, COUNT_MODE_NONE, InvalidCursorError, InvalidSortFieldError,
+    decode_cursor, encode_cursor, keyset_sql, estimate_count, quote_identifier
+)
 
 
 class ReportOptimizationService:
@@ -27,6 +32,24 @@ class ReportOptimizationService:
         ('reports', 'employee_salary_details'): 'employee_salary_details_view'
     }
     
+    # 键集分页使用的视图唯一键列（默认为 id 列）；None 表示视图没有单列唯一键，只支持页码分页
+    KEYSET_ID_COLUMNS: Dict[str, Optional[str]] = {
+        'reports.v_comprehensive_employee_payroll': '薪资条目id',
+        'reports.mv_comprehensive_employee_payroll': '薪资条目id',
+        'reports.v_payroll_basic': '薪资条目id',
+        'reports.mv_payroll_basic': '薪资条目id',
+        'reports.employee_salary_details_view': 'payroll_entry_id',
+        'public.employee_salary_details_view': 'payroll_entry_id',
+        'public.v_payroll_component_usage': 'code',
+        'payroll.audit_overview': 'payroll_run_id',
+        # 按 期间+部门 / 员工+期间 汇总，没有单列唯一键
+        'public.v_payroll_summary_analysis': None,
+        'public.v_employee_salary_history': None,
+    }
+    
+    # 视图名称 -> 列名集合（用于校验客户端传入的排序字段）
+    _view_columns: Dict[str, frozenset] = {}
+    
     # 快速查询视图映射
     FAST_QUERY_MAPPING = {
         ('payroll', 'entries'): 'public.v_payroll_entries_detailed',
@@ -111,31 +134,13 @@ class ReportOptimizationService:
             # 构建查询
             select_fields = cls._build_select_fields(template, query)
             where_clause, params = cls._build_where_clause(query.filters or {})
-            order_clause = cls._build_order_clause(query.sorting or [])
-            
-            # 构建基础查询
-            base_query = f"SELECT {select_fields} FROM {view_name}"
-            if where_clause:
-                base_query += f" WHERE {where_clause}"
-            if order_clause:
-                base_query += f" ORDER BY {order_clause}"
-            
-            # 获取总数
-            count_query = f"SELECT COUNT(*) FROM {view_name}"
-            if where_clause:
-                count_query += f" WHERE {where_clause}"
-            
-            total_result = db.execute(text(count_query), params)
-            total = total_result.scalar() or 0
-            
-            # 添加分页
-            offset = (query.page - 1) * query.page_size
-            paginated_query = f"{base_query} LIMIT {query.page_size} OFFSET {offset}"
+            sorting = [{'field': query.sort_by, 'direction': query.sort_order or 'asc'}] if query.sort_by else []
             
-            # 执行查询
-            result = db.execute(text(paginated_query), params)
-            columns = [{"key": col, "title": col, "dataIndex": col} for col in result.keys()]
-            data = [dict(zip(result.keys(), row)) for row in result.fetchall()]
+            columns, data, total, next_cursor = cls._execute_paginated(
+                db, view_name, select_fields, where_clause, params, sorting,
+                page=query.page, page_size=query.page_size,
+                cursor=query.cursor, count_mode=query.count_mode or COUNT_MODE_EXACT
+            )
             
             execution_time = time.time() - start_time
             
@@ -152,11 +157,15 @@ class ReportOptimizationService:
                 "columns": columns,
                 "data": data,
                 "total": total,
+                "next_cursor": next_cursor,
+                "total_estimated": (query.count_mode or COUNT_MODE_EXACT) != COUNT_MODE_EXACT,
                 "execution_time": round(execution_time, 3),
                 "used_optimized_view": True,
                 "view_name": view_name
             }
             
+        except (InvalidCursorError, InvalidSortFieldError):
+            raise
         except Exception as e:
             execution_time = time.time() - start_time
             logging.error(f"优化查询失败: {str(e)}, 耗时: {execution_time:.3f}s")
@@ -172,9 +181,11 @@ class ReportOptimizationService:
         sorting: List[Dict[str, Any]] = None,
         page: int = 1,
         page_size: int = 20,
-        fields: List[str] = None
+        fields: List[str] = None,
+        cursor: Optional[str] = None,
+        count_mode: str = COUNT_MODE_EXACT
     ) -> Dict[str, Any]:
-        """执行快速查询"""
+        """执行快速查询（cursor 为键集分页游标，count_mode 为总数计算方式）"""
         start_time = time.time()
         
         try:
@@ -186,30 +197,11 @@ class ReportOptimizationService:
             # 构建查询
             select_fields = ", ".join(fields) if fields else "*"
             where_clause, params = cls._build_where_clause(filters or {})
-            order_clause = cls._build_order_clause(sorting or [])
-            
-            base_query = f"SELECT {select_fields} FROM {view_name}"
-            if where_clause:
-                base_query += f" WHERE {where_clause}"
-            if order_clause:
-                base_query += f" ORDER BY {order_clause}"
-            
-            # 获取总数
-            count_query = f"SELECT COUNT(*) FROM {view_name}"
-            if where_clause:
-                count_query += f" WHERE {where_clause}"
-            
-            total_result = db.execute(text(count_query), params)
-            total = total_result.scalar() or 0
-            
-            # 添加分页
-            offset = (page - 1) * page_size
-            paginated_query = f"{base_query} LIMIT {page_size} OFFSET {offset}"
             
-            # 执行查询
-            result = db.execute(text(paginated_query), params)
-            columns = [{"key": col, "title": col, "dataIndex": col} for col in result.keys()]
-            data = [dict(zip(result.keys(), row)) for row in result.fetchall()]
+            columns, data, total, next_cursor = cls._execute_paginated(
+                db, view_name, select_fields, where_clause, params, sorting or [],
+                page=page, page_size=page_size, cursor=cursor, count_mode=count_mode
+            )
             
             execution_time = time.time() - start_time
             
@@ -227,11 +219,15 @@ class ReportOptimizationService:
                 "columns": columns,
                 "data": data,
                 "total": total,
+                "next_cursor": next_cursor,
+                "total_estimated": count_mode != COUNT_MODE_EXACT,
                 "execution_time": round(execution_time, 3),
                 "used_optimized_view": True,
                 "view_name": view_name
             }
             
+        except (InvalidCursorError, InvalidSortFieldError):
+            raise
         except Exception as e:
             execution_time = time.time() - start_time
             logging.error(f"快速查询失败: {str(e)}, 耗时: {execution_time:.3f}s")
@@ -308,6 +304,145 @@ class ReportOptimizationService:
             logging.error(f"预览查询失败: {str(e)}, 耗时: {execution_time:.3f}s")
             raise ValueError(f"预览查询失败: {str(e)}")
     
+    @classmethod
+    def _execute_paginated(
+        cls,
+        db: Session,
+        view_name: str,
+        select_fields: str,
+        where_clause: str,
+        params: Dict[str, Any],
+        sorting: List[Dict[str, Any]],
+        page: int,
+        page_size: int,
+        cursor: Optional[str] = None,
+        count_mode: str = COUNT_MODE_EXACT
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int, Optional[str]]:
+        """
+        执行分页查询，返回 (列定义, 数据, 总数, 下一页游标)
+        
+        提供游标时使用键集分页（按第一个排序字段 + 视图唯一键继续），不使用 OFFSET；
+        count_mode 为 estimated 时总数取执行计划估算值，为 none 时返回已知的下限。
+        排序字段必须是视图的列，否则抛出 InvalidSortFieldError；拼接到SQL中的是引用后的标识符。
+        """
+        params = dict(params)
+        id_column = cls._keyset_id_column(db, view_name)
+        sorting = cls._validate_sorting(db, view_name, sorting)
+        sort_item = next((item for item in sorting if item.get('field')), None)
+        sort_field = sort_item['field'] if sort_item else None
+        descending = bool(sort_item) and str(sort_item.get('direction', 'asc')).upper() == 'DESC'
+        sort_spec = f"{view_name}:{sort_field or id_column}:{'desc' if descending else 'asc'}"
+        
+        if cursor and id_column is None:
+            raise InvalidCursorError("该视图不支持游标分页")
+        cursor_values = decode_cursor(cursor, sort_spec) if cursor else None
+        if id_column is not None and (cursor_values is not None or len(sorting) <= 1):
+            # 排序键 NULLS LAST + 唯一键，顺序稳定，下一页可以用游标继续
+            order_clause, cursor_condition, cursor_params = keyset_sql(
+                sort_field, id_column, descending, cursor_values
+            )
+            keyset_enabled = True
+        else:
+            # 多字段排序或没有唯一键的视图只支持页码分页（与原查询相同，不追加唯一键排序）
+            order_clause = cls._build_order_clause(sorting)
+            order_clause = f"ORDER BY {order_clause}" if order_clause else ""
+            cursor_condition, cursor_params = "", {}
+            keyset_enabled = False
+        
+        # 总数
+        count_mode = count_mode or COUNT_MODE_EXACT
+        count_sql = f"FROM {view_name}" + (f" WHERE {where_clause}" if where_clause else "")
+        total = None
+        if count_mode == COUNT_MODE_ESTIMATED:
+            total = estimate_count(db, f"SELECT 1 {count_sql}", params)
+        elif count_mode != COUNT_MODE_NONE:
+            total = db.execute(text(f"SELECT COUNT(*) {count_sql}"), params).scalar() or 0
+        
+        # 数据：键集模式额外选出排序键和唯一键用于生成游标，多取一行判断是否有下一页
+        conditions = [c for c in (where_clause, cursor_condition) if c]
+        keyset_fields = ""
+        if keyset_enabled:
+            keyset_fields = f", {id_column} AS _keyset_id"
+            if sort_field:
+                keyset_fields += f", {sort_field} AS _keyset_key"
+        paginated_query = f"SELECT {select_fields}{keyset_fields} FROM {view_name}"
+        if conditions:
+            paginated_query += " WHERE " + " AND ".join(f"({c})" for c in conditions)
+        if order_clause:
+            paginated_query += f" {order_clause}"
+        offset = 0 if cursor_values is not None else (page - 1) * page_size
+        paginated_query += f" LIMIT {page_size + 1} OFFSET {offset}"
+        params.update(cursor_params)
+        
+        result = db.execute(text(paginated_query), params)
+        keys = [key for key in result.keys() if key not in ('_keyset_id', '_keyset_key')]
+        rows = [dict(row._mapping) for row in result.fetchall()]
+        
+        next_cursor = None
+        has_more = len(rows) > page_size
+        if has_more:
+            rows = rows[:page_size]
+            if keyset_enabled:
+                last = rows[-1]
+                key_values = [last['_keyset_key']] if sort_field else []
+                next_cursor = encode_cursor(sort_spec, key_values + [last['_keyset_id']])
+        for row in rows:
+            row.pop('_keyset_id', None)
+            row.pop('_keyset_key', None)
+        
+        if total is None:
+            total = offset + len(rows) + (1 if has_more else 0)
+        
+        columns = [{"key": col, "title": col, "dataIndex": col} for col in keys]
+        return columns, rows, total, next_cursor
+    
+    @classmethod
+    def _get_view_columns(cls, db: Session, view_name: str) -> frozenset:
+        """获取视图（或表、物化视图）的列名"""
+        columns = cls._view_columns.get(view_name)
+        if columns is None:
+            # pg_attribute 同时包含物化视图，information_schema.columns 不包含
+            rows = db.execute(text("""
+                SELECT attname FROM pg_attribute
+                WHERE attrelid = to_regclass(:view_name) AND attnum > 0 AND NOT attisdropped
+            """), {"view_name": view_name}).fetchall()
+            columns = frozenset(row[0] for row in rows)
+            if columns:
+                cls._view_columns[view_name] = columns
+        return columns
+    
+    @classmethod
+    def _keyset_id_column(cls, db: Session, view_name: str) -> Optional[str]:
+        """视图唯一键的引用标识符；视图没有单列唯一键或该列不存在时返回 None"""
+        key = cls.KEYSET_ID_COLUMNS.get(view_name, 'id')
+        if key is None or key not in cls._get_view_columns(db, view_name):
+            return None
+        return quote_identifier(key)
+    
+    @classmethod
+    def _validate_sorting(cls, db: Session, view_name: str, sorting: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        校验排序字段，返回字段名已引用为标识符的排序列表
+        
+        Raises:
+            InvalidSortFieldError: 排序字段不是视图的列或排序方向无效
+        """
+        validated = []
+        columns = None
+        for sort_item in sorting:
+            field = sort_item.get('field')
+            if not field:
+                continue
+            if columns is None:
+                columns = cls._get_view_columns(db, view_name)
+            if field not in columns:
+                raise InvalidSortFieldError(f"无效的排序字段: {field}")
+            direction = str(sort_item.get('direction') or 'asc').lower()
+            if direction not in ('asc', 'desc'):
+                raise InvalidSortFieldError(f"无效的排序方向: {sort_item.get('direction')}")
+            validated.append({'field': quote_identifier(field), 'direction': direction})
+        return validated
+    
     @classmethod
     def _build_select_fields(cls, template: Optional[ReportTemplate], query: ReportQuery) -> str:
         """构建SELECT字段列表"""
@@ -396,6 +531,39 @@ class ReportOptimizationService:
         except Exception as e:
             logging.warning(f"记录查询性能失败: {str(e)}")
     
+    @classmethod
+    def get_cached_result(
+        cls,
+        db: Session,
+        data_source: ReportDataSource,
+        template: Optional[ReportTemplate],
+        query: ReportQuery,
+        variant: str = ""
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        查找缓存的查询结果
+        
+        Returns:
+            (缓存键, 缓存结果)；数据源未启用缓存时缓存键为 None
+        """
+        if not data_source.cache_enabled:
+            return None, None
+        cache_key = report_result_cache.make_key(data_source, template, query, variant)
+        return cache_key, report_result_cache.get(db, cache_key)
+    
+    @classmethod
+    def cache_result(
+        cls,
+        db: Session,
+        data_source: ReportDataSource,
+        cache_key: Optional[str],
+        result: Dict[str, Any]
+    ):
+        """按数据源的缓存时长缓存查询结果"""
+        if cache_key is None:
+            return
+        report_result_cache.put(db, cache_key, result, ttl=data_source.cache_duration)
+    
     @classmethod
     def get_performance_stats(cls, db: Session, hours: int = 24) -> Dict[str, Any]:
         """获取性能统计信息"""
@@ -408,7 +576,8 @@ class ReportOptimizationService:
                 "average_execution_time": 0.0,
                 "optimization_rate": 0.0,
                 "top_slow_queries": [],
-                "view_usage_stats": {}
+                "view_usage_stats": {},
+                "result_cache": report_result_cache.get_stats()
             }
         except Exception as e:
             logging.error(f"获取性能统计失败: {str(e)}")
@@ -0,0 +1,214 @@
+"""
+报表查询结果缓存
+
+报表数据源上的 cache_enabled / cache_duration 配置此前没有实际实现，
+同一模板、同一筛选条件的报表查询每次都会重新执行计数和分页查询。
+这里在进程内按 LRU 保存最近的查询结果：
+
+- 缓存键由数据源和模板中影响查询的配置、筛选条件、排序和分页参数组成
+  （不使用模板的更新时间：每次查询都会增加模板的使用次数）；
+- 每条结果按数据源的 cache_duration 过期；
+- 数据版本取自工资期间和工资运行的数量与最大修改时间（payroll.payroll_periods / payroll_runs 的 updated_at），
+  最多每 VERSION_CHECK_INTERVAL_SECONDS 秒向数据库确认一次，版本变化后旧结果全部失效；
+- 条目数和缓存的总行数都有上限，超出时淘汰最久未使用的结果。
+
+工资运行计算、审核或导入完成后 mark_payroll_periods_stale 会刷新期间的修改时间并使本进程缓存立即失效。
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+import hashlib
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 数据版本向数据库确认的最小间隔（秒）
+VERSION_CHECK_INTERVAL_SECONDS = 5
+
+# 数据源未配置缓存时长时的默认值（秒）
+DEFAULT_TTL_SECONDS = 3600
+
+# 最多缓存的查询结果数
+MAX_ENTRIES = 256
+
+# 所有缓存结果的总行数上限
+MAX_TOTAL_ROWS = 200_000
+
+# 单个结果超过该行数时不缓存
+MAX_ENTRY_ROWS = 10_000
+
+# 数据源和模板中影响查询结果的字段（配置修改后缓存键随之变化）
+DATA_SOURCE_QUERY_FIELDS = (
+    "source_type", "schema_name", "table_name", "view_name", "custom_query",
+    "field_mapping", "default_filters", "sort_config", "max_rows",
+)
+TEMPLATE_QUERY_FIELDS = ("data_source_id", "template_config")
+
+
+class _CacheEntry:
+    __slots__ = ("result", "version", "expires_at", "rows")
+
+    def __init__(self, result: Dict[str, Any], version: Tuple, expires_at: float, rows: int):
+        self.result = result
+        self.version = version
+        self.expires_at = expires_at
+        self.rows = rows
+
+
+class ReportResultCache:
+    """进程内共享的报表查询结果缓存（LRU + TTL + 数据版本）"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_total_rows: int = MAX_TOTAL_ROWS):
+        self.max_entries = max_entries
+        self.max_total_rows = max_total_rows
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._total_rows = 0
+        self._version: Optional[Tuple] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(data_source: Any, template: Any, query: Any, variant: str = "") -> str:
+        """
+        生成缓存键
+
+        Args:
+            data_source: 报表数据源
+            template: 报表模板
+            query: 报表查询参数（ReportQuery）
+            variant: 查询方式（同一查询走不同执行路径时结果列可能不同）
+        """
+        payload = {
+            "data_source": [data_source.id] + [
+                getattr(data_source, name, None) for name in DATA_SOURCE_QUERY_FIELDS
+            ],
+            "template": [template.id] + [
+                getattr(template, name, None) for name in TEMPLATE_QUERY_FIELDS
+            ] if template else None,
+            "fields": getattr(query, "fields", None),
+            "filters": query.filters or {},
+            "sort": [query.sort_by, query.sort_order],
+            "page": [query.page, query.page_size, query.cursor, query.count_mode],
+            "variant": variant,
+        }
+        raw = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, db: Session, key: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的查询结果，过期或数据版本变化时返回 None"""
+        version = self._current_version(db)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.version != version or entry.expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(self, db: Session, key: str, result: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """
+        缓存查询结果
+
+        Args:
+            result: 查询结果（缓存后不应再被修改）
+            ttl: 有效期（秒），为空时使用默认值
+        """
+        rows = len(result.get("data") or [])
+        if rows > MAX_ENTRY_ROWS:
+            return
+
+        version = self._current_version(db)
+        expires_at = time.monotonic() + (ttl or DEFAULT_TTL_SECONDS)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(result, version, expires_at, rows)
+            self._total_rows += rows
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._total_rows > self.max_total_rows
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """清空所有缓存结果，并在下次查询时重新确认数据版本"""
+        with self._lock:
+            self._entries.clear()
+            self._total_rows = 0
+            self._version = None
+            self._version_checked_at = 0.0
+        logger.info("🗑️ [报表缓存] 报表查询结果缓存已失效")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "rows": self._total_rows,
+                "max_entries": self.max_entries,
+                "max_total_rows": self.max_total_rows,
+                "version": [str(v) for v in self._version] if self._version else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_rows -= entry.rows
+
+    def _current_version(self, db: Session) -> Tuple:
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < VERSION_CHECK_INTERVAL_SECONDS:
+                return self._version
+
+        # 数量用于感知删除，最大修改时间用于感知新增和修改
+        row = db.execute(text("""
+            SELECT
+                (SELECT COUNT(*) FROM payroll.payroll_periods),
+                (SELECT MAX(updated_at) FROM payroll.payroll_periods),
+                (SELECT COUNT(*) FROM payroll.payroll_runs),
+                (SELECT MAX(updated_at) FROM payroll.payroll_runs)
+        """)).fetchone()
+        version = tuple(row)
+
+        with self._lock:
+            if self._version is not None and self._version != version:
+                # 旧版本的结果不会再命中，提前释放
+                self._entries.clear()
+                self._total_rows = 0
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+
+# 所有调用方共享的报表结果缓存
+report_result_cache = ReportResultCache()
+
+
+def invalidate_report_result_cache() -> None:
+    """薪资数据变更后调用，使本进程的报表查询结果缓存失效"""
+    report_result_cache.invalidate()
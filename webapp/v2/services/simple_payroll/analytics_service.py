@@ -18,6 +18,7 @@ from ...pydantic_models.simple_payroll import (
     SalaryTrendAnalysisResponse,
     SalaryTrendDataPoint
 )
+from ..payroll_snapshot import payroll_view_source
 
 logger = logging.getLogger(__name__)
 
@@ -47,8 +48,12 @@ class PayrollAnalyticsService:
             
             period_name = period_result.name
             
+            # 期间快照过期时回退到实时视图（上一期间不确定，按跨期间查询路由）
+            current_source = payroll_view_source(self.db, 'v_payroll_basic', period_id)
+            previous_source = payroll_view_source(self.db, 'v_payroll_basic')
+            
             # 查询当前期间的部门成本数据
-            current_query = """
+            current_query = f"""
             SELECT 
                 部门id as department_id,
                 部门名称 as department_name,
@@ -59,7 +64,7 @@ class PayrollAnalyticsService:
                 AVG(应发合计) as avg_cost_per_employee,
                 AVG(扣除合计) as avg_deductions_per_employee,
                 AVG(实发合计) as avg_net_pay_per_employee
-            FROM reports.v_payroll_basic 
+            FROM {current_source} 
             WHERE 薪资期间id = :period_id 
                 AND 部门名称 IS NOT NULL
                 AND 应发合计 IS NOT NULL
@@ -76,7 +81,7 @@ class PayrollAnalyticsService:
             total_employees = sum(row.employee_count for row in current_results)
             
             # 查询上一期间数据用于比较
-            previous_query = """
+            previous_query = f"""
             WITH previous_period AS (
                 SELECT id, name 
                 FROM payroll.payroll_periods 
@@ -94,7 +99,7 @@ class PayrollAnalyticsService:
                 SUM(应发合计) as previous_cost,
                 SUM(扣除合计) as previous_deductions,
                 SUM(实发合计) as previous_net_pay
-            FROM reports.v_payroll_basic pb
+            FROM {previous_source} pb
             JOIN previous_period pp ON pb.薪资期间id = pp.id
             WHERE 部门名称 IS NOT NULL
                 AND 应发合计 IS NOT NULL
@@ -187,8 +192,11 @@ class PayrollAnalyticsService:
             
             period_name = period_result.name
             
+            current_source = payroll_view_source(self.db, 'v_payroll_basic', period_id)
+            previous_source = payroll_view_source(self.db, 'v_payroll_basic')
+            
             # 查询当前期间的员工类型数据 - 增强调试
-            current_query = """
+            current_query = f"""
             SELECT 
                 人员类别id as personnel_category_id,
                 人员类别 as type_name,
@@ -198,7 +206,7 @@ class PayrollAnalyticsService:
                 MIN(应发合计) as min_salary,
                 MAX(应发合计) as max_salary,
                 COUNT(CASE WHEN 应发合计 > 0 THEN 1 END) as non_zero_salary_count
-            FROM reports.v_payroll_basic 
+            FROM {current_source} 
             WHERE 薪资期间id = :period_id 
                 AND 人员类别 IS NOT NULL
             GROUP BY 人员类别id, 人员类别
@@ -219,7 +227,7 @@ class PayrollAnalyticsService:
             total_employees = sum(row.employee_count for row in current_results)
             
             # 查询上一期间数据用于比较
-            previous_query = """
+            previous_query = f"""
             WITH previous_period AS (
                 SELECT id, name 
                 FROM payroll.payroll_periods 
@@ -234,7 +242,7 @@ class PayrollAnalyticsService:
             SELECT 
                 人员类别id as personnel_category_id,
                 COUNT(*) as previous_count
-            FROM reports.v_payroll_basic pb
+            FROM {previous_source} pb
             JOIN previous_period pp ON pb.薪资期间id = pp.id
             WHERE 人员类别 IS NOT NULL
             GROUP BY 人员类别id
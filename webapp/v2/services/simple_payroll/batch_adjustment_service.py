@@ -6,7 +6,7 @@ import logging
 from typing import List, Dict, Any, Optional, Tuple
 from decimal import Decimal
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, select, update
+from sqlalchemy import and_, or_, select
 import asyncio
 
 from webapp.v2.models import PayrollRun, PayrollEntry, Employee
@@ -116,12 +116,9 @@ class BatchAdjustmentService:
                     logger.error(f"调整条目 {entry.id} 失败: {str(e)}")
                     continue
             
-            # 提交事务
+            # 提交事务（工资运行和期间的汇总由数据库触发器随条目更新一并维护）
             self.db.commit()
             
-            # 重新计算工资总额
-            await self._recalculate_payroll_totals(request.payroll_run_id)
-            
             logger.info(f"批量调整完成 - 成功调整 {updated_count} 条记录")
             
             return BatchAdjustmentResult(
@@ -299,40 +296,6 @@ class BatchAdjustmentService:
         }
         return name_mapping.get(component_code, component_code)
 
-    async def _recalculate_payroll_totals(self, payroll_run_id: int) -> None:
-        """重新计算工资运行总额"""
-        
-        try:
-            # 获取所有条目的统计
-            query = select(
-                PayrollEntry.gross_pay,
-                PayrollEntry.total_deductions,
-                PayrollEntry.net_pay
-            ).where(PayrollEntry.payroll_run_id == payroll_run_id)
-            
-            result = self.db.execute(query)
-            entries = result.all()
-            
-            if entries:
-                total_gross = sum(entry.gross_pay or 0 for entry in entries)
-                total_deductions = sum(entry.total_deductions or 0 for entry in entries)
-                total_net = sum(entry.net_pay or 0 for entry in entries)
-                
-                # 更新工资运行统计
-                update_stmt = update(PayrollRun).where(
-                    PayrollRun.id == payroll_run_id
-                ).values(
-                    total_gross_pay=total_gross,
-                    total_deductions=total_deductions,
-                    total_net_pay=total_net
-                )
-                
-                self.db.execute(update_stmt)
-                
-        except Exception as e:
-            logger.error(f"重新计算工资总额失败: {str(e)}")
-            raise
-
     async def get_adjustment_history(
         self,
         payroll_run_id: int,
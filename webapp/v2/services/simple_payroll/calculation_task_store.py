@@ -0,0 +1,410 @@
+"""
+薪资计算任务存储
+
+替代原先写入 /tmp/calculation_progress_{task_id}.json 的进度文件：
+- 进度先写入进程内有界的内存环（最近 MAX_TASKS_IN_MEMORY 个任务），查询为 O(1) 字典查找；
+- 同时节流地持久化到 payroll.calculation_tasks（状态变化立即写入，其余最多每 PERSIST_INTERVAL_SECONDS 秒一次），
+  其他 uvicorn 工作进程和重启后的服务通过主键查询读取；
+- 支持任务列表、取消（跨进程通过数据库标记传递）和续算（只重新计算未完成的条目）；
+- 每次进度更新发布到 progress_broadcaster，供 SSE 订阅者接收推送。
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import threading
+import time
+import logging
+
+from ...database import SessionLocalV2
+from ...models.payroll import PayrollCalculationTask
+from ..progress_stream import progress_broadcaster
+
+logger = logging.getLogger(__name__)
+
+# 内存中保留的最近任务数量
+MAX_TASKS_IN_MEMORY = 200
+
+# 非关键进度更新的最小持久化间隔（秒）
+PERSIST_INTERVAL_SECONDS = 1.0
+
+# 取消标记向数据库确认的最小间隔（秒）
+CANCEL_CHECK_INTERVAL_SECONDS = 2.0
+
+# 运行中的任务超过该时间没有更新即视为已中断（服务重启等），可以续算
+STALE_TASK_TIMEOUT = timedelta(minutes=5)
+
+ACTIVE_STATUSES = ("PREPARING", "CALCULATING")
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED")
+
+
+class CalculationTaskStore:
+    """薪资计算任务注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ring: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 仅记录由本进程执行的任务，这些任务的内存进度是权威数据
+        self._owned: Dict[str, Dict[str, Any]] = {}
+
+    # ------------------------------------------------------------------
+    # 任务生命周期
+    # ------------------------------------------------------------------
+
+    def create_task(
+        self,
+        task_id: str,
+        payroll_run_id: int,
+        total: int,
+        request_params: Dict[str, Any],
+        created_by: Optional[int] = None,
+        task_type: str = "integrated_run"
+    ) -> Dict[str, Any]:
+        """创建任务并立即持久化"""
+        now = datetime.now()
+        progress = {
+            "task_id": task_id,
+            "task_type": task_type,
+            "payroll_run_id": payroll_run_id,
+            "status": "PREPARING",
+            "total": total,
+            "processed": 0,
+            "current_employee": None,
+            "stage": "数据准备",
+            "start_time": now.isoformat(),
+            "estimated_remaining_time": None,
+            "last_updated": now.isoformat(),
+        }
+
+        db = SessionLocalV2()
+        try:
+            db.add(PayrollCalculationTask(
+                id=task_id,
+                task_type=task_type,
+                payroll_run_id=payroll_run_id,
+                status="PREPARING",
+                total=total,
+                processed=0,
+                stage=progress["stage"],
+                progress_data=progress,
+                request_params=request_params,
+                completed_entry_ids=[],
+                created_by=created_by,
+                started_at=now
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._owned[task_id] = {
+                "start_time": now,
+                "last_persisted": time.monotonic(),
+                "last_cancel_check": 0.0,
+                "cancel_requested": False,
+                "completed_entry_ids": [],
+            }
+            self._remember(task_id, progress)
+        return dict(progress)
+
+    def claim_task(self, task_id: str, completed_entry_ids: List[int]) -> None:
+        """续算时由执行进程认领任务，恢复已完成条目记录并清除取消标记"""
+        db = SessionLocalV2()
+        try:
+            db.query(PayrollCalculationTask).filter(
+                PayrollCalculationTask.id == task_id
+            ).update({PayrollCalculationTask.cancel_requested: False}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._owned[task_id] = {
+                "start_time": datetime.now(),
+                "last_persisted": 0.0,
+                "last_cancel_check": 0.0,
+                "cancel_requested": False,
+                "completed_entry_ids": list(completed_entry_ids),
+            }
+
+    def update_progress(
+        self,
+        task_id: str,
+        status: str,
+        processed: int = 0,
+        total: int = 0,
+        stage: str = "",
+        current_employee: Optional[Dict[str, Any]] = None,
+        **extra
+    ) -> None:
+        """
+        更新任务进度
+
+        内存进度立即更新；数据库在状态变化、任务结束或距上次写入超过 PERSIST_INTERVAL_SECONDS 时写入。
+
+        Args:
+            extra: 附加到进度数据中的字段（汇总结果、错误列表等）
+        """
+        with self._lock:
+            owned = self._owned.get(task_id)
+            previous = self._ring.get(task_id) or {}
+            start_time = owned["start_time"] if owned else datetime.now()
+
+            progress = dict(previous)
+            progress.update({
+                "task_id": task_id,
+                "status": status,
+                "total": total,
+                "processed": processed,
+                "current_employee": current_employee,
+                "stage": stage,
+                "start_time": previous.get("start_time") or start_time.isoformat(),
+                "estimated_remaining_time": None,
+                "last_updated": datetime.now().isoformat(),
+            })
+            progress.update(extra)
+
+            # 计算预估剩余时间
+            if 0 < processed < total:
+                elapsed = (datetime.now() - start_time).total_seconds()
+                progress["estimated_remaining_time"] = int(elapsed / processed * (total - processed))
+
+            self._remember(task_id, progress)
+
+            now = time.monotonic()
+            should_persist = (
+                status != previous.get("status")
+                or status in TERMINAL_STATUSES
+                or owned is None
+                or now - owned["last_persisted"] >= PERSIST_INTERVAL_SECONDS
+            )
+            if should_persist and owned:
+                owned["last_persisted"] = now
+            completed_snapshot = list(owned["completed_entry_ids"]) if owned else None
+
+        if should_persist:
+            self._persist(task_id, progress, completed_snapshot)
+        progress_broadcaster.publish(progress_channel(task_id), progress)
+
+        if status in TERMINAL_STATUSES:
+            with self._lock:
+                self._owned.pop(task_id, None)
+
+    def mark_entries_completed(self, task_id: str, entry_ids: List[int]) -> None:
+        """记录已提交的条目ID（随下一次进度持久化写入，用于续算）"""
+        with self._lock:
+            owned = self._owned.get(task_id)
+            if owned is not None:
+                owned["completed_entry_ids"].extend(entry_ids)
+
+    def fail_task(self, task_id: str, error_message: str) -> None:
+        """将任务标记为失败"""
+        progress = self.get_progress(task_id) or {}
+        self.update_progress(
+            task_id, "FAILED",
+            processed=progress.get("processed", 0),
+            total=progress.get("total", 0),
+            stage=f"计算失败: {error_message}",
+            error_message=error_message
+        )
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def get_progress(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务进度
+
+        本进程执行的任务和已结束的任务直接从内存返回；其他进程执行中的任务按主键查询数据库。
+        """
+        with self._lock:
+            cached = self._ring.get(task_id)
+            if cached is not None and (task_id in self._owned or cached.get("status") in TERMINAL_STATUSES):
+                return dict(cached)
+
+        task = self._load(task_id)
+        if task is None:
+            return None
+
+        progress = self._to_progress(task)
+        if progress["status"] in TERMINAL_STATUSES:
+            with self._lock:
+                self._remember(task_id, progress)
+        return progress
+
+    def list_tasks(
+        self,
+        payroll_run_id: Optional[int] = None,
+        status: Optional[str] = None,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """按创建时间倒序列出任务"""
+        db = SessionLocalV2()
+        try:
+            query = db.query(PayrollCalculationTask)
+            if payroll_run_id is not None:
+                query = query.filter(PayrollCalculationTask.payroll_run_id == payroll_run_id)
+            if status:
+                query = query.filter(PayrollCalculationTask.status == status)
+            tasks = query.order_by(PayrollCalculationTask.created_at.desc()).limit(limit).all()
+            return [self._to_progress(task, include_details=False) for task in tasks]
+        finally:
+            db.close()
+
+    def get_resume_plan(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取续算计划：原始计算参数和尚未完成的条目ID
+
+        只有失败、已取消或已中断（长时间无更新）的任务可以续算，否则返回 None。
+        """
+        task = self._load(task_id)
+        if task is None or not self._is_resumable(task):
+            return None
+
+        request_params = dict(task.request_params or {})
+        completed = set(task.completed_entry_ids or [])
+        remaining_entry_ids = [i for i in request_params.get("entry_ids", []) if i not in completed]
+        return {
+            "task_id": task.id,
+            "payroll_run_id": task.payroll_run_id,
+            "request_params": request_params,
+            "completed_entry_ids": list(completed),
+            "remaining_entry_ids": remaining_entry_ids,
+        }
+
+    # ------------------------------------------------------------------
+    # 取消
+    # ------------------------------------------------------------------
+
+    def request_cancel(self, task_id: str) -> bool:
+        """
+        请求取消任务（执行中的分块完成后停止）
+
+        Returns:
+            bool: 任务存在且仍在运行时返回 True
+        """
+        db = SessionLocalV2()
+        try:
+            task = db.query(PayrollCalculationTask).filter(PayrollCalculationTask.id == task_id).first()
+            if task is None or task.status not in ACTIVE_STATUSES:
+                return False
+            task.cancel_requested = True
+            db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            owned = self._owned.get(task_id)
+            if owned:
+                owned["cancel_requested"] = True
+        logger.info(f"🛑 [计算任务] 已请求取消任务 {task_id}")
+        return True
+
+    def is_cancel_requested(self, task_id: str) -> bool:
+        """执行进程在分块之间调用，检查任务是否已被取消（数据库确认有节流）"""
+        with self._lock:
+            owned = self._owned.get(task_id)
+            if owned is None:
+                return False
+            if owned["cancel_requested"]:
+                return True
+            now = time.monotonic()
+            if now - owned["last_cancel_check"] < CANCEL_CHECK_INTERVAL_SECONDS:
+                return False
+            owned["last_cancel_check"] = now
+
+        task = self._load(task_id)
+        cancelled = bool(task and task.cancel_requested)
+        if cancelled:
+            with self._lock:
+                if task_id in self._owned:
+                    self._owned[task_id]["cancel_requested"] = True
+        return cancelled
+
+    # ------------------------------------------------------------------
+    # 内部方法
+    # ------------------------------------------------------------------
+
+    def _remember(self, task_id: str, progress: Dict[str, Any]) -> None:
+        """写入内存环（调用方持有锁）"""
+        self._ring[task_id] = progress
+        self._ring.move_to_end(task_id)
+        while len(self._ring) > MAX_TASKS_IN_MEMORY:
+            self._ring.popitem(last=False)
+
+    def _persist(self, task_id: str, progress: Dict[str, Any], completed_entry_ids: Optional[List[int]]) -> None:
+        db = SessionLocalV2()
+        try:
+            values = {
+                PayrollCalculationTask.status: progress["status"],
+                PayrollCalculationTask.total: progress.get("total") or 0,
+                PayrollCalculationTask.processed: progress.get("processed") or 0,
+                PayrollCalculationTask.stage: (progress.get("stage") or "")[:255],
+                PayrollCalculationTask.progress_data: progress,
+            }
+            if completed_entry_ids is not None:
+                values[PayrollCalculationTask.completed_entry_ids] = completed_entry_ids
+            if progress["status"] in TERMINAL_STATUSES:
+                values[PayrollCalculationTask.completed_at] = datetime.now()
+                values[PayrollCalculationTask.error_message] = progress.get("error_message")
+            if progress["status"] in ACTIVE_STATUSES:
+                values[PayrollCalculationTask.completed_at] = None
+            db.query(PayrollCalculationTask).filter(
+                PayrollCalculationTask.id == task_id
+            ).update(values, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"持久化计算任务 {task_id} 进度失败: {e}")
+        finally:
+            db.close()
+
+    def _load(self, task_id: str) -> Optional[PayrollCalculationTask]:
+        db = SessionLocalV2()
+        try:
+            task = db.query(PayrollCalculationTask).filter(PayrollCalculationTask.id == task_id).first()
+            if task is not None:
+                db.expunge(task)
+            return task
+        finally:
+            db.close()
+
+    def _is_resumable(self, task: PayrollCalculationTask) -> bool:
+        if task.status in ("FAILED", "CANCELLED"):
+            return True
+        return task.status in ACTIVE_STATUSES and self._is_stale(task)
+
+    def _is_stale(self, task: PayrollCalculationTask) -> bool:
+        if task.updated_at is None:
+            return False
+        return datetime.now(timezone.utc) - task.updated_at > STALE_TASK_TIMEOUT
+
+    def _to_progress(self, task: PayrollCalculationTask, include_details: bool = True) -> Dict[str, Any]:
+        progress = dict(task.progress_data or {}) if include_details else {}
+        progress.update({
+            "task_id": task.id,
+            "task_type": task.task_type,
+            "payroll_run_id": task.payroll_run_id,
+            "status": task.status,
+            "total": task.total,
+            "processed": task.processed,
+            "stage": task.stage,
+            "cancel_requested": task.cancel_requested,
+            "resumable": self._is_resumable(task),
+            "start_time": task.started_at.isoformat() if task.started_at else None,
+            "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+            "last_updated": task.updated_at.isoformat() if task.updated_at else None,
+        })
+        if task.status in ACTIVE_STATUSES and self._is_stale(task):
+            progress["stage"] = "任务已中断，可续算"
+        return progress
+
+
+def progress_channel(task_id: str) -> str:
+    """计算任务的进度推送频道名称"""
+    return f"calculation:{task_id}"
+
+
+# 进程内共享的任务存储
+calculation_task_store = CalculationTaskStore()
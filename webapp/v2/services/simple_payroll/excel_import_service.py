@@ -5,13 +5,22 @@ Excel导入服务模块
 
 import pandas as pd
 import io
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Callable, Union, BinaryIO
 from decimal import Decimal
 import logging
+import time
 from datetime import datetime
 
+from sqlalchemy.orm import Session
+
 logger = logging.getLogger(__name__)
 
+# 流式导入每批处理的行数
+STREAMING_CHUNK_SIZE = 1000
+
+# 导入的工资条目默认状态
+IMPORTED_ENTRY_STATUS_CODE = 'PENTRY_ENTRY'
+
 class ExcelImportService:
     """Excel导入服务"""
     
@@ -148,47 +157,7 @@ class ExcelImportService:
         
         for row in data:
             try:
-                # 构建收入明细
-                earnings_details = {}
-                if row.get('basic_salary'):
-                    earnings_details['basic_salary'] = float(row['basic_salary'])
-                if row.get('position_salary'):
-                    earnings_details['position_salary'] = float(row['position_salary'])
-                if row.get('overtime_pay'):
-                    earnings_details['overtime_pay'] = float(row['overtime_pay'])
-                if row.get('bonus'):
-                    earnings_details['bonus'] = float(row['bonus'])
-                if row.get('allowances'):
-                    earnings_details['allowances'] = float(row['allowances'])
-                
-                # 构建扣除明细
-                deductions_details = {}
-                if row.get('social_security_personal'):
-                    deductions_details['social_security_personal'] = float(row['social_security_personal'])
-                if row.get('housing_fund_personal'):
-                    deductions_details['housing_fund_personal'] = float(row['housing_fund_personal'])
-                if row.get('personal_income_tax'):
-                    deductions_details['personal_income_tax'] = float(row['personal_income_tax'])
-                if row.get('other_deductions'):
-                    deductions_details['other_deductions'] = float(row['other_deductions'])
-                
-                # 构建工资条目
-                entry = {
-                    'employee_code': str(row['employee_code']).strip(),
-                    'employee_name': str(row['employee_name']).strip(),
-                    'department': str(row.get('department', '')).strip(),
-                    'gross_pay': Decimal(str(row['gross_pay'])),
-                    'net_pay': Decimal(str(row['net_pay'])),
-                    'earnings_details': earnings_details,
-                    'deductions_details': deductions_details,
-                    'calculation_inputs': {
-                        'import_source': 'excel',
-                        'import_time': datetime.now().isoformat()
-                    }
-                }
-                
-                payroll_entries.append(entry)
-                
+                payroll_entries.append(self._convert_row(row))
             except Exception as e:
                 logger.error(f"转换行数据失败: {row}, 错误: {e}")
                 continue
@@ -196,34 +165,382 @@ class ExcelImportService:
         logger.info(f"成功转换 {len(payroll_entries)} 条工资记录")
         return payroll_entries
     
+    def _convert_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """将单行导入数据转换为工资条目格式"""
+        # 构建收入明细
+        earnings_details = {}
+        if row.get('basic_salary'):
+            earnings_details['basic_salary'] = float(row['basic_salary'])
+        if row.get('position_salary'):
+            earnings_details['position_salary'] = float(row['position_salary'])
+        if row.get('overtime_pay'):
+            earnings_details['overtime_pay'] = float(row['overtime_pay'])
+        if row.get('bonus'):
+            earnings_details['bonus'] = float(row['bonus'])
+        if row.get('allowances'):
+            earnings_details['allowances'] = float(row['allowances'])
+        
+        # 构建扣除明细
+        deductions_details = {}
+        if row.get('social_security_personal'):
+            deductions_details['social_security_personal'] = float(row['social_security_personal'])
+        if row.get('housing_fund_personal'):
+            deductions_details['housing_fund_personal'] = float(row['housing_fund_personal'])
+        if row.get('personal_income_tax'):
+            deductions_details['personal_income_tax'] = float(row['personal_income_tax'])
+        if row.get('other_deductions'):
+            deductions_details['other_deductions'] = float(row['other_deductions'])
+        
+        # 构建工资条目
+        entry = {
+            'employee_code': str(row['employee_code']).strip(),
+            'employee_name': str(row['employee_name']).strip(),
+            'department': str(row.get('department', '')).strip(),
+            'gross_pay': Decimal(str(row['gross_pay'])),
+            'total_deductions': Decimal(str(row.get('total_deductions') or 0)),
+            'net_pay': Decimal(str(row['net_pay'])),
+            'earnings_details': earnings_details,
+            'deductions_details': deductions_details,
+            'calculation_inputs': {
+                'import_source': 'excel',
+                'import_time': datetime.now().isoformat()
+            }
+        }
+        
+        return entry
+    
+    def iter_excel_chunks(
+        self,
+        source: Union[str, BinaryIO],
+        filename: str,
+        chunk_size: int = STREAMING_CHUNK_SIZE
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        按批读取Excel数据行（列名已标准化、类型已转换）
+        
+        .xlsx 使用 openpyxl 只读模式逐行读取，内存占用与文件行数无关；
+        .xls 格式不支持流式读取（且最多 65536 行），整表读取后按批产出。
+        
+        Args:
+            source: 文件路径或文件对象（如上传文件的临时文件）
+            filename: 原始文件名，用于判断格式
+            chunk_size: 每批行数
+        
+        Yields:
+            List[Dict]: 一批数据行，每行带有 _row_number（Excel 中的数据行号，从1开始）
+        
+        Raises:
+            ValueError: 文件格式不支持、文件为空或缺少必要列
+        """
+        if filename.endswith('.xlsx'):
+            rows, workbook = self._iter_xlsx_rows(source)
+        elif filename.endswith('.xls'):
+            rows, workbook = iter(pd.read_excel(source, engine='xlrd', header=None, dtype=object).itertuples(index=False, name=None)), None
+        else:
+            raise ValueError("不支持的文件格式，请使用.xlsx或.xls格式")
+        
+        try:
+            header = next(rows, None)
+            if header is None:
+                raise ValueError("Excel文件为空或没有数据")
+            
+            columns = [
+                self._normalize_column_name(str(col).strip()) if col is not None and not pd.isna(col) else None
+                for col in header
+            ]
+            missing_columns = self._missing_required_fields(columns)
+            if missing_columns:
+                raise ValueError(f"缺少必要的列: {', '.join(missing_columns)}")
+            
+            chunk = []
+            for row_number, values in enumerate(rows, start=1):
+                row = {
+                    col: (None if value is not None and not isinstance(value, str) and pd.isna(value) else value)
+                    for col, value in zip(columns, values) if col is not None
+                }
+                row = self._convert_row_types(row)
+                row['_row_number'] = row_number
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            if workbook is not None:
+                workbook.close()
+    
+    def _iter_xlsx_rows(self, source: Union[str, BinaryIO]):
+        """以只读模式打开 .xlsx，返回 (行迭代器, 工作簿)"""
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        worksheet = workbook.active
+        return worksheet.iter_rows(values_only=True), workbook
+    
+    def _count_xlsx_rows(self, source: Union[str, BinaryIO], filename: str) -> Optional[int]:
+        """从工作表尺寸信息估计数据行数（文件未记录尺寸时返回 None）"""
+        if not filename.endswith('.xlsx'):
+            return None
+        try:
+            from openpyxl import load_workbook
+            
+            workbook = load_workbook(source, read_only=True)
+            try:
+                max_row = workbook.active.max_row
+            finally:
+                workbook.close()
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return max(max_row - 1, 0) if max_row else None
+        except Exception:
+            return None
+    
+    def import_excel_streaming(
+        self,
+        db: Session,
+        source: Union[str, BinaryIO],
+        filename: str,
+        payroll_period_id: int,
+        overwrite_mode: Optional[Any] = None,
+        chunk_size: int = STREAMING_CHUNK_SIZE,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        流式导入Excel工资数据
+        
+        每批数据依次完成清理、验证、转换和员工编号解析后，直接写入批量导入路径
+        （bulk_create_payroll_entries_optimized），峰值内存只与批大小有关。
+        每批独立提交：某一批写入失败时停止导入，之前的批次保留。
+        
+        Args:
+            db: 数据库会话
+            source: 文件路径或文件对象（建议为上传文件的临时文件）
+            filename: 原始文件名
+            payroll_period_id: 工资周期ID
+            overwrite_mode: 覆写模式（OverwriteMode），默认不覆写
+            chunk_size: 每批行数
+            on_progress: 每批完成后调用，参数为当前进度
+        
+        Returns:
+            Dict: success, total_rows, processed_rows, imported_count, error_count, errors, warnings, duration
+        """
+        from ...crud.payroll.bulk_operations import bulk_create_payroll_entries_optimized
+        from ...pydantic_models.payroll import OverwriteMode
+        
+        start_time = time.time()
+        overwrite_mode = overwrite_mode or OverwriteMode.NONE
+        total_rows = self._count_xlsx_rows(source, filename)
+        
+        progress = {
+            'status': 'PROCESSING',
+            'total_rows': total_rows,
+            'processed_rows': 0,
+            'imported_count': 0,
+            'error_count': 0,
+            'chunk_index': 0,
+        }
+        errors: List[Dict[str, Any]] = []
+        warnings: List[str] = []
+        seen_codes = set()
+        
+        try:
+            status_id = self._imported_entry_status_id(db)
+            
+            for chunk in self.iter_excel_chunks(source, filename, chunk_size):
+                progress['chunk_index'] += 1
+                progress['processed_rows'] += len(chunk)
+                
+                entries, row_numbers = self._prepare_chunk(
+                    db, chunk, payroll_period_id, status_id, seen_codes, errors, warnings
+                )
+                
+                if entries:
+                    created_entries, bulk_errors = bulk_create_payroll_entries_optimized(
+                        db, payroll_period_id, entries, overwrite_mode
+                    )
+                    progress['imported_count'] += len(created_entries)
+                    for error in bulk_errors:
+                        index = error.get('index')
+                        errors.append({
+                            'row': row_numbers[index] if isinstance(index, int) and 0 <= index < len(row_numbers) else None,
+                            'employee_id': error.get('employee_id'),
+                            'error': error.get('error')
+                        })
+                
+                progress['error_count'] = len(errors)
+                logger.info(
+                    f"📥 [流式导入] 第 {progress['chunk_index']} 批完成: 已处理 {progress['processed_rows']}"
+                    f"{'/' + str(total_rows) if total_rows else ''} 行, 已导入 {progress['imported_count']} 条, 错误 {len(errors)} 条"
+                )
+                if on_progress:
+                    on_progress(dict(progress))
+            
+            progress['status'] = 'COMPLETED'
+            success = True
+        except Exception as e:
+            logger.error(f"流式导入Excel文件失败: {e}", exc_info=True)
+            errors.append({'row': None, 'employee_id': None, 'error': f"导入失败: {str(e)}"})
+            progress['status'] = 'FAILED'
+            progress['error_count'] = len(errors)
+            success = False
+        
+        if on_progress:
+            on_progress(dict(progress))
+        
+        duration = time.time() - start_time
+        logger.info(
+            f"📥 [流式导入] {filename} 结束: 处理 {progress['processed_rows']} 行, "
+            f"导入 {progress['imported_count']} 条, 错误 {len(errors)} 条, 耗时 {duration:.2f} 秒"
+        )
+        return {
+            'success': success,
+            'total_rows': progress['processed_rows'],
+            'processed_rows': progress['processed_rows'],
+            'imported_count': progress['imported_count'],
+            'error_count': len(errors),
+            'errors': errors,
+            'warnings': warnings,
+            'duration': duration,
+        }
+    
+    def _prepare_chunk(
+        self,
+        db: Session,
+        chunk: List[Dict[str, Any]],
+        payroll_period_id: int,
+        status_id: int,
+        seen_codes: set,
+        errors: List[Dict[str, Any]],
+        warnings: List[str]
+    ) -> Tuple[List[Any], List[int]]:
+        """
+        清理、验证和转换一批数据，并按员工编号一次查询解析员工
+        
+        Returns:
+            (PayrollEntryCreate 列表, 对应的 Excel 行号列表)
+        """
+        from ...models import Employee
+        from ...payroll_engine.component_registry import get_component_registry
+        from ...pydantic_models.payroll import PayrollEntryCreate
+        
+        valid_rows = []
+        for row in self._clean_data(chunk):
+            row_number = row.pop('_row_number')
+            row_errors, row_warnings = self._validate_row(row, row_number)
+            warnings.extend(row_warnings)
+            
+            employee_code = str(row.get('employee_code', '')).strip()
+            if employee_code in seen_codes:
+                row_errors.append(f"第{row_number}行：员工编号 {employee_code} 重复")
+            
+            if row_errors:
+                errors.extend({'row': row_number, 'employee_id': None, 'error': error} for error in row_errors)
+                continue
+            
+            try:
+                valid_rows.append((row_number, self._convert_row(row)))
+                seen_codes.add(employee_code)
+            except Exception as e:
+                errors.append({'row': row_number, 'employee_id': None, 'error': f"第{row_number}行：转换失败: {e}"})
+        
+        if not valid_rows:
+            return [], []
+        
+        codes = [entry['employee_code'] for _, entry in valid_rows]
+        employee_ids = dict(
+            db.query(Employee.employee_code, Employee.id).filter(Employee.employee_code.in_(codes)).all()
+        )
+        registry = get_component_registry(db)
+        
+        entries, row_numbers = [], []
+        for row_number, entry in valid_rows:
+            employee_id = employee_ids.get(entry['employee_code'])
+            if employee_id is None:
+                errors.append({
+                    'row': row_number,
+                    'employee_id': None,
+                    'error': f"第{row_number}行：员工编号 {entry['employee_code']} 不存在"
+                })
+                continue
+            
+            deductions_details = {
+                self._component_code(registry, code): {'amount': amount}
+                for code, amount in entry['deductions_details'].items()
+            }
+            total_deductions = entry['total_deductions'] or sum(
+                (Decimal(str(item['amount'])) for item in deductions_details.values()), Decimal('0')
+            )
+            entries.append(PayrollEntryCreate(
+                employee_id=employee_id,
+                payroll_period_id=payroll_period_id,
+                payroll_run_id=0,  # 由批量导入路径设置为周期的默认运行
+                gross_pay=entry['gross_pay'],
+                total_deductions=total_deductions,
+                net_pay=entry['net_pay'],
+                earnings_details={
+                    self._component_code(registry, code): {'amount': amount}
+                    for code, amount in entry['earnings_details'].items()
+                },
+                deductions_details=deductions_details,
+                calculation_inputs=entry['calculation_inputs'],
+                status_lookup_value_id=status_id
+            ))
+            row_numbers.append(row_number)
+        
+        return entries, row_numbers
+    
+    @staticmethod
+    def _component_code(registry, field: str) -> str:
+        """标准字段名对应的薪资组件代码（按代码大小写不敏感匹配，找不到时原样返回并由导入路径报错）"""
+        component = registry.get(field) or registry.get(field.upper())
+        return component.code if component else field
+    
+    def _imported_entry_status_id(self, db: Session) -> int:
+        """导入条目的默认状态ID"""
+        from ...crud.config import get_lookup_type_by_code, get_lookup_value_by_code
+        
+        status_type = get_lookup_type_by_code(db, "PAYROLL_ENTRY_STATUS")
+        if not status_type:
+            raise ValueError("PAYROLL_ENTRY_STATUS lookup type not found")
+        status = get_lookup_value_by_code(db, status_type.id, IMPORTED_ENTRY_STATUS_CODE)
+        if not status:
+            raise ValueError(f"PAYROLL_ENTRY_STATUS lookup value '{IMPORTED_ENTRY_STATUS_CODE}' not found")
+        return status.id
+    
     def _normalize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """标准化列名"""
         # 去除列名的前后空格
         df.columns = df.columns.str.strip()
         
         # 映射到标准字段名
-        new_columns = {}
-        for col in df.columns:
-            if col in self.column_mapping:
-                new_columns[col] = self.column_mapping[col]
-            else:
-                # 尝试模糊匹配
-                for cn_name, en_name in self.column_mapping.items():
-                    if cn_name in col or col in cn_name:
-                        new_columns[col] = en_name
-                        break
-                else:
-                    # 保持原列名，转为小写并替换空格
-                    new_columns[col] = col.lower().replace(' ', '_')
+        new_columns = {col: self._normalize_column_name(col) for col in df.columns}
         
         df = df.rename(columns=new_columns)
         return df
     
+    def _normalize_column_name(self, col: str) -> str:
+        """将单个列名映射到标准字段名"""
+        if col in self.column_mapping:
+            return self.column_mapping[col]
+        
+        # 尝试模糊匹配
+        for cn_name, en_name in self.column_mapping.items():
+            if cn_name in col or col in cn_name:
+                return en_name
+        
+        # 保持原列名，转为小写并替换空格
+        return col.lower().replace(' ', '_')
+    
     def _check_required_columns(self, df: pd.DataFrame) -> List[str]:
         """检查必要列是否存在"""
+        return self._missing_required_fields(df.columns)
+    
+    def _missing_required_fields(self, columns) -> List[str]:
+        """返回缺少的必要列（中文名）"""
         missing_columns = []
         for field in self.required_fields:
-            if field not in df.columns:
+            if field not in columns:
                 # 查找对应的中文名
                 cn_names = [cn for cn, en in self.column_mapping.items() if en == field]
                 cn_name = cn_names[0] if cn_names else field
@@ -242,6 +559,16 @@ class ExcelImportService:
         
         return df
     
+    def _convert_row_types(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """按行转换数据类型（与 _convert_data_types 的列转换规则一致）"""
+        for col, value in row.items():
+            if col in self.numeric_fields:
+                numeric_value = pd.to_numeric(value, errors='coerce') if value is not None else None
+                row[col] = 0 if numeric_value is None or pd.isna(numeric_value) else numeric_value
+            elif col in ['employee_code', 'employee_name', 'department']:
+                row[col] = '' if value is None else str(value)
+        return row
+    
     def _clean_data(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """清理数据"""
         cleaned_data = []
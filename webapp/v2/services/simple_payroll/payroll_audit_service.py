@@ -16,6 +16,7 @@ from ...models import (
 )
 from ...models.audit import AuditRuleConfiguration
 from ...pydantic_models.simple_payroll import AuditSummaryResponse, AuditAnomalyResponse
+from ..payroll_snapshot import mark_payroll_periods_stale
 
 logger = logging.getLogger(__name__)
 
@@ -163,6 +164,7 @@ class PayrollAuditService:
         if payroll_run:
             payroll_run.updated_at = datetime.now()
             self.db.commit()
+            mark_payroll_periods_stale(payroll_run.payroll_period_id)
         
         # 返回审核汇总
         return self.get_audit_summary(payroll_run_id)
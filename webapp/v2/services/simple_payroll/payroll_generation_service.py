@@ -117,8 +117,11 @@ class PayrollGenerationService:
         try:
             logger.info(f"🔍 [检查现有数据] 检查期间 {target_period_id} 的现有数据")
             
-            # 检查工资运行记录
-            existing_runs = self.db.query(PayrollRun).filter(
+            # 检查工资运行记录（条目数读取运行上维护的汇总字段，状态名称随运行一起查询）
+            from ...models.config import LookupValue
+            existing_runs = self.db.query(PayrollRun, LookupValue.name).outerjoin(
+                LookupValue, LookupValue.id == PayrollRun.status_lookup_value_id
+            ).filter(
                 PayrollRun.payroll_period_id == target_period_id
             ).all()
             
@@ -129,23 +132,14 @@ class PayrollGenerationService:
             }
             
             total_entries = 0
-            for run in existing_runs:
-                from ...models.payroll import PayrollEntry
-                entries_count = self.db.query(PayrollEntry).filter(
-                    PayrollEntry.payroll_run_id == run.id
-                ).count()
+            for run, status_name in existing_runs:
+                entries_count = run.total_employees or 0
                 total_entries += entries_count
                 
-                # 获取状态信息
-                from ...models.config import LookupValue
-                status = self.db.query(LookupValue).filter(
-                    LookupValue.id == run.status_lookup_value_id
-                ).first()
-                
                 payroll_data_info["runs"].append({
                     "id": run.id,
                     "run_date": run.run_date.isoformat() if run.run_date else None,
-                    "status_name": status.name if status else "未知状态",
+                    "status_name": status_name or "未知状态",
                     "entries_count": entries_count,
                     "total_gross_pay": float(run.total_gross_pay or 0),
                     "total_net_pay": float(run.total_net_pay or 0)
@@ -12,8 +12,10 @@ import logging
 
 from ...models import (
     PayrollRun, PayrollEntry, Employee, PayrollPeriod,
-    Department, Position, PayrollComponentDefinition
+    Department, Position
 )
+from ...models.payroll import PayrollEntryComponentValue
+from ...payroll_engine.component_registry import get_component_registry
 from ...pydantic_models.simple_payroll import (
     ReportGenerationRequest
 )
@@ -192,14 +194,13 @@ class PayrollReportService:
             # 构建查询
             query = """
             SELECT 
+                pe.id,
                 e.employee_code,
                 e.last_name || e.first_name as employee_name,
                 d.name as department_name,
                 p.name as position_name,
                 pe.gross_pay,
-                pe.net_pay,
-                pe.earnings_details,
-                pe.deductions_details
+                pe.net_pay
             FROM payroll.payroll_entries pe
             JOIN hr.employees e ON pe.employee_id = e.id
             LEFT JOIN hr.departments d ON e.department_id = d.id
@@ -211,6 +212,9 @@ class PayrollReportService:
             result = self.db.execute(text(query), {'payroll_run_id': request.payroll_run_id})
             rows = result.fetchall()
             
+            # 组件金额从按列存储的组件金额表读取，不再逐条解析 JSONB 明细
+            component_amounts = self._get_component_amounts(request.payroll_run_id)
+            
             # 获取薪资组件定义用于列标题
             earnings_components = self._get_payroll_components('EARNING')
             deductions_components = self._get_payroll_components('DEDUCTION')
@@ -256,17 +260,16 @@ class PayrollReportService:
                 }
                 
                 # 添加收入明细
-                earnings_details = row.earnings_details or {}
+                amounts = component_amounts.get(row.id, {})
                 for component in earnings_components:
                     key = f'earning_{component["code"]}'
-                    value = earnings_details.get(component['code'], 0)
+                    value = amounts.get(('EARNING', component['code']), 0)
                     row_data[key] = f"{value:.2f}"
                 
                 # 添加扣除明细
-                deductions_details = row.deductions_details or {}
                 for component in deductions_components:
                     key = f'deduction_{component["code"]}'
-                    value = deductions_details.get(component['code'], 0)
+                    value = amounts.get(('DEDUCTION', component['code']), 0)
                     row_data[key] = f"{value:.2f}"
                 
                 data.append(row_data)
@@ -291,14 +294,16 @@ class PayrollReportService:
             SELECT 
                 d.name as department_name,
                 COUNT(pe.id) as employee_count,
-                COALESCE(SUM((pe.deductions_details->>'personal_income_tax')::numeric), 0) as total_tax,
-                COALESCE(AVG((pe.deductions_details->>'personal_income_tax')::numeric), 0) as avg_tax,
+                COALESCE(SUM(tax.amount), 0) as total_tax,
+                COALESCE(AVG(tax.amount), 0) as avg_tax,
                 COALESCE(SUM(pe.gross_pay), 0) as total_taxable_income
-            FROM payroll.payroll_entries pe
+            FROM payroll.entry_component_values tax
+            JOIN payroll.payroll_entries pe ON pe.id = tax.entry_id
             JOIN hr.employees e ON pe.employee_id = e.id
             LEFT JOIN hr.departments d ON e.department_id = d.id
-            WHERE pe.payroll_run_id = :payroll_run_id
-            AND pe.deductions_details->>'personal_income_tax' IS NOT NULL
+            WHERE tax.payroll_run_id = :payroll_run_id
+            AND tax.section = 'DEDUCTION'
+            AND tax.component_code = 'PERSONAL_INCOME_TAX'
             GROUP BY d.name
             ORDER BY total_tax DESC
             """
@@ -348,16 +353,30 @@ class PayrollReportService:
         """生成社保汇总表"""
         try:
             query = """
+            WITH contributions AS (
+                SELECT 
+                    v.entry_id,
+                    SUM(v.amount) FILTER (WHERE v.component_code = 'PENSION_PERSONAL_AMOUNT') as pension_personal,
+                    SUM(v.amount) FILTER (WHERE v.component_code = 'MEDICAL_PERSONAL_AMOUNT') as medical_personal,
+                    SUM(v.amount) FILTER (WHERE v.component_code = 'UNEMPLOYMENT_PERSONAL_AMOUNT') as unemployment_personal,
+                    SUM(v.amount) FILTER (WHERE v.component_code = 'HOUSING_FUND_PERSONAL') as housing_fund_personal
+                FROM payroll.entry_component_values v
+                WHERE v.payroll_run_id = :payroll_run_id
+                AND v.section = 'DEDUCTION'
+                AND v.component_code IN ('PENSION_PERSONAL_AMOUNT', 'MEDICAL_PERSONAL_AMOUNT', 'UNEMPLOYMENT_PERSONAL_AMOUNT', 'HOUSING_FUND_PERSONAL')
+                GROUP BY v.entry_id
+            )
             SELECT 
                 d.name as department_name,
                 COUNT(pe.id) as employee_count,
-                COALESCE(SUM((pe.deductions_details->>'pension_personal')::numeric), 0) as pension_personal,
-                COALESCE(SUM((pe.deductions_details->>'medical_personal')::numeric), 0) as medical_personal,
-                COALESCE(SUM((pe.deductions_details->>'unemployment_personal')::numeric), 0) as unemployment_personal,
-                COALESCE(SUM((pe.deductions_details->>'housing_fund_personal')::numeric), 0) as housing_fund_personal
+                COALESCE(SUM(c.pension_personal), 0) as pension_personal,
+                COALESCE(SUM(c.medical_personal), 0) as medical_personal,
+                COALESCE(SUM(c.unemployment_personal), 0) as unemployment_personal,
+                COALESCE(SUM(c.housing_fund_personal), 0) as housing_fund_personal
             FROM payroll.payroll_entries pe
             JOIN hr.employees e ON pe.employee_id = e.id
             LEFT JOIN hr.departments d ON e.department_id = d.id
+            LEFT JOIN contributions c ON c.entry_id = pe.id
             WHERE pe.payroll_run_id = :payroll_run_id
             GROUP BY d.name
             ORDER BY d.name
@@ -490,18 +509,24 @@ class PayrollReportService:
         try:
             # 这里简化为按部门分析，实际应该根据成本中心字段
             query = """
+            WITH employer_contributions AS (
+                SELECT v.entry_id, SUM(v.amount) as amount
+                FROM payroll.entry_component_values v
+                WHERE v.payroll_run_id = :payroll_run_id
+                AND v.section = 'DEDUCTION'
+                AND v.component_code IN ('PENSION_EMPLOYER_AMOUNT', 'MEDICAL_EMPLOYER_AMOUNT', 'UNEMPLOYMENT_EMPLOYER_AMOUNT', 'HOUSING_FUND_EMPLOYER')
+                GROUP BY v.entry_id
+            )
             SELECT 
                 d.name as cost_center,
                 COUNT(pe.id) as employee_count,
                 COALESCE(SUM(pe.gross_pay), 0) as total_labor_cost,
                 COALESCE(AVG(pe.gross_pay), 0) as avg_labor_cost,
-                COALESCE(SUM((pe.deductions_details->>'pension_employer')::numeric), 0) +
-                COALESCE(SUM((pe.deductions_details->>'medical_employer')::numeric), 0) +
-                COALESCE(SUM((pe.deductions_details->>'unemployment_employer')::numeric), 0) +
-                COALESCE(SUM((pe.deductions_details->>'housing_fund_employer')::numeric), 0) as employer_contributions
+                COALESCE(SUM(ec.amount), 0) as employer_contributions
             FROM payroll.payroll_entries pe
             JOIN hr.employees e ON pe.employee_id = e.id
             LEFT JOIN hr.departments d ON e.department_id = d.id
+            LEFT JOIN employer_contributions ec ON ec.entry_id = pe.id
             WHERE pe.payroll_run_id = :payroll_run_id
             GROUP BY d.name
             ORDER BY total_labor_cost DESC
@@ -554,19 +579,33 @@ class PayrollReportService:
             logger.error(f"生成成本中心分析失败: {e}")
             raise
     
+    def _get_component_amounts(self, payroll_run_id: int) -> Dict[int, Dict[tuple, Decimal]]:
+        """获取薪资运行中各条目的组件金额: {条目ID: {(来源, 组件代码): 金额}}"""
+        rows = self.db.query(
+            PayrollEntryComponentValue.entry_id,
+            PayrollEntryComponentValue.section,
+            PayrollEntryComponentValue.component_code,
+            PayrollEntryComponentValue.amount
+        ).filter(
+            PayrollEntryComponentValue.payroll_run_id == payroll_run_id,
+            PayrollEntryComponentValue.section.in_(['EARNING', 'DEDUCTION'])
+        ).all()
+        
+        amounts: Dict[int, Dict[tuple, Decimal]] = {}
+        for entry_id, section, component_code, amount in rows:
+            amounts.setdefault(entry_id, {})[(section, component_code)] = amount
+        return amounts
+    
     def _get_payroll_components(self, component_type: str) -> List[Dict[str, str]]:
         """获取薪资组件定义"""
         try:
-            components = self.db.query(PayrollComponentDefinition).filter(
-                PayrollComponentDefinition.component_type == component_type,
-                PayrollComponentDefinition.is_active == True
-            ).order_by(PayrollComponentDefinition.display_order).all()
+            components = get_component_registry(self.db).of_type(component_type)
             
             return [
                 {
                     'code': comp.code,
                     'name': comp.name,
-                    'type': comp.component_type
+                    'type': comp.type
                 }
                 for comp in components
             ]
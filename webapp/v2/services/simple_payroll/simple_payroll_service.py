@@ -4,13 +4,13 @@
 """
 
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, func, case
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, and_, func, case, extract
 from datetime import datetime
 from decimal import Decimal
 import logging
 
-from ...models import PayrollPeriod, PayrollRun, Employee, Department, PayrollEntry, LookupValue
+from ...models import PayrollPeriod, PayrollRun, Employee, Department, LookupValue
 from ...pydantic_models.simple_payroll import (
     PayrollPeriodResponse, PayrollRunResponse
 )
@@ -68,19 +68,29 @@ class SimplePayrollService:
         page: int = 1,
         size: int = 50
     ) -> Dict[str, Any]:
-        """获取工资期间列表"""
-        logger.info(f"🔄 [SimplePayrollService.get_payroll_periods] 开始查询 - 参数: year={year}, month={month}, is_active={is_active}, page={page}, size={size}")
-        
+        """
+        获取工资期间列表
+
+        运行数、条目数和最新运行读取期间上由数据库触发器维护的汇总字段，
+        整页数据（含频率和状态名称）一次查询获得，不再逐个期间统计。
+        """
         try:
-            query = self.db.query(PayrollPeriod)
-            logger.info(f"📊 [SimplePayrollService.get_payroll_periods] 基础查询创建完成")
+            frequency = aliased(LookupValue)
+            period_status = aliased(LookupValue)
+            query = self.db.query(
+                PayrollPeriod,
+                frequency.name.label('frequency_name'),
+                period_status.name.label('status_name')
+            ).outerjoin(
+                frequency, frequency.id == PayrollPeriod.frequency_lookup_value_id
+            ).outerjoin(
+                period_status, period_status.id == PayrollPeriod.status_lookup_value_id
+            )
             
             # 应用筛选条件
             if year is not None:
-                from sqlalchemy import extract
                 query = query.filter(extract('year', PayrollPeriod.start_date) == year)
             if month is not None:
-                from sqlalchemy import extract
                 query = query.filter(extract('month', PayrollPeriod.start_date) == month)
             if is_active is not None:
                 # 假设活跃期间是那些有开始日期且未过期的期间
@@ -93,63 +103,29 @@ class SimplePayrollService:
             query = query.order_by(desc(PayrollPeriod.start_date))
             
             # 分页
-            total = query.count()
-            logger.info(f"📊 [SimplePayrollService.get_payroll_periods] 查询统计 - 总记录数: {total}")
-            
-            periods = query.offset((page - 1) * size).limit(size).all()
-            logger.info(f"📊 [SimplePayrollService.get_payroll_periods] 分页查询完成 - 当前页记录数: {len(periods)}")
+            total = query.order_by(None).count()
+            rows = query.offset((page - 1) * size).limit(size).all()
             
             result = []
-            for period in periods:
-                # 获取该期间的工资运行统计
-                try:
-                    runs_count = self.db.query(PayrollRun).filter(
-                        PayrollRun.payroll_period_id == period.id
-                    ).count()
-                    logger.info(f"🔍 [调试] 期间 {period.id} 的运行统计: {runs_count}")
-                except Exception as e:
-                    logger.error(f"❌ 统计运行数失败: {e}")
-                    runs_count = 0
-                
-                # 获取最新运行的基本信息
-                latest_run = self.db.query(PayrollRun).filter(
-                    PayrollRun.payroll_period_id == period.id
-                ).order_by(desc(PayrollRun.run_date)).first()
-                
-                # 使用SQL实时统计该期间的工资条目数量（所有PayrollRun的总和）
-                try:
-                    entries_count = self.db.query(PayrollEntry).filter(
-                        PayrollEntry.payroll_period_id == period.id
-                    ).count()
-                    logger.info(f"🔍 [调试] 期间 {period.id} 的条目统计: {entries_count}")
-                except Exception as e:
-                    logger.error(f"❌ 统计条目数失败: {e}")
-                    entries_count = 0
-                
-                # 计算状态
-                status = "empty"  # 无数据
-                if latest_run:
-                    # 根据PayrollRun模型的实际字段判断状态
-                    # 这里简化处理，可以根据实际业务需求调整
-                    status = "calculated"  # 已计算
-                
-                logger.info(f"📊 [期间统计] ID={period.id}, 名称={period.name}, 运行数={runs_count}, 条目数={entries_count}")
+            for period, frequency_name, status_name in rows:
+                # 没有设置期间状态时按是否已有工资运行显示
+                status = "calculated" if period.latest_run_id else "empty"
                 
                 result.append(PayrollPeriodResponse(
                     id=period.id,
                     name=period.name,
                     description=None,  # 模型中没有description字段
                     frequency_id=period.frequency_lookup_value_id,
-                    frequency_name=period.frequency.name if period.frequency else "未知",
+                    frequency_name=frequency_name or "未知",
                     status_id=period.status_lookup_value_id or 0,
-                    status_name=period.status_lookup.name if period.status_lookup else status,
+                    status_name=status_name or status,
                     is_active=True,  # 暂时设为True
                     start_date=period.start_date,
                     end_date=period.end_date,
-                    runs_count=runs_count,
-                    entries_count=entries_count,  # 实际工资条目数量
+                    runs_count=period.runs_count,
+                    entries_count=period.entries_count,
                     created_at=datetime.now(),  # 模型中没有created_at字段，使用当前时间
-                    updated_at=datetime.now()   # 模型中没有updated_at字段，使用当前时间
+                    updated_at=period.updated_at
                 ))
             
             # 返回分页格式
@@ -163,7 +139,7 @@ class SimplePayrollService:
                 }
             }
             
-            logger.info(f"✅ [SimplePayrollService.get_payroll_periods] 查询完成 - 返回 {len(result)} 条记录")
+            logger.info(f"✅ [SimplePayrollService.get_payroll_periods] 查询完成 - 返回 {len(result)}/{total} 条记录")
             return response_data
             
         except Exception as e:
@@ -176,7 +152,12 @@ class SimplePayrollService:
         page: int = 1, 
         size: int = 20
     ) -> Dict[str, Any]:
-        """获取指定期间的工资运行列表"""
+        """
+        获取指定期间的工资运行列表
+
+        条目数和金额合计读取工资运行上由数据库触发器维护的汇总字段（total_employees 即条目数），
+        状态名称随运行一起查询。
+        """
         try:
             # 验证期间是否存在
             period = self.db.query(PayrollPeriod).filter(
@@ -186,78 +167,46 @@ class SimplePayrollService:
             if not period:
                 raise ValueError(f"工资期间 {period_id} 不存在")
             
-            # 🎯 修改查询逻辑：优先选择有薪资条目数据的工资运行，然后按时间排序
-            # 使用子查询统计每个工资运行的薪资条目数量
-            entry_count_subquery = self.db.query(
-                PayrollEntry.payroll_run_id,
-                func.count(PayrollEntry.id).label('entries_count')
-            ).group_by(PayrollEntry.payroll_run_id).subquery()
+            entries_count = func.coalesce(PayrollRun.total_employees, 0)
             
-            # 主查询，左连接获取薪资条目统计，并按以下顺序排序：
-            # 1. 有数据的工资运行优先（entries_count > 0）
-            # 2. 同等条件下按创建时间倒序排列
+            # 有薪资条目的工资运行优先，同等条件下按运行时间倒序
             query = self.db.query(
                 PayrollRun,
-                func.coalesce(entry_count_subquery.c.entries_count, 0).label('entries_count')
+                LookupValue.name.label('status_name')
             ).outerjoin(
-                entry_count_subquery,
-                PayrollRun.id == entry_count_subquery.c.payroll_run_id
+                LookupValue, LookupValue.id == PayrollRun.status_lookup_value_id
             ).filter(
                 PayrollRun.payroll_period_id == period_id
             ).order_by(
-                desc(case((func.coalesce(entry_count_subquery.c.entries_count, 0) > 0, 1), else_=0)),  # 有数据的优先
-                desc(PayrollRun.run_date)  # 然后按时间倒序
+                desc(case((entries_count > 0, 1), else_=0)),
+                desc(PayrollRun.run_date)
             )
             
-            total = query.count()
+            total = period.runs_count
             results = query.offset((page - 1) * size).limit(size).all()
             
             result = []
-            for index, (run, entries_count) in enumerate(results):
-                # 查询真实的状态信息
-                status_name = "未知状态"
-                status_id = run.status_lookup_value_id or 60  # 默认为待计算
-                
-                if run.status_lookup_value_id:
-                    status_lookup = self.db.query(LookupValue).filter(
-                        LookupValue.id == run.status_lookup_value_id
-                    ).first()
-                    if status_lookup:
-                        status_name = status_lookup.name
-                        status_id = status_lookup.id
-                
-                # 使用预查询的条目数量
-                entries_count = entries_count or 0
-                
-                # 计算汇总金额
-                entry_stats = self.db.query(
-                    func.sum(PayrollEntry.gross_pay).label('total_gross'),
-                    func.sum(PayrollEntry.total_deductions).label('total_deductions'),
-                    func.sum(PayrollEntry.net_pay).label('total_net')
-                ).filter(PayrollEntry.payroll_run_id == run.id).first()
-                
-                total_gross_pay = entry_stats.total_gross or Decimal('0.00')
-                total_deductions = entry_stats.total_deductions or Decimal('0.00')
-                total_net_pay = entry_stats.total_net or Decimal('0.00')
+            for index, (run, status_name) in enumerate(results, start=(page - 1) * size + 1):
+                entries_count = run.total_employees or 0
                 
                 # 构建响应数据
                 result.append(PayrollRunResponse(
                     id=run.id,
                     period_id=period_id,
                     period_name=period.name,
-                    version_number=index + 1,  # 简单的版本号
-                    status_id=status_id,
-                    status_name=status_name,
+                    version_number=index,  # 简单的版本号
+                    status_id=run.status_lookup_value_id or 60,  # 默认为待计算
+                    status_name=status_name or "未知状态",
                     total_entries=entries_count,
-                    total_gross_pay=total_gross_pay,
-                    total_net_pay=total_net_pay,
-                    total_deductions=total_deductions,
+                    total_gross_pay=run.total_gross_pay or Decimal('0.00'),
+                    total_net_pay=run.total_net_pay or Decimal('0.00'),
+                    total_deductions=run.total_deductions or Decimal('0.00'),
                     initiated_by_user_id=run.initiated_by_user_id or 1,
                     initiated_by_username="系统",
                     initiated_at=run.run_date or datetime.now(),
                     calculated_at=run.run_date,
                     approved_at=None,
-                    description=f"工资运行 #{index + 1}" + (f" (含{entries_count}条薪资数据)" if entries_count > 0 else " (无薪资数据)")
+                    description=f"工资运行 #{index}" + (f" (含{entries_count}条薪资数据)" if entries_count > 0 else " (无薪资数据)")
                 ))
             
             logger.info(f"✅ [get_payroll_versions] 期间 {period_id} 获取到 {len(result)} 个工资运行，已按有数据优先+时间倒序排列")
@@ -0,0 +1,245 @@
+"""
+已验证令牌缓存
+
+认证依赖在每个请求上都会重新验证 JWT 签名并查询用户。页面加载时前端会用同一个令牌并发发出大量请求，
+这里在进程内缓存验证结果：
+
+- 以令牌的 SHA-256 摘要为键（不保存令牌原文），条目在令牌的 exp 到期时失效；
+- 条目同时保存用户快照，快照记录创建时的权限缓存代数（permission_cache.generation），
+  用户、角色或权限变更后代数变化，快照需要重新查询，但无需再次验证签名；
+- 快照的最长使用时间与权限缓存的 TTL 一致，权限变更通知不可用时也能限制过期时间；
+- revoke_token / revoke_user 用于吊销令牌或移除用户的所有令牌，吊销的令牌在到期前不会再次通过验证；
+  吊销通过权限缓存的 LISTEN/NOTIFY 频道广播，所有 worker 都会生效（通知只包含令牌摘要）。
+  监听不可用的 worker 收不到广播，直到令牌到期前仍可能接受已吊销的令牌。
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import event
+import hashlib
+import threading
+import time
+import logging
+
+from .permission_cache import permission_cache, publish_notification
+
+logger = logging.getLogger(__name__)
+
+# 最多缓存的令牌数
+MAX_ENTRIES = 4096
+
+# 令牌没有 exp 时的有效期（秒）
+DEFAULT_TTL_SECONDS = 300
+
+# 失效频道上的吊销通知前缀（载荷分别为 "令牌摘要:到期时间" 和用户名，空用户名表示所有用户）
+TOKEN_REVOCATION_PREFIX = "#revoke-token:"
+USER_REVOCATION_PREFIX = "#revoke-user:"
+
+
+class TokenEntry:
+    """一个已验证令牌的缓存条目"""
+
+    __slots__ = ("username", "expires_at", "user", "generation", "loaded_at")
+
+    def __init__(self, username: str, expires_at: float):
+        self.username = username
+        self.expires_at = expires_at
+        self.user: Any = None
+        self.generation = -1
+        self.loaded_at = 0.0
+
+    @property
+    def user_is_fresh(self) -> bool:
+        """用户快照是否仍然可用"""
+        return (
+            self.user is not None
+            and self.generation == permission_cache.generation
+            and time.monotonic() - self.loaded_at <= permission_cache.ttl_seconds
+        )
+
+
+class TokenVerificationCache:
+    """进程内共享的已验证令牌缓存（LRU + 令牌到期时间 + 吊销）"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, TokenEntry]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revocations = 0
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[TokenEntry]:
+        """获取已验证令牌的条目，不存在、已过期或已吊销时返回 None"""
+        # 吊销广播由权限缓存的监听线程接收
+        permission_cache.ensure_listener()
+        key = self.token_key(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, token: str, username: str, exp: Optional[float]) -> Optional[TokenEntry]:
+        """
+        缓存验证通过的令牌
+
+        Args:
+            exp: 令牌的 exp 声明（Unix 时间戳），为空时使用默认有效期
+
+        Returns:
+            新条目；令牌已吊销时返回 None
+        """
+        key = self.token_key(token)
+        now = time.time()
+        expires_at = float(exp) if exp else now + DEFAULT_TTL_SECONDS
+
+        with self._lock:
+            if key in self._revoked:
+                return None
+            entry = TokenEntry(username, expires_at)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def set_user(self, entry: TokenEntry, user: Any, generation: int) -> None:
+        """
+        保存条目的用户快照
+
+        Args:
+            generation: 开始查询用户前的权限缓存代数
+        """
+        entry.user = user
+        entry.generation = generation
+        entry.loaded_at = time.monotonic()
+
+    def is_revoked(self, token: str) -> bool:
+        key = self.token_key(token)
+        with self._lock:
+            expires_at = self._revoked.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._revoked[key]
+                return False
+            return True
+
+    def revoke_token(self, token: str, exp: Optional[float] = None) -> float:
+        """
+        在本进程吊销单个令牌（如用户退出登录），需要通知所有 worker 时使用模块函数 revoke_token
+
+        Args:
+            exp: 令牌的 exp 声明，吊销记录保留到令牌到期；为空时使用缓存条目的到期时间
+
+        Returns:
+            吊销记录的到期时间
+        """
+        return self.revoke_key(self.token_key(token), exp)
+
+    def revoke_key(self, key: str, exp: Optional[float] = None) -> float:
+        """按令牌摘要吊销（处理其他进程的吊销通知）"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if exp is None:
+                exp = entry.expires_at if entry else now + DEFAULT_TTL_SECONDS
+            self._revoked[key] = float(exp)
+            # 顺便清理已到期的吊销记录
+            for revoked_key in [k for k, v in self._revoked.items() if v <= now]:
+                del self._revoked[revoked_key]
+            self.revocations += 1
+        return float(exp)
+
+    def revoke_user(self, username: Optional[str] = None) -> None:
+        """
+        在本进程移除某个用户（为空时所有用户）的已验证令牌，之后的请求重新验证签名并查询用户
+
+        需要通知所有 worker 时使用模块函数 revoke_user。
+        """
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, e in self._entries.items() if e.username == username]:
+                    del self._entries[key]
+            self.revocations += 1
+        logger.info(f"🗑️ [令牌缓存] 已移除已验证令牌: {username or '所有用户'}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "revocations": self.revocations,
+            }
+
+
+# 所有认证依赖共享的已验证令牌缓存
+token_verification_cache = TokenVerificationCache()
+
+
+def revoke_token(token: str, exp: Optional[float] = None, db: Optional[Session] = None) -> None:
+    """
+    吊销单个令牌并通知所有 worker
+
+    Args:
+        db: 提供时随该会话的事务提交送达其他 worker，否则立即发送
+    """
+    key = token_verification_cache.token_key(token)
+    expires_at = token_verification_cache.revoke_key(key, exp)
+    publish_notification(f"{TOKEN_REVOCATION_PREFIX}{key}:{expires_at}", db)
+
+
+def revoke_user(username: Optional[str] = None, db: Optional[Session] = None) -> None:
+    """
+    移除用户（为空时所有用户）已缓存的令牌验证结果并通知所有 worker
+
+    用户被停用或删除时调用，之后该用户的令牌需要重新验证签名并查询用户。
+
+    Args:
+        db: 提供时随该会话的事务提交送达其他 worker，否则立即发送
+    """
+    token_verification_cache.revoke_user(username)
+    publish_notification(f"{USER_REVOCATION_PREFIX}{username or ''}", db)
+    if db is not None:
+        # 提交前可能有并发请求重新缓存了该用户的令牌
+        event.listen(db, "after_commit", lambda session: token_verification_cache.revoke_user(username), once=True)
+
+
+def _on_token_revoked(payload: str) -> None:
+    key, _, exp = payload.partition(":")
+    token_verification_cache.revoke_key(key, float(exp) if exp else None)
+
+
+def _on_user_revoked(payload: str) -> None:
+    token_verification_cache.revoke_user(payload or None)
+
+
+permission_cache.add_notification_handler(TOKEN_REVOCATION_PREFIX, _on_token_revoked)
+permission_cache.add_notification_handler(USER_REVOCATION_PREFIX, _on_user_revoked)
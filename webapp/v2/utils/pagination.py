@@ -0,0 +1,201 @@
+"""
+键集（游标）分页和估算总数工具。
+
+LIMIT/OFFSET 分页的耗时随页码线性增长，深分页需要扫描并丢弃前面所有行；
+键集分页记住上一页最后一行的排序键和ID，下一页直接从该位置继续，任意页与第一页一样快。
+
+- 游标对调用方不透明：base64url 编码的 JSON，包含排序规格（用于校验）和上一页最后一行的键值
+- 排序规则统一为 “排序键 NULLS LAST，ID” ，保证顺序稳定且与游标条件一致
+- 总数可选择精确 COUNT(*)、基于执行计划的估算值或不计算
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+# 总数计算方式
+COUNT_MODE_EXACT = "exact"
+COUNT_MODE_ESTIMATED = "estimated"
+COUNT_MODE_NONE = "none"
+COUNT_MODES = (COUNT_MODE_EXACT, COUNT_MODE_ESTIMATED, COUNT_MODE_NONE)
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或与当前排序不一致。"""
+    pass
+
+
+class InvalidSortFieldError(ValueError):
+    """排序字段不是查询对象的列。"""
+    pass
+
+
+def quote_identifier(name: str) -> str:
+    """将已校验的列名引用为 SQL 标识符。"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+# 游标中日期、时间和精确小数的类型标记。
+# 解码后恢复为原类型再作为绑定参数，asyncpg 等按参数类型严格编码的驱动不接受字符串形式的时间和小数
+_TYPED_DECODERS = {
+    "dt": datetime.fromisoformat,
+    "d": date.fromisoformat,
+    "dec": Decimal,
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$t": "dt", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {"$t": "d", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$t": "dec", "v": str(value)}
+    raise TypeError(f"无法编码到游标的类型: {type(value).__name__}")
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and value.get("$t") in _TYPED_DECODERS:
+        return _TYPED_DECODERS[value["$t"]](value["v"])
+    return value
+
+
+def encode_cursor(sort_spec: str, values: Sequence[Any]) -> str:
+    """
+    生成游标。
+
+    Args:
+        sort_spec: 排序规格（如 "gross_pay:desc"），解码时校验，防止游标用于其他排序
+        values: 上一页最后一行的排序键值（最后一个为ID）
+    """
+    payload = json.dumps({"s": sort_spec, "v": list(values)}, default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_spec: str) -> List[Any]:
+    """
+    解析游标，返回排序键值。
+
+    Raises:
+        InvalidCursorError: 游标格式错误或排序规格不一致
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = payload["v"]
+        spec = payload["s"]
+        if spec == sort_spec and isinstance(values, list):
+            values = [_decode_value(value) for value in values]
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        raise InvalidCursorError(f"无效的分页游标: {e}")
+    if spec != sort_spec or not isinstance(values, list):
+        raise InvalidCursorError("分页游标与当前排序条件不一致")
+    return values
+
+
+def keyset_sql(
+    sort_expr: Optional[str],
+    id_expr: str,
+    descending: bool,
+    cursor_values: Optional[Sequence[Any]],
+    param_prefix: str = "cursor"
+) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    为原生SQL查询构建键集分页的排序和条件。
+
+    sort_expr 和 id_expr 会原样拼接到SQL中，只能传入已校验并引用的标识符
+    （见 quote_identifier），不能直接使用客户端传入的字段名。
+
+    Args:
+        sort_expr: 排序键标识符（为空表示只按ID排序）
+        id_expr: 唯一ID标识符
+        descending: 是否降序
+        cursor_values: 解码后的游标键值（None 表示第一页）
+
+    Returns:
+        (ORDER BY 子句, WHERE 条件（第一页为空字符串）, 绑定参数)
+    """
+    direction = "DESC" if descending else "ASC"
+    op = "<" if descending else ">"
+    id_param = f"{param_prefix}_id"
+    key_param = f"{param_prefix}_key"
+
+    if not sort_expr:
+        order_clause = f"ORDER BY {id_expr} {direction}"
+        if cursor_values is None:
+            return order_clause, "", {}
+        return order_clause, f"{id_expr} {op} :{id_param}", {id_param: cursor_values[-1]}
+
+    order_clause = f"ORDER BY {sort_expr} {direction} NULLS LAST, {id_expr} {direction}"
+    if cursor_values is None:
+        return order_clause, "", {}
+
+    key_value, id_value = cursor_values[0], cursor_values[-1]
+    if key_value is None:
+        # 已进入排序键为 NULL 的尾部，只按ID继续
+        condition = f"({sort_expr} IS NULL AND {id_expr} {op} :{id_param})"
+        return order_clause, condition, {id_param: id_value}
+
+    # 行值比较可以直接利用 (排序键, ID) 上的索引
+    condition = f"(({sort_expr}, {id_expr}) {op} (:{key_param}, :{id_param}) OR {sort_expr} IS NULL)"
+    return order_clause, condition, {key_param: key_value, id_param: id_value}
+
+
+def keyset_filter(columns: Sequence[Any], id_column: Any, cursor_values: Sequence[Any]):
+    """
+    为 ORM 查询构建键集分页条件（所有排序列升序、NULLS LAST，最后按ID）。
+
+    Args:
+        columns: 排序列（不含ID）
+        id_column: 唯一ID列
+        cursor_values: 解码后的游标键值，顺序与 columns 一致，最后一个为ID
+    """
+    all_columns = list(columns) + [id_column]
+    clauses = []
+    # 按字典序展开：前 i 列相等且第 i 列更大
+    for i, column in enumerate(all_columns):
+        value = cursor_values[i]
+        prefix = [
+            (col.is_(None) if cursor_values[j] is None else col == cursor_values[j])
+            for j, col in enumerate(all_columns[:i])
+        ]
+        if value is None:
+            # NULLS LAST：NULL 之后没有更大的非 NULL 值
+            continue
+        greater = column > value
+        if column is not id_column:
+            greater = or_(greater, column.is_(None))
+        clauses.append(and_(*prefix, greater))
+    return or_(*clauses)
+
+
+def keyset_order(columns: Sequence[Any], id_column: Any) -> List[Any]:
+    """与 keyset_filter 一致的 ORM 排序（NULLS LAST，最后按ID）。"""
+    return [column.asc().nulls_last() for column in columns] + [id_column.asc()]
+
+
+def estimate_count(db: Session, statement: Union[str, Any], params: Optional[Dict[str, Any]] = None) -> int:
+    """
+    根据 PostgreSQL 执行计划估算查询返回的行数，不实际执行查询。
+
+    估算值来自表统计信息，ANALYZE 后通常足够用于分页显示；需要精确值时使用 COUNT(*)。
+
+    Args:
+        statement: 使用 :name 绑定参数的 SQL 文本，或 SQLAlchemy Select / ORM Query
+        params: SQL 文本的绑定参数
+    """
+    if isinstance(statement, str):
+        result = db.execute(text(f"EXPLAIN (FORMAT JSON) {statement}"), params or {})
+    else:
+        statement = getattr(statement, "statement", statement)
+        compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+        result = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])